@@ -0,0 +1,117 @@
+"""
+Benchmark: envío de alertas de Telegram contra un servidor local.
+
+Levanta un servidor HTTP que imita sendMessage de Telegram (con latencia
+configurable y un 429 con `retry_after` cada --throttle-every peticiones) y
+apunta TELEGRAM_API_URL a él. Simula --bars cierres de vela con una alerta
+por activo y compara:
+
+    síncrono     send_telegram_alert() por alerta (lo que hacía el scheduler)
+    dispatcher   AlertDispatcher.submit(): encola y vuelve; agrupa por vela,
+                 limita la tasa y reintenta en segundo plano
+
+Reporta p50/p99 de lo que bloquea cada alerta al llamador, peticiones HTTP
+enviadas y tiempo total hasta entregar todo. También reenvía la primera vela
+para comprobar la deduplicación por (symbol, bar_time).
+
+Uso:
+    python benchmarks/bench_alerts.py
+    python benchmarks/bench_alerts.py --symbols 10 --bars 5 --latency-ms 300
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC_DIR)
+
+
+class StubTelegram(BaseHTTPRequestHandler):
+    latency = 0.1
+    throttle_every = 0
+    lock = threading.Lock()
+    received = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        time.sleep(self.latency)
+        with self.lock:
+            self.received.append(body)
+            n = len(self.received)
+        if self.throttle_every and n % self.throttle_every == 0:
+            payload = {'ok': False, 'error_code': 429, 'parameters': {'retry_after': 1}}
+            self.send_response(429)
+        else:
+            payload = {'ok': True, 'result': {'message_id': n}}
+            self.send_response(200)
+        data = json.dumps(payload).encode()
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--symbols', type=int, default=5)
+    parser.add_argument('--bars', type=int, default=3)
+    parser.add_argument('--latency-ms', type=float, default=150)
+    parser.add_argument('--throttle-every', type=int, default=4, help='un 429 cada N peticiones (0 = nunca)')
+    parser.add_argument('--coalesce', type=float, default=0.5)
+    parser.add_argument('--rate-per-minute', type=float, default=600)
+    args = parser.parse_args()
+
+    StubTelegram.latency = args.latency_ms / 1000
+    StubTelegram.throttle_every = args.throttle_every
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubTelegram)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    os.environ.update(TELEGRAM_API_URL=f"http://127.0.0.1:{server.server_address[1]}",
+                      TELEGRAM_TOKEN='bench', TELEGRAM_CHAT_ID='1')
+    from alerts import AlertDispatcher, send_telegram_alert, format_prediction_message
+
+    symbols = [f"SYM{i}-USD" for i in range(args.symbols)]
+    alerts = [(s, f"2024-01-01 00:{b:02d}:00", 100.0 + b, 1, 85.0) for b in range(args.bars) for s in symbols]
+    print(f"{len(alerts)} alertas ({args.symbols} activos x {args.bars} velas), "
+          f"latencia del servidor {args.latency_ms:.0f} ms, 429 cada {args.throttle_every} peticiones")
+    print(f"{'caso':<12}{'p50 ms':>10}{'p99 ms':>10}{'peticiones':>12}{'total s':>9}")
+
+    def report(name, blocked, requests_before, total):
+        p50, p99 = np.percentile(np.array(blocked) * 1000, [50, 99])
+        print(f"{name:<12}{p50:>10.2f}{p99:>10.2f}{len(StubTelegram.received) - requests_before:>12}{total:>9.2f}")
+
+    before, blocked, t0 = len(StubTelegram.received), [], time.perf_counter()
+    for symbol, _, price, pred, conf in alerts:
+        t = time.perf_counter()
+        send_telegram_alert(format_prediction_message(symbol, price, pred, conf))
+        blocked.append(time.perf_counter() - t)
+    report('síncrono', blocked, before, time.perf_counter() - t0)
+
+    dispatcher = AlertDispatcher(coalesce=args.coalesce, rate_per_minute=args.rate_per_minute)
+    before, blocked, t0 = len(StubTelegram.received), [], time.perf_counter()
+    for b in range(args.bars):
+        for symbol, bar_time, price, pred, conf in alerts[b * args.symbols:(b + 1) * args.symbols]:
+            t = time.perf_counter()
+            dispatcher.submit(symbol, bar_time, price, pred, conf)
+            blocked.append(time.perf_counter() - t)
+        # Siguiente cierre de vela
+        time.sleep(args.coalesce * 2)
+    # Reenvío de la primera vela: no debe generar mensajes
+    for symbol, bar_time, price, pred, conf in alerts[:args.symbols]:
+        dispatcher.submit(symbol, bar_time, price, pred, conf)
+    dispatcher.flush(timeout=60)
+    report('dispatcher', blocked, before, time.perf_counter() - t0)
+    print(f"\nEstadísticas del dispatcher: {dispatcher.stats}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
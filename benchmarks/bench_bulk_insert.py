@@ -0,0 +1,105 @@
+"""
+Benchmark: filas/s al guardar predicciones en PostgreSQL (usa las variables DB_* del .env).
+
+    fila a fila         save_predictions([fila]) por predicción: un checkout y un commit
+                        por fila, como un bucle sobre el camino del scheduler
+    execute_values      save_predictions(filas) con page_size 100 (el de psycopg2) y
+                        DB_INSERT_PAGE_SIZE
+    COPY                copy_predictions(filas): COPY a tabla temporal + INSERT ... SELECT
+
+Cada caso escribe con su propio model_version para no chocar con los demás, y
+después se repite la misma carga para comprobar que es idempotente (0 filas
+escritas). Las filas usan bar_interval='bench' y se borran al terminar.
+
+Uso:
+    python benchmarks/bench_bulk_insert.py
+    python benchmarks/bench_bulk_insert.py --rows 200000 --single-rows 5000
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC_DIR)
+
+from dotenv import load_dotenv  # noqa: E402
+load_dotenv(os.path.join(os.path.dirname(SRC_DIR), '.env'))
+
+from database import (init_db, get_connection, save_predictions, copy_predictions,  # noqa: E402
+                      DB_INSERT_PAGE_SIZE)
+from ingestion import SYMBOLS  # noqa: E402
+from schema import ensure_partitions  # noqa: E402
+
+BENCH_INTERVAL = 'bench'
+
+
+def make_rows(n, version):
+    """n predicciones repartidas entre los activos soportados, una vela de 1m por fila y activo."""
+    rng = np.random.default_rng(0)
+    per_symbol = -(-n // len(SYMBOLS))
+    end = pd.Timestamp.now(tz='UTC').floor('min').tz_localize(None)
+    bar_times = pd.date_range(end=end, periods=per_symbol, freq='1min').to_pydatetime()
+    rows = [{
+        'symbol': SYMBOLS[i % len(SYMBOLS)], 'bar_time': bar_times[i // len(SYMBOLS)],
+        'bar_interval': BENCH_INTERVAL, 'model_version': version,
+        'entry_price': float(30000 + rng.normal(0, 100)), 'prediction': int(rng.random() > 0.5),
+        'confidence': float(50 + 50 * rng.random()),
+    } for i in range(n)]
+    return rows, bar_times[0]
+
+
+def cleanup():
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM predictions WHERE bar_interval = %s", (BENCH_INTERVAL,))
+        cur.close()
+
+
+def single(rows):
+    return sum(len(save_predictions([r])) for r in rows)
+
+
+def run(name, fn, rows):
+    t0 = time.perf_counter()
+    written = fn(rows)
+    elapsed = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    rewritten = fn(rows)
+    again = time.perf_counter() - t0
+    print(f"{name:<24}{len(rows):>9}{len(rows) / elapsed:>12,.0f}{written:>10}{rewritten:>12}{again:>11.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50_000)
+    parser.add_argument('--single-rows', type=int, default=2_000, help='filas del caso fila a fila (es lento)')
+    args = parser.parse_args()
+
+    init_db()
+    cases = [
+        ('fila a fila', single, args.single_rows),
+        ('execute_values p=100', lambda rows: len(save_predictions(rows, page_size=100)), args.rows),
+        (f'execute_values p={DB_INSERT_PAGE_SIZE}', lambda rows: len(save_predictions(rows)), args.rows),
+        ('execute_values upsert', lambda rows: len(save_predictions(rows, upsert=True)), args.rows),
+        ('COPY', copy_predictions, args.rows),
+    ]
+    payloads = [make_rows(n, f'bench-{i}') for i, (_, _, n) in enumerate(cases)]
+    with get_connection() as conn:
+        cur = conn.cursor()
+        ensure_partitions(cur, start=min(start for _, start in payloads).date())
+        cur.close()
+
+    print(f"{'caso':<24}{'filas':>9}{'filas/s':>12}{'escritas':>10}{'repetición':>12}{'rep. s':>11}")
+    try:
+        cleanup()
+        for (name, fn, _), (rows, _) in zip(cases, payloads):
+            run(name, fn, rows)
+    finally:
+        cleanup()
+
+
+if __name__ == '__main__':
+    main()
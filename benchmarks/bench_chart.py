@@ -0,0 +1,91 @@
+"""
+Benchmark: datos del gráfico de velas del dashboard con zoom "Todo".
+
+    completo      todas las velas + MA20 calculada con rolling (lo que hacía app.py)
+    reducido      chart_data.ChartSeries desde cero (CHART_POINTS cubetas + LTTB)
+    incremental   ChartSeries.update con una vela nueva (el refresco habitual)
+
+Tamaño del payload: JSON de la figura de Plotly (velas + MA20) si plotly está
+instalado; si no, el JSON de las mismas columnas (aproximado).
+
+Uso:
+    python benchmarks/bench_chart.py
+    python benchmarks/bench_chart.py --sizes 17000 100000 1000000 --points 1200
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'src'))
+sys.path.insert(0, BENCH_DIR)
+
+from chart_data import ChartSeries, CHART_POINTS  # noqa: E402
+from storage import read_legacy_csv  # noqa: E402
+from suite import raw_datasets, scaled_ohlcv  # noqa: E402
+
+try:
+    import plotly.graph_objects as go
+except ImportError:
+    go = None
+
+
+def payload_bytes(ohlc, ma):
+    if go is not None:
+        fig = go.Figure()
+        fig.add_trace(go.Candlestick(x=ohlc.index, open=ohlc['Open'], high=ohlc['High'],
+                                     low=ohlc['Low'], close=ohlc['Close']))
+        fig.add_trace(go.Scatter(x=ma.index, y=ma))
+        return len(fig.to_json())
+    data = {'x': ohlc.index.astype(str).tolist(), 'ma_x': ma.index.astype(str).tolist(),
+            'ma': [None if np.isnan(v) else v for v in ma.to_numpy()]}
+    data.update({col: ohlc[col].tolist() for col in ['Open', 'High', 'Low', 'Close']})
+    return len(json.dumps(data))
+
+
+def best(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[17_000, 100_000, 1_000_000])
+    parser.add_argument('--points', type=int, default=CHART_POINTS)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    base = read_legacy_csv(next(iter(raw_datasets().values())))
+    print(f"payload: {'plotly to_json' if go is not None else 'JSON de columnas (plotly no instalado)'}")
+    print(f"{'velas':>10}{'caso':>13}{'puntos':>8}{'ms':>10}{'payload KB':>12}")
+    for n in args.sizes:
+        df = scaled_ohlcv(base, n + 1)
+        current = df.iloc[:n]
+
+        def full():
+            return current, current['Close'].rolling(window=20).mean()
+
+        def reduced():
+            return ChartSeries('1m', None, args.points).update(current)
+
+        series = ChartSeries('1m', None, args.points)
+        series.update(current)
+
+        def incremental():
+            # Misma vela nueva en cada repetición: el estado ya la contiene tras la primera
+            return series.update(df)
+
+        for name, fn in [('completo', full), ('reducido', reduced), ('incremental', incremental)]:
+            seconds, (ohlc, ma) = best(fn, args.repeat)
+            print(f"{n:>10,}{name:>13}{len(ohlc):>8,}{seconds * 1000:>10.1f}{payload_bytes(ohlc, ma) / 1024:>12,.0f}")
+
+
+if __name__ == '__main__':
+    main()
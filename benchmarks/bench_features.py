@@ -0,0 +1,153 @@
+"""
+Benchmark: cálculo de features con la implementación pandas anterior vs
+indicators.py (kernels NumPy), sobre un frame sintético de --rows velas de 1m
+(retornos reales re-muestreados, ver suite.scaled_ohlcv).
+
+    pandas       calculate_features tal como estaba antes de indicators.py
+                 (rolling de pandas + columnas intermedias), copiada aquí como referencia
+    numpy base   calculate_features() actual: las 8 columnas de siempre
+    numpy <set>  calculate_features(features=FEATURE_SETS[set]) para cada conjunto
+
+Cada caso corre en un proceso nuevo (pico de RSS propio). Con --assets N el
+frame se reparte en N activos apilados (group_col='Symbol'). Antes de medir
+comprueba que pandas y NumPy coinciden en las columnas base; si no, termina con error.
+
+Uso:
+    python benchmarks/bench_features.py                       # 10M filas
+    python benchmarks/bench_features.py --rows 1000000 --assets 3 --repeat 5
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+import numpy as np
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(BENCH_DIR), 'src')
+sys.path.insert(0, SRC_DIR)
+
+from features import calculate_features, BASE_COLUMNS  # noqa: E402
+from indicators import FEATURE_SETS  # noqa: E402
+
+
+def pandas_features(df, group_col=None):
+    """calculate_features previo a indicators.py (referencia de paridad y de velocidad)."""
+    df = df.copy()
+    groups = df[group_col].to_numpy() if group_col else None
+    pos = df.groupby(group_col, sort=False).cumcount().to_numpy() if group_col else None
+
+    def mask_warmup(series, min_pos):
+        if pos is not None:
+            series = series.mask(pos < min_pos)
+        return series
+
+    def rolling(series, window, how):
+        if groups is None:
+            return getattr(series.rolling(window=window), how)()
+        result = getattr(series.groupby(groups, sort=False).rolling(window=window), how)()
+        return pd.Series(result.to_numpy(), index=series.index)
+
+    for col in ['Open', 'High', 'Low', 'Close', 'Volume']:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    df['MA_20'] = rolling(df['Close'], 20, 'mean')
+    df['Returns_1m'] = mask_warmup(df['Close'].pct_change(1), 1)
+    df['Returns_2m'] = mask_warmup(df['Close'].pct_change(2), 2)
+    df['Dist_MA_20'] = (df['Close'] - df['MA_20']) / df['MA_20']
+    delta = mask_warmup(df['Close'].diff(), 1)
+    gain = rolling(delta.where(delta > 0, 0), 14, 'mean')
+    loss = rolling(-delta.where(delta < 0, 0), 14, 'mean')
+    df['RSI_14'] = 100 - (100 / (1 + gain / loss))
+    std_20 = rolling(df['Close'], 20, 'std')
+    df['BB_Upper'] = df['MA_20'] + (std_20 * 2)
+    df['BB_Lower'] = df['MA_20'] - (std_20 * 2)
+    bb_width = (df['BB_Upper'] - df['BB_Lower']).replace(0, 0.000001)
+    df['BB_Position'] = (df['Close'] - df['BB_Lower']) / bb_width
+    df.replace([float('inf'), float('-inf')], 0, inplace=True)
+    return df
+
+
+def make_frame(rows, assets, seed=42):
+    from suite import raw_datasets, scaled_ohlcv
+    from storage import read_legacy_csv
+    base = read_legacy_csv(next(iter(raw_datasets().values())))
+    df = scaled_ohlcv(base, rows, seed)
+    if assets > 1:
+        df['Symbol'] = np.repeat([f'A{i}' for i in range(assets)], -(-rows // assets))[:rows]
+    return df
+
+
+def check_parity(rows, assets):
+    df = make_frame(rows, assets, seed=7)
+    group_col = 'Symbol' if assets > 1 else None
+    expected = pandas_features(df, group_col)
+    actual = calculate_features(df, group_col)
+    for col in BASE_COLUMNS:
+        a, b = expected[col].to_numpy(), actual[col].to_numpy()
+        # Tolerancia relativa a la escala de la columna (BB_Position cerca de 0, precios...)
+        scale = np.nanmax(np.abs(a)) if np.isfinite(a).any() else 1.0
+        if not np.allclose(a, b, rtol=1e-6, atol=1e-6 * scale, equal_nan=True):
+            worst = np.nanmax(np.abs(a - b))
+            raise SystemExit(f"Paridad: {col} difiere de pandas (máx. {worst:.3g})")
+    print(f"Paridad OK en {rows:,} filas ({', '.join(BASE_COLUMNS)})")
+
+
+_CHILD = """
+import sys, time, json, resource
+sys.path.insert(0, {src!r}); sys.path.insert(0, {bench!r})
+from bench_features import make_frame, pandas_features
+from features import calculate_features
+from indicators import FEATURE_SETS
+df = make_frame({rows}, {assets})
+group_col = 'Symbol' if {assets} > 1 else None
+case = {case!r}
+if case == 'pandas':
+    fn = lambda: pandas_features(df, group_col)
+elif case == 'base':
+    fn = lambda: calculate_features(df, group_col)
+else:
+    fn = lambda: calculate_features(df, group_col, features=FEATURE_SETS[case])
+times = []
+for _ in range({repeat}):
+    t0 = time.perf_counter()
+    out = fn()
+    times.append(time.perf_counter() - t0)
+    del out
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps({{'seconds': min(times), 'rss_mb': rss}}))
+"""
+
+
+def run_case(case, args):
+    code = _CHILD.format(src=SRC_DIR, bench=BENCH_DIR, rows=args.rows, assets=args.assets,
+                         case=case, repeat=args.repeat)
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--assets', type=int, default=1, help='activos apilados (group_col)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--parity-rows', type=int, default=200_000)
+    args = parser.parse_args()
+
+    check_parity(args.parity_rows, args.assets)
+    cases = ['pandas', 'base'] + [s for s in FEATURE_SETS if s != 'base']
+    print(f"\n{args.rows:,} filas, {args.assets} activo(s), mejor de {args.repeat}")
+    print(f"{'caso':<16}{'columnas':>9}{'segundos':>10}{'filas/s':>14}{'RSS MB':>9}{'vs pandas':>11}")
+    reference = None
+    for case in cases:
+        result = run_case(case, args)
+        reference = reference or result['seconds']
+        n_cols = len(BASE_COLUMNS) + len(set(FEATURE_SETS.get(case, [])) - set(BASE_COLUMNS))
+        name = case if case == 'pandas' else f'numpy {case}'
+        print(f"{name:<16}{n_cols:>9}{result['seconds']:>10.2f}{args.rows / result['seconds']:>14,.0f}"
+              f"{result['rss_mb']:>9.0f}{reference / result['seconds']:>10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
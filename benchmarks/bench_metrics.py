@@ -0,0 +1,100 @@
+"""
+Benchmark: coste de la instrumentación (metrics.py) habilitada y deshabilitada.
+
+Mide en un proceso nuevo por caso (METRICS_ENABLED se lee al importar):
+
+    vacío      la función sin instrumentar
+    timer      `with timer(...)` con dos etiquetas
+    timed      función decorada con @timed
+    inc        un contador con una etiqueta
+
+y, como referencia, una inferencia de una fila con el bosque compilado
+(forest_predictor), que es la operación instrumentada más rápida del pipeline.
+
+Uso:
+    python benchmarks/bench_metrics.py
+    python benchmarks/bench_metrics.py --calls 1000000
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+_CHILD = """
+import sys, time, json
+sys.path.insert(0, {src!r})
+from metrics import timer, timed, inc
+calls = {calls}
+
+def noop():
+    pass
+
+@timed('bench_seconds', stage='x')
+def decorated():
+    pass
+
+def bench(fn):
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - t0) / calls * 1e9
+
+def with_timer():
+    with timer('bench_seconds', stage='predict', symbol='BTC-USD'):
+        pass
+
+out = {{
+    'vacío': bench(noop),
+    'timer': bench(with_timer),
+    'timed': bench(decorated),
+    'inc': bench(lambda: inc('bench_total', symbol='BTC-USD')),
+}}
+print(json.dumps(out))
+"""
+
+_REFERENCE = """
+import sys, time, json
+import numpy as np
+sys.path.insert(0, {src!r})
+from sklearn.ensemble import RandomForestClassifier
+from forest_predictor import compile_model
+rng = np.random.default_rng(0)
+X = rng.normal(size=(20000, 5))
+model = RandomForestClassifier(n_estimators=100, max_depth=10, min_samples_leaf=5, random_state=42).fit(X, X[:, 0] > 0)
+predictor = compile_model(model)
+x = X[:1]
+t0 = time.perf_counter()
+for _ in range(2000):
+    predictor.predict(x)
+print(json.dumps((time.perf_counter() - t0) / 2000 * 1e9))
+"""
+
+
+def run(code, enabled):
+    env = dict(os.environ, METRICS_ENABLED='1' if enabled else '0')
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True, env=env)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=200_000)
+    args = parser.parse_args()
+
+    code = _CHILD.format(src=SRC_DIR, calls=args.calls)
+    results = {True: run(code, True), False: run(code, False)}
+    reference = run(_REFERENCE.format(src=SRC_DIR), True)
+
+    print(f"{'caso':<10}{'habilitado ns':>15}{'deshabilitado ns':>18}")
+    for case in results[True]:
+        print(f"{case:<10}{results[True][case]:>15.0f}{results[False][case]:>18.0f}")
+    overhead = results[True]['timer'] - results[True]['vacío']
+    print(f"\nReferencia: predicción de una fila = {reference / 1000:.0f} µs; un timer habilitado "
+          f"añade {overhead:.0f} ns ({overhead / reference:.2%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark: carga en frío de un modelo, .pkl antiguo vs artefacto versionado.
+
+Entrena un RandomForest con la configuración por defecto sobre datos
+sintéticos, lo guarda como el .pkl de siempre (modelo + DataFrame de
+importancias en un único pickle) y en el formato nuevo (meta.json +
+model.joblib sin comprimir y comprimido), y mide en un proceso nuevo:
+
+    meta     sólo la metadata (lo que necesita el dashboard)
+    full     metadata + bosque (lo que necesita el scheduler)
+
+Uso:
+    python benchmarks/bench_model_load.py
+    python benchmarks/bench_model_load.py --rows 200000 --trees 300 --max-depth 16
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+import pandas as pd
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC_DIR)
+
+import joblib  # noqa: E402
+from sklearn.ensemble import RandomForestClassifier  # noqa: E402
+from train_model import FEATURES, MODEL_PARAMS  # noqa: E402
+from model_registry import save_artifact, legacy_path  # noqa: E402
+
+TICKER = 'BENCH-USD'
+
+_CHILD = """
+import sys, time, json, resource
+sys.path.insert(0, {src!r})
+import joblib
+import sklearn.ensemble  # noqa: F401  (se mide la carga, no el import de sklearn)
+from model_registry import load_metadata, load_artifact
+kind, what, models_dir, legacy, mmap = {kind!r}, {what!r}, {models_dir!r}, {legacy!r}, {mmap!r}
+rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+t0 = time.perf_counter()
+if kind == 'pkl':
+    pack = joblib.load(legacy)
+elif what == 'meta':
+    pack = load_metadata({ticker!r}, models_dir=models_dir)
+else:
+    pack = load_artifact({ticker!r}, models_dir=models_dir, mmap=mmap)
+elapsed = time.perf_counter() - t0
+rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{'seconds': elapsed, 'load_rss_mb': (rss_after - rss_before) / 1024}}))
+"""
+
+
+def measure(kind, what, models_dir, legacy, mmap=False, repeat=5):
+    runs = []
+    for _ in range(repeat):
+        code = _CHILD.format(src=SRC_DIR, kind=kind, what=what, models_dir=models_dir,
+                             legacy=legacy, mmap=mmap, ticker=TICKER)
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return min(runs, key=lambda r: r['seconds'])
+
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--trees', type=int, default=MODEL_PARAMS['n_estimators'])
+    parser.add_argument('--max-depth', type=int, default=MODEL_PARAMS['max_depth'])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--workdir', default=None)
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='bench_model_load_')
+    print(f"Entrenando {args.trees} árboles (max_depth={args.max_depth}) sobre {args.rows:,} filas...")
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(args.rows, len(FEATURES))), columns=FEATURES)
+    y = (X.iloc[:, 0] + rng.normal(size=args.rows) > 0).astype(int)
+    params = dict(MODEL_PARAMS, n_estimators=args.trees, max_depth=args.max_depth)
+    model = RandomForestClassifier(**params, n_jobs=-1).fit(X, y)
+    model.set_params(n_jobs=None)
+    pack = {
+        'model': model, 'features': FEATURES, 'interval': '5m', 'ticker': TICKER,
+        'feature_importance': pd.DataFrame({'Feature': FEATURES, 'Importance': model.feature_importances_}),
+        'metrics': {'accuracy': 0.5}, 'params': params, 'tuning': None,
+    }
+
+    legacy = legacy_path(TICKER, workdir)
+    joblib.dump(pack, legacy)
+    dirs = {'raw': os.path.join(workdir, 'raw'), 'zlib3': os.path.join(workdir, 'zlib3')}
+    save_artifact(pack, models_dir=dirs['raw'], compress=0)
+    save_artifact(pack, models_dir=dirs['zlib3'], compress=3)
+
+    cases = [
+        ('pkl (antiguo)', 'pkl', 'full', None, False, os.path.getsize(legacy)),
+        ('v1 meta', 'v1', 'meta', dirs['raw'], False, None),
+        ('v1 full', 'v1', 'full', dirs['raw'], False, dir_size(dirs['raw'])),
+        ('v1 full mmap', 'v1', 'full', dirs['raw'], True, dir_size(dirs['raw'])),
+        ('v1 full zlib=3', 'v1', 'full', dirs['zlib3'], False, dir_size(dirs['zlib3'])),
+    ]
+    print(f"{'caso':<16}{'tamaño MB':>11}{'carga ms':>10}{'+RSS MB':>9}{'speedup':>9}")
+    baseline = None
+    for name, kind, what, models_dir, mmap, size in cases:
+        r = measure(kind, what, models_dir, legacy, mmap, args.repeat)
+        baseline = baseline or r['seconds']
+        size_txt = f"{size / 1e6:.1f}" if size else "-"
+        print(f"{name:<16}{size_txt:>11}{r['seconds'] * 1000:>10.1f}{r['load_rss_mb']:>9.0f}"
+              f"{baseline / r['seconds']:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark: latencia de get_history y de la calificación sobre una tabla
+`predictions` grande, en un PostgreSQL local (usa las variables DB_* del .env).
+
+Siembra N filas con generate_series (en el servidor, sin round-trips), repartidas
+entre los activos soportados y varios meses, con un porcentaje pendiente de
+calificar. Después mide p50/p95 de:
+
+    - get_history(limit=10)                 (todas las monedas)
+    - get_history(limit=10, symbol=...)     (índice symbol, timestamp DESC)
+    - get_pending_predictions(symbol, 1000) (índice parcial WHERE result IS NULL)
+    - grade_predictions(1000 filas)         (UPDATE ... FROM (VALUES ...))
+
+Uso:
+    python benchmarks/bench_predictions_db.py --rows 5000000
+    python benchmarks/bench_predictions_db.py --rows 2000000 --no-seed   # reusar datos
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC_DIR)
+
+from dotenv import load_dotenv  # noqa: E402
+load_dotenv(os.path.join(os.path.dirname(SRC_DIR), '.env'))
+
+from database import (init_db, get_connection, get_history, get_pending_predictions,  # noqa: E402
+                      grade_predictions)
+from ingestion import SYMBOLS  # noqa: E402
+from schema import ensure_partitions  # noqa: E402
+
+BENCH_INTERVAL = 'bench'
+
+
+def seed(rows, days, pending_ratio):
+    """Filas sintéticas con bar_interval='bench' para poder limpiarlas después."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT (now() - make_interval(days => %s))::date", (days,))
+        ensure_partitions(cur, start=cur.fetchone()[0])
+        cur.execute("""
+            INSERT INTO predictions (timestamp, symbol, bar_time, bar_interval,
+                                     entry_price, prediction, confidence, result)
+            SELECT ts, (%(symbols)s)[1 + (g %% %(n_symbols)s)], ts, %(interval)s,
+                   30000 + random() * 1000, (random() > 0.5)::int, 50 + random() * 50,
+                   CASE WHEN random() < %(pending)s THEN NULL ELSE (random() > 0.5)::int END
+            FROM (
+                SELECT g, now()::timestamp - make_interval(secs => (%(rows)s - g) * %(step)s) AS ts
+                FROM generate_series(1, %(rows)s) AS g
+            ) s
+            ON CONFLICT DO NOTHING
+        """, {
+            'symbols': SYMBOLS, 'n_symbols': len(SYMBOLS), 'interval': BENCH_INTERVAL,
+            'pending': pending_ratio, 'rows': rows, 'step': days * 86400.0 / rows,
+        })
+        cur.execute("ANALYZE predictions")
+        cur.close()
+
+
+def cleanup():
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM predictions WHERE bar_interval = %s", (BENCH_INTERVAL,))
+        cur.close()
+
+
+def measure(name, fn, repeat):
+    fn()  # calentamiento (pool, caché de planes)
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(f"  {name:<40}p50 {statistics.median(samples):>8.2f} ms   p95 {p95:>8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--days', type=int, default=365, help='Rango temporal de las filas sembradas')
+    parser.add_argument('--pending', type=float, default=0.01, help='Fracción sin calificar')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--no-seed', action='store_true')
+    parser.add_argument('--keep', action='store_true', help='No borrar las filas sembradas al terminar')
+    args = parser.parse_args()
+
+    init_db()
+    if not args.no_seed:
+        t0 = time.perf_counter()
+        seed(args.rows, args.days, args.pending)
+        print(f"Sembradas {args.rows:,} filas en {time.perf_counter() - t0:.1f}s")
+
+    symbol = SYMBOLS[0]
+    pending = get_pending_predictions([symbol], limit=1000)
+    results = [(int(i), 1) for i in pending['id']]
+
+    print(f"\nLatencias ({args.repeat} repeticiones):")
+    measure("get_history(limit=10)", lambda: get_history(10), args.repeat)
+    measure(f"get_history(limit=10, symbol={symbol})", lambda: get_history(10, symbol=symbol), args.repeat)
+    measure("get_pending_predictions(limit=1000)", lambda: get_pending_predictions([symbol], limit=1000), args.repeat)
+    # only_pending=False: re-califica las mismas filas en cada repetición
+    measure(f"grade_predictions({len(results)} filas)", lambda: grade_predictions(results, only_pending=False),
+            max(1, args.repeat // 5))
+
+    if not args.keep:
+        cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark: inferencia de una fila con sklearn vs el bosque compilado.
+
+Entrena un RandomForest con la configuración por defecto sobre datos
+sintéticos y compara:
+
+    sklearn DataFrame   lo que hacía el scheduler (DataFrame de 1 fila + predict_proba)
+    sklearn ndarray     predict_proba sobre un array (sin pandas)
+    compilado           forest_predictor.FlatForest.predict (clase + probabilidad; los
+                        lotes de SKLEARN_MIN_ROWS filas o más los resuelve sklearn)
+
+Antes de medir comprueba la paridad con sklearn sobre --parity-rows filas
+(con NaN y valores extremos incluidos): misma clase y misma probabilidad. Si no coinciden,
+el script termina con error.
+
+Reporta p50/p99 por llamada para 1 fila y para lotes de --batch filas.
+
+Uso:
+    python benchmarks/bench_predictor.py
+    python benchmarks/bench_predictor.py --trees 300 --max-depth 16 --calls 5000
+"""
+import os
+import sys
+import time
+import argparse
+import warnings
+import numpy as np
+import pandas as pd
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC_DIR)
+
+from sklearn.ensemble import RandomForestClassifier  # noqa: E402
+from train_model import FEATURES, MODEL_PARAMS  # noqa: E402
+from forest_predictor import compile_model, SKLEARN_MIN_ROWS  # noqa: E402
+
+
+def check_parity(model, predictor, X):
+    # predict() delega en sklearn para lotes grandes: se comprueba el recorrido aplanado
+    # directamente y también predict() con lotes pequeños
+    expected = model.predict_proba(X)
+    proba = predictor.predict_proba_flat(X)
+    small = X[:SKLEARN_MIN_ROWS - 1]
+    classes, confidence, proba_small = predictor.predict(small)
+    if not np.array_equal(proba_small, proba[:len(small)]):
+        raise SystemExit("Paridad: predict() no coincide con el recorrido aplanado")
+    classes = predictor.classes_[proba.argmax(axis=1)]
+    if not np.array_equal(classes, model.predict(X)):
+        raise SystemExit("Paridad: las clases no coinciden con sklearn")
+    err = float(np.abs(proba - expected).max())
+    if err > 1e-12:
+        raise SystemExit(f"Paridad: probabilidad distinta de sklearn (error máx {err:.3g})")
+    if not np.allclose(confidence, expected[:len(small)].max(axis=1)):
+        raise SystemExit("Paridad: la confianza no es la probabilidad de la clase elegida")
+    return err
+
+
+def latencies(fn, inputs):
+    times = []
+    for x in inputs:
+        t0 = time.perf_counter()
+        fn(x)
+        times.append(time.perf_counter() - t0)
+    return np.percentile(np.array(times) * 1e6, [50, 99])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000, help='filas de entrenamiento')
+    parser.add_argument('--trees', type=int, default=MODEL_PARAMS['n_estimators'])
+    parser.add_argument('--max-depth', type=int, default=MODEL_PARAMS['max_depth'])
+    parser.add_argument('--parity-rows', type=int, default=100_000)
+    parser.add_argument('--calls', type=int, default=2000, help='llamadas medidas por caso')
+    parser.add_argument('--batch', type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"Entrenando {args.trees} árboles (max_depth={args.max_depth}) sobre {args.rows:,} filas...")
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(args.rows, len(FEATURES))), columns=FEATURES)
+    y = (X.iloc[:, 0] + rng.normal(size=args.rows) > 0).astype(int)
+    params = dict(MODEL_PARAMS, n_estimators=args.trees, max_depth=args.max_depth)
+    model = RandomForestClassifier(**params, n_jobs=-1).fit(X, y)
+    model.set_params(n_jobs=None)
+    # Entrenado con DataFrame (como train_model); los casos con ndarray no llevan nombres
+    warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+    t0 = time.perf_counter()
+    predictor = compile_model(model)
+    print(f"Compilado en {(time.perf_counter() - t0) * 1000:.1f} ms "
+          f"({len(predictor.feature):,} nodos)")
+
+    X_parity = rng.normal(size=(args.parity_rows, len(FEATURES)))
+    X_parity[::97, 1] = np.nan
+    X_parity[::89, 2] = 1e30
+    err = check_parity(model, predictor, X_parity)
+    print(f"Paridad OK sobre {args.parity_rows:,} filas (error máx de probabilidad {err:.1e})")
+
+    def sklearn_frame(x):
+        proba = model.predict_proba(pd.DataFrame(x, columns=FEATURES))
+        return model.classes_[proba.argmax(axis=1)], proba.max(axis=1)
+
+    def sklearn_array(x):
+        proba = model.predict_proba(x)
+        return model.classes_[proba.argmax(axis=1)], proba.max(axis=1)
+
+    cases = [('sklearn DataFrame', sklearn_frame), ('sklearn ndarray', sklearn_array),
+             ('compilado', predictor.predict)]
+    for label, size, calls in [('1 fila', 1, args.calls), (f'lote de {args.batch}', args.batch, max(args.calls // 20, 20))]:
+        inputs = [rng.normal(size=(size, len(FEATURES))) for _ in range(calls)]
+        print(f"\n{label} ({calls} llamadas)")
+        print(f"{'caso':<20}{'p50 µs':>12}{'p99 µs':>12}{'µs/fila':>10}{'speedup':>9}")
+        baseline = None
+        for name, fn in cases:
+            fn(inputs[0])
+            p50, p99 = latencies(fn, inputs)
+            baseline = baseline or p50
+            print(f"{name:<20}{p50:>12.1f}{p99:>12.1f}{p50 / size:>10.2f}{baseline / p50:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark: re-entrenamiento completo (train_model) vs incremental (refresh_model)
+cuando llegan --new velas nuevas a un dataset de N velas (datasets sintéticos de
+1m re-muestreando los retornos reales, ver suite.scaled_ohlcv).
+
+    completo      train_model sobre las N velas, con la matriz de features ya en
+                  caché (sólo el ajuste de 100 árboles y la evaluación)
+    incremental   refresh_model: matriz de features extendida desde la caché y
+                  MODEL_REFRESH_TREES árboles nuevos sobre las últimas
+                  MODEL_REFRESH_WINDOW filas (el resto del bosque se conserva)
+
+Modelos, caché de features y datasets van a un directorio temporal.
+
+Uso:
+    python benchmarks/bench_refresh.py
+    python benchmarks/bench_refresh.py --sizes 100000 1000000 --new 288
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import contextlib
+import io
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+WORKDIR = tempfile.mkdtemp(prefix='bench_refresh_')
+# Antes de importar train_model: los módulos leen estas variables al importarse
+os.environ['MODELS_DIR'] = os.path.join(WORKDIR, 'models')
+os.environ['FEATURE_CACHE_DIR'] = os.path.join(WORKDIR, 'features')
+
+import storage  # noqa: E402
+from storage import save_ohlcv, training_data_path, read_legacy_csv  # noqa: E402
+from train_model import train_model, refresh_model  # noqa: E402
+from suite import raw_datasets, scaled_ohlcv  # noqa: E402
+
+storage.DATA_DIR = WORKDIR
+
+
+def timed_call(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    # Los informes de entrenamiento no aportan nada aquí
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn(*args, **kwargs)
+    return time.perf_counter() - t0, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 500_000])
+    parser.add_argument('--new', type=int, default=60, help='velas nuevas entre entrenamientos')
+    args = parser.parse_args()
+
+    base = read_legacy_csv(next(iter(raw_datasets().values())))
+    print(f"{'filas':>10}{'nuevas':>8}{'completo s':>12}{'incremental s':>15}{'aceleración':>13}{'acc nuevas':>12}")
+    for n in args.sizes:
+        ticker = f'BENCH-{n}'
+        df = scaled_ohlcv(base, n)
+        path = training_data_path(ticker)
+        # Modelo base sobre todo menos la cola; luego llega la cola
+        save_ohlcv(df.iloc[:-args.new], path)
+        timed_call(train_model, ticker, '1m')
+        save_ohlcv(df, path)
+        refresh_seconds, result = timed_call(refresh_model, ticker, '1m')
+        full_seconds, _ = timed_call(train_model, ticker, '1m')
+        print(f"{n:>10,}{args.new:>8}{full_seconds:>12.2f}{refresh_seconds:>15.2f}"
+              f"{full_seconds / refresh_seconds:>12.1f}x{result['accuracy']:>12.3f}")
+    print(f"\nDirectorio de trabajo: {WORKDIR}")
+
+
+if __name__ == '__main__':
+    main()
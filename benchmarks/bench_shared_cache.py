@@ -0,0 +1,91 @@
+"""
+Benchmark: llamadas al origen con N sesiones del dashboard abiertas.
+
+Simula --sessions sesiones (hilos) que refrescan cada --refresh segundos y,
+en cada refresco, leen las velas y 3 consultas de predicciones de un activo,
+como app.py. El origen (almacén de velas / Postgres) se imita con una espera
+de --latency-ms. Compara:
+
+    sin caché    cada sesión llama al origen en cada refresco
+    compartida   shared_cache.SharedCache: una llamada por clave y vela; las
+                 sesiones que llegan a la vez esperan a la que ya está en curso
+
+Uso:
+    python benchmarks/bench_shared_cache.py
+    python benchmarks/bench_shared_cache.py --sessions 50 --duration 20 --interval 1m
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC_DIR)
+
+from shared_cache import SharedCache, bar_slot, ttl_until_next_bar  # noqa: E402
+
+QUERIES = ['candles', 'history', 'latest', 'summary']
+
+
+def run(sessions, duration, refresh, latency, interval, cache=None):
+    calls = {'n': 0}
+    lock = threading.Lock()
+    frame = pd.DataFrame(np.random.default_rng(0).normal(size=(20_000, 5)),
+                         columns=['Open', 'High', 'Low', 'Close', 'Volume'])
+    page_times = []
+
+    def upstream(kind):
+        with lock:
+            calls['n'] += 1
+        time.sleep(latency)
+        return frame if kind == 'candles' else frame.tail(10)
+
+    def session(offset):
+        time.sleep(offset)
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            t0 = time.perf_counter()
+            for kind in QUERIES:
+                if cache is None:
+                    upstream(kind)
+                else:
+                    key = (kind, 'BTC-USD', interval, bar_slot(interval, grace=0).isoformat())
+                    cache.get_or_load(key, lambda kind=kind: upstream(kind), ttl_until_next_bar(interval, grace=0))
+            with lock:
+                page_times.append(time.perf_counter() - t0)
+            time.sleep(refresh)
+
+    rng = np.random.default_rng(1)
+    threads = [threading.Thread(target=session, args=(rng.uniform(0, refresh),)) for _ in range(sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return calls['n'], len(page_times), np.percentile(np.array(page_times) * 1000, [50, 99])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=10, help='segundos simulados')
+    parser.add_argument('--refresh', type=float, default=1.0, help='segundos entre refrescos de una sesión')
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--interval', default='1m')
+    args = parser.parse_args()
+
+    print(f"{args.sessions} sesiones, refresco cada {args.refresh}s durante {args.duration}s, "
+          f"{len(QUERIES)} lecturas por página, origen {args.latency_ms:.0f} ms")
+    print(f"{'caso':<12}{'páginas':>9}{'al origen':>11}{'p50 ms':>9}{'p99 ms':>9}")
+    cache = SharedCache(cache_dir='')
+    for name, c in [('sin caché', None), ('compartida', cache)]:
+        upstream, pages, (p50, p99) = run(args.sessions, args.duration, args.refresh,
+                                          args.latency_ms / 1000, args.interval, c)
+        print(f"{name:<12}{pages:>9}{upstream:>11}{p50:>9.1f}{p99:>9.1f}")
+    print(f"\nContadores de la caché: {cache.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark: carga del dataset de entrenamiento CSV (ruta antigua) vs Parquet / Arrow IPC.
+
+Genera un histórico sintético de velas de 1m de varios años, lo guarda en los
+tres formatos y mide, cada lectura en un proceso nuevo, el tiempo de carga y el
+pico de memoria (RSS máximo del proceso hijo).
+
+Uso:
+    python benchmarks/bench_storage.py --years 3
+    python benchmarks/bench_storage.py --years 1 --columns Close
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+import pandas as pd
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC_DIR)
+
+from storage import save_ohlcv  # noqa: E402
+
+
+def synthetic_ohlcv(n_rows, freq='1min', seed=42, start='2020-01-01'):
+    """Paseo aleatorio geométrico con OHLCV coherente (High >= max(O, C), Low <= min(O, C))."""
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.0008, n_rows)))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    spread = np.abs(rng.normal(0, 0.0005, n_rows)) * close
+    high = np.maximum(open_, close) + spread
+    low = np.minimum(open_, close) - spread
+    volume = rng.integers(0, 5_000_000, n_rows)
+    index = pd.date_range(start, periods=n_rows, freq=freq, tz='UTC', name='Datetime')
+    return pd.DataFrame({'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume}, index=index)
+
+
+def write_legacy_csv(df, path, ticker='BTC-USD'):
+    """Mismo layout que guardaba yfinance: 3 filas de cabecera (Price / Ticker / Datetime)."""
+    out = df[['Close', 'High', 'Low', 'Open', 'Volume']].copy()
+    out.columns = pd.MultiIndex.from_product([out.columns, [ticker]], names=['Price', 'Ticker'])
+    out.to_csv(path)
+
+
+_CHILD = """
+import sys, time, json, resource
+sys.path.insert(0, {src!r})
+from storage import read_legacy_csv, load_ohlcv
+fmt, path, columns = {fmt!r}, {path!r}, {columns!r}
+rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+t0 = time.perf_counter()
+if fmt == 'csv':
+    df = read_legacy_csv(path)
+    if columns:
+        df = df[columns]
+else:
+    df = load_ohlcv(path, columns=columns)
+elapsed = time.perf_counter() - t0
+rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{'seconds': elapsed, 'rows': len(df),
+                  'peak_rss_mb': rss_after / 1024, 'load_rss_mb': (rss_after - rss_before) / 1024}}))
+"""
+
+
+def measure(fmt, path, columns=None, repeat=3):
+    runs = []
+    for _ in range(repeat):
+        code = _CHILD.format(src=SRC_DIR, fmt=fmt, path=path, columns=columns)
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    best = min(runs, key=lambda r: r['seconds'])
+    return {'format': fmt, 'size_mb': os.path.getsize(path) / 1e6, **best}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--years', type=float, default=3.0, help='Años de velas de 1m a generar')
+    parser.add_argument('--columns', nargs='*', default=None, help='Proyección de columnas (p.ej. Close)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workdir', default=None)
+    args = parser.parse_args()
+
+    n_rows = int(args.years * 365 * 24 * 60)
+    workdir = args.workdir or tempfile.mkdtemp(prefix='bench_storage_')
+    print(f"Generando {n_rows:,} velas de 1m en {workdir}...")
+    df = synthetic_ohlcv(n_rows)
+
+    paths = {
+        'csv': os.path.join(workdir, 'raw_BTC_USD_data.csv'),
+        'parquet': os.path.join(workdir, 'raw_BTC_USD_data.parquet'),
+        'arrow': os.path.join(workdir, 'raw_BTC_USD_data.arrow'),
+    }
+    write_legacy_csv(df, paths['csv'])
+    save_ohlcv(df, paths['parquet'])
+    save_ohlcv(df, paths['arrow'])
+    del df
+
+    # pico RSS = máximo del proceso; +RSS carga = lo que añade la lectura sobre los imports
+    print(f"{'formato':<10}{'tamaño MB':>12}{'carga s':>10}{'pico RSS MB':>14}{'+RSS carga':>12}{'speedup':>10}")
+    results = [measure(fmt, path, args.columns, args.repeat) for fmt, path in paths.items()]
+    csv_seconds = results[0]['seconds']
+    for r in results:
+        print(f"{r['format']:<10}{r['size_mb']:>12.1f}{r['seconds']:>10.3f}{r['peak_rss_mb']:>14.0f}"
+              f"{r['load_rss_mb']:>12.0f}{csv_seconds / r['seconds']:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark: pico de memoria del entrenamiento completo sobre historias largas
+(datasets sintéticos de 1m re-muestreando los retornos reales, ver
+suite.scaled_ohlcv), guardados en Parquet como los de data/.
+
+    completo     train_model(low_memory=False): DataFrame de velas + caché de
+                 features (matriz float64) + X + splits
+    acotado      train_model(low_memory=True): matriz float32 construida por
+                 bloques de TRAIN_CHUNK_ROWS velas (training_matrix.py)
+    acotado N    lo mismo con --max-rows N (sólo las N velas más recientes)
+
+Cada caso corre en un proceso nuevo (pico de RSS propio). Se entrenan --trees
+árboles (el pico de memoria no depende del número de árboles con n_jobs=1).
+Modelos, caché de features y datasets van a un directorio temporal.
+
+Uso:
+    python benchmarks/bench_training_memory.py
+    python benchmarks/bench_training_memory.py --sizes 10000000 --trees 5 --max-rows 2000000
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(BENCH_DIR), 'src')
+sys.path.insert(0, SRC_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from storage import save_ohlcv, training_data_path, read_legacy_csv  # noqa: E402
+from suite import raw_datasets, scaled_ohlcv  # noqa: E402
+
+_CHILD = """
+import os, sys, io, time, json, contextlib
+os.environ['MODELS_DIR'] = os.path.join({workdir!r}, 'models')
+os.environ['FEATURE_CACHE_DIR'] = os.path.join({workdir!r}, 'features')
+sys.path.insert(0, {src!r})
+import storage
+storage.DATA_DIR = {workdir!r}
+from train_model import train_model
+from metrics import peak_rss_mb
+t0 = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    result = train_model({ticker!r}, '1m', n_jobs=1, params={{'n_estimators': {trees}}},
+                         feature_set={feature_set!r}, low_memory={low_memory}, max_rows={max_rows})
+print(json.dumps({{'seconds': time.perf_counter() - t0, 'rss_mb': peak_rss_mb(),
+                  'rows': result['rows'], 'accuracy': result['accuracy']}}))
+"""
+
+
+def run_case(args, workdir, ticker, low_memory, max_rows=None):
+    code = _CHILD.format(workdir=workdir, src=SRC_DIR, ticker=ticker, trees=args.trees,
+                         feature_set=args.feature_set, low_memory=low_memory, max_rows=max_rows)
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    if out.returncode != 0:
+        # Típicamente el OOM killer con el camino completo en historias muy largas
+        return None
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000_000, 5_000_000])
+    parser.add_argument('--trees', type=int, default=5)
+    parser.add_argument('--feature-set', default='base')
+    parser.add_argument('--max-rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_training_memory_')
+    base = read_legacy_csv(next(iter(raw_datasets().values())))
+    print(f"{args.trees} árboles, conjunto de features '{args.feature_set}'")
+    print(f"{'velas':>12}{'caso':>20}{'filas':>12}{'segundos':>10}{'RSS MB':>9}{'accuracy':>10}")
+    for n in args.sizes:
+        ticker = f'BENCH-{n}'
+        df = scaled_ohlcv(base, n)
+        save_ohlcv(df, training_data_path(ticker, data_dir=workdir))
+        del df
+        cases = [('completo', False, None), ('acotado', True, None)]
+        if args.max_rows and args.max_rows < n:
+            cases.append((f'acotado {args.max_rows:,}', True, args.max_rows))
+        for name, low_memory, max_rows in cases:
+            result = run_case(args, workdir, ticker, low_memory, max_rows)
+            if result is None:
+                print(f"{n:>12,}{name:>20}{'(falló: sin memoria?)':>41}")
+                continue
+            print(f"{n:>12,}{name:>20}{result['rows']:>12,}{result['seconds']:>10.1f}"
+                  f"{result['rss_mb']:>9.0f}{result['accuracy']:>10.3f}")
+    print(f"\nDirectorio de trabajo: {workdir}")
+
+
+if __name__ == '__main__':
+    main()
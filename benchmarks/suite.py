@@ -0,0 +1,417 @@
+"""
+Suite de benchmarks de los caminos críticos: features, carga de datos,
+entrenamiento, inferencia y PostgreSQL.
+
+Datasets:
+    raw_<TICKER>     los CSV versionados en data/raw_*_data.csv (formato yfinance)
+    synthetic_<N>    N velas de 1m generadas re-muestreando (bootstrap) los retornos
+                     reales de esos CSV, para escalar a 1M-50M filas (--sizes)
+
+Casos por dataset (con --only se eligen):
+    load_csv         lectura del CSV antiguo de yfinance (storage.read_legacy_csv)
+    load_parquet     lectura del Parquet (storage.load_ohlcv), lo que usa train_model
+    features         calculate_features (filas/s)
+    fit              RandomForestClassifier(MODEL_PARAMS).fit sobre --fit-rows filas
+    predict_batch    predict_proba de sklearn y del bosque compilado sobre --predict-rows filas
+    predict_row      latencia p50/p99 de una fila (sklearn y compilado)
+    db               save_predictions y copy_predictions (filas/s), get_history y
+                     get_performance_summary
+                     contra el PostgreSQL del .env (se omite si no hay conexión o sin --db)
+
+Cada métrica se guarda como {value, unit, better, gate} en un JSON en
+benchmarks/results/ junto a la versión del código y del entorno. Los tiempos son
+el mínimo de varias ejecuciones (al menos --repeat y hasta sumar MIN_TIME
+segundos). Con --baseline se compara contra un resultado anterior y el proceso
+termina con código 1 si alguna métrica con gate empeora más de --tolerance (por
+defecto 10%); p99 y memoria se muestran pero no cortan.
+
+Uso:
+    python benchmarks/suite.py                                   # raw + 1M filas
+    python benchmarks/suite.py --sizes 1000000 10000000 --only features load_parquet
+    python benchmarks/suite.py --db --baseline benchmarks/results/baseline.json
+    python benchmarks/suite.py --compare results/a.json results/b.json
+"""
+import os
+import sys
+import gc
+import json
+import glob
+import time
+import platform
+import argparse
+import tempfile
+import resource
+import subprocess
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+SRC_DIR = os.path.join(ROOT_DIR, 'src')
+sys.path.insert(0, SRC_DIR)
+
+from dotenv import load_dotenv  # noqa: E402
+load_dotenv(os.path.join(ROOT_DIR, '.env'))
+
+import sklearn  # noqa: E402
+from sklearn.ensemble import RandomForestClassifier  # noqa: E402
+from features import calculate_features  # noqa: E402
+from forest_predictor import compile_model  # noqa: E402
+from storage import save_ohlcv, load_ohlcv, read_legacy_csv  # noqa: E402
+from train_model import FEATURES, MODEL_PARAMS, add_target  # noqa: E402
+
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+CASES = ['load_csv', 'load_parquet', 'features', 'fit', 'predict_batch', 'predict_row', 'db']
+DEFAULT_TOLERANCE = 0.10
+# Repeticiones de los casos rápidos: hasta sumar MIN_TIME segundos (máx. MAX_REPEAT)
+MIN_TIME = 1.0
+MAX_REPEAT = 1000
+DB_BENCH_SYMBOL = 'BENCH-USD'
+DB_BENCH_INTERVAL = 'bench'
+
+
+# --- Datasets ---
+def raw_datasets():
+    """{nombre: ruta} de los CSV versionados (data/raw_*_data.csv)."""
+    paths = sorted(glob.glob(os.path.join(ROOT_DIR, 'data', 'raw_*_data.csv')))
+    return {os.path.basename(p)[:-len('_data.csv')]: p for p in paths}
+
+
+def scaled_ohlcv(base, n_rows, seed=42):
+    """
+    N velas de 1m con los retornos y rangos intravela de `base` re-muestreados:
+    misma distribución que los datos reales, a cualquier escala.
+    """
+    rng = np.random.default_rng(seed)
+    close = base['Close'].to_numpy(dtype='float64')
+    returns = np.diff(np.log(close))
+    returns = returns[np.isfinite(returns)]
+    spread = ((base['High'] - base['Low']) / base['Close']).to_numpy(dtype='float64')
+    spread = spread[np.isfinite(spread)]
+    volume = base['Volume'].to_numpy(dtype='int64')
+
+    close = close[0] * np.exp(np.cumsum(rng.choice(returns, n_rows)))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    half = rng.choice(spread, n_rows) * close / 2
+    index = pd.date_range('2015-01-01', periods=n_rows, freq='1min', tz='UTC', name='Datetime')
+    return pd.DataFrame({
+        'Open': open_, 'High': np.maximum(open_, close) + half, 'Low': np.minimum(open_, close) - half,
+        'Close': close, 'Volume': rng.choice(volume, n_rows),
+    }, index=index)
+
+
+def write_legacy_csv(df, path, ticker='BTC-USD'):
+    """CSV con las 3 filas de cabecera de yfinance (como los de data/)."""
+    with open(path, 'w') as f:
+        f.write("Price,Close,High,Low,Open,Volume\n")
+        f.write(f"Ticker,{ticker},{ticker},{ticker},{ticker},{ticker}\n")
+        f.write("Datetime,,,,,\n")
+    df[['Close', 'High', 'Low', 'Open', 'Volume']].to_csv(path, mode='a', header=False)
+
+
+# --- Medición ---
+def measure(fn, repeat, min_time=MIN_TIME):
+    """
+    (min, mediana) en segundos y el último resultado. Ejecuta fn() al menos `repeat`
+    veces y, si es rápida, las que quepan en `min_time` segundos (hasta MAX_REPEAT):
+    el mínimo de muchas ejecuciones es mucho más estable que una sola medida.
+    """
+    times, result = [], None
+    while len(times) < repeat or (sum(times) < min_time and len(times) < MAX_REPEAT):
+        gc.collect()
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return min(times), float(np.median(times)), result
+
+
+def latencies(fn, inputs):
+    times = []
+    for x in inputs:
+        t0 = time.perf_counter()
+        fn(x)
+        times.append(time.perf_counter() - t0)
+    return np.percentile(times, [50, 99])
+
+
+def metric(value, unit, better='lower', gate=True, **extra):
+    """gate=False: se reporta y compara pero no cuenta como regresión (p99, memoria)."""
+    return {'value': float(value), 'unit': unit, 'better': better, 'gate': gate, **extra}
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# --- Casos ---
+def bench_load(name, paths, repeat):
+    results = {}
+    if 'csv' in paths:
+        best, median, df = measure(lambda: read_legacy_csv(paths['csv']), repeat)
+        results['load_csv'] = metric(best, 's', rows=len(df), median=median,
+                                     rows_per_s=len(df) / best)
+    best, median, df = measure(lambda: load_ohlcv(paths['parquet']), repeat)
+    results['load_parquet'] = metric(best, 's', rows=len(df), median=median, rows_per_s=len(df) / best)
+    return results
+
+
+def bench_features(df, repeat):
+    best, median, out = measure(lambda: calculate_features(df), repeat)
+    return {'features': metric(best, 's', rows=len(df), median=median, rows_per_s=len(df) / best)}, out
+
+
+def training_matrix(features_df):
+    ml = add_target(features_df.copy())
+    ml = ml.iloc[:-1].dropna(subset=FEATURES)
+    return ml[FEATURES].to_numpy(dtype='float64'), ml['Target'].to_numpy()
+
+
+def bench_fit(X, y, fit_rows, n_jobs, repeat):
+    X, y = X[-fit_rows:], y[-fit_rows:]
+
+    def fit():
+        return RandomForestClassifier(**MODEL_PARAMS, n_jobs=n_jobs).fit(X, y)
+
+    best, median, model = measure(fit, repeat)
+    model.set_params(n_jobs=None)
+    return {'fit': metric(best, 's', rows=len(X), median=median, n_jobs=n_jobs)}, model
+
+
+def bench_predict_batch(model, predictor, X, predict_rows, repeat):
+    X = X[-predict_rows:]
+    results = {}
+    best, median, _ = measure(lambda: model.predict_proba(X), repeat)
+    results['predict_batch_sklearn'] = metric(best, 's', rows=len(X), median=median, rows_per_s=len(X) / best)
+    best, median, _ = measure(lambda: predictor.predict(X), repeat)
+    results['predict_batch_compiled'] = metric(best, 's', rows=len(X), median=median, rows_per_s=len(X) / best)
+    return results
+
+
+def bench_predict_row(model, predictor, X, calls):
+    rng = np.random.default_rng(0)
+    rows = [X[i:i + 1] for i in rng.integers(0, len(X), calls)]
+    model.predict_proba(rows[0])
+    predictor.predict(rows[0])
+    results = {}
+    p50, p99 = latencies(model.predict_proba, rows)
+    results['predict_row_sklearn_p50'] = metric(p50, 's')
+    results['predict_row_sklearn_p99'] = metric(p99, 's', gate=False)
+    p50, p99 = latencies(predictor.predict, rows)
+    results['predict_row_compiled_p50'] = metric(p50, 's')
+    results['predict_row_compiled_p99'] = metric(p99, 's', gate=False)
+    return results
+
+
+def bench_db(rows, batch, repeat):
+    """Inserción por lotes y lecturas sobre filas marcadas bar_interval='bench' (se borran al final)."""
+    from database import (init_db, get_connection, save_predictions, copy_predictions, get_history,
+                          get_performance_summary)
+    from schema import ensure_partitions
+
+    init_db()
+    now = pd.Timestamp.now(tz='UTC').floor('min').tz_localize(None)
+    bar_times = pd.date_range(end=now, periods=rows, freq='1min')
+    rng = np.random.default_rng(0)
+    payload = [{
+        'symbol': DB_BENCH_SYMBOL, 'bar_time': t.to_pydatetime(), 'bar_interval': DB_BENCH_INTERVAL,
+        'entry_price': float(p), 'prediction': int(u > 0.5), 'confidence': float(50 + 50 * c),
+    } for t, p, u, c in zip(bar_times, 30000 + rng.normal(0, 100, rows), rng.random(rows), rng.random(rows))]
+
+    def cleanup():
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM predictions WHERE symbol = %s AND bar_interval = %s",
+                        (DB_BENCH_SYMBOL, DB_BENCH_INTERVAL))
+            cur.close()
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        ensure_partitions(cur, start=bar_times[0].date())
+        cur.close()
+
+    results = {}
+    try:
+        cleanup()
+        t0 = time.perf_counter()
+        for i in range(0, rows, batch):
+            save_predictions(payload[i:i + batch])
+        elapsed = time.perf_counter() - t0
+        results['db_insert'] = metric(elapsed, 's', rows=rows, batch=batch, rows_per_s=rows / elapsed)
+        t0 = time.perf_counter()
+        copy_predictions([{**r, 'model_version': 'copy'} for r in payload])
+        elapsed = time.perf_counter() - t0
+        results['db_copy'] = metric(elapsed, 's', rows=rows, rows_per_s=rows / elapsed)
+        best, median, _ = measure(lambda: get_history(limit=10, symbol=DB_BENCH_SYMBOL), max(repeat, 20))
+        results['db_history'] = metric(best, 's', median=median)
+        best, median, _ = measure(lambda: get_performance_summary([DB_BENCH_SYMBOL], days=30), max(repeat, 5))
+        results['db_summary'] = metric(best, 's', median=median)
+    finally:
+        cleanup()
+    return results
+
+
+# --- Ejecución ---
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit, 'python': platform.python_version(), 'platform': platform.platform(),
+        'cpus': os.cpu_count(), 'numpy': np.__version__, 'pandas': pd.__version__,
+        'sklearn': sklearn.__version__,
+    }
+
+
+def run_dataset(name, df, paths, args, log):
+    results = {}
+    only = set(args.only or CASES)
+    if only & {'load_csv', 'load_parquet'}:
+        results.update(bench_load(name, paths, args.repeat))
+        log(name, 'load')
+    feats = None
+    if only & {'features', 'fit', 'predict_batch', 'predict_row'}:
+        metrics_, feats = bench_features(df, args.repeat)
+        if 'features' in only:
+            results.update(metrics_)
+            log(name, 'features')
+    if only & {'fit', 'predict_batch', 'predict_row'}:
+        X, y = training_matrix(feats)
+        del feats
+        fit_metrics, model = bench_fit(X, y, min(args.fit_rows, len(X)), args.n_jobs,
+                                       args.repeat if 'fit' in only else 1)
+        if 'fit' in only:
+            results.update(fit_metrics)
+            log(name, 'fit')
+        predictor = compile_model(model)
+        if 'predict_batch' in only:
+            results.update(bench_predict_batch(model, predictor, X, min(args.predict_rows, len(X)), args.repeat))
+            log(name, 'predict_batch')
+        if 'predict_row' in only:
+            results.update(bench_predict_row(model, predictor, X, args.row_calls))
+            log(name, 'predict_row')
+    results['peak_rss_mb'] = metric(peak_rss_mb(), 'MB', gate=False)
+    return results
+
+
+def compare(current, baseline, tolerance):
+    """Filas (dataset, métrica, base, actual, cambio, regresión) de las métricas comunes."""
+    rows = []
+    for dataset, metrics_ in current['results'].items():
+        for name, m in metrics_.items():
+            base = baseline.get('results', {}).get(dataset, {}).get(name)
+            if base is None or not base['value']:
+                continue
+            change = m['value'] / base['value'] - 1
+            worse = change > tolerance if m['better'] == 'lower' else change < -tolerance
+            worse = worse and m.get('gate', True)
+            rows.append((dataset, name, base['value'], m['value'], change, worse))
+    return rows
+
+
+def print_comparison(rows):
+    print(f"\n{'dataset':<20}{'métrica':<28}{'base':>12}{'actual':>12}{'cambio':>9}")
+    for dataset, name, base, value, change, worse in rows:
+        flag = '  REGRESIÓN' if worse else ''
+        print(f"{dataset:<20}{name:<28}{base:>12.4g}{value:>12.4g}{change:>+8.1%}{flag}")
+    regressions = sum(r[5] for r in rows)
+    print(f"\n{regressions} regresiones de {len(rows)} métricas comparadas")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='*', default=[1_000_000],
+                        help='filas de los datasets sintéticos (0 o vacío = sólo los CSV)')
+    parser.add_argument('--no-raw', action='store_true', help='omitir los CSV de data/')
+    parser.add_argument('--only', nargs='*', choices=CASES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--fit-rows', type=int, default=200_000)
+    parser.add_argument('--predict-rows', type=int, default=100_000)
+    parser.add_argument('--row-calls', type=int, default=1000)
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    parser.add_argument('--db', action='store_true', help='incluir PostgreSQL (variables DB_* del .env)')
+    parser.add_argument('--db-rows', type=int, default=100_000)
+    parser.add_argument('--db-batch', type=int, default=1000)
+    parser.add_argument('--output', default=None, help='JSON de resultados (por defecto benchmarks/results/<fecha>.json)')
+    parser.add_argument('--baseline', default=None, help='JSON contra el que comparar')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'ACTUAL'), help='sólo comparar dos JSON')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        sys.exit(1 if print_comparison(compare(current, baseline, args.tolerance)) else 0)
+
+    started = time.perf_counter()
+
+    def log(dataset, case):
+        print(f"[{time.perf_counter() - started:7.1f}s] {dataset}: {case}")
+
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'environment': environment(),
+        'args': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline', 'compare')},
+        'results': {},
+    }
+
+    raw = raw_datasets()
+    base_frames = [read_legacy_csv(p) for p in raw.values()]
+    workdir = tempfile.mkdtemp(prefix='bench_suite_')
+    datasets = [] if args.no_raw else [(name, path) for name, path in raw.items()]
+    datasets += [(f'synthetic_{n}', n) for n in (args.sizes or []) if n > 0]
+
+    for name, source in datasets:
+        if isinstance(source, str):
+            df = read_legacy_csv(source)
+            paths = {'csv': source}
+        else:
+            df = scaled_ohlcv(base_frames[0], source)
+            paths = {}
+            if 'load_csv' in set(args.only or CASES):
+                paths['csv'] = os.path.join(workdir, f'{name}.csv')
+                write_legacy_csv(df, paths['csv'])
+        paths['parquet'] = os.path.join(workdir, f'{name}.parquet')
+        save_ohlcv(df, paths['parquet'])
+        report['results'][name] = run_dataset(name, df, paths, args, log)
+        del df
+        for path in paths.values():
+            if path.startswith(workdir):
+                os.remove(path)
+
+    if args.db and 'db' in set(args.only or CASES):
+        try:
+            report['results']['postgres'] = bench_db(args.db_rows, args.db_batch, args.repeat)
+            log('postgres', 'db')
+        except Exception as e:
+            print(f"PostgreSQL omitido: {e}")
+            report['skipped'] = {'db': str(e)}
+
+    print(f"\n{'dataset':<20}{'métrica':<28}{'valor':>12}  unidad")
+    for dataset, metrics_ in report['results'].items():
+        for name, m in metrics_.items():
+            extra = f"  ({m['rows_per_s']:,.0f} filas/s)" if 'rows_per_s' in m else ''
+            print(f"{dataset:<20}{name:<28}{m['value']:>12.4g}  {m['unit']}{extra}")
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{report['environment']['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResultados en {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if print_comparison(compare(report, baseline, args.tolerance)):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+import os
+import time
+import queue
+import threading
+from collections import OrderedDict
+import requests
+from metrics import timer, inc
+
+# --- CONFIGURACIÓN DE AMBIENTE ---
+TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
+TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+# Confianza mínima (%) para avisar por Telegram
+TELEGRAM_THRESHOLD = float(os.getenv("TELEGRAM_THRESHOLD", "80"))
+# Base de la API (configurable para apuntar a un servidor local de pruebas)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+# Segundos que se esperan tras la primera alerta para agrupar las de otros activos
+ALERT_COALESCE_SECONDS = float(os.getenv("ALERT_COALESCE_SECONDS", "2"))
+# Mensajes por minuto y chat (Telegram limita a ~20/min en grupos)
+ALERT_RATE_PER_MINUTE = float(os.getenv("ALERT_RATE_PER_MINUTE", "20"))
+ALERT_MAX_RETRIES = int(os.getenv("ALERT_MAX_RETRIES", "3"))
+
+# Límite de longitud de un mensaje de Telegram
+MAX_MESSAGE_CHARS = 4096
+REQUEST_TIMEOUT = 5
+# Claves (symbol, bar_time) recordadas para no avisar dos veces de la misma vela
+DEDUP_SIZE = 1000
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Sesión HTTP compartida (reutiliza la conexión TLS entre mensajes)."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+        return _session
+
+
+def _send(text, chat_id, token, session=None):
+    """
+    Un POST a sendMessage. Devuelve (ok, retry_after): retry_after son los
+    segundos a esperar si hay que reintentar, None si no tiene sentido (4xx).
+    """
+    url = f"{TELEGRAM_API_URL}/bot{token}/sendMessage"
+    payload = {"chat_id": chat_id, "text": text, "parse_mode": "Markdown"}
+    try:
+        with timer('telegram_request_seconds'):
+            resp = (session or get_session()).post(url, json=payload, timeout=REQUEST_TIMEOUT)
+    except requests.RequestException as e:
+        print(f"Error Telegram: {e}")
+        inc('telegram_requests_total', status='error')
+        return False, 1.0
+    inc('telegram_requests_total', status=str(resp.status_code))
+    if resp.status_code == 200:
+        return True, None
+    if resp.status_code == 429:
+        # Telegram indica cuánto esperar en parameters.retry_after
+        try:
+            retry_after = float(resp.json().get("parameters", {}).get("retry_after", 1))
+        except ValueError:
+            retry_after = 1.0
+        return False, retry_after
+    print(f"Error Telegram: HTTP {resp.status_code} {resp.text[:200]}")
+    return False, 1.0 if resp.status_code >= 500 else None
+
+
+def send_telegram_alert(message):
+    """Envío síncrono de un mensaje (un intento). Para el scheduler, usar AlertDispatcher."""
+    if not TELEGRAM_TOKEN or not TELEGRAM_CHAT_ID:
+        return False
+    ok, _ = _send(message, TELEGRAM_CHAT_ID, TELEGRAM_TOKEN)
+    return ok
+
+
+def format_prediction_message(symbol, price, prediction, confidence):
+    emoji = "📈" if prediction == 1 else "📉"
+    txt = "SUBE" if prediction == 1 else "BAJA"
+    return (
+        f"🔔 *NUEVA PREDICCIÓN*\n\n"
+        f"Activo: `{symbol}`\n"
+        f"Precio: `${price:,.2f}`\n"
+        f"Predicción: *{txt}* {emoji}\n"
+        f"Confianza: `{confidence:.1f}%`"
+    )
+
+
+def format_prediction_batch(alerts):
+    """Un único mensaje con las predicciones de varios activos (una línea por activo)."""
+    if len(alerts) == 1:
+        a = alerts[0]
+        return format_prediction_message(a['symbol'], a['price'], a['prediction'], a['confidence'])
+    lines = [f"🔔 *NUEVAS PREDICCIONES* ({len(alerts)})\n"]
+    for a in alerts:
+        emoji = "📈" if a['prediction'] == 1 else "📉"
+        txt = "SUBE" if a['prediction'] == 1 else "BAJA"
+        lines.append(f"`{a['symbol']}` `${a['price']:,.2f}` *{txt}* {emoji} `{a['confidence']:.1f}%`")
+    return "\n".join(lines)
+
+
+def split_message(text, limit=MAX_MESSAGE_CHARS):
+    """Parte un texto largo en trozos de como mucho `limit` caracteres, cortando por líneas."""
+    chunks, current = [], ""
+    for line in text.split("\n"):
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit and current:
+            chunks.append(current)
+            candidate = line
+        while len(candidate) > limit:
+            chunks.append(candidate[:limit])
+            candidate = candidate[limit:]
+        current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class TokenBucket:
+    """Limitador de tasa: `rate` mensajes por segundo con ráfagas de hasta `capacity`."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def wait(self):
+        """Segundos a esperar hasta tener un token (0 si hay); si hay, lo consume."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class AlertDispatcher:
+    """
+    Envío de alertas en segundo plano.
+
+    submit() sólo encola (no bloquea al scheduler). Un hilo consume la cola:
+    espera `coalesce` segundos tras la primera alerta para juntar las de otros
+    activos de la misma vela en un único mensaje, respeta el límite de tasa del
+    chat (token bucket) y reintenta con backoff, usando el `retry_after` que
+    devuelve Telegram en los 429. Las alertas se deduplican por
+    (symbol, bar_time).
+    """
+
+    def __init__(self, token=None, chat_id=None, coalesce=None, rate_per_minute=None,
+                 max_retries=None, session=None):
+        self.token = token or TELEGRAM_TOKEN
+        self.chat_id = chat_id or TELEGRAM_CHAT_ID
+        self.coalesce = ALERT_COALESCE_SECONDS if coalesce is None else coalesce
+        # Mensajes por segundo de cada chat
+        self.rate = (rate_per_minute or ALERT_RATE_PER_MINUTE) / 60
+        self.max_retries = ALERT_MAX_RETRIES if max_retries is None else max_retries
+        self.session = session or get_session()
+        self.buckets = {}
+        self._queue = queue.Queue()
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stats = {'submitted': 0, 'duplicates': 0, 'messages': 0, 'failed': 0, 'retries': 0}
+
+    @property
+    def enabled(self):
+        return bool(self.token and self.chat_id)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name="alert-dispatcher", daemon=True)
+                self._thread.start()
+        return self
+
+    def submit(self, symbol, bar_time, price, prediction, confidence):
+        """Encola una alerta. Devuelve False si está deshabilitado o ya se avisó de esa vela."""
+        if not self.enabled:
+            return False
+        key = (symbol, str(bar_time))
+        with self._lock:
+            if key in self._seen:
+                self.stats['duplicates'] += 1
+                return False
+            self._seen[key] = True
+            if len(self._seen) > DEDUP_SIZE:
+                self._seen.popitem(last=False)
+            self.stats['submitted'] += 1
+        self.start()
+        self._queue.put({'symbol': symbol, 'bar_time': bar_time, 'price': price,
+                         'prediction': prediction, 'confidence': confidence})
+        return True
+
+    def flush(self, timeout=None):
+        """Espera a que se hayan enviado (o descartado) todas las alertas encoladas."""
+        if self._thread is None:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def _collect(self):
+        # Bloquea hasta la primera alerta y junta las que lleguen en la ventana
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.coalesce
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _deliver(self, text):
+        bucket = self.buckets.setdefault(self.chat_id, TokenBucket(self.rate))
+        for attempt in range(self.max_retries + 1):
+            delay = bucket.wait()
+            while delay > 0:
+                time.sleep(delay)
+                delay = bucket.wait()
+            ok, retry_after = _send(text, self.chat_id, self.token, self.session)
+            if ok:
+                self.stats['messages'] += 1
+                return True
+            if retry_after is None or attempt == self.max_retries:
+                break
+            self.stats['retries'] += 1
+            # Backoff exponencial (o lo que pida Telegram si es mayor)
+            time.sleep(max(retry_after, 2 ** attempt))
+        self.stats['failed'] += 1
+        return False
+
+    def _worker(self):
+        while True:
+            batch = self._collect()
+            try:
+                for text in split_message(format_prediction_batch(batch)):
+                    self._deliver(text)
+            except Exception as e:
+                print(f"Error enviando alertas: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """Dispatcher compartido del proceso (se crea en la primera llamada)."""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = AlertDispatcher()
+        return _dispatcher
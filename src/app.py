@@ -1,11 +1,7 @@
 import streamlit as st
 import pandas as pd
-import joblib
-import yfinance as yf
 import plotly.graph_objects as go
 import os
-import requests
-from database import init_db, save_prediction, get_history, update_last_result
 from streamlit_autorefresh import st_autorefresh
 
 from dotenv import load_dotenv
@@ -15,23 +11,10 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(current_dir)
 load_dotenv(os.path.join(project_root, '.env'))
 
-# --- CONFIGURACIÓN DE AMBIENTE ---
-TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
-TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
-
-def send_telegram_alert(message):
-    if not TELEGRAM_TOKEN or not TELEGRAM_CHAT_ID:
-        return
-    try:
-        url = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
-        payload = {
-            "chat_id": TELEGRAM_CHAT_ID, 
-            "text": message, 
-            "parse_mode": "Markdown"
-        }
-        requests.post(url, json=payload, timeout=5)
-    except Exception as e:
-        st.sidebar.error(f"Error Telegram: {e}")
+# El dashboard es sólo lectura: predicciones, calificación y alertas las hace
+# el scheduler (src/scheduler.py), una vez por vela, aunque no haya pestañas abiertas.
+from database import (init_db, get_history, get_latest_prediction, get_pool_stats,
+                      get_performance_summary, get_calibration, get_daily_performance)
 
 # --- CONFIGURACIÓN DE UI ---
 st.set_page_config(page_title="Crypto Monitor", layout="wide", page_icon="🤖")
@@ -47,17 +30,51 @@ except Exception as e:
 count = st_autorefresh(interval=60000, key="bot_refresh")
 
 @st.cache_resource
-def load_model(ticker="BTC-USD"):
-    safe_ticker = ticker.replace("-", "_")
-    model_filename = f'crypto_model_{safe_ticker}.pkl'
-    model_path = os.path.join(project_root, 'models', model_filename)
-    if os.path.exists(model_path):
-        return joblib.load(model_path)
-    return None
-
-from ingestion import run_ingestion
-from train_model import train_model
-from features import calculate_features
+def load_model(ticker="BTC-USD", version=None):
+    # `version` sólo forma parte de la clave de caché: un modelo nuevo invalida la entrada.
+    # El dashboard sólo muestra metadata (intervalo, métricas, importancias): el bosque no se carga
+    return load_model_metadata(ticker)
+
+from ingestion import SYMBOLS
+from inference import load_model_metadata
+from model_registry import latest_version
+from training import submit_training, get_training_run
+from candle_store import CandleStore
+from ingestion import INTERVAL_DELTAS
+from shared_cache import cached, get_cache, bump_generation
+from coordination import start_listener
+from chart_data import get_chart_data, bucket_size
+from metrics import REGISTRY, read_exported, process_name, set_process_name
+
+set_process_name('dashboard')
+# LISTEN de Postgres: cada predicción guardada por el worker invalida la caché de su activo
+db_listener = start_listener(bump_generation)
+# Con varias réplicas detrás del balanceador el re-entrenamiento lo hace el worker
+DASHBOARD_TRAINING = os.getenv("DASHBOARD_TRAINING", "1") == "1"
+# Réplicas de sólo lectura: nunca descargan velas ni escriben en el almacén (lo mantiene el worker)
+DASHBOARD_READ_ONLY = os.getenv("DASHBOARD_READ_ONLY", "0") == "1"
+
+@st.cache_resource
+def get_candle_store():
+    return CandleStore()
+
+def candles_stale(df, interval):
+    step = INTERVAL_DELTAS.get(interval, pd.Timedelta(minutes=1))
+    return df.empty or df.index[-1] < pd.Timestamp.now(tz='UTC') - 2 * step
+
+def _read_candles(ticker, interval):
+    # El scheduler mantiene el almacén al día; sólo se descarga si está desactualizado
+    # (en sólo lectura se sirve lo que haya y la página avisa)
+    store = get_candle_store()
+    df = store.read(ticker, interval)
+    if candles_stale(df, interval) and not DASHBOARD_READ_ONLY:
+        df = store.get(ticker, interval)
+    return df
+
+def read_candles(ticker, interval):
+    # Una lectura por vela para todas las sesiones abiertas (ver shared_cache.py).
+    # El DataFrame es compartido: no modificarlo
+    return cached('candles', ticker, interval, lambda: _read_candles(ticker, interval))
 
 # ... (imports existing)
 
@@ -66,9 +83,9 @@ from features import calculate_features
 # SIDEBAR se define ANTES de cargar el modelo en esta arquitectura propuesta
 st.sidebar.header("⚙️ Configuración")
 # ... (previous code)
-symbol = st.sidebar.selectbox("Activo", ["BTC-USD", "ETH-USD", "SOL-USD", "BNB-USD", "ADA-USD", "XRP-USD"])
+symbol = st.sidebar.selectbox("Activo", SYMBOLS)
 
-data_pack = load_model(symbol)
+data_pack = load_model(symbol, latest_version(symbol))
 training_interval = st.sidebar.selectbox("Intervalo de Entrenamiento", ["1m", "5m", "15m", "1h", "1d"], index=1)
 training_period = st.sidebar.selectbox(
     "Periodo de Historia", 
@@ -76,150 +93,150 @@ training_period = st.sidebar.selectbox(
     index=2,
     help="Nota: Yahoo Finance limita la historia para intervalos cortos.\n- '1m' permite máx ~7 días.\n- '5m' permite máx ~60 días.\nPara periodos largos (meses/años) usa intervalos de 1h o 1d."
 )
-auto_save = st.sidebar.checkbox("Guardado Automático", value=True)
-conf_threshold = st.sidebar.slider("Umbral Telegram (%)", 50, 95, 80)
+# Ventana de la analítica (win rate, distribución, calibración), agregada en Postgres
+ANALYTICS_WINDOWS = {"24 horas": 1, "7 días": 7, "30 días": 30, "Todo": None}
+analytics_window = st.sidebar.selectbox("Ventana de Analítica", list(ANALYTICS_WINDOWS), index=2)
+analytics_days = ANALYTICS_WINDOWS[analytics_window]
+st.sidebar.caption("Las predicciones y alertas de Telegram las genera el scheduler (`TELEGRAM_THRESHOLD` en `.env`).")
 
 st.sidebar.markdown("---")
-if st.sidebar.button("🔄 Actualizar Modelo"):
-    with st.spinner("Descargando nuevos datos y re-entrenando..."):
-        try:
-            # 1. Ingesta
-            if run_ingestion(ticker=symbol, period=training_period, interval=training_interval):
-                st.sidebar.success(f"Datos actualizados ({training_period}).")
-                
-                # 2. Entrenamiento
-                train_model(ticker=symbol, interval=training_interval)
-                st.sidebar.success(f"Modelo para {symbol} re-entrenado.")
-                
-                # 3. Recarga
-                load_model.clear() # Limpiar cache de st
-                st.cache_resource.clear()
-                
-                st.sidebar.success("¡Modelo recargado! 🎉")
-                st.rerun()
-            else:
-                st.sidebar.error("Falló la descarga de datos.")
-        except Exception as e:
-            st.sidebar.error(f"Error: {e}")
+# Re-entrenamiento en segundo plano (pool de procesos, ver training.py): la UI no se bloquea
+training_run = get_training_run(st.session_state.get("training_run_id"))
+training_busy = training_run is not None and not training_run.done
+if not DASHBOARD_TRAINING:
+    st.sidebar.caption("Re-entrenamiento desactivado en este dashboard (`DASHBOARD_TRAINING=0`): "
+                       "lo hace el worker (programado / por deriva) o `python src/training.py`.")
+training_disabled = training_busy or not DASHBOARD_TRAINING
+incremental = st.sidebar.checkbox(
+    "Incremental", value=True, disabled=not DASHBOARD_TRAINING,
+    help="Sólo las velas nuevas: reemplaza los árboles más antiguos por árboles ajustados sobre las velas "
+         "recientes (train_model.refresh_model). Sin marcar, re-entrena el bosque completo.")
+col_one, col_all = st.sidebar.columns(2)
+retrain_jobs = None
+if col_one.button("🔄 Actualizar Modelo", disabled=training_disabled):
+    retrain_jobs = [(symbol, training_interval)]
+if col_all.button("🔁 Todos", disabled=training_disabled, help="Re-entrenar todos los activos en paralelo"):
+    retrain_jobs = [(ticker, training_interval) for ticker in SYMBOLS]
+if retrain_jobs:
+    try:
+        training_run = submit_training(retrain_jobs, period=training_period, refresh=incremental)
+        st.session_state["training_run_id"] = training_run.id
+        st.session_state["training_run_applied"] = False
+        training_busy = True
+    except Exception as e:
+        st.sidebar.error(f"Error: {e}")
+
+if training_run is not None:
+    STATE_ICONS = {'pendiente': '⏳', 'en curso': '⚙️', 'ok': '✅', 'error': '❌'}
+    with st.sidebar.expander("🏋️ Entrenamiento", expanded=training_busy):
+        st.caption(f"{training_run.workers} procesos x {training_run.n_jobs} hilos por modelo")
+        for job in training_run.status():
+            line = f"{STATE_ICONS[job['state']]} {job['ticker']} ({job['interval']})"
+            if job['state'] == 'ok' and job.get('skipped'):
+                line += f" · {job['seconds']:.0f}s · sin velas nuevas"
+            elif job['state'] == 'ok':
+                line += f" · {job['seconds']:.0f}s"
+                if job.get('accuracy') is not None:
+                    line += f" · acc {job['accuracy']:.1%}"
+                if job.get('accuracy_before') is not None:
+                    # Modelo anterior sobre las velas nuevas (el refresco no recalcula el test)
+                    line += f" · velas nuevas {job['accuracy_before']:.1%}"
+            elif job['state'] == 'error':
+                line += f" · {job['error']}"
+            st.caption(line)
+    if training_busy:
+        # Sondeo rápido mientras hay un entrenamiento en marcha
+        st_autorefresh(interval=3000, key="training_refresh")
+    elif not st.session_state.get("training_run_applied"):
+        # Terminó: recargar los modelos nuevos una sola vez
+        st.session_state["training_run_applied"] = True
+        load_model.clear()
+        st.cache_resource.clear()
+        st.rerun()
+
+with st.sidebar.expander("🗄️ Pool de Conexiones DB", expanded=False):
+    pool_stats = get_pool_stats()
+    st.caption(f"Checkouts: {pool_stats['checkouts']} | Reconexiones: {pool_stats['reconnects']}")
+    st.caption(f"Espera media: {pool_stats['wait_time_avg'] * 1000:.1f} ms (máx {pool_stats['wait_time_max'] * 1000:.1f} ms)")
+    st.caption(f"Checkout medio: {pool_stats['checkout_time_avg'] * 1000:.1f} ms (máx {pool_stats['checkout_time_max'] * 1000:.1f} ms)")
+
+with st.sidebar.expander("🧊 Caché Compartida", expanded=False):
+    cache_stats = get_cache().stats()
+    st.caption(f"Aciertos: {cache_stats['hits']} | Fallos: {cache_stats['misses']} | "
+               f"Agrupadas: {cache_stats['coalesced']} (tasa {cache_stats['hit_rate']:.0%})")
+    st.caption(f"Entradas: {cache_stats['entries']} ({cache_stats['size_mb']:.1f} MB) | "
+               f"Expulsadas: {cache_stats['evictions']} | Desde disco: {cache_stats['disk_hits']}")
+    if db_listener is not None:
+        st.caption(f"Avisos de Postgres: {'conectado' if db_listener.connected else 'sin conexión'} | "
+                   f"Recibidos: {db_listener.received}")
 
 if data_pack:
-    model = data_pack['model']
-    features = data_pack['features']
     model_interval = data_pack.get('interval', '1m')
 
     # --- OBTENCIÓN DE DATOS Y ESTADO ---
-    # Determinar periodo seguro según intervalo
-    fetch_period = "5d" if model_interval == "1m" else "60d"
-    if model_interval == "1d": fetch_period = "2y" # Necesitamos suficiente historia para MA
-
-    df = yf.download(symbol, period=fetch_period, interval=model_interval, progress=False)
-    history_df = get_history()
+    # Velas desde el almacén local y predicciones ya guardadas por el scheduler. Sólo
+    # cambian con cada vela: una consulta por vela para todas las sesiones
+    df = read_candles(symbol, model_interval)
+    history_df = cached('history', symbol, model_interval, lambda: get_history(symbol=symbol))
+    latest = cached('latest', symbol, model_interval, lambda: get_latest_prediction(symbol))
+    summary = cached('summary', symbol, model_interval,
+                     lambda: get_performance_summary([symbol], days=analytics_days), analytics_days)
+    stats = summary.iloc[0] if not summary.empty else None
+    if DASHBOARD_READ_ONLY and candles_stale(df, model_interval):
+        last = f"la última es de {df.index[-1]:%Y-%m-%d %H:%M} UTC" if not df.empty else "no hay ninguna"
+        st.warning(f"⚠️ Velas de {symbol} desactualizadas ({last}). En este dashboard las descarga el worker: "
+                   f"¿está corriendo `python src/scheduler.py`?")
 
     if not df.empty:
-        # Limpieza de columnas (yfinance a veces trae MultiIndex)
-        if isinstance(df.columns, pd.MultiIndex):
-            df.columns = df.columns.get_level_values(0)
-
-        # Cálculo de Indicadores (Centralizado)
-        df = calculate_features(df)
-        
-        # Seleccionar features correctos
-        last_row = df[features].tail(1)
-        # Reemplazar infinitos o NaNs si ocurren por volatilidad explsiva
-        last_row.replace([float('inf'), float('-inf')], 0, inplace=True)
-        last_row.fillna(0, inplace=True)
         precio_actual = float(df['Close'].iloc[-1])
 
-        if not last_row.isnull().values.any():
-            # Predicción del Modelo
-            print(f"DEBUG - Datos para predicción:\n{last_row}")
-            prediction = int(model.predict(last_row)[0])
-            prob = model.predict_proba(last_row)[0]
-            confianza = float(max(prob) * 100)
-
-            # --- 1. LÓGICA DE AUTO-CALIFICACIÓN ---
-            if not history_df.empty:
-                last_pred = history_df.iloc[0]
-                # Si la última predicción aún no tiene resultado (NULL)
-                if pd.isna(last_pred['result']):
-                    p_entrada = last_pred['entry_price']
-                    pred_hecha = last_pred['prediction']
-                    id_pred = int(last_pred['id'])
-                    
-                    exito = 1 if (pred_hecha == 1 and precio_actual > p_entrada) or \
-                                 (pred_hecha == 0 and precio_actual < p_entrada) else 0
-                    
-                    update_last_result(id_pred, exito)
-                    st.toast(f"Resultado actualizado ID {id_pred}", icon="⚖️")
-                    history_df = get_history() # Recargar con el resultado nuevo
-
-            # --- 2. LÓGICA DE GUARDADO Y TELEGRAM ---
-            if auto_save:
-                already_saved = False
-                if not history_df.empty:
-                    last_entry_time = pd.to_datetime(history_df.iloc[0]['timestamp'])
-                    # Evitar duplicados en el mismo minuto
-                    if (pd.Timestamp.now(tz='UTC').tz_localize(None) - last_entry_time.tz_localize(None)).seconds < 55:
-                        already_saved = True
-
-                if not already_saved:
-                    save_prediction(symbol, precio_actual, prediction, confianza)
-                    st.toast(f"✅ Nueva predicción guardada", icon="💾")
-                    
-                    if confianza >= conf_threshold:
-                        emoji = "📈" if prediction == 1 else "📉"
-                        txt = "SUBE" if prediction == 1 else "BAJA"
-                        mensaje = (
-                            f"🔔 *NUEVA PREDICCIÓN*\n\n"
-                            f"Activo: `{symbol}`\n"
-                            f"Precio: `${precio_actual:,.2f}`\n"
-                            f"Predicción: *{txt}* {emoji}\n"
-                            f"Confianza: `{confianza:.1f}%`"
-                        )
-                        send_telegram_alert(mensaje)
-                    
-                    history_df = get_history()
-
-            # --- 3. DASHBOARD VISUAL ---
-            c1, c2, c3, c4 = st.columns(4)
-            c1.metric("Precio Actual", f"${precio_actual:,.2f}")
+        # --- 3. DASHBOARD VISUAL ---
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Precio Actual", f"${precio_actual:,.2f}")
+        if latest is not None:
+            prediction = int(latest['prediction'])
+            confianza = float(latest['confidence'])
             pred_text = "SUBE 📈" if prediction == 1 else "BAJA 📉"
             c2.metric("Predicción", pred_text, f"{confianza:.1f}%")
-            # Cálculo de Win Rate para el header
-            if not history_df.empty:
-                valid = history_df.dropna(subset=['result'])
-                if len(valid) > 0:
-                    wr = (valid['result'].sum() / len(valid)) * 100
-                    c3.metric("Win Rate", f"{wr:.1f}%", f"{len(valid)} trades")
-            c4.metric("Refresco", f"#{count}")
-            
-            # Selector de Zoom
-            zoom_period = st.select_slider(
-                "🔎 Zoom del Gráfico (Velas)", 
-                options=[50, 100, 200, 500, 1000, 2000, "Todo"],
-                value=200
-            )
-            
-            # Filtrado de datos para visualización
-            if zoom_period != "Todo":
-                df_display = df.tail(zoom_period)
-            else:
-                df_display = df
-            
-            fig = go.Figure()
-            fig.add_trace(go.Candlestick(
-                x=df_display.index, open=df_display['Open'], high=df_display['High'], 
-                low=df_display['Low'], close=df_display['Close'], name="Precio"
-            ))
-            fig.add_trace(go.Scatter(x=df_display.index, y=df_display['MA_20'], line=dict(color='yellow', width=2), name="MA20"))
-            fig.update_layout(
-                template="plotly_dark", 
-                height=450, 
-                margin=dict(t=30, b=10), 
-                xaxis_rangeslider_visible=False,
-                title=f"Gráfico {symbol} - {len(df_display)} velas"
-            )
-            st.plotly_chart(fig, on_select="rerun")
+        else:
+            c2.metric("Predicción", "⏳ Pendiente")
+            st.info(f"Aún no hay predicciones guardadas para {symbol}. ¿Está corriendo el scheduler (`python src/scheduler.py`)?")
+        # Win Rate de toda la ventana (calculado en la DB, no sobre las últimas filas)
+        if stats is not None and stats['graded'] > 0:
+            c3.metric("Win Rate", f"{stats['win_rate']:.1f}%", f"{int(stats['graded'])} trades ({analytics_window})")
+        c4.metric("Refresco", f"#{count}")
+        
+        # Selector de Zoom
+        zoom_period = st.select_slider(
+            "🔎 Zoom del Gráfico (Velas)", 
+            options=[50, 100, 200, 500, 1000, 2000, "Todo"],
+            value=200
+        )
+        
+        # Velas reducidas a CHART_POINTS cubetas OHLC y MA20 con LTTB (ver chart_data.py).
+        # Se calculan una vez por vela para todas las sesiones y sólo se procesa la cola
+        zoom = None if zoom_period == "Todo" else zoom_period
+        chart_ohlc, chart_ma = cached('chart', symbol, model_interval,
+                                      lambda: get_chart_data(symbol, model_interval, zoom, df), zoom)
+        n_bars = min(len(df), zoom or len(df))
+        per_point = bucket_size(n_bars)
+        
+        fig = go.Figure()
+        fig.add_trace(go.Candlestick(
+            x=chart_ohlc.index, open=chart_ohlc['Open'], high=chart_ohlc['High'], 
+            low=chart_ohlc['Low'], close=chart_ohlc['Close'], name="Precio"
+        ))
+        fig.add_trace(go.Scatter(x=chart_ma.index, y=chart_ma, line=dict(color='yellow', width=2), name="MA20"))
+        fig.update_layout(
+            template="plotly_dark", 
+            height=450, 
+            margin=dict(t=30, b=10), 
+            xaxis_rangeslider_visible=False,
+            # Conserva el zoom/desplazamiento del usuario entre refrescos
+            uirevision=f"{symbol}-{model_interval}-{zoom_period}",
+            title=f"Gráfico {symbol} - {n_bars} velas" + (f" ({per_point} por vela mostrada)" if per_point > 1 else "")
+        )
+        st.plotly_chart(fig, on_select="rerun")
 
     # --- 4. HISTORIAL Y ANALÍTICA ---
     st.write("---")
@@ -227,9 +244,10 @@ if data_pack:
     
     with col_left:
         st.subheader("📊 Distribución")
-        if not history_df.empty:
-            dist = history_df['prediction'].map({1: 'SUBE', 0: 'BAJA'}).value_counts()
+        if stats is not None:
+            dist = pd.Series({'SUBE': int(stats['ups']), 'BAJA': int(stats['downs'])}, name="count")
             st.bar_chart(dist)
+            st.caption(f"{int(stats['total'])} predicciones ({analytics_window})")
     
     with col_right:
         st.subheader("📜 Registro en tiempo real (PostgreSQL)")
@@ -250,6 +268,34 @@ if data_pack:
                 hide_index=True
             )
 
+    # --- 4b. CALIBRACIÓN Y RENDIMIENTO DIARIO ---
+    with st.expander("🎯 Calibración y Rendimiento", expanded=False):
+        col_cal, col_daily = st.columns(2)
+        with col_cal:
+            st.caption("Win rate real por tramo de confianza: un modelo calibrado acierta ~lo que dice.")
+            calibration = cached('calibration', symbol, model_interval,
+                                 lambda: get_calibration(symbol, days=analytics_days),
+                                 analytics_days).dropna(subset=['win_rate'])
+            if not calibration.empty:
+                labels = [f"{b}-{b + 9}%" for b in calibration['conf_bucket']]
+                fig_cal = go.Figure()
+                fig_cal.add_trace(go.Bar(x=labels, y=calibration['win_rate'], name="Win Rate real",
+                                         text=calibration['graded'], hovertemplate="%{y:.1f}% (%{text} trades)"))
+                fig_cal.add_trace(go.Scatter(x=labels, y=calibration['conf_bucket'] + 5, mode="lines+markers",
+                                             name="Confianza media del tramo", line=dict(color='yellow', dash='dash')))
+                fig_cal.update_layout(template="plotly_dark", height=300, margin=dict(t=10, b=10),
+                                      yaxis=dict(range=[0, 100], title="%"))
+                st.plotly_chart(fig_cal, use_container_width=True)
+            else:
+                st.info("Todavía no hay predicciones calificadas en esta ventana.")
+        with col_daily:
+            st.caption("Predicciones y win rate por día.")
+            daily = cached('daily', symbol, model_interval,
+                           lambda: get_daily_performance(symbol, days=analytics_days or 90), analytics_days)
+            if not daily.empty:
+                st.line_chart(daily.set_index('day')[['win_rate']])
+                st.bar_chart(daily.set_index('day')[['ups', 'downs']])
+
     # --- 5. DATA SCIENCE: INTERPRETABILIDAD DEL MODELO ---
     with st.expander("🧠 Explicabilidad del Modelo (Feature Importance)", expanded=False):
         st.caption("Este análisis muestra qué indicadores técnicos tienen más peso en la decisión del algoritmo.")
@@ -352,4 +398,34 @@ if data_pack:
         """)
 
 else:
-    st.warning(f"⚠️ No se encontró el modelo para {symbol}. Por favor, presiona 'Actualizar Modelo' en el menú lateral para entrenar uno nuevo.")
\ No newline at end of file
+    st.warning(f"⚠️ No se encontró el modelo para {symbol}. Por favor, presiona 'Actualizar Modelo' en el menú lateral para entrenar uno nuevo.")
+# --- 6. MÉTRICAS DEL PIPELINE ---
+# Latencias por etapa/activo del scheduler (exportadas a METRICS_DIR) y de este proceso
+with st.expander("⏱️ Métricas del Pipeline", expanded=False):
+    snapshots = [s for s in read_exported(max_age=3600) if s['process'] != process_name()]
+    snapshots.append(REGISTRY.snapshot())
+    hist_rows, counter_rows = [], []
+    for snap in snapshots:
+        for h in snap['histograms']:
+            hist_rows.append({
+                'Proceso': snap['process'], 'Métrica': h['name'],
+                'Etiquetas': ", ".join(f"{k}={v}" for k, v in h['labels'].items()),
+                'N': h['count'], 'p50 ms': (h['p50'] or 0) * 1000, 'p95 ms': (h['p95'] or 0) * 1000,
+                'p99 ms': (h['p99'] or 0) * 1000, 'Máx ms': h['max'] * 1000,
+            })
+        for c in snap['counters']:
+            counter_rows.append({
+                'Proceso': snap['process'], 'Métrica': c['name'],
+                'Etiquetas': ", ".join(f"{k}={v}" for k, v in c['labels'].items()), 'Valor': c['value'],
+            })
+    if hist_rows:
+        st.dataframe(pd.DataFrame(hist_rows).sort_values(['Proceso', 'Métrica', 'Etiquetas']),
+                     column_config={col: st.column_config.NumberColumn(format="%.1f")
+                                    for col in ['p50 ms', 'p95 ms', 'p99 ms', 'Máx ms']},
+                     use_container_width=True, hide_index=True)
+        if counter_rows:
+            st.dataframe(pd.DataFrame(counter_rows).sort_values(['Proceso', 'Métrica', 'Etiquetas']),
+                         use_container_width=True, hide_index=True)
+        st.caption("Endpoint Prometheus del scheduler: `METRICS_PORT` en `.env` (ruta `/metrics`).")
+    else:
+        st.info("Sin métricas todavía (¿`METRICS_ENABLED=0`, o el scheduler aún no exportó a `METRICS_DIR`?).")
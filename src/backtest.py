@@ -0,0 +1,254 @@
+"""
+Backtesting walk-forward con simulación de comisiones y slippage.
+
+Divide las velas guardadas en folds (ventana de entrenamiento rodante o
+expansiva + ventana de test a continuación), re-entrena en cada fold un modelo
+con los mismos hiperparámetros y features que el artefacto guardado y simula
+la estrategia sobre el test:
+
+    p(SUBE) >= threshold        -> largo
+    p(SUBE) <= 1 - threshold    -> corto (sólo con --allow-short)
+    resto                       -> fuera
+
+Cada cambio de posición paga (fee + slippage) por unidad operada. Los folds
+corren en paralelo en un pool de procesos.
+
+Uso:
+    python src/backtest.py --ticker BTC-USD --interval 5m --source training
+    python src/backtest.py --train-bars 100000 --test-bars 20000 --mode expanding --fee-bps 10 --slippage-bps 5
+"""
+import os
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier
+
+from features import calculate_features
+from ingestion import INTERVAL_DELTAS
+from inference import load_model_pack
+from storage import load_training_data
+from train_model import FEATURES, MODEL_PARAMS, add_target
+
+DEFAULT_TRAIN_BARS = 50000
+DEFAULT_TEST_BARS = 10000
+DEFAULT_THRESHOLD = 0.55
+# Comisión y slippage por lado, en puntos básicos (10 bps = 0.1%)
+DEFAULT_FEE_BPS = 10.0
+DEFAULT_SLIPPAGE_BPS = 5.0
+
+SECONDS_PER_YEAR = 365 * 24 * 3600  # cripto opera 24/7
+
+# Datos compartidos por los procesos del pool (se envían una vez por worker, no por fold)
+_shared = {}
+
+
+def bars_per_year(interval):
+    step = INTERVAL_DELTAS.get(interval, pd.Timedelta(minutes=1))
+    return SECONDS_PER_YEAR / step.total_seconds()
+
+
+def load_candles(ticker, interval, source='store'):
+    """Velas del almacén local (source='store') o el dataset de entrenamiento ('training')."""
+    if source == 'store':
+        from candle_store import CandleStore
+        df = CandleStore().read(ticker, interval)
+        if not df.empty:
+            return df
+        print(f"Sin velas {interval} de {ticker} en el almacén; usando el dataset de entrenamiento.")
+    return load_training_data(ticker)
+
+
+def prepare_dataset(df, features=FEATURES):
+    """
+    Features + target + retorno de la vela siguiente, alineados y sin NaN.
+    Devuelve (index, X float64, y int, forward_returns).
+    """
+    df = add_target(calculate_features(df, features=features))
+    df['Forward_Return'] = df['Close'].shift(-1) / df['Close'] - 1
+    # La última vela no tiene vela siguiente: no se puede ni entrenar ni operar
+    df = df.iloc[:-1].replace([np.inf, -np.inf], np.nan).dropna(subset=list(features) + ['Forward_Return'])
+    return (df.index, df[features].to_numpy(dtype='float64'), df['Target'].to_numpy(),
+            df['Forward_Return'].to_numpy(dtype='float64'))
+
+
+def walk_forward_folds(n, train_bars, test_bars, mode='rolling', step=None, gap=0):
+    """
+    [(train_start, train_end, test_start, test_end)] por posición.
+    rolling: ventana de entrenamiento fija que avanza; expanding: empieza siempre en 0.
+    gap: velas de separación (embargo) entre entrenamiento y test.
+    """
+    if mode not in ('rolling', 'expanding'):
+        raise ValueError("mode debe ser 'rolling' o 'expanding'")
+    step = step or test_bars
+    folds = []
+    train_end = train_bars
+    while train_end + gap < n:
+        test_start = train_end + gap
+        train_start = 0 if mode == 'expanding' else train_end - train_bars
+        folds.append((train_start, train_end, test_start, min(test_start + test_bars, n)))
+        train_end += step
+    return folds
+
+
+def simulate(proba_up, forward_returns, threshold=DEFAULT_THRESHOLD, allow_short=False,
+             fee_bps=DEFAULT_FEE_BPS, slippage_bps=DEFAULT_SLIPPAGE_BPS):
+    """Posiciones y retornos netos por vela. Se entra desde plano y se cierra al final del fold."""
+    position = np.where(proba_up >= threshold, 1.0, 0.0)
+    if allow_short:
+        position = np.where(proba_up <= 1 - threshold, -1.0, position)
+    turnover = np.abs(np.diff(position, prepend=0.0))
+    turnover[-1] += abs(position[-1])
+    cost = (fee_bps + slippage_bps) / 1e4
+    net = position * forward_returns - turnover * cost
+    return position, turnover, net
+
+
+def performance(net, position, forward_returns, periods_per_year):
+    """PnL compuesto, Sharpe anualizado, máximo drawdown y hit rate de las velas con posición."""
+    equity = np.cumprod(1 + net)
+    drawdown = equity / np.maximum.accumulate(equity) - 1
+    std = net.std()
+    in_market = position != 0
+    return {
+        'pnl': float(equity[-1] - 1) if len(equity) else 0.0,
+        'sharpe': float(net.mean() / std * np.sqrt(periods_per_year)) if std > 0 else 0.0,
+        'max_drawdown': float(drawdown.min()) if len(drawdown) else 0.0,
+        'hit_rate': float((position[in_market] * forward_returns[in_market] > 0).mean()) if in_market.any() else np.nan,
+        'exposure': float(in_market.mean()) if len(position) else 0.0,
+        'bars': int(len(net)),
+    }
+
+
+def _init_worker(X, y, forward_returns, model, settings):
+    _shared.update(X=X, y=y, forward_returns=forward_returns, model=model, settings=settings)
+
+
+def _run_fold(fold):
+    train_start, train_end, test_start, test_end = fold
+    X, y, fwd = _shared['X'], _shared['y'], _shared['forward_returns']
+    settings = _shared['settings']
+    t0 = time.perf_counter()
+
+    model = clone(_shared['model'])
+    if 'n_jobs' in model.get_params():
+        # El paralelismo está en los folds: un núcleo por modelo
+        model.set_params(n_jobs=1)
+    model.fit(X[train_start:train_end], y[train_start:train_end])
+
+    X_test, y_test, fwd_test = X[test_start:test_end], y[test_start:test_end], fwd[test_start:test_end]
+    classes = list(model.classes_)
+    proba_up = model.predict_proba(X_test)[:, classes.index(1)] if 1 in classes else np.zeros(len(X_test))
+    position, turnover, net = simulate(
+        proba_up, fwd_test, settings['threshold'], settings['allow_short'],
+        settings['fee_bps'], settings['slippage_bps']
+    )
+    stats = performance(net, position, fwd_test, settings['periods_per_year'])
+    stats.update({
+        'accuracy': float(((proba_up >= 0.5).astype(int) == y_test).mean()),
+        'trades': int(np.count_nonzero(position[1:] != position[:-1]) + (position[0] != 0)),
+        'fit_seconds': time.perf_counter() - t0,
+    })
+    return stats, net, position
+
+
+def run_backtest(ticker="BTC-USD", interval=None, df=None, pack=None, source='store',
+                 train_bars=DEFAULT_TRAIN_BARS, test_bars=DEFAULT_TEST_BARS, mode='rolling', step=None, gap=0,
+                 threshold=DEFAULT_THRESHOLD, allow_short=False, fee_bps=DEFAULT_FEE_BPS,
+                 slippage_bps=DEFAULT_SLIPPAGE_BPS, max_workers=None):
+    """
+    Walk-forward completo. Devuelve (folds, summary):
+    folds: DataFrame con una fila por fold (fechas, pnl, sharpe, max_drawdown, hit_rate, ...).
+    summary: las mismas métricas sobre la curva de equity concatenada de todos los folds.
+    """
+    t0 = time.perf_counter()
+    pack = pack if pack is not None else load_model_pack(ticker)
+    if pack:
+        # Mismo formato de artefacto que train_model: modelo (como plantilla) + features + intervalo
+        model, features = pack['model'], pack['features']
+        interval = interval or pack.get('interval', '5m')
+    else:
+        model, features = RandomForestClassifier(**MODEL_PARAMS), FEATURES
+        interval = interval or '5m'
+
+    if df is None:
+        df = load_candles(ticker, interval, source)
+    if df is None or df.empty:
+        raise ValueError(f"No hay velas para {ticker} {interval}")
+    index, X, y, fwd = prepare_dataset(df, features)
+
+    folds = walk_forward_folds(len(X), train_bars, test_bars, mode, step, gap)
+    if not folds:
+        raise ValueError(f"Datos insuficientes: {len(X)} velas para train_bars={train_bars}")
+
+    settings = {
+        'threshold': threshold, 'allow_short': allow_short, 'fee_bps': fee_bps,
+        'slippage_bps': slippage_bps, 'periods_per_year': bars_per_year(interval),
+    }
+    max_workers = min(max_workers or os.cpu_count() or 1, len(folds))
+    if max_workers > 1:
+        with ProcessPoolExecutor(max_workers, initializer=_init_worker,
+                                 initargs=(X, y, fwd, model, settings)) as executor:
+            results = list(executor.map(_run_fold, folds))
+    else:
+        _init_worker(X, y, fwd, model, settings)
+        results = [_run_fold(fold) for fold in folds]
+
+    rows = []
+    for i, ((train_start, train_end, test_start, test_end), (stats, _, _)) in enumerate(zip(folds, results)):
+        rows.append({
+            'fold': i,
+            'train_start': index[train_start], 'train_end': index[train_end - 1],
+            'test_start': index[test_start], 'test_end': index[test_end - 1],
+            **stats,
+        })
+    fold_df = pd.DataFrame(rows)
+
+    # Con step == test_bars los tests no se solapan: equity continua de todo el periodo
+    net = np.concatenate([r[1] for r in results])
+    position = np.concatenate([r[2] for r in results])
+    fwd_all = np.concatenate([fwd[test_start:test_end] for _, _, test_start, test_end in folds])
+    summary = performance(net, position, fwd_all, settings['periods_per_year'])
+    summary.update({
+        'ticker': ticker, 'interval': interval, 'mode': mode, 'folds': len(folds),
+        'trades': int(fold_df['trades'].sum()), 'fee_bps': fee_bps, 'slippage_bps': slippage_bps,
+        'workers': max_workers, 'seconds': time.perf_counter() - t0,
+    })
+    return fold_df, summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtesting walk-forward con comisiones y slippage")
+    parser.add_argument("--ticker", default="BTC-USD")
+    parser.add_argument("--interval", default=None, help="Por defecto, el del modelo entrenado")
+    parser.add_argument("--source", choices=["store", "training"], default="store",
+                        help="Velas del almacén local o dataset de entrenamiento (data/)")
+    parser.add_argument("--mode", choices=["rolling", "expanding"], default="rolling")
+    parser.add_argument("--train-bars", type=int, default=DEFAULT_TRAIN_BARS)
+    parser.add_argument("--test-bars", type=int, default=DEFAULT_TEST_BARS)
+    parser.add_argument("--gap", type=int, default=0, help="Velas de embargo entre train y test")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--allow-short", action="store_true")
+    parser.add_argument("--fee-bps", type=float, default=DEFAULT_FEE_BPS)
+    parser.add_argument("--slippage-bps", type=float, default=DEFAULT_SLIPPAGE_BPS)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default=None, help="CSV con el detalle por fold")
+    args = parser.parse_args()
+
+    folds, summary = run_backtest(
+        args.ticker, args.interval, source=args.source, train_bars=args.train_bars,
+        test_bars=args.test_bars, mode=args.mode, gap=args.gap, threshold=args.threshold,
+        allow_short=args.allow_short, fee_bps=args.fee_bps, slippage_bps=args.slippage_bps,
+        max_workers=args.workers,
+    )
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(folds[['fold', 'test_start', 'test_end', 'pnl', 'sharpe', 'max_drawdown', 'hit_rate',
+                     'trades', 'accuracy', 'fit_seconds']].round(4).to_string(index=False))
+    print(f"\nTotal ({summary['folds']} folds, {summary['workers']} workers, {summary['seconds']:.1f}s): "
+          f"PnL {summary['pnl']:.2%} | Sharpe {summary['sharpe']:.2f} | "
+          f"Max DD {summary['max_drawdown']:.2%} | Hit rate {summary['hit_rate']:.2%} | {summary['trades']} trades")
+    if args.output:
+        folds.to_csv(args.output, index=False)
+        print(f"Detalle guardado en {args.output}")
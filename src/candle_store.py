@@ -0,0 +1,219 @@
+import os
+import json
+import threading
+from contextlib import contextmanager
+import pandas as pd
+from ingestion import (YahooFinanceProvider, INTERVAL_DELTAS, DEFAULT_PERIODS,
+                       normalize_ohlcv, period_to_timedelta, to_utc)
+from storage import save_ohlcv, load_ohlcv, temp_path
+from metrics import timer
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin lock entre procesos
+    fcntl = None
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+DEFAULT_STORE_DIR = os.path.join(project_root, 'data', 'candles')
+
+
+class _FileLock:
+    """
+    Lock de archivo alrededor de leer-modificar-escribir un Parquet del almacén:
+    el refresco (subproceso de training) y el streaming del líder escriben el mismo.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.handle = None
+
+    def __enter__(self):
+        self.handle = open(self.path, 'a')
+        if fcntl is not None:
+            fcntl.flock(self.handle, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self.handle, fcntl.LOCK_UN)
+        self.handle.close()
+
+
+class CandleStore:
+    """
+    Almacén local de velas OHLCV, un archivo Parquet por (ticker, intervalo).
+
+    En lugar de re-descargar 60 días en cada refresco, `update()` mira la última
+    vela guardada y sólo pide al proveedor la cola que falta (con un pequeño solape
+    para reemplazar la vela que estaba en curso). Las lecturas se sirven desde
+    disco / memoria. El proveedor es intercambiable (YahooFinanceProvider,
+    CsvReplayProvider para pruebas offline, ...): sólo necesita `fetch()`.
+    """
+
+    def __init__(self, root=None, provider=None, overlap_bars=2):
+        self.root = root or os.getenv("CANDLE_STORE_DIR", DEFAULT_STORE_DIR)
+        self.provider = provider or YahooFinanceProvider()
+        self.overlap_bars = overlap_bars
+        self._frames = {}
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    # --- Rutas / metadatos ---
+    def _path(self, ticker, interval):
+        safe_ticker = ticker.replace("-", "_")
+        return os.path.join(self.root, f'{safe_ticker}_{interval}.parquet')
+
+    def _meta_path(self, ticker, interval):
+        return self._path(ticker, interval).replace('.parquet', '.meta.json')
+
+    @contextmanager
+    def _lock(self, ticker, interval):
+        # Hilos del proceso y, con el lock de archivo, otros procesos (otro CandleStore)
+        with self._locks_guard:
+            lock = self._locks.setdefault((ticker, interval), threading.Lock())
+        with lock, _FileLock(self._path(ticker, interval) + '.lock'):
+            yield
+
+    def _read_meta(self, ticker, interval):
+        path = self._meta_path(ticker, interval)
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_meta(self, ticker, interval, meta):
+        path = self._meta_path(ticker, interval)
+        tmp = temp_path(path)
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, path)
+
+    # --- Lectura / escritura ---
+    @staticmethod
+    def _stamp(path):
+        # mtime solo no basta: dos escrituras seguidas pueden caer en el mismo tick del
+        # reloj del sistema de archivos; os.replace deja además otro inodo
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_ino, st.st_size
+
+    def _load(self, ticker, interval):
+        key = (ticker, interval)
+        path = self._path(ticker, interval)
+        # Se recarga si otro proceso reescribió el archivo
+        stamp = self._stamp(path)
+        cached = self._frames.get(key)
+        if cached is None or cached[0] != stamp:
+            if stamp is not None:
+                df = load_ohlcv(path)
+            else:
+                df = pd.DataFrame(columns=['Open', 'High', 'Low', 'Close', 'Volume'],
+                                  index=pd.DatetimeIndex([], tz='UTC', name='Datetime'),
+                                  dtype='float64')
+            self._frames[key] = (stamp, df)
+        return self._frames[key][1]
+
+    def _save(self, ticker, interval, df):
+        path = self._path(ticker, interval)
+        # Escritura atómica: otro proceso nunca ve un archivo a medias
+        save_ohlcv(df, path)
+        self._frames[(ticker, interval)] = (self._stamp(path), df)
+
+    def last_timestamp(self, ticker, interval):
+        df = self._load(ticker, interval)
+        return df.index[-1] if not df.empty else None
+
+    def read(self, ticker, interval, start=None, end=None, last_n=None):
+        """Velas en [start, end); fechas sin zona (o texto, '2025-01-01') se toman como UTC."""
+        df = self._load(ticker, interval)
+        if start is not None:
+            df = df.loc[df.index >= to_utc(start)]
+        if end is not None:
+            df = df.loc[df.index < to_utc(end)]
+        if last_n is not None:
+            df = df.tail(last_n)
+        return df.copy()
+
+    @staticmethod
+    def merge(old, new):
+        """Une velas guardadas y nuevas; ante solape gana la más reciente."""
+        if new is None or new.empty:
+            return old
+        new = normalize_ohlcv(new)
+        if old.empty:
+            return new
+        merged = pd.concat([old, new])
+        return merged[~merged.index.duplicated(keep='last')].sort_index()
+
+    # --- Sincronización con el proveedor ---
+    def update(self, ticker, interval, period=None):
+        """
+        Trae sólo las velas que faltan. Si `period` pide más historia de la que
+        hay guardada, también rellena la cabeza. Devuelve el nº de velas nuevas.
+        """
+        with self._lock(ticker, interval), timer('candle_update_seconds', symbol=ticker, interval=interval):
+            df = self._load(ticker, interval)
+            meta = self._read_meta(ticker, interval)
+            before = len(df)
+            period = period or DEFAULT_PERIODS.get(interval, '60d')
+
+            if df.empty:
+                fetched = self.provider.fetch(ticker, interval, period=period)
+                if fetched is not None and not fetched.empty:
+                    df = self.merge(df, fetched)
+                    meta['covered_period'] = period
+            else:
+                # Cola: desde la última vela guardada menos un solape
+                step = INTERVAL_DELTAS.get(interval, pd.Timedelta(minutes=1))
+                start = df.index[-1] - step * self.overlap_bars
+                df = self.merge(df, self.provider.fetch(ticker, interval, start=start))
+
+                # Cabeza: sólo si se pide más historia de la ya cubierta
+                wanted = period_to_timedelta(period)
+                covered = meta.get('covered_period')
+                covered_delta = period_to_timedelta(covered) if covered else pd.Timedelta(0)
+                if covered != 'max' and (wanted is None or wanted > covered_delta):
+                    head = self.provider.fetch(ticker, interval, period=period)
+                    if head is not None and not head.empty:
+                        # No pisar velas ya guardadas con la descarga de cabeza
+                        head = normalize_ohlcv(head)
+                        df = self.merge(head, df)
+                        # Sólo cuenta como cubierto si el proveedor lo sirvió (Yahoo devuelve
+                        # vacío si se le pide más historia de la que tiene para el intervalo)
+                        meta['covered_period'] = period
+
+            if df.empty:
+                return 0
+            self._save(ticker, interval, df)
+            meta['last_update'] = pd.Timestamp.now(tz='UTC').isoformat()
+            meta['last_timestamp'] = df.index[-1].isoformat()
+            self._write_meta(ticker, interval, meta)
+            return len(df) - before
+
+    def append(self, ticker, interval, bars):
+        """
+        Añade velas ya construidas (p.ej. las de StreamingIngestion) sin pasar por
+        el proveedor. Una vela repetida reemplaza a la guardada (vela en curso).
+        """
+        if bars is None or bars.empty:
+            return 0
+        with self._lock(ticker, interval):
+            df = self._load(ticker, interval)
+            before = len(df)
+            df = self.merge(df, bars)
+            self._save(ticker, interval, df)
+            meta = self._read_meta(ticker, interval)
+            meta['last_update'] = pd.Timestamp.now(tz='UTC').isoformat()
+            meta['last_timestamp'] = df.index[-1].isoformat()
+            self._write_meta(ticker, interval, meta)
+            return len(df) - before
+
+    def get(self, ticker, interval, refresh=True, last_n=None):
+        """Atajo para la app: sincroniza la cola y devuelve las velas locales."""
+        if refresh:
+            self.update(ticker, interval)
+        return self.read(ticker, interval, last_n=last_n)
@@ -0,0 +1,209 @@
+"""
+Datos del gráfico de velas reducidos a un presupuesto de puntos, en el servidor.
+
+Con el zoom "Todo" el dashboard mandaba cada vela (17k a 5m, muchas más a 1m) a
+un Candlestick de Plotly más la MA20 en cada refresco: varios MB de JSON por
+pestaña para un gráfico de ~1000 píxeles de ancho. Aquí la serie se reduce a
+CHART_POINTS puntos como mucho:
+
+    velas   agregación OHLC en cubetas de k velas (apertura de la primera, máximo,
+            mínimo, cierre de la última, volumen sumado): ninguna mecha se pierde
+    líneas  LTTB (Largest-Triangle-Three-Buckets) sobre las mismas cubetas: un punto
+            por cubeta, el que mejor conserva la forma de la curva
+
+Las cubetas se anclan al tiempo (múltiplos de k * intervalo desde epoch), así
+que con cada vela nueva sólo cambian la última cubeta y las nuevas. ChartSeries
+guarda lo ya reducido por (symbol, intervalo, zoom) y en cada refresco sólo
+procesa la cola (y la cubeta inicial si la ventana del zoom se desplazó).
+"""
+import os
+import math
+import threading
+import numpy as np
+import pandas as pd
+
+from ingestion import INTERVAL_DELTAS
+
+# Puntos máximos por serie (del orden del ancho del gráfico en píxeles)
+CHART_POINTS = int(os.getenv("CHART_POINTS", "800"))
+MA_WINDOW = 20
+# Velas del final que se recalculan siempre (la vela en curso cambia entre refrescos)
+REDO_BARS = 2
+OHLC_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+def bucket_size(n_bars, max_points=CHART_POINTS):
+    """Velas por cubeta para que `n_bars` quepan en `max_points`."""
+    return max(1, math.ceil(n_bars / max_points))
+
+
+def resample_ohlc(df, width):
+    """Velas de `df` agregadas en cubetas de `width` (Timedelta) ancladas a epoch."""
+    if df.empty:
+        return df[OHLC_COLUMNS].copy()
+    keys = df.index.floor(width)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(df)] - 1
+    columns = {
+        'Open': df['Open'].to_numpy(dtype=np.float64)[starts],
+        # fmax/fmin: una vela con NaN no borra la cubeta entera
+        'High': np.fmax.reduceat(df['High'].to_numpy(dtype=np.float64), starts),
+        'Low': np.fmin.reduceat(df['Low'].to_numpy(dtype=np.float64), starts),
+        'Close': df['Close'].to_numpy(dtype=np.float64)[ends],
+    }
+    if 'Volume' in df.columns:
+        columns['Volume'] = np.add.reduceat(np.nan_to_num(df['Volume'].to_numpy(dtype=np.float64)), starts)
+    return pd.DataFrame(columns, index=keys[starts])
+
+
+def lttb(x, y, starts, first=0, previous=None):
+    """
+    LTTB con cubetas dadas: `starts` son las posiciones donde empieza cada cubeta.
+    Elige un punto por cubeta desde la cubeta `first`, partiendo del punto ya
+    elegido `previous` (x, y) si lo hay. Devuelve las posiciones elegidas (-1 si
+    la cubeta no tiene valores). La última cubeta conserva su último punto.
+    """
+    n_buckets = len(starts)
+    bounds = np.r_[starts, len(x)]
+    valid = np.isfinite(y)
+    # Media de cada cubeta (el vértice "siguiente" del triángulo)
+    sums_x = np.add.reduceat(np.where(valid, x, 0.0), starts) if len(x) else np.array([])
+    sums_y = np.add.reduceat(np.where(valid, y, 0.0), starts) if len(x) else np.array([])
+    counts = np.add.reduceat(valid.astype(np.int64), starts) if len(x) else np.array([])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_x, mean_y = sums_x / counts, sums_y / counts
+
+    chosen = np.full(n_buckets - first, -1, dtype=np.int64)
+    for i in range(first, n_buckets):
+        lo, hi = bounds[i], bounds[i + 1]
+        idx = lo + np.flatnonzero(valid[lo:hi])
+        if len(idx) == 0:
+            continue
+        if previous is None or i == n_buckets - 1:
+            # Primer punto de la serie / último punto de la serie
+            pick = idx[0] if previous is None else idx[-1]
+        else:
+            ax, ay = previous
+            j = i + 1
+            while j < n_buckets and counts[j] == 0:
+                j += 1
+            cx, cy = (mean_x[j], mean_y[j]) if j < n_buckets else (x[idx[-1]], y[idx[-1]])
+            area = np.abs((ax - cx) * (y[idx] - ay) - (ax - x[idx]) * (cy - ay))
+            pick = idx[np.argmax(area)]
+        chosen[i - first] = pick
+        previous = (x[pick], y[pick])
+    return chosen
+
+
+class ChartSeries:
+    """
+    Velas reducidas + MA_20 (LTTB) de una ventana de zoom, actualizadas de forma
+    incremental. `update(df)` recibe todas las velas (la MA necesita las
+    MA_WINDOW - 1 anteriores a la ventana) y devuelve (ohlc, ma): DataFrame de
+    cubetas y Series de la MA con un punto por cubeta.
+    """
+
+    def __init__(self, interval, zoom=None, max_points=CHART_POINTS, ma_window=MA_WINDOW):
+        self.step = INTERVAL_DELTAS.get(interval, pd.Timedelta(minutes=1))
+        self.zoom = zoom
+        self.max_points = max_points
+        self.ma_window = ma_window
+        self.k = None
+        self.last = None
+        self.ohlc = None
+        self.ma = None          # MA por vela de la ventana (resolución completa)
+        self.picks = None       # posición elegida por LTTB en cada cubeta (-1: sin valor)
+        self.bars_processed = 0
+
+    def _moving_average(self, df, start):
+        # MA de las velas desde la posición `start` (con su historia previa)
+        close = df['Close'].iloc[max(0, start - self.ma_window + 1):]
+        return close.rolling(window=self.ma_window).mean().iloc[start - max(0, start - self.ma_window + 1):]
+
+    def _full(self, df, window_start, width):
+        window = df.iloc[window_start:]
+        self.ohlc = resample_ohlc(window, width)
+        self.ma = self._moving_average(df, window_start)
+        self.picks = None
+        self.bars_processed += len(window)
+
+    def update(self, df):
+        n = len(df)
+        window_start = max(0, n - self.zoom) if self.zoom else 0
+        if n == 0:
+            return df[OHLC_COLUMNS].copy(), pd.Series(dtype=np.float64, name='MA_20')
+        k = bucket_size(n - window_start, self.max_points)
+        width = self.step * k
+        head = df.index[window_start].floor(width)
+
+        if self.ohlc is None or k != self.k or self.last not in df.index or head < self.ohlc.index[0]:
+            self._full(df, window_start, width)
+            first_bucket = 0
+        else:
+            # Desde la cubeta de las últimas REDO_BARS velas ya vistas
+            redo_pos = max(df.index.get_loc(self.last) - REDO_BARS + 1, window_start)
+            redo = df.index[redo_pos].floor(width)
+            redo_pos = max(int(df.index.searchsorted(redo)), window_start)
+            index = self.ohlc.index
+            kept = self.ohlc.iloc[index.searchsorted(head, side='right'):index.searchsorted(redo)]
+            parts = []
+            if head < redo:
+                # La ventana se desplazó: la primera cubeta puede haber quedado parcial
+                head_end = int(df.index.searchsorted(head + width))
+                parts.append(resample_ohlc(df.iloc[window_start:min(head_end, redo_pos)], width))
+                self.bars_processed += min(head_end, redo_pos) - window_start
+            parts += [kept, resample_ohlc(df.iloc[redo_pos:], width)]
+            head_changed = len(self.ohlc) == 0 or self.ohlc.index[0] != head or \
+                self.ma.index[0] != df.index[window_start]
+            self.ohlc = pd.concat([p for p in parts if not p.empty])
+            index = self.ma.index
+            self.ma = pd.concat([self.ma.iloc[index.searchsorted(df.index[window_start]):
+                                              index.searchsorted(df.index[redo_pos])],
+                                 self._moving_average(df, redo_pos)])
+            self.bars_processed += n - redo_pos
+            # LTTB es secuencial: se conserva lo elegido antes de la cubeta anterior a `redo`
+            first_bucket = 0 if head_changed or self.picks is None else \
+                max(0, int(self.ohlc.index.searchsorted(redo)) - 1)
+
+        self.k = k
+        self.last = df.index[-1]
+        ma = self.ma.to_numpy(dtype=np.float64)
+        x = self.ma.index.asi8.astype(np.float64)
+        starts = np.searchsorted(self.ma.index.asi8, self.ohlc.index.asi8)
+        starts[0] = 0
+        kept_picks = self.picks[:first_bucket] if first_bucket else np.array([], dtype=np.int64)
+        previous = None
+        valid_kept = kept_picks[kept_picks >= 0]
+        if len(valid_kept):
+            previous = (x[valid_kept[-1]], ma[valid_kept[-1]])
+        # Sólo las cubetas desde `first_bucket` (posiciones relativas a su primera vela)
+        offset = starts[first_bucket] if first_bucket < len(starts) else len(x)
+        picks = lttb(x[offset:], ma[offset:], starts[first_bucket:] - offset, 0, previous)
+        self.picks = np.r_[kept_picks, np.where(picks >= 0, picks + offset, -1)]
+        picks = self.picks[self.picks >= 0]
+        return self.ohlc, pd.Series(ma[picks], index=self.ma.index[picks], name='MA_20')
+
+
+# Series en memoria del proceso, compartidas por todas las sesiones del dashboard
+_series = {}
+_series_lock = threading.Lock()
+
+
+def get_chart_data(symbol, interval, zoom, df, max_points=CHART_POINTS):
+    """(ohlc, ma) reducidos de `df` para un zoom (nº de velas o None = todas). No modificarlos."""
+    key = (symbol, interval, zoom, max_points)
+    with _series_lock:
+        series = _series.get(key)
+        if series is None:
+            series = _series[key] = ChartSeries(interval, zoom, max_points)
+    # Una sesión a la vez por serie (el estado incremental no admite llamadas concurrentes)
+    with series_lock(key):
+        return series.update(df)
+
+
+_locks = {}
+
+
+def series_lock(key):
+    with _series_lock:
+        return _locks.setdefault(key, threading.Lock())
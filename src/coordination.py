@@ -0,0 +1,187 @@
+"""
+Coordinación entre procesos a través de PostgreSQL (despliegue con varias réplicas).
+
+    LeaderLock       advisory lock de sesión: sólo un worker (scheduler.py) predice,
+                     califica, manda alertas y re-entrena; el resto espera en
+                     standby y toma el relevo si el líder cae (Postgres libera el
+                     lock al cerrarse su conexión)
+    notify_update    NOTIFY en DB_NOTIFY_CHANNEL cuando el worker guarda o califica
+                     predicciones de un activo, con una generación (secuencia de
+                     Postgres) que también queda en la tabla cache_generations
+    UpdateListener   LISTEN en un hilo de cada réplica del dashboard: cada aviso
+                     cambia la generación del activo en shared_cache, así que la
+                     siguiente ejecución del script lee los datos nuevos de
+                     inmediato, sin esperar al TTL ni consultar Postgres antes.
+                     Al (re)conectar lee cache_generations: recupera los avisos
+                     perdidos y todas las réplicas usan las mismas generaciones
+                     (mismas claves en la caché de disco compartida)
+
+Si el líder pierde la conexión hay una ventana (hasta LEADER_CHECK_SECONDS) en
+la que dos workers pueden creerse líderes: las escrituras ya son idempotentes
+(índice único por vela y modelo, alerta sólo de quien inserta), así que en el
+peor caso se repite trabajo, nunca predicciones ni alertas.
+"""
+import os
+import json
+import time
+import select
+import threading
+
+import psycopg2
+from psycopg2 import sql
+
+from database import get_connection, open_connection
+from metrics import inc
+
+# Clave para pg_advisory_lock del worker líder (MIGRATION_LOCK_KEY + 1, ver schema.py)
+LEADER_LOCK_KEY = 727402
+# Cada cuánto el líder comprueba que sigue teniendo el lock / el standby lo reintenta
+LEADER_CHECK_SECONDS = float(os.getenv("LEADER_CHECK_SECONDS", "5"))
+# Canal de LISTEN/NOTIFY para los cambios de predicciones (vacío = sin avisos)
+DB_NOTIFY_CHANNEL = os.getenv("DB_NOTIFY_CHANNEL", "prediction_updates")
+# Espera máxima del listener entre avisos antes de comprobar la conexión
+LISTEN_TIMEOUT = 30.0
+LISTEN_RETRY_MAX = 60.0
+
+_GENERATION_SQL = """
+    INSERT INTO cache_generations (symbol, seq) VALUES (%s, nextval('cache_generation_seq'))
+    ON CONFLICT (symbol) DO UPDATE SET seq = EXCLUDED.seq, updated_at = CURRENT_TIMESTAMP
+    RETURNING seq
+"""
+
+
+# --- ELECCIÓN DE LÍDER ---
+class LeaderLock:
+    """
+    pg_try_advisory_lock sobre una conexión dedicada. El lock dura lo que dure
+    la sesión: no hace falta renovarlo, sólo comprobar que la conexión sigue viva.
+    """
+
+    def __init__(self, key=LEADER_LOCK_KEY):
+        self.key = key
+        self.conn = None
+
+    def try_acquire(self):
+        """True si este proceso es (o pasa a ser) el líder."""
+        if self.conn is None or self.conn.closed:
+            self.conn = open_connection(application_name='cripto-worker')
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_lock(%s)", (self.key,))
+            return bool(cur.fetchone()[0])
+
+    def is_held(self):
+        """False si se perdió la sesión (y con ella el lock)."""
+        if self.conn is None or self.conn.closed:
+            return False
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            self.release()
+            return False
+
+    def release(self):
+        if self.conn is not None and not self.conn.closed:
+            self.conn.close()
+        self.conn = None
+
+
+# --- AVISOS (LISTEN / NOTIFY) ---
+def notify_update(symbol, interval=None, bar_time=None):
+    """Avisa a los dashboards de que cambiaron las predicciones de `symbol`."""
+    if not DB_NOTIFY_CHANNEL:
+        return
+    # Generación y aviso en la misma transacción: el aviso se entrega al hacer commit
+    # (get_connection), cuando la generación ya es visible para quien reconecte
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(_GENERATION_SQL, (symbol,))
+            seq = cur.fetchone()[0]
+            payload = json.dumps({'symbol': symbol, 'interval': interval, 'seq': seq,
+                                  'bar_time': str(bar_time) if bar_time is not None else None})
+            cur.execute("SELECT pg_notify(%s, %s)", (DB_NOTIFY_CHANNEL, payload))
+    inc('db_notify_total', channel=DB_NOTIFY_CHANNEL)
+
+
+class UpdateListener(threading.Thread):
+    """
+    Hilo con una conexión dedicada en LISTEN. on_update(symbol, seq) por cada
+    aviso y, al (re)conectar, por cada activo de cache_generations: mientras no
+    había conexión se pudieron perder avisos. Un aviso puede llegar después de
+    haber leído ya una generación más nueva: on_update debe ignorar las antiguas.
+    """
+
+    def __init__(self, on_update, channel=None):
+        super().__init__(name='db-listener', daemon=True)
+        self.on_update = on_update
+        self.channel = channel or DB_NOTIFY_CHANNEL
+        self.connected = False
+        self.received = 0
+        self.last_at = None
+        self._stopping = threading.Event()
+
+    def run(self):
+        delay = 1.0
+        while not self._stopping.is_set():
+            conn = None
+            try:
+                conn = open_connection(application_name='cripto-dashboard')
+                with conn.cursor() as cur:
+                    cur.execute(sql.SQL("LISTEN {}").format(sql.Identifier(self.channel)))
+                    # Después del LISTEN: un aviso posterior a esta lectura no se pierde
+                    cur.execute("SELECT symbol, seq FROM cache_generations")
+                    generations = cur.fetchall()
+                self.connected = True
+                delay = 1.0
+                for symbol, seq in generations:
+                    self.on_update(symbol, seq)
+                self._listen(conn)
+            except (psycopg2.Error, OSError) as e:
+                print(f"Listener de {self.channel}: {e}")
+            finally:
+                self.connected = False
+                if conn is not None and not conn.closed:
+                    conn.close()
+            self._stopping.wait(delay)
+            delay = min(delay * 2, LISTEN_RETRY_MAX)
+
+    def _listen(self, conn):
+        while not self._stopping.is_set():
+            if select.select([conn], [], [], LISTEN_TIMEOUT) == ([], [], []):
+                # Sin avisos: comprobar que la conexión sigue viva
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                continue
+            conn.poll()
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                try:
+                    data = json.loads(notify.payload)
+                    symbol, seq = data['symbol'], int(data['seq'])
+                except (ValueError, TypeError, KeyError):
+                    print(f"Listener de {self.channel}: aviso no válido: {notify.payload!r}")
+                    continue
+                self.received += 1
+                self.last_at = time.time()
+                inc('db_notifications_total', channel=self.channel)
+                self.on_update(symbol, seq)
+
+    def stop(self):
+        self._stopping.set()
+
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def start_listener(on_update):
+    """Listener del proceso (uno aunque lo pidan todas las sesiones). None sin canal."""
+    global _listener
+    if not DB_NOTIFY_CHANNEL:
+        return None
+    with _listener_lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = UpdateListener(on_update)
+            _listener.start()
+        return _listener
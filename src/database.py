@@ -1,71 +1,508 @@
 import psycopg2
-from psycopg2 import extras
+from psycopg2 import extras, pool
+import io
 import os
 import time
+import threading
+from datetime import date, datetime, timedelta
+from contextlib import contextmanager
+from metrics import timed, observe
 
-def get_connection():
-    # Reintento de conexión por si Postgres tarda en arrancar
-    max_retries = 5
-    for i in range(max_retries):
+# --- POOL DE CONEXIONES ---
+# Un único pool por proceso: Streamlit re-ejecuta app.py en cada refresco,
+# pero los módulos importados (y este pool) viven mientras viva el proceso.
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+# Segundos máximos esperando una conexión libre antes de fallar
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Conexiones ociosas más tiempo que esto se validan con SELECT 1 antes de usarse
+DB_HEALTHCHECK_IDLE = float(os.getenv("DB_HEALTHCHECK_IDLE", "30"))
+# Reintentos con backoff exponencial (por si Postgres tarda en arrancar o se reinicia)
+DB_CONNECT_RETRIES = int(os.getenv("DB_CONNECT_RETRIES", "5"))
+DB_CONNECT_BACKOFF = float(os.getenv("DB_CONNECT_BACKOFF", "0.5"))
+
+_pool = None
+_pool_lock = threading.Lock()
+# Limita los checkouts concurrentes al tamaño del pool: psycopg2 lanza PoolError
+# si se agota, así que esperamos aquí (y medimos cuánto) en lugar de fallar.
+_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+_last_used = {}
+
+_db_initialized = False
+_init_lock = threading.Lock()
+
+# Contadores del pool (se leen con get_pool_stats())
+_stats_lock = threading.Lock()
+_stats = {
+    'checkouts': 0,
+    'wait_time_total': 0.0,     # tiempo esperando un hueco libre en el pool
+    'wait_time_max': 0.0,
+    'checkout_time_total': 0.0, # tiempo total de checkout (espera + health check + reconexión)
+    'checkout_time_max': 0.0,
+    'healthcheck_failures': 0,
+    'reconnects': 0,
+}
+
+
+def _connect_kwargs():
+    return dict(
+        dbname=os.getenv("DB_NAME"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT")
+    )
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = _with_retries(
+                    lambda: pool.ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, **_connect_kwargs())
+                )
+    return _pool
+
+
+def _with_retries(fn):
+    # Reintento de conexión con backoff exponencial (0.5s, 1s, 2s, ...)
+    for i in range(DB_CONNECT_RETRIES):
         try:
-            return psycopg2.connect(
-                dbname=os.getenv("DB_NAME"),
-                user=os.getenv("DB_USER"),
-                password=os.getenv("DB_PASSWORD"),
-                host=os.getenv("DB_HOST"),
-                port=os.getenv("DB_PORT")
-            )
-        except Exception as e:
-            if i < max_retries - 1:
-                time.sleep(2)
+            return fn()
+        except psycopg2.OperationalError:
+            if i < DB_CONNECT_RETRIES - 1:
+                time.sleep(DB_CONNECT_BACKOFF * (2 ** i))
                 continue
-            raise e
-
-def init_db():
-    conn = get_connection()
-    cur = conn.cursor()
-    # Sintaxis de Postgres (cambia un poco respecto a SQLite)
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS predictions (
-            id SERIAL PRIMARY KEY,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            symbol TEXT,
-            entry_price FLOAT,
-            prediction INTEGER,
-            confidence FLOAT,
-            result INTEGER
-        )
-    """)
-    conn.commit()
-    cur.close()
-    conn.close()
+            raise
+
+
+def _is_healthy(conn):
+    if conn.closed:
+        return False
+    if time.monotonic() - _last_used.get(id(conn), 0) < DB_HEALTHCHECK_IDLE:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def _checkout():
+    p = _get_pool()
+    for i in range(DB_CONNECT_RETRIES):
+        try:
+            conn = p.getconn()
+        except psycopg2.OperationalError:
+            if i < DB_CONNECT_RETRIES - 1:
+                time.sleep(DB_CONNECT_BACKOFF * (2 ** i))
+                continue
+            raise
+        if _is_healthy(conn):
+            return conn
+        # Conexión rota (p.ej. Postgres reiniciado): se descarta y se pide otra
+        with _stats_lock:
+            _stats['healthcheck_failures'] += 1
+            _stats['reconnects'] += 1
+        _last_used.pop(id(conn), None)
+        p.putconn(conn, close=True)
+    raise psycopg2.OperationalError("No se pudo obtener una conexión sana del pool")
+
+
+@contextmanager
+def get_connection():
+    """
+    Presta una conexión del pool y la devuelve al salir del bloque.
+    Hace commit si el bloque termina bien y rollback si lanza una excepción.
+    """
+    start = time.monotonic()
+    if not _pool_slots.acquire(timeout=DB_POOL_TIMEOUT):
+        raise pool.PoolError(f"Pool agotado: sin conexiones libres tras {DB_POOL_TIMEOUT}s")
+    waited = time.monotonic() - start
+    try:
+        conn = _checkout()
+    except Exception:
+        _pool_slots.release()
+        raise
+    elapsed = time.monotonic() - start
+    observe('db_checkout_seconds', elapsed)
+    with _stats_lock:
+        _stats['checkouts'] += 1
+        _stats['wait_time_total'] += waited
+        _stats['wait_time_max'] = max(_stats['wait_time_max'], waited)
+        _stats['checkout_time_total'] += elapsed
+        _stats['checkout_time_max'] = max(_stats['checkout_time_max'], elapsed)
+
+    broken = False
+    try:
+        yield conn
+        conn.commit()
+    except psycopg2.OperationalError:
+        broken = True
+        raise
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        broken = broken or bool(conn.closed)
+        if broken:
+            _last_used.pop(id(conn), None)
+        else:
+            _last_used[id(conn)] = time.monotonic()
+        _get_pool().putconn(conn, close=broken)
+        _pool_slots.release()
+
+
+def open_connection(**options):
+    """
+    Conexión dedicada, fuera del pool (con reintentos), para lo que necesita la
+    misma sesión durante mucho tiempo: advisory locks de sesión, LISTEN.
+    Con keepalives TCP para detectar en segundos un servidor caído.
+    """
+    kwargs = dict(_connect_kwargs(), keepalives=1, keepalives_idle=10, keepalives_interval=5,
+                  keepalives_count=3, **options)
+    conn = _with_retries(lambda: psycopg2.connect(**kwargs))
+    conn.autocommit = True
+    return conn
+
+
+def get_pool_stats():
+    """Snapshot de los contadores del pool (tiempos en segundos)."""
+    with _stats_lock:
+        stats = dict(_stats)
+    n = stats['checkouts'] or 1
+    stats['wait_time_avg'] = stats['wait_time_total'] / n
+    stats['checkout_time_avg'] = stats['checkout_time_total'] / n
+    stats['pool_min'] = DB_POOL_MIN
+    stats['pool_max'] = DB_POOL_MAX
+    return stats
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+            _last_used.clear()
+
+
+def init_db(force=False):
+    # Solo una vez por proceso (app.py lo llama en cada rerun de Streamlit)
+    global _db_initialized
+    if _db_initialized and not force:
+        return
+    with _init_lock:
+        if _db_initialized and not force:
+            return
+        # Esquema versionado e idempotente (ver schema.py)
+        from schema import migrate
+        migrate()
+        _db_initialized = True
 
 def save_prediction(symbol, price, prediction, confidence):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO predictions (symbol, entry_price, prediction, confidence) VALUES (%s, %s, %s, %s)",
-        (symbol, price, prediction, confidence)
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO predictions (symbol, entry_price, prediction, confidence) VALUES (%s, %s, %s, %s)",
+            (symbol, price, prediction, confidence)
+        )
+        cur.close()
+
+PREDICTION_COLUMNS = ['symbol', 'bar_time', 'bar_interval', 'model_version',
+                      'entry_price', 'prediction', 'confidence']
+# Filas por sentencia en execute_values (su valor por defecto es 100)
+DB_INSERT_PAGE_SIZE = int(os.getenv("DB_INSERT_PAGE_SIZE", "1000"))
+
+# Idempotencia: una predicción por (symbol, bar_interval, bar_time, model_version).
+# Upsert: si cambia la predicción o el precio de entrada, la calificación anterior
+# deja de valer. Las filas idénticas no se reescriben (reintentos sin coste).
+_UPSERT_SQL = """
+    ON CONFLICT (symbol, bar_interval, bar_time, model_version) DO UPDATE SET
+        entry_price = EXCLUDED.entry_price,
+        prediction = EXCLUDED.prediction,
+        confidence = EXCLUDED.confidence,
+        result = CASE WHEN (predictions.prediction, predictions.entry_price)
+                           = (EXCLUDED.prediction, EXCLUDED.entry_price)
+                      THEN predictions.result END
+    WHERE (predictions.entry_price, predictions.prediction, predictions.confidence)
+          IS DISTINCT FROM (EXCLUDED.entry_price, EXCLUDED.prediction, EXCLUDED.confidence)
+"""
+_IGNORE_SQL = "ON CONFLICT (symbol, bar_interval, bar_time, model_version) DO NOTHING"
+
+# Camino en vivo (scheduler, predict_all): una predicción (y una alerta) por vela, sea
+# cual sea la versión del modelo. Si el modelo se re-entrena o recarga a mitad de vela,
+# la versión nueva no vuelve a insertar (ni a avisar de) una vela ya predicha.
+# Los escritores se serializan por vela con un advisory lock de transacción (clase
+# BAR_LOCK_KEY; ver schema.MIGRATION_LOCK_KEY y coordination.LEADER_LOCK_KEY)
+BAR_LOCK_KEY = 727403
+_PER_BAR_SQL = f"""
+    INSERT INTO predictions ({', '.join(PREDICTION_COLUMNS)})
+    SELECT v.* FROM (VALUES %s) AS v ({', '.join(PREDICTION_COLUMNS)})
+    WHERE NOT EXISTS (
+        SELECT 1 FROM predictions p
+        WHERE p.symbol = v.symbol AND p.bar_interval = v.bar_interval AND p.bar_time = v.bar_time
     )
-    conn.commit()
-    cur.close()
-    conn.close()
-
-def get_history(limit=10):
-    conn = get_connection()
-    # Usamos DictCursor para que Streamlit reciba los datos como si fuera un diccionario
-    cur = conn.cursor(cursor_factory=extras.DictCursor)
-    cur.execute("SELECT * FROM predictions ORDER BY timestamp DESC LIMIT %s", (limit,))
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+    {_IGNORE_SQL}
+    RETURNING id, symbol, bar_time, bar_interval, model_version
+"""
+_PER_BAR_TEMPLATE = "(%s, %s::timestamp, %s, %s, %s::float, %s::integer, %s::float)"
+
+
+def _prediction_values(rows):
+    # Una fila por clave (gana la última): ON CONFLICT DO UPDATE falla si la
+    # misma clave aparece dos veces en una sentencia
+    values = {}
+    for r in rows:
+        row = (r['symbol'], r.get('bar_time'), r.get('bar_interval'), r.get('model_version') or '',
+               r['entry_price'], r['prediction'], r['confidence'])
+        values[row[:4]] = row
+    return list(values.values())
+
+
+@timed('db_query_seconds', query='save_predictions')
+def save_predictions(rows, upsert=False, page_size=DB_INSERT_PAGE_SIZE, per_bar=False):
+    """
+    Inserta muchas predicciones con execute_values (un round-trip cada `page_size` filas).
+    rows: lista de dicts con symbol, entry_price, prediction, confidence y
+    opcionalmente bar_time / bar_interval / model_version.
+    Idempotente sobre (symbol, bar_interval, bar_time, model_version): por defecto las
+    velas ya predichas se ignoran y devuelve sólo las filas insertadas; con
+    upsert=True se actualizan y devuelve también las que cambiaron.
+    per_bar=True (camino en vivo): idempotente sobre (symbol, bar_interval, bar_time);
+    una vela ya predicha por cualquier versión del modelo se ignora, así que quien
+    recibe la fila insertada es el único que debe avisar.
+    """
+    if not rows:
+        return []
+    if per_bar and upsert:
+        raise ValueError("per_bar no admite upsert: la vela ya predicha se conserva")
+    if per_bar:
+        # Una fila por vela: las de una misma sentencia no se ven entre sí en el NOT EXISTS
+        values = list({v[:3]: v for v in _prediction_values(rows)}.values())
+        sql, template = _PER_BAR_SQL, _PER_BAR_TEMPLATE
+    else:
+        values = _prediction_values(rows)
+        sql, template = f"""
+            INSERT INTO predictions ({', '.join(PREDICTION_COLUMNS)})
+            VALUES %s
+            {_UPSERT_SQL if upsert else _IGNORE_SQL}
+            RETURNING id, symbol, bar_time, bar_interval, model_version
+            """, None
+    with get_connection() as conn:
+        cur = conn.cursor()
+        if per_bar:
+            # Locks en orden fijo: dos escritores con velas en común no se bloquean en cruz
+            bars = sorted({f"{v[0]}|{v[2]}|{v[1]}" for v in values})
+            cur.execute("SELECT pg_advisory_xact_lock(%s, hashtext(k)) FROM unnest(%s::text[]) AS k",
+                        (BAR_LOCK_KEY, bars))
+        written = extras.execute_values(cur, sql, values, template=template, page_size=page_size, fetch=True)
+        cur.close()
+    return [
+        {'id': r[0], 'symbol': r[1], 'bar_time': r[2], 'bar_interval': r[3], 'model_version': r[4]}
+        for r in written
+    ]
+
+
+def _copy_field(value):
+    # Formato de texto de COPY: \N es NULL; los timestamps van en ISO
+    if value is None:
+        return '\\N'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+
+@timed('db_query_seconds', query='copy_predictions')
+def copy_predictions(rows, upsert=True):
+    """
+    Carga masiva (backfills, replays): COPY FROM STDIN a una tabla temporal y un
+    único INSERT ... SELECT con la misma idempotencia que save_predictions.
+    Pensado para decenas de miles de filas o más; devuelve el nº de filas escritas.
+    """
+    if not rows:
+        return 0
+    buf = io.StringIO()
+    for row in _prediction_values(rows):
+        buf.write('\t'.join(_copy_field(v) for v in row) + '\n')
+    buf.seek(0)
+    columns = ', '.join(PREDICTION_COLUMNS)
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            CREATE TEMP TABLE predictions_stage (
+                symbol TEXT, bar_time TIMESTAMP, bar_interval TEXT, model_version TEXT,
+                entry_price FLOAT, prediction INTEGER, confidence FLOAT
+            ) ON COMMIT DROP
+        """)
+        cur.copy_expert(f"COPY predictions_stage ({columns}) FROM STDIN", buf)
+        cur.execute(f"""
+            INSERT INTO predictions ({columns})
+            SELECT {columns} FROM predictions_stage
+            {_UPSERT_SQL if upsert else _IGNORE_SQL}
+        """)
+        written = cur.rowcount
+        cur.close()
+    return written
+
+HISTORY_COLUMNS = ['id', 'timestamp', 'symbol', 'entry_price', 'prediction', 'confidence', 'result',
+                   'bar_time', 'bar_interval']
+
+@timed('db_query_seconds', query='get_history')
+def get_history(limit=10, symbol=None):
+    with get_connection() as conn:
+        # Usamos DictCursor para que Streamlit reciba los datos como si fuera un diccionario
+        cur = conn.cursor(cursor_factory=extras.DictCursor)
+        if symbol:
+            # Usa el índice (symbol, timestamp DESC)
+            cur.execute(
+                f"SELECT {', '.join(HISTORY_COLUMNS)} FROM predictions WHERE symbol = %s ORDER BY timestamp DESC LIMIT %s",
+                (symbol, limit)
+            )
+        else:
+            cur.execute(f"SELECT {', '.join(HISTORY_COLUMNS)} FROM predictions ORDER BY timestamp DESC LIMIT %s", (limit,))
+        rows = cur.fetchall()
+        cur.close()
+    import pandas as pd
+    return pd.DataFrame(rows, columns=HISTORY_COLUMNS)
+
+@timed('db_query_seconds', query='get_latest_prediction')
+def get_latest_prediction(symbol):
+    """Última predicción guardada para un activo (o None)."""
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=extras.RealDictCursor)
+        cur.execute(
+            f"SELECT {', '.join(HISTORY_COLUMNS)} FROM predictions WHERE symbol = %s ORDER BY timestamp DESC LIMIT 1",
+            (symbol,)
+        )
+        row = cur.fetchone()
+        cur.close()
+    return dict(row) if row else None
+
+PENDING_COLUMNS = ['id', 'timestamp', 'symbol', 'bar_time', 'bar_interval', 'entry_price', 'prediction']
+
+@timed('db_query_seconds', query='get_pending_predictions')
+def get_pending_predictions(symbols=None, after_id=0, limit=None, include_graded=False):
+    """
+    Predicciones sin calificar (result IS NULL), paginadas por id (keyset).
+    include_graded=True devuelve también las ya calificadas (para re-calificar).
+    """
+    conditions = ["id > %(after_id)s"]
+    if not include_graded:
+        conditions.append("result IS NULL")
+    if symbols:
+        conditions.append("symbol = ANY(%(symbols)s)")
+    query = f"SELECT {', '.join(PENDING_COLUMNS)} FROM predictions WHERE {' AND '.join(conditions)} ORDER BY id"
+    if limit:
+        query += " LIMIT %(limit)s"
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(query, {'after_id': after_id, 'symbols': list(symbols or []), 'limit': limit})
+        rows = cur.fetchall()
+        cur.close()
     import pandas as pd
-    return pd.DataFrame(rows, columns=['id', 'timestamp', 'symbol', 'entry_price', 'prediction', 'confidence', 'result'])
+    return pd.DataFrame(rows, columns=PENDING_COLUMNS)
+
+@timed('db_query_seconds', query='grade_predictions')
+def grade_predictions(results, only_pending=True):
+    """
+    Califica muchas predicciones con un único UPDATE ... FROM (VALUES ...).
+    results: iterable de (id, result). Devuelve el nº de filas actualizadas.
+    """
+    results = [(int(pred_id), int(result)) for pred_id, result in results]
+    if not results:
+        return 0
+    query = """
+        UPDATE predictions AS p
+        SET result = v.result
+        FROM (VALUES %s) AS v(id, result)
+        WHERE p.id = v.id
+    """
+    if only_pending:
+        query += " AND p.result IS NULL"
+    with get_connection() as conn:
+        cur = conn.cursor()
+        # page_size = len(results): una sola sentencia por llamada (y rowcount exacto)
+        extras.execute_values(cur, query, results, page_size=len(results))
+        updated = cur.rowcount
+        cur.close()
+    return updated
 
 def update_last_result(pred_id, result):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("UPDATE predictions SET result = %s WHERE id = %s", (result, pred_id))
-    conn.commit()
-    cur.close()
-    conn.close()
\ No newline at end of file
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("UPDATE predictions SET result = %s WHERE id = %s", (result, pred_id))
+        cur.close()
+
+# --- ANALÍTICA AGREGADA ---
+# Tramo de confianza (50-59, 60-69, ..., 90-100) para la calibración
+CONF_BUCKET_SQL = "LEAST(FLOOR(confidence / 10) * 10, 90)::int"
+# Clave de predictions_daily en rollup_state (ver schema.refresh_rollup)
+ROLLUP_NAME = 'predictions_daily'
+
+AGGREGATE_GROUPS = ('symbol', 'day', 'conf_bucket')
+
+@timed('db_query_seconds', query='aggregate')
+def _aggregate(group_by, symbols=None, days=None):
+    """
+    Agrega total / ups / graded / wins en Postgres. Los días ya resumidos salen de
+    predictions_daily y sólo los recientes (aún calificándose) se leen de
+    predictions, así que el coste no crece con el histórico.
+    """
+    if group_by not in AGGREGATE_GROUPS:
+        raise ValueError(f"group_by debe ser uno de {AGGREGATE_GROUPS}")
+    since = datetime.utcnow().date() - timedelta(days=days) if days else date.min
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT refreshed_until FROM rollup_state WHERE name = %s", (ROLLUP_NAME,))
+        row = cur.fetchone()
+        boundary = row[0] if row else date.min
+        symbol_filter = "AND symbol = ANY(%(symbols)s)" if symbols else ""
+        cur.execute(f"""
+            WITH source AS (
+                SELECT day, symbol, conf_bucket, total, ups, graded, wins
+                FROM predictions_daily
+                WHERE day < %(boundary)s AND day >= %(since)s {symbol_filter}
+                UNION ALL
+                SELECT bar_time::date, symbol, {CONF_BUCKET_SQL},
+                       COUNT(*), COUNT(*) FILTER (WHERE prediction = 1),
+                       COUNT(result), COALESCE(SUM(result), 0)
+                FROM predictions
+                WHERE bar_time >= %(live_since)s {symbol_filter}
+                GROUP BY 1, 2, 3
+            )
+            SELECT {group_by}, SUM(total)::bigint, SUM(ups)::bigint, SUM(graded)::bigint, SUM(wins)::bigint
+            FROM source
+            GROUP BY {group_by}
+            ORDER BY {group_by}
+        """, {
+            'boundary': boundary, 'since': since, 'live_since': max(boundary, since),
+            'symbols': list(symbols or []),
+        })
+        rows = cur.fetchall()
+        cur.close()
+    import pandas as pd
+    df = pd.DataFrame(rows, columns=[group_by, 'total', 'ups', 'graded', 'wins'])
+    df['downs'] = df['total'] - df['ups']
+    # Win rate sobre las calificadas (NaN si todavía no hay ninguna)
+    df['win_rate'] = (df['wins'] * 100 / df['graded'].where(df['graded'] > 0)).astype('float64')
+    return df
+
+def get_performance_summary(symbols=None, days=None):
+    """
+    Rendimiento por activo: total, ups (SUBE), downs (BAJA), graded, wins y win_rate (%).
+    days=None: todo el histórico (incluido lo ya resumido por la retención).
+    """
+    return _aggregate('symbol', symbols, days)
+
+def get_calibration(symbol=None, days=None):
+    """Win rate real por tramo de confianza (conf_bucket = 50, 60, ..., 90)."""
+    return _aggregate('conf_bucket', [symbol] if symbol else None, days)
+
+def get_daily_performance(symbol=None, days=30):
+    """Serie diaria de predicciones y win rate."""
+    return _aggregate('day', [symbol] if symbol else None, days)
@@ -0,0 +1,65 @@
+"""
+Detección de deriva (drift) de las features con el índice PSI.
+
+Al entrenar se guarda en el artefacto un perfil de referencia de cada feature
+(`drift_profile`: cortes por cuantiles de las filas de entrenamiento y la
+proporción de filas en cada tramo). Después se compara con las features de
+las últimas velas:
+
+    PSI = sum((actual - esperado) * ln(actual / esperado))
+
+Valores orientativos: < 0.1 estable, 0.1-0.25 cambio moderado, > 0.25 la
+distribución cambió y conviene re-entrenar (DRIFT_PSI_THRESHOLD).
+"""
+import os
+import numpy as np
+
+DRIFT_BINS = 10
+# PSI máximo (de cualquier feature) a partir del cual se re-entrena; 0 desactiva
+DRIFT_PSI_THRESHOLD = float(os.getenv("DRIFT_PSI_THRESHOLD", "0.25"))
+# Proporción mínima por tramo (evita log(0) con tramos vacíos)
+PSI_EPSILON = 1e-4
+
+
+def feature_profile(X, bins=DRIFT_BINS):
+    """Perfil de referencia de un DataFrame de features (serializable a JSON)."""
+    profile = {}
+    for col in X.columns:
+        values = X[col].to_numpy(dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            continue
+        edges = np.unique(np.quantile(values, np.linspace(0, 1, bins + 1)[1:-1]))
+        counts = np.bincount(np.searchsorted(edges, values, side='right'), minlength=len(edges) + 1)
+        profile[col] = {'edges': edges.tolist(), 'expected': (counts / len(values)).tolist()}
+    return profile
+
+
+def psi(profile, X):
+    """Dict feature -> PSI de las filas de X frente al perfil de referencia."""
+    scores = {}
+    for col, ref in profile.items():
+        if col not in X.columns:
+            continue
+        values = X[col].to_numpy(dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            continue
+        edges = np.asarray(ref['edges'])
+        counts = np.bincount(np.searchsorted(edges, values, side='right'), minlength=len(edges) + 1)
+        actual = np.maximum(counts / len(values), PSI_EPSILON)
+        expected = np.maximum(np.asarray(ref['expected']), PSI_EPSILON)
+        scores[col] = float(np.sum((actual - expected) * np.log(actual / expected)))
+    return scores
+
+
+def drift_report(pack, X, threshold=DRIFT_PSI_THRESHOLD):
+    """(PSI máximo, feature, ¿hay deriva?) del modelo `pack` sobre las filas X. None sin perfil."""
+    profile = pack.get('drift_profile')
+    if not profile:
+        return None
+    scores = psi(profile, X)
+    if not scores:
+        return None
+    feature = max(scores, key=scores.get)
+    return scores[feature], feature, threshold > 0 and scores[feature] > threshold
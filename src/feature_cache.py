@@ -0,0 +1,148 @@
+"""
+Caché en disco de matrices de features + target.
+
+La clave es un hash del contenido de las velas (índice y OHLCV) más
+FEATURES_VERSION y las columnas de features pedidas, así que cualquier cambio en los datos o en el código de
+features invalida la entrada. Una búsqueda de hiperparámetros repetida sobre
+el mismo dataset no vuelve a pasar por calculate_features.
+
+Si las velas sólo crecieron (re-entrenamiento incremental: mismas velas más
+una cola nueva, quizá sin las más antiguas), la matriz guardada se extiende:
+sólo se calculan las features de la cola, con la historia de calentamiento
+que necesitan los indicadores, en lugar de recalcular todo el dataset.
+
+Los archivos viven en data/features/ (FEATURE_CACHE_DIR) como Parquet.
+"""
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from features import calculate_features, FEATURES_VERSION, BASE_COLUMNS
+from indicators import warmup_bars
+from storage import temp_path
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+FEATURE_CACHE_DIR = os.getenv("FEATURE_CACHE_DIR", os.path.join(project_root, 'data', 'features'))
+
+OHLCV_HASH_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+# Clave de la metadata Parquet con el rango de velas que cubre cada matriz
+CACHE_META_KEY = b'feature_cache'
+
+
+def dataset_hash(df, features=None):
+    """Hash estable del contenido de las velas (no depende de dónde ni cómo se guardaron)."""
+    columns = [c for c in OHLCV_HASH_COLUMNS if c in df.columns]
+    row_hashes = pd.util.hash_pandas_object(df[columns], index=True).to_numpy()
+    digest = hashlib.sha256(row_hashes.tobytes())
+    digest.update(f"{FEATURES_VERSION}|{','.join(columns)}|{','.join(features or [])}".encode())
+    return digest.hexdigest()[:16]
+
+
+def cache_path(ticker, key, cache_dir=None):
+    safe_ticker = ticker.replace("-", "_")
+    return os.path.join(cache_dir or FEATURE_CACHE_DIR, f'{safe_ticker}_{key}.parquet')
+
+
+def build_feature_matrix(df, features=None):
+    """Features + Target, sin filas con NaN (lo mismo que hacía train_model en línea)."""
+    from train_model import add_target
+    return add_target(calculate_features(df, features=features)).dropna()
+
+
+def _prefix(ticker):
+    return ticker.replace("-", "_") + '_'
+
+
+def _cache_meta(path):
+    metadata = pq.read_schema(path).metadata or {}
+    return json.loads(metadata[CACHE_META_KEY]) if CACHE_META_KEY in metadata else None
+
+
+def _previous_entry(ticker, cache_dir=None):
+    # La caché guarda una sola matriz por ticker: la última calculada
+    directory = cache_dir or FEATURE_CACHE_DIR
+    prefix = _prefix(ticker)
+    if not os.path.isdir(directory):
+        return None
+    paths = [os.path.join(directory, name) for name in os.listdir(directory)
+             if name.startswith(prefix) and name.endswith('.parquet')]
+    return max(paths, key=os.path.getmtime) if paths else None
+
+
+def extend_feature_matrix(ticker, df, cache_dir=None, features=None):
+    """
+    Matriz de `df` a partir de la última guardada para el ticker, si `df` contiene
+    sus velas sin cambios (con velas nuevas al final y, quizá, sin las primeras).
+    Se recalculan las dos últimas filas guardadas (la última vela pudo estar en
+    curso, y el Target de la anterior depende de ella) y la cola nueva, con
+    `warmup_bars` de historia. None si no hay una matriz reutilizable.
+    """
+    path = _previous_entry(ticker, cache_dir)
+    meta = _cache_meta(path) if path else None
+    if meta is None or meta.get('features') != list(features or []) or \
+            meta.get('features_version') != FEATURES_VERSION:
+        return None
+    last = pd.Timestamp(meta['last'])
+    if last not in df.index or last == df.index[-1]:
+        return None
+    old = pq.read_table(path, memory_map=True).to_pandas()
+    old = old.loc[old.index >= df.index[0]]
+    if len(old) < 2:
+        return None
+    # Las velas de la matriz guardada tienen que seguir siendo las mismas
+    kept = old.iloc[:-1]
+    if not kept.index.isin(df.index).all():
+        return None
+    columns = [c for c in OHLCV_HASH_COLUMNS if c in df.columns and c in old.columns]
+    current = df.loc[kept.index, columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+    if not np.array_equal(kept[columns].to_numpy(dtype=np.float64), current, equal_nan=True):
+        return None
+
+    warmup = warmup_bars(BASE_COLUMNS + list(features or []))
+    cut = kept.index[-1]
+    start = df.index.get_loc(cut)
+    tail = build_feature_matrix(df.iloc[max(0, start - warmup):], features)
+    tail = tail.loc[tail.index >= cut]
+    # Filas del principio que el cálculo completo sobre `df` descartaría (calentamiento)
+    old = old.loc[(old.index < cut) & (old.index >= df.index[min(warmup - 1, len(df) - 1)])]
+    return pd.concat([old, tail[old.columns]])
+
+
+def load_feature_matrix(ticker, df, cache_dir=None, use_cache=True, features=None, incremental=True):
+    """
+    Devuelve (matriz, hit): la matriz de features/target de `df`, leída de la caché
+    si ya se calculó para exactamente estas velas con esta versión de features.
+    features: columnas extra de indicators.py (p.ej. las de un conjunto de FEATURE_SETS).
+    incremental: si sólo cambió la cola, extender la matriz guardada (hit = 'extended').
+    """
+    if not use_cache:
+        return build_feature_matrix(df, features), False
+    key = dataset_hash(df, features)
+    path = cache_path(ticker, key, cache_dir)
+    if os.path.exists(path):
+        return pq.read_table(path, memory_map=True).to_pandas(), True
+
+    matrix = extend_feature_matrix(ticker, df, cache_dir, features) if incremental else None
+    hit = 'extended' if matrix is not None else False
+    if matrix is None:
+        matrix = build_feature_matrix(df, features)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = temp_path(path)
+    table = pa.Table.from_pandas(matrix, preserve_index=True)
+    meta = {'key': key, 'first': df.index[0].isoformat(), 'last': df.index[-1].isoformat(),
+            'features': list(features or []), 'features_version': FEATURES_VERSION}
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           CACHE_META_KEY: json.dumps(meta).encode()})
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+    # Sólo se conserva la última versión por ticker
+    prefix = _prefix(ticker)
+    for name in os.listdir(os.path.dirname(path)):
+        if name.startswith(prefix) and name != os.path.basename(path) and name.endswith('.parquet'):
+            os.remove(os.path.join(os.path.dirname(path), name))
+    return matrix, hit
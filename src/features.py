@@ -1,53 +1,266 @@
+import math
+from collections import deque
 
 import pandas as pd
 
-def calculate_features(df):
+from indicators import compute
+from metrics import timed
+
+# Bump whenever calculate_features changes its output: it is part of the
+# feature-cache key, so cached matrices from older code are never reused.
+FEATURES_VERSION = 4
+
+# Always present in the output (the original indicator set, used by the
+# incremental engine, the dashboard and models trained with the 'base' set)
+BASE_COLUMNS = ['MA_20', 'Returns_1m', 'Returns_2m', 'Dist_MA_20', 'RSI_14',
+                'BB_Upper', 'BB_Lower', 'BB_Position']
+
+@timed('features_seconds', mode='batch')
+def calculate_features(df, group_col=None, features=None):
     """
     Centralized feature engineering logic to ensure consistency 
     between Training, Inference (App), and Backtesting.
+
+    Indicators come from indicators.py (single-pass NumPy kernels over the
+    OHLCV arrays). The output has BASE_COLUMNS plus any extra indicator listed
+    in `features` (e.g. a model's pack['features'] or indicators.FEATURE_SETS['full']).
+
+    group_col: optional column identifying several assets stacked in one frame
+    (rows of each asset contiguous and time-ordered). Indicators are computed in
+    one vectorized pass over the whole frame, with rolling windows restarting and
+    lags masked at each asset boundary, so each asset gets the same values as if
+    it were computed alone.
     """
     df = df.copy()
-    
+
     # Ensure numeric types
     cols = ['Open', 'High', 'Low', 'Close', 'Volume']
     for col in cols:
         if col in df.columns:
             df[col] = pd.to_numeric(df[col], errors='coerce')
-            
-    # --- INDICATORS ---
-    # 1. Moving Average 20
-    df['MA_20'] = df['Close'].rolling(window=20).mean()
-    
-    # 2. Relative Features (Percentage based)
-    # 1-period Return (Momentum)
-    df['Returns_1m'] = df['Close'].pct_change(1)
-    
-    # 2-period Return (Lagged Momentum)
-    df['Returns_2m'] = df['Close'].pct_change(2)
-    
-    # Distance from Moving Average (Trend Strength/Reversion)
-    df['Dist_MA_20'] = (df['Close'] - df['MA_20']) / df['MA_20']
-    
-    # --- NEW INDICATORS ---
-    # 3. RSI (Relative Strength Index) - 14 periods
-    delta = df['Close'].diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-    rs = gain / loss
-    df['RSI_14'] = 100 - (100 / (1 + rs))
-    
-    # 4. Bollinger Bands (Volatility)
-    # Already have MA_20. Need Std Dev.
-    std_20 = df['Close'].rolling(window=20).std()
-    df['BB_Upper'] = df['MA_20'] + (std_20 * 2)
-    df['BB_Lower'] = df['MA_20'] - (std_20 * 2)
-    
-    # Feature: Position within Bands (0 = Lower, 1 = Upper, >1 Overbought, <0 Oversold)
-    # Avoid division by zero
-    bb_width = (df['BB_Upper'] - df['BB_Lower']).replace(0, 0.000001)
-    df['BB_Position'] = (df['Close'] - df['BB_Lower']) / bb_width
-    
-    # Handle infinite or NaN values created by calculations
-    df.replace([float('inf'), float('-inf')], 0, inplace=True)
-    
+
+    # +/-inf created by the calculations (e.g. x/0) are already replaced by 0
+    columns = BASE_COLUMNS + [c for c in features or [] if c not in BASE_COLUMNS]
+    values = compute(df, columns, group_col)
+    for col in columns:
+        df[col] = values[col]
     return df
+
+
+# --- INCREMENTAL (STREAMING) ENGINE ---
+MA_WINDOW = 20
+RSI_WINDOW = 14
+# Closes needed to reproduce every feature of the last bar exactly:
+# MA/std window (20) + 1 previous close for the first delta of the RSI window.
+WARMUP_BARS = MA_WINDOW + 1
+
+
+def _div(a, b):
+    # Same semantics as pandas/numpy float division (x/0 -> inf, 0/0 -> NaN)
+    if b == 0 or math.isnan(b):
+        if math.isnan(a) or math.isnan(b) or a == 0:
+            return float('nan')
+        return math.copysign(float('inf'), a) * math.copysign(1.0, b)
+    return a / b
+
+
+def _finite(x):
+    # calculate_features replaces +/-inf with 0 at the end
+    return 0.0 if math.isinf(x) else x
+
+
+class IncrementalFeatures:
+    """
+    Stateful, O(1)-per-bar version of calculate_features.
+
+    Keeps ring buffers of the last closes / gains / losses plus running sums
+    (mean and M2 via sliding Welford for MA_20 and std_20, running gain/loss
+    sums for RSI_14), so each new candle costs the same regardless of how much
+    history came before it. Values match calculate_features on the same
+    sequence of candles up to floating point rounding.
+    """
+
+    FEATURE_COLUMNS = BASE_COLUMNS
+
+    def __init__(self, resync_every=1000):
+        # Running sums accumulate rounding error; every `resync_every` bars they
+        # are recomputed from the (tiny) buffers to keep parity with pandas.
+        self.resync_every = resync_every
+        self.reset()
+
+    def reset(self):
+        self.closes = deque(maxlen=3)        # c(t-2), c(t-1), c(t)
+        self.window = deque(maxlen=MA_WINDOW)
+        self.gains = deque(maxlen=RSI_WINDOW)
+        self.losses = deque(maxlen=RSI_WINDOW)
+        self.n_valid = 0                     # non-NaN closes in window
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.gain_sum = 0.0
+        self.loss_sum = 0.0
+        self.equal_run = 0                   # consecutive identical closes
+        self.last_timestamp = None
+        self.n_bars = 0
+
+    # --- Running statistics ---
+    def _welford_add(self, x):
+        self.n_valid += 1
+        delta = x - self.mean
+        self.mean += delta / self.n_valid
+        self.m2 += delta * (x - self.mean)
+
+    def _welford_remove(self, x):
+        self.n_valid -= 1
+        if self.n_valid == 0:
+            self.mean = 0.0
+            self.m2 = 0.0
+            return
+        delta = x - self.mean
+        self.mean -= delta / self.n_valid
+        self.m2 -= delta * (x - self.mean)
+
+    def _resync(self):
+        valid = [x for x in self.window if not math.isnan(x)]
+        self.n_valid = len(valid)
+        self.mean = math.fsum(valid) / len(valid) if valid else 0.0
+        self.m2 = math.fsum((x - self.mean) ** 2 for x in valid)
+        self.gain_sum = math.fsum(self.gains)
+        self.loss_sum = math.fsum(self.losses)
+
+    def _push(self, close):
+        prev = self.closes[-1] if self.closes else float('nan')
+
+        # Equal-value runs: pandas returns exactly 0 std for a constant window
+        if self.closes and close == prev:
+            self.equal_run += 1
+        else:
+            self.equal_run = 1
+
+        # MA / std window
+        if len(self.window) == MA_WINDOW:
+            old = self.window[0]
+            if not math.isnan(old):
+                self._welford_remove(old)
+        self.window.append(close)
+        if not math.isnan(close):
+            self._welford_add(close)
+
+        # RSI gains / losses (NaN deltas count as 0, like delta.where(...))
+        delta = close - prev
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        if len(self.gains) == RSI_WINDOW:
+            self.gain_sum -= self.gains[0]
+            self.loss_sum -= self.losses[0]
+        self.gains.append(gain)
+        self.losses.append(loss)
+        self.gain_sum += gain
+        self.loss_sum += loss
+
+        self.closes.append(close)
+        self.n_bars += 1
+        if self.resync_every and self.n_bars % self.resync_every == 0:
+            self._resync()
+
+    def _features(self, bar):
+        close = self.closes[-1]
+        out = {col: bar.get(col, float('nan')) for col in ['Open', 'High', 'Low', 'Close', 'Volume']}
+        out['Close'] = close
+        nan = float('nan')
+
+        # 1. Moving Average 20 / std 20
+        if len(self.window) == MA_WINDOW and self.n_valid == MA_WINDOW:
+            if self.equal_run >= MA_WINDOW:
+                ma, std = close, 0.0
+            else:
+                ma = self.mean
+                std = math.sqrt(max(self.m2, 0.0) / (MA_WINDOW - 1))
+        else:
+            ma, std = nan, nan
+        out['MA_20'] = ma
+
+        # 2. Returns
+        c = list(self.closes)
+        out['Returns_1m'] = _finite(_div(close - c[-2], c[-2])) if len(c) >= 2 else nan
+        out['Returns_2m'] = _finite(_div(close - c[-3], c[-3])) if len(c) >= 3 else nan
+        out['Dist_MA_20'] = _finite(_div(close - ma, ma))
+
+        # 3. RSI 14
+        if len(self.gains) == RSI_WINDOW:
+            gain = max(self.gain_sum, 0.0) / RSI_WINDOW
+            loss = max(self.loss_sum, 0.0) / RSI_WINDOW
+            rs = _div(gain, loss)
+            out['RSI_14'] = _finite(100 - _div(100, 1 + rs))
+        else:
+            out['RSI_14'] = nan
+
+        # 4. Bollinger Bands
+        upper = ma + (std * 2)
+        lower = ma - (std * 2)
+        out['BB_Upper'] = upper
+        out['BB_Lower'] = lower
+        width = upper - lower
+        if width == 0:
+            width = 0.000001
+        out['BB_Position'] = _finite(_div(close - lower, width))
+        return out
+
+    # --- Public API ---
+    def update(self, bar, timestamp=None):
+        """
+        Ingests one closed candle (dict/Series with at least 'Close') and
+        returns the feature row for it.
+        """
+        close = float(bar['Close'])
+        self._push(close)
+        self.last_timestamp = timestamp
+        return self._features(bar)
+
+    def peek(self, bar):
+        """
+        Features for a provisional (still open) candle without committing it,
+        e.g. the in-progress bar yfinance returns as the last row.
+        """
+        clone = IncrementalFeatures.from_state(self.to_state())
+        return clone.update(bar)
+
+    def warm_start(self, df):
+        """Seeds the state from the tail of a stored OHLCV frame (closed bars)."""
+        self.reset()
+        tail = df.tail(WARMUP_BARS)
+        closes = pd.to_numeric(tail['Close'], errors='coerce')
+        for ts, close in zip(tail.index, closes):
+            self._push(float(close))
+            self.last_timestamp = ts
+        self._resync()
+        return self
+
+    @classmethod
+    def from_frame(cls, df, **kwargs):
+        return cls(**kwargs).warm_start(df)
+
+    def to_state(self):
+        """Serializable snapshot (closes window + counters) to persist and warm-start later."""
+        return {
+            'closes': list(self.window)[-WARMUP_BARS:],
+            'gains': list(self.gains),
+            'losses': list(self.losses),
+            'prev_closes': list(self.closes),
+            'equal_run': self.equal_run,
+            'n_bars': self.n_bars,
+            'last_timestamp': self.last_timestamp,
+            'resync_every': self.resync_every,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        engine = cls(resync_every=state.get('resync_every', 1000))
+        engine.window.extend(state['closes'])
+        engine.gains.extend(state['gains'])
+        engine.losses.extend(state['losses'])
+        engine.closes.extend(state['prev_closes'])
+        engine.equal_run = state['equal_run']
+        engine.n_bars = state['n_bars']
+        engine.last_timestamp = state['last_timestamp']
+        engine._resync()
+        return engine
@@ -0,0 +1,144 @@
+"""
+Predictor compilado para RandomForestClassifier.
+
+Aplana todos los árboles del bosque en arrays NumPy contiguos (feature,
+umbral, hijo izquierdo/derecho y probabilidades de cada hoja) y recorre los
+árboles de forma vectorizada: en cada paso de profundidad avanzan a la vez
+todas las filas en todos los árboles. Devuelve clase y probabilidad en una
+sola pasada, sin la validación de sklearn/pandas por llamada, que para una
+sola fila de 5 features es casi todo el coste.
+
+Mismos resultados que sklearn: la entrada se redondea a float32 (como hace
+sklearn antes de recorrer los árboles) y se compara `x <= umbral` en float64.
+La paridad se comprueba en tests/test_forest_predictor.py (y antes de medir en
+benchmarks/bench_predictor.py).
+
+El recorrido vectorizado cuesta O(filas x árboles x profundidad) en NumPy: gana
+de largo con pocas filas (la inferencia en vivo) pero sklearn, en Cython, es más
+rápido a partir de ~1.000 filas. Por encima de SKLEARN_MIN_ROWS se delega en él.
+"""
+import numpy as np
+
+# A partir de cuántas filas predict_proba delega en sklearn (ver benchmarks/suite.py)
+SKLEARN_MIN_ROWS = 512
+
+
+class FlatForest:
+    """Bosque aplanado. Construir con FlatForest(modelo_sklearn_entrenado)."""
+
+    def __init__(self, model):
+        trees = [est.tree_ for est in model.estimators_]
+        self.model = model
+        self.classes_ = np.asarray(model.classes_)
+        self.n_features = model.n_features_in_
+        self.n_trees = len(trees)
+
+        sizes = np.array([t.node_count for t in trees])
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        self.roots = offsets.astype(np.intp)
+        self.max_depth = max(t.max_depth for t in trees)
+
+        feature, threshold, left, right, missing_left, value = [], [], [], [], [], []
+        for tree, offset in zip(trees, offsets):
+            node_ids = np.arange(tree.node_count) + offset
+            is_leaf = tree.children_left == -1
+            # Las hojas apuntan a sí mismas: seguir iterando no las mueve
+            left.append(np.where(is_leaf, node_ids, tree.children_left + offset))
+            right.append(np.where(is_leaf, node_ids, tree.children_right + offset))
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(np.where(is_leaf, np.inf, tree.threshold))
+            missing = getattr(tree, 'missing_go_to_left', None)
+            missing_left.append(np.zeros(tree.node_count, dtype=bool) if missing is None else missing.astype(bool))
+            # Probabilidad de cada clase en la hoja (lo que promedia predict_proba). Desde
+            # sklearn 1.4 tree_.value ya guarda fracciones y predict_proba las usa tal cual:
+            # volver a normalizarlas cambia el último bit con más de dos clases
+            counts = tree.value[:, 0, :]
+            sums = counts.sum(axis=1, keepdims=True)
+            value.append(counts if np.allclose(sums, 1.0) else counts / sums)
+
+        self.feature = np.concatenate(feature).astype(np.intp)
+        self.threshold = np.concatenate(threshold).astype(np.float64)
+        self.left = np.concatenate(left).astype(np.intp)
+        self.right = np.concatenate(right).astype(np.intp)
+        self.missing_left = np.concatenate(missing_left)
+        self.value = np.ascontiguousarray(np.concatenate(value), dtype=np.float64)
+
+    def apply(self, X):
+        """Índice global de la hoja alcanzada por cada fila en cada árbol: (n_filas, n_árboles)."""
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        # take() sobre arrays planos es bastante más rápido que el indexado 2D
+        flat = X.ravel()
+        row_offset = (np.arange(len(X)) * X.shape[1])[:, None]
+        node = np.broadcast_to(self.roots, (len(X), self.n_trees)).copy()
+        for _ in range(self.max_depth):
+            x = flat.take(row_offset + self.feature.take(node))
+            go_left = x <= self.threshold.take(node)
+            nan = np.isnan(x)
+            if nan.any():
+                go_left = np.where(nan, self.missing_left.take(node), go_left)
+            node = np.where(go_left, self.left.take(node), self.right.take(node))
+        return node
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 2 and len(X) >= SKLEARN_MIN_ROWS:
+            return _sklearn_proba(self.model, X)
+        return self.predict_proba_flat(X)
+
+    def predict_proba_flat(self, X):
+        """Recorrido vectorizado sobre los arrays aplanados, sea cual sea el nº de filas."""
+        # Suma árbol a árbol en el mismo orden que sklearn y divide al final
+        leaf_values = self.value.take(self.apply(X), axis=0)
+        proba = leaf_values[:, 0, :].copy()
+        for t in range(1, self.n_trees):
+            proba += leaf_values[:, t, :]
+        return proba / self.n_trees
+
+    def predict(self, X):
+        """(clases, probabilidad de la clase elegida, matriz de probabilidades) en una pasada."""
+        proba = self.predict_proba(X)
+        k = proba.argmax(axis=1)
+        return self.classes_[k], proba[np.arange(len(k)), k], proba
+
+
+class _SklearnPredictor:
+    """Mismo interfaz que FlatForest para modelos que no son bosques de árboles."""
+
+    def __init__(self, model):
+        self.model = model
+        self.classes_ = np.asarray(model.classes_)
+
+    def predict_proba(self, X):
+        return _sklearn_proba(self.model, np.atleast_2d(np.asarray(X, dtype=np.float64)))
+
+    def predict(self, X):
+        proba = self.predict_proba(X)
+        k = proba.argmax(axis=1)
+        return self.classes_[k], proba[np.arange(len(k)), k], proba
+
+
+def _sklearn_proba(model, X):
+    names = getattr(model, 'feature_names_in_', None)
+    if names is not None:
+        # Entrenado con DataFrame: mismas columnas para no disparar el aviso de sklearn
+        import pandas as pd
+        X = pd.DataFrame(X, columns=names)
+    return model.predict_proba(X)
+
+
+def compile_model(model):
+    """FlatForest si el modelo es un bosque de árboles de clasificación (una salida); si no, sklearn."""
+    estimators = getattr(model, 'estimators_', None)
+    if (estimators and all(hasattr(e, 'tree_') for e in estimators)
+            and getattr(model, 'n_outputs_', 1) == 1 and hasattr(model, 'classes_')):
+        return FlatForest(model)
+    return _SklearnPredictor(model)
+
+
+def get_predictor(pack):
+    """Predictor compilado de un pack de modelo (se compila una vez y se guarda en el pack)."""
+    if pack.get('predictor') is None:
+        pack['predictor'] = compile_model(pack['model'])
+    return pack['predictor']
@@ -0,0 +1,129 @@
+"""
+Calificación en bloque de predicciones.
+
+Busca todas las predicciones sin resultado, las cruza con las velas guardadas
+para obtener el cierre real de la vela siguiente y las resuelve con un único
+UPDATE ... FROM (VALUES ...) por lote.
+
+Uso:
+    python src/grading.py run                      # pendientes de todos los activos
+    python src/grading.py backfill --regrade       # re-califica todo el histórico
+    python src/grading.py backfill --symbols BTC-USD --batch-size 50000
+"""
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+load_dotenv(os.path.join(project_root, '.env'))
+
+from database import get_pending_predictions, grade_predictions  # noqa: E402
+from ingestion import INTERVAL_DELTAS  # noqa: E402
+from inference import load_model_pack  # noqa: E402
+
+DEFAULT_BATCH_SIZE = 10000
+
+
+def _default_interval(symbol):
+    # Filas antiguas sin bar_interval: se asume el intervalo del modelo actual
+    pack = load_model_pack(symbol)
+    return pack.get('interval', '1m') if pack else None
+
+
+def resolve_outcomes(pending, candles, interval, now=None):
+    """
+    Cruza predicciones con velas (vectorizado). Devuelve [(id, result)] sólo para
+    las predicciones cuya vela siguiente ya cerró.
+
+    pending: DataFrame con id, timestamp, bar_time, entry_price, prediction
+             (y opcionalmente legacy: filas guardadas antes de tener vela propia).
+    candles: OHLCV con DatetimeIndex UTC.
+    """
+    if pending.empty or candles.empty:
+        return []
+    now = now or pd.Timestamp.now(tz='UTC')
+    step = INTERVAL_DELTAS.get(interval, pd.Timedelta(minutes=1))
+
+    # Vela predicha: bar_time; en filas antiguas (sin bar_interval), la vela en curso al guardar
+    bar_time = pd.to_datetime(pending['bar_time']).dt.tz_localize('UTC')
+    legacy_bar = pd.to_datetime(pending['timestamp']).dt.tz_localize('UTC').dt.floor(step)
+    is_legacy = pending['legacy'] if 'legacy' in pending else bar_time.isna()
+    bar_time = bar_time.where(~is_legacy & bar_time.notna(), legacy_bar)
+
+    next_bar = bar_time + step
+    next_close = candles['Close'].reindex(pd.DatetimeIndex(next_bar)).to_numpy()
+    closed = (next_bar + step <= now).to_numpy()
+    ready = closed & ~np.isnan(next_close)
+
+    entry = pending['entry_price'].to_numpy(dtype='float64')
+    pred = pending['prediction'].to_numpy()
+    result = ((pred == 1) & (next_close > entry)) | ((pred == 0) & (next_close < entry))
+    ids = pending['id'].to_numpy()
+    return list(zip(ids[ready].tolist(), result[ready].astype(int).tolist()))
+
+
+def grade_pending(store, symbols=None, only_pending=True, batch_size=DEFAULT_BATCH_SIZE,
+                  refresh=True, now=None):
+    """
+    Califica todas las predicciones pendientes (o todas, si only_pending=False).
+    Pagina por id para no cargar tablas enormes de golpe. Devuelve filas actualizadas.
+    """
+    updated = 0
+    after_id = 0
+    intervals = {}
+    refreshed = set()
+    while True:
+        page = get_pending_predictions(symbols, after_id=after_id, limit=batch_size,
+                                       include_graded=not only_pending)
+        if page.empty:
+            break
+        after_id = int(page['id'].iloc[-1])
+
+        results = []
+        for symbol, rows in page.groupby('symbol'):
+            if symbol not in intervals:
+                intervals[symbol] = _default_interval(symbol)
+            rows = rows.assign(legacy=rows['bar_interval'].isna(),
+                               bar_interval=rows['bar_interval'].fillna(intervals[symbol] or ''))
+            for interval, group in rows.groupby('bar_interval'):
+                if not interval:
+                    continue
+                if refresh and (symbol, interval) not in refreshed:
+                    store.update(symbol, interval)
+                    refreshed.add((symbol, interval))
+                results.extend(resolve_outcomes(group, store.read(symbol, interval), interval, now=now))
+
+        updated += grade_predictions(results, only_pending=only_pending)
+        if len(page) < batch_size:
+            break
+    return updated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calificación en bloque de predicciones")
+    parser.add_argument("command", choices=["run", "backfill"])
+    parser.add_argument("--symbols", nargs="*", default=None)
+    parser.add_argument("--regrade", action="store_true",
+                        help="(backfill) re-calificar también las ya calificadas")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--no-refresh", action="store_true",
+                        help="No descargar velas nuevas; usar sólo el almacén local")
+    args = parser.parse_args()
+
+    import time
+    from candle_store import CandleStore
+    t0 = time.perf_counter()
+    n = grade_pending(
+        CandleStore(), args.symbols,
+        only_pending=not (args.command == "backfill" and args.regrade),
+        batch_size=args.batch_size,
+        refresh=not args.no_refresh,
+    )
+    print(f"{n} predicciones calificadas en {time.perf_counter() - t0:.2f}s")
+    if args.command == "backfill" and args.regrade:
+        # Cambiaron calificaciones de días ya resumidos: recalcular el rollup diario
+        from schema import rebuild_rollup
+        print(f"Rollup diario recalculado: {rebuild_rollup()}")
@@ -0,0 +1,503 @@
+"""
+Librería de indicadores técnicos sobre arrays NumPy contiguos.
+
+Cada indicador es una columna con nombre (p.ej. 'RSI_14', 'MACD_Rel') que se
+calcula con kernels de una sola pasada sobre float64:
+
+    * ventanas móviles (media / desviación) con sumas prefijas por bloques,
+      centradas en un ancla por bloque para no perder precisión con precios grandes
+    * máximos / mínimos móviles con el algoritmo de van Herk / Gil-Werman
+    * EMAs con un filtro IIR (scipy.signal.lfilter) por activo
+
+Varios activos apilados (group_col) se calculan en la misma pasada: las
+ventanas que cruzan el límite entre activos se enmascaran, como hacía
+calculate_features con pandas.
+
+Conjuntos de features con nombre (FEATURE_SETS): train_model elige uno y guarda
+su lista de columnas en el artefacto (`features`) junto a `feature_set`, así
+que inferencia y backtest calculan exactamente las columnas del modelo.
+
+Uso:
+    from indicators import compute, FEATURE_SETS, warmup_bars
+    values = compute(df, FEATURE_SETS['full'], group_col='Symbol')   # dict columna -> array
+"""
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+# Filas por bloque de las sumas prefijas: acota el error de redondeo (las sumas
+# nunca acumulan más de un bloque) y debe ser >= a la ventana más larga.
+BLOCK_SIZE = 256
+# Una EMA de span s converge a (1 - 2/(s+1))**(EMA_WARMUP_SPANS*s) ≈ e^-20 de su
+# valor con historia infinita: antes de eso la columna queda NaN, así que
+# entrenamiento e inferencia (que arranca con menos historia) coinciden.
+EMA_WARMUP_SPANS = 10
+# Ventanas mal condicionadas (ver rolling_moments): cota de (rango del bloque)² x
+# bloque frente a la suma de cuadrados de la ventana. Por debajo el error relativo
+# de las sumas prefijas es < ~1e-10; por encima la ventana se recalcula en dos pasadas.
+MAX_BLOCK_CONDITION = 1e6
+# Sustituye a un ancho de bandas 0 (mismo valor que usaba calculate_features)
+BB_MIN_WIDTH = 0.000001
+
+FEATURE_SETS = {
+    # Las 5 features originales (relativas: no dependen del nivel de precio)
+    'base': ['Returns_1m', 'Returns_2m', 'Dist_MA_20', 'RSI_14', 'BB_Position'],
+    'momentum': ['Returns_1m', 'Returns_2m', 'Returns_5', 'Returns_15', 'Returns_60',
+                 'Dist_MA_20', 'RSI_14', 'BB_Position', 'Dist_EMA_12', 'Dist_EMA_26',
+                 'MACD_Rel', 'MACD_Hist_Rel'],
+    'full': ['Returns_1m', 'Returns_2m', 'Returns_5', 'Returns_15', 'Returns_60',
+             'Dist_MA_20', 'RSI_14', 'BB_Position', 'Dist_EMA_12', 'Dist_EMA_26',
+             'MACD_Rel', 'MACD_Hist_Rel', 'Volatility_15', 'Volatility_60', 'ATR_Rel_14',
+             'Stoch_K_14', 'Stoch_D_14', 'OBV_Flow_20', 'Dist_VWAP_20'],
+}
+DEFAULT_FEATURE_SET = 'base'
+
+
+def resolve_feature_set(feature_set):
+    """Lista de columnas de un conjunto con nombre (o la lista tal cual)."""
+    if isinstance(feature_set, str):
+        if feature_set not in FEATURE_SETS:
+            raise ValueError(f"Conjunto de features desconocido: {feature_set!r} "
+                             f"(disponibles: {', '.join(FEATURE_SETS)})")
+        return list(FEATURE_SETS[feature_set])
+    return list(feature_set)
+
+
+# --- Kernels ---
+def _blocks(x, block, fill=np.nan):
+    # Vista (n_bloques, block), rellenando el último bloque con `fill`
+    pad = (-len(x)) % block
+    if pad:
+        x = np.concatenate([x, np.full(pad, fill)])
+    return x.reshape(-1, block)
+
+
+def rolling_moments(x, window, ddof=1, std=True):
+    """
+    Media y desviación estándar móviles (ventana completa; NaN si la ventana
+    tiene algún NaN), en una pasada con sumas prefijas por bloque.
+
+    Cada bloque se centra en su propia media, y la parte de una ventana que cae
+    en el bloque anterior se re-centra con un desplazamiento exacto, así que los
+    productos nunca son del orden de precio² y la precisión no depende del nivel
+    de precio ni de la longitud de la serie. Todo son operaciones sobre cortes
+    de la matriz (n_bloques, bloque): sin indexado por máscara.
+
+    Ventana constante: la media es exactamente ese valor y la desviación 0,
+    como en pandas (sin restos de redondeo: una RSI con ganancias y pérdidas
+    todas a 0 debe dar 0/0, no el cociente de dos restos).
+
+    Un bloque que mezcla escalas (activos apilados con precios muy distintos, un
+    salto enorme) tiene el ancla lejos de las ventanas pequeñas: el error de sus
+    sumas, que crece con el rango del bloque, deja de ser despreciable frente a
+    la ventana. Esas ventanas (MAX_BLOCK_CONDITION) se recalculan en dos pasadas.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    n = len(x)
+    w = window
+    if n < w:
+        return np.full(n, np.nan), np.full(n, np.nan) if std else None
+    block = max(BLOCK_SIZE, w)
+    # El relleno repite el último valor: no introduce NaN ni mueve el ancla
+    xb = _blocks(x, block, fill=x[-1])
+    # Una suma NaN delata algún NaN sin materializar la máscara
+    has_nan = not np.isfinite(xb.sum())
+    if has_nan:
+        nan = np.isnan(xb)
+        valid = block - nan.sum(axis=1)
+        anchor = np.where(nan, 0.0, xb).sum(axis=1) / np.maximum(valid, 1)
+        dev = np.where(nan, 0.0, xb - anchor[:, None])
+    else:
+        anchor = xb.mean(axis=1)
+        dev = xb - anchor[:, None]
+    # Rango del bloque y del anterior (del que salen las ventanas que lo cruzan)
+    top = anchor + dev.max(axis=1)
+    bottom = anchor + dev.min(axis=1)
+    top[1:], bottom[1:] = np.maximum(top[1:], top[:-1]), np.minimum(bottom[1:], bottom[:-1])
+    reach = ((top - bottom) * (block / MAX_BLOCK_CONDITION))[:, None]
+
+    def window_sums(p, cross_fix):
+        # p: sumas prefijas por bloque. Columnas >= w-1: ventana dentro del bloque
+        s = np.empty_like(p)
+        s[:, w - 1] = p[:, w - 1]
+        np.subtract(p[:, w:], p[:, :-w], out=s[:, w:])
+        # Columnas < w-1: la ventana empieza en la cola del bloque anterior
+        s[0, :w - 1] = np.nan
+        if w > 1 and len(p) > 1:
+            tail = p[:-1, -1:] - p[:-1, block - w:block - 1]
+            s[1:, :w - 1] = p[1:, :w - 1] + cross_fix(tail)
+        return s
+
+    k = np.arange(w - 1, 0, -1, dtype=np.float64)      # elementos en la cola, por columna
+    d = (anchor[1:] - anchor[:-1])[:, None]             # cambio de ancla entre bloques
+    p1 = dev.cumsum(axis=1)
+    tail1 = p1[:-1, -1:] - p1[:-1, block - w:block - 1] if w > 1 and len(p1) > 1 else None
+    s1 = window_sums(p1, lambda t: t - k * d)
+    sd = None
+    if std:
+        np.multiply(dev, dev, out=dev)
+        p2 = dev.cumsum(axis=1)
+        s2 = window_sums(p2, lambda t: t - 2 * d * tail1 + k * d * d)
+        # var = (s2 - s1²/w) / (w - ddof), en el sitio sobre p2
+        np.multiply(s1, s1, out=p2)
+        p2 *= -1.0 / w
+        p2 += s2
+        np.maximum(p2, 0.0, out=p2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            p2 /= (w - ddof)
+    s1 *= 1.0 / w
+    s1 += anchor[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ill = np.abs(s1) < reach / w
+        if std:
+            ill |= p2 < reach * (top - bottom)[:, None] / (w - ddof)
+            sd = np.sqrt(p2, out=p2).ravel()[:n]
+    mean = s1.ravel()[:n]
+    ill = ill.ravel()[:n]
+
+    constant = constant_windows(x, w)
+    ill[:w - 1] = False
+    ill &= ~constant
+    if ill.any():
+        _exact_moments(x, w, ddof, np.flatnonzero(ill), mean, sd)
+
+    if constant.any():
+        mean[constant] = x[constant]
+        if sd is not None:
+            sd[constant] = 0.0
+
+    # Ventanas incompletas al principio o con algún NaN
+    mean[:w - 1] = np.nan
+    if sd is not None:
+        sd[:w - 1] = np.nan
+    if has_nan:
+        cnt = np.cumsum(np.isnan(x), dtype=np.int64)
+        bad = np.zeros(n, dtype=bool)
+        bad[w - 1] = cnt[w - 1] > 0
+        bad[w:] = (cnt[w:] - cnt[:-w]) > 0
+        mean[bad] = np.nan
+        if sd is not None:
+            sd[bad] = np.nan
+    return mean, sd
+
+
+def _exact_moments(x, window, ddof, rows, mean, sd, chunk=65536):
+    # Media y desviación de las ventanas que terminan en `rows`, en dos pasadas (en el sitio)
+    windows = np.lib.stride_tricks.sliding_window_view(x, window)
+    for i in range(0, len(rows), chunk):
+        end = rows[i:i + chunk]
+        win = windows[end - window + 1]
+        m = win.mean(axis=1)
+        mean[end] = m
+        if sd is not None:
+            win = win - m[:, None]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                sd[end] = np.sqrt(np.einsum('ij,ij->i', win, win) / (window - ddof))
+
+
+def rolling_mean(x, window):
+    return rolling_moments(x, window, std=False)[0]
+
+
+def rolling_extreme(x, window, ufunc):
+    """Máximo (np.maximum) o mínimo (np.minimum) móvil en O(n): van Herk / Gil-Werman."""
+    n = len(x)
+    xb = _blocks(np.asarray(x, dtype=np.float64), window)
+    prefix = ufunc.accumulate(xb, axis=1).ravel()[:n]
+    suffix = ufunc.accumulate(xb[:, ::-1], axis=1)[:, ::-1].ravel()[:n]
+    out = np.full(n, np.nan)
+    if n >= window:
+        out[window - 1:] = ufunc(suffix[:n - window + 1], prefix[window - 1:])
+    return out
+
+
+def constant_windows(x, window):
+    """True donde la ventana que termina en cada posición es constante. Exacto: cuenta entera de cambios."""
+    n = len(x)
+    out = np.zeros(n, dtype=bool)
+    if n < window:
+        return out
+    # cs[i]: cambios entre las posiciones 0..i (int32 si cabe: la mitad de memoria)
+    cs = np.empty(n, dtype=np.int32 if n < 2 ** 31 else np.int64)
+    cs[0] = 0
+    np.cumsum(x[1:] != x[:-1], out=cs[1:])
+    np.equal(cs[window - 1:], cs[:n - window + 1], out=out[window - 1:])
+    return out
+
+
+def ema(x, span, starts):
+    """EMA (como pandas ewm(span, adjust=False)) reiniciada en cada activo; los NaN se rellenan hacia delante."""
+    alpha = 2.0 / (span + 1)
+    out = np.empty(len(x))
+    bounds = list(starts) + [len(x)]
+    for a, b in zip(bounds[:-1], bounds[1:]):
+        seg = pd.Series(x[a:b]).ffill().bfill().to_numpy()
+        if not len(seg) or np.isnan(seg[0]):
+            out[a:b] = np.nan
+            continue
+        out[a:b], _ = lfilter([alpha], [1.0, alpha - 1.0], seg, zi=[(1.0 - alpha) * seg[0]])
+    return out
+
+
+def _div(a, b):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return a / b
+
+
+def _safe_div(a, b, fill=0.0):
+    # Para ratios sobre volumen: yfinance devuelve velas con volumen 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(b != 0, a / b, fill)
+
+
+# --- Contexto de cálculo ---
+class IndicatorFrame:
+    """
+    Arrays OHLCV contiguos de un DataFrame (uno o varios activos apilados) y la
+    fila donde empieza cada activo. Los indicadores se memorizan: MA_20,
+    EMA_26, las bandas... se calculan una sola vez aunque los usen varias columnas.
+    """
+
+    def __init__(self, df, group_col=None):
+        self.n = len(df)
+        self._arrays = {}
+        for col in ('Open', 'High', 'Low', 'Close', 'Volume'):
+            if col in df.columns:
+                self._arrays[col] = np.ascontiguousarray(pd.to_numeric(df[col], errors='coerce'), dtype=np.float64)
+        # Filas de cada activo contiguas y ordenadas en el tiempo
+        if group_col and self.n:
+            groups = df[group_col].to_numpy()
+            is_start = np.ones(self.n, dtype=bool)
+            is_start[1:] = groups[1:] != groups[:-1]
+        else:
+            is_start = np.zeros(self.n, dtype=bool)
+            is_start[:1] = True
+        self.starts = np.flatnonzero(is_start)
+        self._cache = {}
+
+    def col(self, name):
+        if name not in self._arrays:
+            raise KeyError(f"Falta la columna {name!r} para calcular los indicadores")
+        return self._arrays[name]
+
+    def get(self, name):
+        """Valor de un indicador (ver INDICATORS), calculado una sola vez."""
+        if name not in self._cache:
+            fn, warmup = INDICATORS[name]
+            values = fn(self)
+            # Filas sin historia suficiente dentro de su activo (las funciones
+            # devuelven arrays propios, nunca un intermedio memorizado)
+            if warmup:
+                values = self.mask_warmup(values, warmup)
+            self._cache[name] = values
+        return self._cache[name]
+
+    # --- Bloques compartidos ---
+    def mask_warmup(self, values, k):
+        """NaN (en el sitio) en las k primeras filas de cada activo."""
+        for start in self.starts:
+            values[start:start + k] = np.nan
+        return values
+
+    def shift(self, x, k):
+        out = np.full(self.n, np.nan)
+        out[k:] = x[:self.n - k]
+        return self.mask_warmup(out, k)
+
+    def moments(self, name, x_name, window):
+        key = ('moments', name, window)
+        if key not in self._cache:
+            x = self.get(x_name) if x_name in INDICATORS else self.col(x_name)
+            mean, std = rolling_moments(x, window)
+            self._cache[key] = (self.mask_warmup(mean, window - 1), self.mask_warmup(std, window - 1))
+        return self._cache[key]
+
+    def bands(self, window):
+        """Bandas de Bollinger (superior, inferior) a 2 desviaciones."""
+        key = ('bands', window)
+        if key not in self._cache:
+            ma, std = self.moments('close', 'Close', window)
+            self._cache[key] = (ma + std * 2, ma - std * 2)
+        return self._cache[key]
+
+    def ema(self, name, x, span):
+        key = ('ema', name, span)
+        if key not in self._cache:
+            self._cache[key] = ema(x, span, self.starts)
+        return self._cache[key]
+
+
+# --- Indicadores ---
+def _returns(k):
+    def fn(f):
+        c = f.col('Close')
+        return _div(c, f.shift(c, k)) - 1
+    return fn, k
+
+
+def _delta(f):
+    c = f.col('Close')
+    return c - f.shift(c, 1)
+
+
+def _ma(window):
+    return lambda f: f.moments('close', 'Close', window)[0].copy(), window - 1
+
+
+def _dist_ma(window):
+    def fn(f):
+        ma = f.moments('close', 'Close', window)[0]
+        return _div(f.col('Close') - ma, ma)
+    return fn, window - 1
+
+
+def _rsi(window):
+    def fn(f):
+        delta = f.get('Delta')
+        # El primer delta de cada activo (NaN) cuenta como 0, igual que delta.where(...)
+        gain = np.where(delta > 0, delta, 0.0)
+        loss = np.where(delta < 0, -delta, 0.0)
+        rs = _div(rolling_mean(gain, window), rolling_mean(loss, window))
+        return 100 - _div(100, 1 + rs)
+    return fn, window - 1
+
+
+def _bollinger(window, part):
+    def fn(f):
+        upper, lower = f.bands(window)
+        if part == 'upper':
+            return upper.copy()
+        if part == 'lower':
+            return lower.copy()
+        width = upper - lower
+        width[width == 0] = BB_MIN_WIDTH
+        return _div(f.col('Close') - lower, width)
+    return fn, window - 1
+
+
+def _ema_warmup(*spans):
+    return EMA_WARMUP_SPANS * sum(spans)
+
+
+def _dist_ema(span):
+    def fn(f):
+        c = f.col('Close')
+        return _div(c, f.ema('close', c, span)) - 1
+    return fn, _ema_warmup(span)
+
+
+def _macd(f):
+    c = f.col('Close')
+    return f.ema('close', c, 12) - f.ema('close', c, 26)
+
+
+def _macd_rel(f):
+    return _div(f.get('MACD'), f.col('Close'))
+
+
+def _macd_hist_rel(f):
+    c = f.col('Close')
+    # Sobre el MACD sin enmascarar: la señal arranca con el activo, como las EMAs
+    macd = f.ema('close', c, 12) - f.ema('close', c, 26)
+    return _div(macd - f.ema('macd', macd, 9), c)
+
+
+def _volatility(window):
+    def fn(f):
+        return f.moments('returns', 'Returns_1m', window)[1].copy()
+    return fn, window
+
+
+def _atr_rel(window):
+    def fn(f):
+        h, low, c = f.col('High'), f.col('Low'), f.col('Close')
+        prev = f.shift(c, 1)
+        tr = np.fmax(h - low, np.fmax(np.abs(h - prev), np.abs(low - prev)))
+        return _div(rolling_mean(tr, window), c)
+    return fn, window - 1
+
+
+def _stoch_k(window):
+    def fn(f):
+        high = rolling_extreme(f.col('High'), window, np.maximum)
+        low = rolling_extreme(f.col('Low'), window, np.minimum)
+        # Rango 0 (vela plana): se toma el punto medio
+        return _safe_div(100 * (f.col('Close') - low), high - low, fill=50.0)
+    return fn, window - 1
+
+
+def _stoch_d(window, smooth=3):
+    def fn(f):
+        return rolling_mean(f.get(f'Stoch_K_{window}'), smooth)
+    return fn, window - 1 + smooth - 1
+
+
+def _obv_flow(window):
+    # Variación del OBV en la ventana / volumen de la ventana: -1 (todo vendedor) .. 1 (todo comprador)
+    def fn(f):
+        v = np.nan_to_num(f.col('Volume'))
+        signed = np.sign(np.nan_to_num(f.get('Delta'))) * v
+        flow = rolling_mean(signed, window)
+        volume = rolling_mean(v, window)
+        return np.where(np.isnan(flow), np.nan, _safe_div(flow, volume))
+    return fn, window
+
+
+def _dist_vwap(window):
+    def fn(f):
+        h, low, c = f.col('High'), f.col('Low'), f.col('Close')
+        v = np.nan_to_num(f.col('Volume'))
+        pv = rolling_mean((h + low + c) / 3 * v, window)
+        volume = rolling_mean(v, window)
+        vwap = _safe_div(pv, volume, fill=np.nan)
+        dist = np.where(np.isnan(vwap), 0.0, _div(c, vwap) - 1)
+        return np.where(np.isnan(pv), np.nan, dist)
+    return fn, window - 1
+
+
+# nombre -> (función(IndicatorFrame) -> array, filas de calentamiento por activo)
+INDICATORS = {
+    'Delta': (_delta, 1),
+    'Returns_1m': _returns(1),
+    'Returns_2m': _returns(2),
+    'Returns_5': _returns(5),
+    'Returns_15': _returns(15),
+    'Returns_60': _returns(60),
+    'MA_20': _ma(20),
+    'Dist_MA_20': _dist_ma(20),
+    'RSI_14': _rsi(14),
+    'BB_Upper': _bollinger(20, 'upper'),
+    'BB_Lower': _bollinger(20, 'lower'),
+    'BB_Position': _bollinger(20, 'position'),
+    'Dist_EMA_12': _dist_ema(12),
+    'Dist_EMA_26': _dist_ema(26),
+    'MACD': (_macd, _ema_warmup(26)),
+    'MACD_Rel': (_macd_rel, _ema_warmup(26)),
+    'MACD_Hist_Rel': (_macd_hist_rel, _ema_warmup(26, 9)),
+    'Volatility_15': _volatility(15),
+    'Volatility_60': _volatility(60),
+    'ATR_Rel_14': _atr_rel(14),
+    'Stoch_K_14': _stoch_k(14),
+    'Stoch_D_14': _stoch_d(14),
+    'OBV_Flow_20': _obv_flow(20),
+    'Dist_VWAP_20': _dist_vwap(20),
+}
+
+
+def warmup_bars(columns):
+    """Velas de historia necesarias para que la última fila tenga todas las `columns`."""
+    return max((INDICATORS[c][1] for c in columns), default=0) + 1
+
+
+def compute(df, columns, group_col=None):
+    """Dict columna -> array float64 (mismo orden de filas que `df`); ±inf se reemplaza por 0."""
+    unknown = [c for c in columns if c not in INDICATORS]
+    if unknown:
+        raise ValueError(f"Indicadores desconocidos: {', '.join(unknown)}")
+    frame = IndicatorFrame(df, group_col)
+    out = {}
+    for name in columns:
+        values = frame.get(name)
+        inf = np.isinf(values)
+        out[name] = np.where(inf, 0.0, values) if inf.any() else values
+    return out
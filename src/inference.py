@@ -0,0 +1,169 @@
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from features import calculate_features, WARMUP_BARS
+from indicators import warmup_bars
+from ingestion import SYMBOLS, INTERVAL_DELTAS
+from model_registry import load_artifact, load_metadata, load_legacy
+from forest_predictor import get_predictor
+from metrics import observe
+
+
+def load_model_pack(ticker="BTC-USD"):
+    # Última versión del registro; si no hay, el .pkl antiguo
+    pack = load_artifact(ticker)
+    return pack if pack is not None else load_legacy(ticker)
+
+
+def model_version(pack):
+    """Versión del modelo tal como se guarda en predictions.model_version ('' para el .pkl antiguo)."""
+    version = pack.get('version')
+    return str(version) if version is not None else ''
+
+
+def pack_warmup_bars(pack):
+    """Velas necesarias para calcular las features del modelo en la última vela."""
+    return max(WARMUP_BARS, warmup_bars(pack['features']))
+
+
+def load_model_metadata(ticker="BTC-USD"):
+    """Features, intervalo, métricas e importancias sin deserializar el bosque."""
+    meta = load_metadata(ticker)
+    if meta is not None:
+        return meta
+    pack = load_legacy(ticker)
+    if pack is not None:
+        pack.pop('model', None)
+    return pack
+
+
+def drop_open_bar(df, interval, now=None):
+    """Quita la última vela si todavía está en curso (su cierre es posterior a `now`)."""
+    if df.empty:
+        return df
+    now = now or pd.Timestamp.now(tz='UTC')
+    step = INTERVAL_DELTAS.get(interval, pd.Timedelta(minutes=1))
+    if df.index[-1] + step > now:
+        return df.iloc[:-1]
+    return df
+
+
+def to_db_timestamp(ts):
+    """Timestamp UTC con zona -> datetime naive en UTC (columnas TIMESTAMP de Postgres)."""
+    ts = pd.Timestamp(ts)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert('UTC').tz_localize(None)
+    return ts.to_pydatetime()
+
+
+def predict_all(tickers=None, store=None, model_packs=None, save=True, closed_only=True,
+                now=None, max_workers=None):
+    """
+    Inferencia batch para todos los activos en una sola pasada:
+
+    1. fetch:    velas de cada (ticker, intervalo del modelo) en paralelo (hilos).
+    2. features: un único DataFrame apilado con las últimas velas de cada activo
+                 (las que pida su conjunto de features, pack_warmup_bars) y
+                 calculate_features(..., group_col='Symbol').
+    3. predict:  una pasada por el bosque compilado de cada modelo (forest_predictor).
+    4. persist:  todas las predicciones en un único INSERT batch.
+
+    Devuelve (DataFrame de predicciones, dict de tiempos por etapa en segundos).
+    """
+    from candle_store import CandleStore
+    tickers = list(tickers or SYMBOLS)
+    store = store or CandleStore()
+    timings = {}
+
+    t0 = time.perf_counter()
+    if model_packs is None:
+        model_packs = {t: load_model_pack(t) for t in tickers}
+    model_packs = {t: p for t, p in model_packs.items() if p is not None and t in tickers}
+    timings['load_models'] = time.perf_counter() - t0
+    if not model_packs:
+        return pd.DataFrame(), timings
+
+    # 1. Fetch concurrente (I/O: red + disco)
+    t0 = time.perf_counter()
+
+    def fetch(ticker):
+        interval = model_packs[ticker].get('interval', '1m')
+        try:
+            df = store.get(ticker, interval)
+        except Exception as e:
+            # Un activo caído no tumba el batch completo
+            print(f"Error descargando {ticker}: {e}")
+            return ticker, pd.DataFrame()
+        if closed_only:
+            df = drop_open_bar(df, interval, now=now)
+        return ticker, df.tail(pack_warmup_bars(model_packs[ticker]))
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(model_packs)) as pool:
+        frames = [(t, df) for t, df in pool.map(fetch, model_packs) if not df.empty]
+    timings['fetch'] = time.perf_counter() - t0
+    if not frames:
+        return pd.DataFrame(), timings
+
+    # 2. Features sobre un único frame apilado
+    t0 = time.perf_counter()
+    stacked = pd.concat([df.assign(Symbol=t) for t, df in frames])
+    features = list(dict.fromkeys(f for t, _ in frames for f in model_packs[t]['features']))
+    stacked = calculate_features(stacked, group_col='Symbol', features=features)
+    last_rows = stacked.groupby('Symbol', sort=False).tail(1)
+    timings['features'] = time.perf_counter() - t0
+
+    # 3. Bosque compilado por modelo (clase y probabilidad en una sola pasada)
+    t0 = time.perf_counter()
+    results = []
+    for bar_time, row in last_rows.iterrows():
+        ticker = row['Symbol']
+        pack = model_packs[ticker]
+        x = row[pack['features']].to_numpy(dtype=np.float64)[None, :]
+        x = np.nan_to_num(x, nan=0.0, posinf=0.0, neginf=0.0)
+        classes, confidence, _ = get_predictor(pack).predict(x)
+        results.append({
+            'symbol': ticker,
+            'bar_time': bar_time,
+            'bar_interval': pack.get('interval', '1m'),
+            'model_version': model_version(pack),
+            'entry_price': float(row['Close']),
+            'prediction': int(classes[0]),
+            'confidence': float(confidence[0] * 100),
+        })
+    predictions = pd.DataFrame(results)
+    timings['predict'] = time.perf_counter() - t0
+
+    # 4. Persistencia en un único INSERT
+    t0 = time.perf_counter()
+    if save and results:
+        from database import save_predictions
+        save_predictions([{**r, 'bar_time': to_db_timestamp(r['bar_time'])} for r in results], per_bar=True)
+    timings['persist'] = time.perf_counter() - t0
+    timings['total'] = sum(timings.values())
+    for stage, seconds in timings.items():
+        observe('inference_stage_seconds', seconds, stage=stage)
+    return predictions, timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inferencia batch para todos los activos")
+    parser.add_argument("--symbols", nargs="*", default=SYMBOLS)
+    parser.add_argument("--no-save", action="store_true", help="No escribir en PostgreSQL")
+    parser.add_argument("--replay", action="store_true",
+                        help="Usar los CSV de data/ (CsvReplayProvider) en lugar de Yahoo Finance")
+    args = parser.parse_args()
+
+    store = None
+    if args.replay:
+        import tempfile
+        from candle_store import CandleStore
+        from ingestion import CsvReplayProvider
+        store = CandleStore(root=tempfile.mkdtemp(prefix='replay_candles_'), provider=CsvReplayProvider())
+
+    preds, timings = predict_all(args.symbols, store=store, save=not args.no_save)
+    print(preds.to_string(index=False) if not preds.empty else "Sin predicciones (¿modelos entrenados?)")
+    print("\nTiempos por etapa:")
+    for stage, seconds in timings.items():
+        print(f"  {stage:<12}{seconds * 1000:>10.1f} ms")
@@ -1,6 +1,495 @@
 import yfinance as yf
 import pandas as pd
+import numpy as np
 import os
+import asyncio
+from collections import namedtuple
+from metrics import timer, inc
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# Activos soportados (selector de la app e inferencia batch)
+SYMBOLS = ["BTC-USD", "ETH-USD", "SOL-USD", "BNB-USD", "ADA-USD", "XRP-USD"]
+
+# Duración de cada vela (para calcular solapes y fronteras de vela)
+INTERVAL_DELTAS = {
+    '1m': pd.Timedelta(minutes=1),
+    '2m': pd.Timedelta(minutes=2),
+    '5m': pd.Timedelta(minutes=5),
+    '15m': pd.Timedelta(minutes=15),
+    '30m': pd.Timedelta(minutes=30),
+    '60m': pd.Timedelta(hours=1),
+    '90m': pd.Timedelta(minutes=90),
+    '1h': pd.Timedelta(hours=1),
+    '1d': pd.Timedelta(days=1),
+}
+
+# Historia máxima que Yahoo Finance sirve por intervalo (usada en la primera descarga)
+DEFAULT_PERIODS = {
+    '1m': '7d',
+    '2m': '60d',
+    '5m': '60d',
+    '15m': '60d',
+    '30m': '60d',
+    '60m': '730d',
+    '90m': '60d',
+    '1h': '730d',
+    '1d': 'max',
+}
+
+
+def period_to_timedelta(period):
+    """'60d', '6mo', '2y' -> Timedelta. 'max' -> None (toda la historia)."""
+    if period == 'max':
+        return None
+    if period.endswith('mo'):
+        return pd.Timedelta(days=30 * int(period[:-2]))
+    if period.endswith('y'):
+        return pd.Timedelta(days=365 * int(period[:-1]))
+    if period.endswith('d'):
+        return pd.Timedelta(days=int(period[:-1]))
+    raise ValueError(f"Periodo no soportado: {period}")
+
+
+def normalize_ohlcv(df):
+    """
+    Deja un DataFrame de velas en formato canónico: precios en float64, volumen en int64,
+    índice DatetimeIndex en UTC llamado 'Datetime', ordenado y sin duplicados.
+    """
+    df = df.copy()
+    # yfinance a veces trae MultiIndex (Price, Ticker)
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+    df = df[[c for c in OHLCV_COLUMNS if c in df.columns]]
+    for col in df.columns:
+        df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+    # Volumen entero (int64) cuando no hay huecos
+    if 'Volume' in df.columns and df['Volume'].notna().all():
+        df['Volume'] = df['Volume'].astype('int64')
+    df.index = pd.to_datetime(df.index, utc=True)
+    df.index.name = 'Datetime'
+    df = df[~df.index.duplicated(keep='last')].sort_index()
+    return df
+
+
+# --- PROVEEDORES DE DATOS (intercambiables) ---
+class YahooFinanceProvider:
+    """Proveedor por defecto: Yahoo Finance vía yfinance."""
+
+    def fetch(self, ticker, interval, start=None, end=None, period=None):
+        with timer('ingestion_fetch_seconds', provider='yahoo', symbol=ticker, interval=interval):
+            if start is not None:
+                data = yf.download(tickers=ticker, start=start, end=end, interval=interval, progress=False)
+            else:
+                data = yf.download(tickers=ticker, period=period or DEFAULT_PERIODS.get(interval, '60d'),
+                                   interval=interval, progress=False)
+        if data is None or data.empty:
+            return pd.DataFrame(columns=OHLCV_COLUMNS)
+        inc('ingestion_rows_total', len(data), provider='yahoo', symbol=ticker)
+        return normalize_ohlcv(data)
+
+
+class CsvReplayProvider:
+    """
+    Proveedor offline que reproduce los CSV de `data/` (raw_<ticker>_data.csv).
+    Tiene un reloj simulado (`now`): sólo devuelve velas hasta ese instante, así
+    se puede probar la descarga incremental avanzando el reloj con `advance()`.
+    """
+
+    def __init__(self, data_dir=None, now=None):
+        if data_dir is None:
+            current_dir = os.path.dirname(os.path.abspath(__file__))
+            data_dir = os.path.join(os.path.dirname(current_dir), 'data')
+        self.data_dir = data_dir
+        self.now = None
+        if now is not None:
+            self.advance(now)
+        self.calls = []
+        self._frames = {}
+
+    def _load(self, ticker):
+        if ticker not in self._frames:
+            safe_ticker = ticker.replace("-", "_")
+            path = os.path.join(self.data_dir, f'raw_{safe_ticker}_data.csv')
+            if not os.path.exists(path):
+                # Sin CSV para este activo: se comporta como "sin datos" de Yahoo
+                self._frames[ticker] = normalize_ohlcv(pd.DataFrame(columns=OHLCV_COLUMNS))
+            else:
+                self._frames[ticker] = normalize_ohlcv(read_yfinance_csv(path))
+        return self._frames[ticker]
+
+    def advance(self, to):
+        self.now = to_utc(to)
+
+    def fetch(self, ticker, interval, start=None, end=None, period=None):
+        self.calls.append({'ticker': ticker, 'interval': interval, 'start': start, 'end': end, 'period': period})
+        df = self._load(ticker)
+        if df.empty:
+            return df.copy()
+        now = self.now if self.now is not None else df.index[-1]
+        df = df.loc[df.index <= now]
+        if start is not None:
+            df = df.loc[df.index >= to_utc(start)]
+        elif period is not None and period_to_timedelta(period) is not None:
+            df = df.loc[df.index >= now - period_to_timedelta(period)]
+        if end is not None:
+            df = df.loc[df.index < to_utc(end)]
+        return df.copy()
+
+
+def read_yfinance_csv(path):
+    """Lee un CSV guardado por yfinance (3 filas de cabecera: Price / Ticker / Datetime)."""
+    df = pd.read_csv(path, header=0)
+    df = df.iloc[2:]
+    df.rename(columns={'Price': 'Datetime'}, inplace=True)
+    df.set_index('Datetime', inplace=True)
+    return df
+
+
+# --- STREAMING (ticks en vivo -> velas OHLCV) ---
+# Un feed es cualquier objeto con `ticks(symbols)`: un generador asíncrono de Tick.
+# `realtime` indica si el tiempo de los ticks es el reloj de pared (las velas se
+# cierran también por reloj aunque no lleguen más ticks) o un reloj simulado.
+Tick = namedtuple('Tick', ['symbol', 'time', 'price', 'volume'])
+Bar = namedtuple('Bar', ['symbol', 'interval', 'time', 'open', 'high', 'low', 'close', 'volume'])
+
+# Segundos tras la frontera de vela antes de cerrarla por reloj (ticks con retraso de red)
+STREAM_GRACE = float(os.getenv("STREAM_GRACE", "2"))
+# Cada cuánto se guarda la vela en curso en el almacén (precio actual del dashboard); 0 = nunca
+STREAM_SNAPSHOT_SECONDS = float(os.getenv("STREAM_SNAPSHOT_SECONDS", "10"))
+# Feeds con reloj simulado (replay acelerado): velas cerradas que se acumulan, como
+# mucho estos segundos reales, antes de escribirlas juntas en el almacén
+STREAM_PERSIST_SECONDS = 1.0
+
+
+def bars_to_frame(bars):
+    """Lista de Bar (de un mismo activo e intervalo) -> DataFrame OHLCV canónico."""
+    df = pd.DataFrame({
+        'Open': [b.open for b in bars], 'High': [b.high for b in bars], 'Low': [b.low for b in bars],
+        'Close': [b.close for b in bars], 'Volume': [b.volume for b in bars],
+    }, index=pd.DatetimeIndex([b.time for b in bars]))
+    return normalize_ohlcv(df)
+
+
+class BarAggregator:
+    """
+    Agrega ticks en velas OHLCV de un intervalo, en memoria. Una vela se cierra
+    cuando llega un tick de la vela siguiente o, en feeds en vivo, cuando el reloj
+    pasa su frontera (`close_due`). Intervalos sin ningún tick no generan vela.
+    """
+
+    def __init__(self, interval):
+        if interval not in INTERVAL_DELTAS:
+            raise ValueError(f"Intervalo no soportado: {interval}")
+        self.interval = interval
+        self.step = INTERVAL_DELTAS[interval]
+        self._open = {}     # symbol -> [inicio, open, high, low, close, volume]
+        self._closed = {}   # symbol -> inicio de la última vela cerrada
+        self.late_ticks = 0
+
+    def _bar(self, symbol, state):
+        start, o, h, l, c, v = state
+        return Bar(symbol, self.interval, start, o, h, l, c, v)
+
+    def add(self, tick):
+        """Incorpora un tick. Devuelve la lista de velas que cierra (0 o 1)."""
+        start = tick.time.floor(self.step)
+        closed = self._closed.get(tick.symbol)
+        if closed is not None and start <= closed:
+            # Tick de una vela ya publicada: no se reabre
+            self.late_ticks += 1
+            return []
+        state = self._open.get(tick.symbol)
+        if state is not None and start == state[0]:
+            state[2] = max(state[2], tick.price)
+            state[3] = min(state[3], tick.price)
+            state[4] = tick.price
+            state[5] += tick.volume
+            return []
+        done = []
+        if state is not None:
+            if start < state[0]:
+                self.late_ticks += 1
+                return []
+            done.append(self._close(tick.symbol))
+        self._open[tick.symbol] = [start, tick.price, tick.price, tick.price, tick.price, tick.volume]
+        return done
+
+    def _close(self, symbol):
+        state = self._open.pop(symbol)
+        self._closed[symbol] = state[0]
+        return self._bar(symbol, state)
+
+    def close_due(self, now):
+        """Cierra las velas cuya frontera ya pasó según el reloj `now`."""
+        return [self._close(symbol) for symbol, state in list(self._open.items())
+                if state[0] + self.step <= now]
+
+    def flush(self):
+        """Cierra todas las velas abiertas (fin del feed)."""
+        return [self._close(symbol) for symbol in list(self._open)]
+
+    def snapshot(self):
+        """Velas en curso, sin cerrarlas."""
+        return [self._bar(symbol, state) for symbol, state in self._open.items()]
+
+
+def to_utc(ts):
+    """Timestamp (o texto) en UTC: las fechas sin zona se toman como UTC."""
+    if ts is None:
+        return None
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+
+
+class CsvReplayFeed:
+    """
+    Feed offline: reproduce las velas de los CSV de `data/` como ticks, a `speed`
+    veces el tiempo real (speed=0: tan rápido como se consuman). Cada vela se
+    emite como 4 ticks (apertura, máximo/mínimo en el orden del recorrido y cierre
+    con todo el volumen), así que al re-agregarla al intervalo del CSV, o a uno
+    múltiplo, se obtiene exactamente la misma vela.
+    """
+    realtime = False
+
+    def __init__(self, data_dir=None, speed=60.0, start=None, end=None):
+        self.provider = CsvReplayProvider(data_dir)
+        self.speed = speed
+        self.start = to_utc(start)
+        self.end = to_utc(end)
+
+    def _ticks(self, symbols):
+        # Todos los ticks de todos los activos como arrays ordenados por tiempo
+        times, codes, prices, volumes = [], [], [], []
+        for code, symbol in enumerate(symbols):
+            df = self.provider._load(symbol).dropna(subset=['Open', 'High', 'Low', 'Close'])
+            if self.start is not None:
+                df = df.loc[df.index >= self.start]
+            if self.end is not None:
+                df = df.loc[df.index < self.end]
+            if len(df) < 2:
+                continue
+            t = df.index.as_unit('ns').asi8
+            step = int(np.median(np.diff(t)))
+            o, h, l, c = (df[col].to_numpy() for col in ['Open', 'High', 'Low', 'Close'])
+            up = c >= o
+            # Vela alcista: O -> L -> H -> C; bajista: O -> H -> L -> C
+            path = np.stack([o, np.where(up, l, h), np.where(up, h, l), c], axis=1)
+            vol = np.zeros((len(df), 4))
+            vol[:, 3] = df['Volume'].fillna(0).to_numpy()
+            offsets = np.arange(4) * (step // 4)
+            times.append((t[:, None] + offsets).ravel())
+            codes.append(np.full(4 * len(df), code))
+            prices.append(path.ravel())
+            volumes.append(vol.ravel())
+        if not times:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([]), np.array([])
+        times, codes = np.concatenate(times), np.concatenate(codes)
+        order = np.argsort(times, kind='stable')
+        return times[order], codes[order], np.concatenate(prices)[order], np.concatenate(volumes)[order]
+
+    async def ticks(self, symbols):
+        times, codes, prices, volumes = self._ticks(symbols)
+        tz_times = pd.to_datetime(times, unit='ns', utc=True)
+        previous = None
+        for i in range(len(times)):
+            if previous is not None and times[i] != previous:
+                # Se duerme una vez por instante simulado, no por tick
+                await asyncio.sleep((times[i] - previous) / 1e9 / self.speed if self.speed > 0 else 0)
+            previous = times[i]
+            yield Tick(symbols[codes[i]], tz_times[i], float(prices[i]), float(volumes[i]))
+
+
+class CcxtFeed:
+    """
+    Feed en vivo de trades de un exchange vía CCXT (dependencia opcional, no está
+    en requirements.txt). Con ccxt.pro usa el WebSocket (`watch_trades`); si sólo
+    está ccxt, sondea `fetch_trades` cada `poll_seconds`. 'BTC-USD' se traduce a
+    'BTC/<quote>' y el volumen va en moneda de cotización (como el de Yahoo).
+    """
+    realtime = True
+
+    def __init__(self, exchange='binance', quote='USDT', poll_seconds=1.0):
+        self.exchange_id = exchange
+        self.quote = quote
+        self.poll_seconds = poll_seconds
+
+    def market(self, symbol):
+        return f"{symbol.split('-')[0]}/{self.quote}"
+
+    def _exchange(self):
+        try:
+            import ccxt.pro as ccxt_module
+            streaming = True
+        except ImportError:
+            try:
+                import ccxt.async_support as ccxt_module
+            except ImportError:
+                raise RuntimeError("CcxtFeed necesita el paquete ccxt (pip install ccxt)") from None
+            streaming = False
+        return getattr(ccxt_module, self.exchange_id)({'enableRateLimit': True}), streaming
+
+    def _tick(self, symbol, trade):
+        price = float(trade['price'])
+        return Tick(symbol, pd.Timestamp(trade['timestamp'], unit='ms', tz='UTC'),
+                    price, price * float(trade['amount']))
+
+    async def _watch(self, exchange, symbol, queue):
+        while True:
+            for trade in await exchange.watch_trades(self.market(symbol)):
+                await queue.put(self._tick(symbol, trade))
+
+    async def _poll(self, exchange, symbol, queue):
+        since = None
+        seen = set()
+        while True:
+            trades = await exchange.fetch_trades(self.market(symbol), since=since)
+            for trade in trades:
+                if trade['id'] in seen:
+                    continue
+                seen.add(trade['id'])
+                await queue.put(self._tick(symbol, trade))
+            if trades:
+                since = trades[-1]['timestamp']
+                seen = {t['id'] for t in trades if t['timestamp'] == since}
+            await asyncio.sleep(self.poll_seconds)
+
+    async def ticks(self, symbols):
+        exchange, streaming = self._exchange()
+        queue = asyncio.Queue()
+        reader = self._watch if streaming else self._poll
+        # Una tarea por activo; los trades de todos se intercalan en la cola
+        tasks = [asyncio.create_task(reader(exchange, symbol, queue)) for symbol in symbols]
+        try:
+            while True:
+                done = [t for t in tasks if t.done()]
+                if done:
+                    done[0].result()  # propaga el error de la tarea caída
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=5)
+                except asyncio.TimeoutError:
+                    continue
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await exchange.close()
+
+
+class StreamingIngestion:
+    """
+    Ingesta en streaming: consume un feed de ticks, los agrega en velas de uno o
+    varios intervalos y publica cada vela cerrada a los consumidores suscritos
+    (`subscribe()` -> asyncio.Queue de Bar; None al terminar el feed). Con `store`
+    las velas cerradas se añaden al CandleStore y la vela en curso se guarda cada
+    `snapshot_seconds`, así el precio actual del dashboard no depende de Yahoo.
+    `last_price` tiene el último precio de cada activo.
+
+    Con feeds en vivo cada vela se guarda y se publica al cerrar. En un replay
+    acelerado se escriben por lotes (STREAM_PERSIST_SECONDS) para no reescribir
+    el Parquet por cada vela; la publicación espera a que su lote esté guardado.
+    """
+
+    def __init__(self, feed, symbols, intervals=('1m',), store=None, grace=STREAM_GRACE,
+                 snapshot_seconds=STREAM_SNAPSHOT_SECONDS):
+        self.feed = feed
+        self.symbols = list(symbols)
+        self.aggregators = [BarAggregator(interval) for interval in dict.fromkeys(intervals)]
+        self.store = store
+        self.grace = grace
+        self.snapshot_seconds = snapshot_seconds
+        self.last_price = {}
+        self._subscribers = []
+        self._pending = []
+        self._last_persist = 0.0
+
+    def subscribe(self):
+        queue = asyncio.Queue()
+        self._subscribers.append(queue)
+        return queue
+
+    def _persist(self, bars):
+        groups = {}
+        for bar in bars:
+            groups.setdefault((bar.symbol, bar.interval), []).append(bar)
+        for (symbol, interval), group in groups.items():
+            self.store.append(symbol, interval, bars_to_frame(group))
+
+    async def _publish(self, bars, final=False):
+        self._pending.extend(bars)
+        if not self._pending:
+            return
+        if self.store is not None:
+            loop = asyncio.get_running_loop()
+            batch_due = loop.time() - self._last_persist >= STREAM_PERSIST_SECONDS
+            if not (final or getattr(self.feed, 'realtime', True) or batch_due):
+                return
+            # Antes de avisar: el consumidor ya encuentra la vela en el almacén
+            await asyncio.to_thread(self._persist, self._pending)
+            self._last_persist = loop.time()
+        bars, self._pending = self._pending, []
+        for bar in bars:
+            inc('stream_bars_total', symbol=bar.symbol, interval=bar.interval)
+            for queue in self._subscribers:
+                queue.put_nowait(bar)
+
+    async def _clock(self):
+        # Feeds en vivo: cierra por reloj las velas de activos sin ticks nuevos
+        step = min(agg.step for agg in self.aggregators)
+        while True:
+            now = pd.Timestamp.now(tz='UTC')
+            await asyncio.sleep((now.floor(step) + step - now).total_seconds() + self.grace)
+            now = pd.Timestamp.now(tz='UTC') - pd.Timedelta(seconds=self.grace)
+            await self._publish([bar for agg in self.aggregators for bar in agg.close_due(now)])
+
+    async def _snapshots(self):
+        while True:
+            await asyncio.sleep(self.snapshot_seconds)
+            bars = [bar for agg in self.aggregators for bar in agg.snapshot()]
+            if bars:
+                await asyncio.to_thread(self._persist, bars)
+
+    async def run(self):
+        background = []
+        if getattr(self.feed, 'realtime', True):
+            background.append(asyncio.create_task(self._clock()))
+            if self.store is not None and self.snapshot_seconds > 0:
+                background.append(asyncio.create_task(self._snapshots()))
+        ticks = 0
+        try:
+            async for tick in self.feed.ticks(self.symbols):
+                ticks += 1
+                self.last_price[tick.symbol] = (tick.time, tick.price)
+                await self._publish([bar for agg in self.aggregators for bar in agg.add(tick)])
+            # Fin del feed (replay): las velas abiertas están completas
+            await self._publish([bar for agg in self.aggregators for bar in agg.flush()], final=True)
+        finally:
+            for task in background:
+                task.cancel()
+            inc('stream_ticks_total', ticks)
+            inc('stream_late_ticks_total', sum(agg.late_ticks for agg in self.aggregators))
+            for queue in self._subscribers:
+                queue.put_nowait(None)
+
+
+def make_feed(name, **options):
+    """'replay' -> CsvReplayFeed, 'ccxt' -> CcxtFeed (opciones del constructor de cada uno)."""
+    feeds = {'replay': CsvReplayFeed, 'ccxt': CcxtFeed}
+    if name not in feeds:
+        raise ValueError(f"Feed desconocido: {name} (opciones: {', '.join(feeds)})")
+    return feeds[name](**{k: v for k, v in options.items() if v is not None})
+
+
+async def stream_bars(feed, symbols, intervals=('1m',), store=None):
+    """Modo streaming por consola: imprime cada vela cerrada."""
+    ingestion = StreamingIngestion(feed, symbols, intervals, store=store)
+    queue = ingestion.subscribe()
+    runner = asyncio.create_task(ingestion.run())
+    while (bar := await queue.get()) is not None:
+        print(f"[{bar.time}] {bar.symbol} {bar.interval}: O={bar.open:.2f} H={bar.high:.2f} "
+              f"L={bar.low:.2f} C={bar.close:.2f} V={bar.volume:,.0f}")
+    await runner
+
 
 def fetch_crypto_data(ticker="BTC-USD", period="60d", interval="5m"):
     """
@@ -10,31 +499,59 @@ def fetch_crypto_data(ticker="BTC-USD", period="60d", interval="5m"):
     """
     print(f"Descargando datos para {ticker}...")
     data = yf.download(tickers=ticker, period=period, interval=interval)
-    
+
     if data.empty:
         print("No se obtuvieron datos. Revisa el ticker o la conexión.")
         return None
-    
+
     return data
 
-def run_ingestion(ticker="BTC-USD", period="60d", interval="5m"):
-    # Prueba rápida
-    df = fetch_crypto_data(ticker=ticker, period=period, interval=interval)
-    if df is not None:
+def run_ingestion(ticker="BTC-USD", period="60d", interval="5m", store=None):
+    # Sólo se descarga lo que falta en el almacén local de velas
+    from candle_store import CandleStore
+    from storage import save_ohlcv, training_data_path
+    store = store or CandleStore()
+    new_bars = store.update(ticker, interval, period=period)
+    print(f"{new_bars} velas nuevas para {ticker} ({interval})")
+
+    delta = period_to_timedelta(period)
+    df = store.read(ticker, interval)
+    if delta is not None and not df.empty:
+        df = df.loc[df.index >= df.index[-1] - delta]
+    if not df.empty:
         print(df.head())
         # Crear carpeta data si no existe (en root del proyecto)
         current_dir = os.path.dirname(os.path.abspath(__file__))
         project_root = os.path.dirname(current_dir)
         data_dir = os.path.join(project_root, 'data')
         os.makedirs(data_dir, exist_ok=True)
-        
-        # Guardar para inspeccionar
-        safe_ticker = ticker.replace("-", "_")
-        save_path = os.path.join(data_dir, f'raw_{safe_ticker}_data.csv')
-        df.to_csv(save_path)
+
+        # Formato columnar tipado (Parquet / Arrow IPC), listo para train_model
+        save_path = save_ohlcv(df, training_data_path(ticker, data_dir=data_dir))
         print(f"Archivo guardado en {save_path}")
         return True
+    print("No se obtuvieron datos. Revisa el ticker o la conexión.")
     return False
 
 if __name__ == "__main__":
-    run_ingestion()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Ingesta de velas (descarga histórica o streaming)")
+    parser.add_argument("--ticker", default="BTC-USD")
+    parser.add_argument("--period", default="60d")
+    parser.add_argument("--interval", default="5m")
+    parser.add_argument("--stream", choices=['replay', 'ccxt'],
+                        help="Modo streaming: feed de ticks agregado en velas en memoria")
+    parser.add_argument("--symbols", nargs="*", default=None, help="Activos del modo streaming")
+    parser.add_argument("--speed", type=float, default=None, help="Replay: aceleración (0 = sin pausas)")
+    parser.add_argument("--start", default=None, help="Replay: primera vela a reproducir")
+    parser.add_argument("--exchange", default=None, help="CCXT: exchange (binance, kraken...)")
+    parser.add_argument("--save", action="store_true", help="Streaming: guardar las velas en el almacén")
+    args = parser.parse_args()
+    if args.stream:
+        from candle_store import CandleStore
+        feed = make_feed(args.stream, speed=args.speed, start=args.start) if args.stream == 'replay' \
+            else make_feed(args.stream, exchange=args.exchange)
+        asyncio.run(stream_bars(feed, args.symbols or [args.ticker], [args.interval],
+                                store=CandleStore() if args.save else None))
+    else:
+        run_ingestion(args.ticker, period=args.period, interval=args.interval)
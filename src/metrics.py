@@ -0,0 +1,317 @@
+"""
+Instrumentación ligera: contadores e histogramas de latencia con etiquetas.
+
+    from metrics import timer, timed, inc, observe
+
+    with timer('pipeline_stage_seconds', stage='fetch', symbol='BTC-USD'):
+        ...
+    @timed('train_model_seconds')
+    def train_model(...): ...
+    inc('alerts_sent_total', chat='...')
+
+Exportación:
+    * Formato de texto de Prometheus: render_prometheus(), servido por
+      start_http_server() en METRICS_PORT (el scheduler lo arranca si se define).
+    * Archivos en METRICS_DIR (<proceso>.prom para el textfile collector de
+      node_exporter y <proceso>.json para el panel del dashboard), escritos por
+      export_files(); el dashboard lee los de todos los procesos.
+
+Con METRICS_ENABLED=0 `timed` devuelve la función sin envolver, `timer`
+devuelve un contexto vacío compartido e `inc`/`observe` vuelven sin hacer nada.
+"""
+import os
+import json
+import time
+import bisect
+import socket
+import threading
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+# Puerto del endpoint /metrics (vacío = sin servidor HTTP)
+METRICS_PORT = os.getenv("METRICS_PORT", "")
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(project_root, 'data', 'metrics'))
+# Cada cuánto se reescriben los archivos de METRICS_DIR
+METRICS_EXPORT_SECONDS = float(os.getenv("METRICS_EXPORT_SECONDS", "15"))
+
+# Límites superiores (segundos) de los buckets de los histogramas
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+PREFIX = 'cripto_'
+
+
+class _Histogram:
+    __slots__ = ('buckets', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Cuantil aproximado por interpolación lineal dentro del bucket (como histogram_quantile)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                # Acotado al máximo observado (el bucket puede ser mucho más ancho)
+                upper = min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+                lower = min(self.buckets[i - 1], upper) if i > 0 else 0.0
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.max
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}      # (nombre, etiquetas) -> valor
+        self.histograms = {}    # (nombre, etiquetas) -> _Histogram
+        self.started = time.time()
+
+    def inc(self, name, value=1, labels=()):
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=(), buckets=DEFAULT_BUCKETS):
+        key = (name, labels)
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = _Histogram(buckets)
+            hist.observe(value)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        """Dict serializable (JSON) con todos los contadores y un resumen de cada histograma."""
+        with self._lock:
+            counters = [{'name': n, 'labels': dict(l), 'value': v} for (n, l), v in self.counters.items()]
+            histograms = [{
+                'name': n, 'labels': dict(l), 'count': h.count, 'sum': h.sum, 'max': h.max,
+                'p50': h.quantile(0.5), 'p95': h.quantile(0.95), 'p99': h.quantile(0.99),
+            } for (n, l), h in self.histograms.items()]
+        return {'process': process_name(), 'pid': os.getpid(), 'started': self.started,
+                'updated': time.time(), 'counters': counters, 'histograms': histograms}
+
+    def render_prometheus(self):
+        """Formato de texto de exposición de Prometheus (0.0.4)."""
+        lines = []
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda kv: kv[0])
+            typed = set()
+            for (name, labels), value in counters:
+                full = PREFIX + name
+                if full not in typed:
+                    lines.append(f"# TYPE {full} counter")
+                    typed.add(full)
+                lines.append(f"{full}{_fmt_labels(labels)} {value}")
+            for (name, labels), hist in histograms:
+                full = PREFIX + name
+                if full not in typed:
+                    lines.append(f"# TYPE {full} histogram")
+                    typed.add(full)
+                cumulative = 0
+                for bound, n in zip(list(hist.buckets) + ['+Inf'], hist.counts):
+                    cumulative += n
+                    le = bound if bound == '+Inf' else repr(float(bound))
+                    lines.append(f"{full}_bucket{_fmt_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{full}_sum{_fmt_labels(labels)} {hist.sum}")
+                lines.append(f"{full}_count{_fmt_labels(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _fmt_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+REGISTRY = Registry()
+_process_name = None
+
+
+def process_name():
+    """Nombre del proceso en los archivos exportados (set_process_name o host-pid)."""
+    return _process_name or f"{socket.gethostname()}-{os.getpid()}"
+
+
+def set_process_name(name):
+    global _process_name
+    _process_name = name
+
+
+def peak_rss_mb():
+    """Pico de memoria residente del proceso en MB (None si no se puede medir)."""
+    # VmHWM (Linux): ru_maxrss se hereda a través de exec, así que en un proceso
+    # hijo incluiría el pico del padre
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    # ru_maxrss: KB en Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+# --- API de instrumentación ---
+class _Timer:
+    __slots__ = ('name', 'labels', 'start')
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        elapsed = time.perf_counter() - self.start
+        REGISTRY.observe(self.name, elapsed, self.labels)
+        if exc_type is not None:
+            REGISTRY.inc(self.name.replace('_seconds', '') + '_errors_total', 1, self.labels)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(name, **labels):
+    """Contexto que registra la duración del bloque en el histograma `name` (y errores si lanza)."""
+    if not METRICS_ENABLED:
+        return _NULL_TIMER
+    return _Timer(name, _labels(labels))
+
+
+def timed(name, **labels):
+    """Decorador: timer() alrededor de cada llamada. Deshabilitado, devuelve la función tal cual."""
+    def decorator(fn):
+        if not METRICS_ENABLED:
+            return fn
+        key = _labels(labels)
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Timer(name, key):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def inc(name, value=1, **labels):
+    if METRICS_ENABLED:
+        REGISTRY.inc(name, value, _labels(labels))
+
+
+def observe(name, value, **labels):
+    if METRICS_ENABLED:
+        REGISTRY.observe(name, value, _labels(labels))
+
+
+# --- Exportación ---
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = REGISTRY.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_http_server(port=None, addr='0.0.0.0'):
+    """Sirve /metrics en un hilo daemon. Devuelve el servidor (o None si no hay puerto)."""
+    port = port if port is not None else METRICS_PORT
+    if not METRICS_ENABLED or port in (None, ''):
+        return None
+    server = ThreadingHTTPServer((addr, int(port)), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
+
+
+def _write_atomic(path, text):
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(path + '.tmp', path)
+
+
+def export_files(metrics_dir=None):
+    """Escribe <proceso>.prom y <proceso>.json en METRICS_DIR."""
+    if not METRICS_ENABLED:
+        return None
+    metrics_dir = metrics_dir or METRICS_DIR
+    os.makedirs(metrics_dir, exist_ok=True)
+    base = os.path.join(metrics_dir, process_name())
+    _write_atomic(base + '.prom', REGISTRY.render_prometheus())
+    _write_atomic(base + '.json', json.dumps(REGISTRY.snapshot()))
+    return base
+
+
+def read_exported(metrics_dir=None, max_age=None):
+    """Snapshots JSON de todos los procesos (los más viejos que `max_age` segundos se ignoran)."""
+    metrics_dir = metrics_dir or METRICS_DIR
+    if not os.path.isdir(metrics_dir):
+        return []
+    snapshots = []
+    for name in sorted(os.listdir(metrics_dir)):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(metrics_dir, name), encoding='utf-8') as f:
+                snap = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if max_age is None or time.time() - snap.get('updated', 0) <= max_age:
+            snapshots.append(snap)
+    return snapshots
@@ -0,0 +1,321 @@
+"""
+Formato de artefactos de modelo versionado + registro.
+
+Estructura en models/:
+
+    models/
+        registry.json                 índice: versiones y última versión por ticker
+        BTC_USD/
+            v1/meta.json              features, intervalo, métricas, params, importancias...
+            v1/model.joblib           sólo el estimador (sin comprimir: admite memory map)
+            v2/...
+
+La metadata se lee sin deserializar el bosque (el dashboard no necesita más),
+y el estimador se carga aparte (opcionalmente con mmap_mode='r'). Cada meta.json lleva
+`schema_version`: un artefacto de un formato más nuevo que el que entiende este
+código se rechaza en lugar de fallar a medias.
+
+Los .pkl antiguos (crypto_model_<ticker>.pkl) se siguen leyendo como respaldo y
+se pueden migrar con `python src/model_registry.py migrate`.
+
+Uso:
+    python src/model_registry.py list
+    python src/model_registry.py migrate          # .pkl antiguos -> v1
+    python src/model_registry.py rebuild          # regenera registry.json escaneando models/
+    python src/model_registry.py prune --keep 3
+"""
+import os
+import re
+import json
+import shutil
+import argparse
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin lock entre procesos
+    fcntl = None
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+MODELS_DIR = os.getenv("MODELS_DIR", os.path.join(project_root, 'models'))
+
+# Versión del formato de meta.json / model.joblib
+ARTIFACT_SCHEMA_VERSION = 1
+META_FILE = 'meta.json'
+MODEL_FILE = 'model.joblib'
+REGISTRY_FILE = 'registry.json'
+# 0 = sin comprimir (carga con memory map); 1-9 = zlib (menos disco, carga más lenta)
+MODEL_COMPRESS = int(os.getenv("MODEL_COMPRESS", "0"))
+# Memory map al cargar: sklearn copia los nodos de cada árbol al deserializar, así que
+# sólo compensa con bosques grandes (ver benchmarks/bench_model_load.py)
+MODEL_MMAP = os.getenv("MODEL_MMAP", "0") == "1"
+# Versiones que conserva `prune` por ticker
+DEFAULT_KEEP = 5
+
+_VERSION_RE = re.compile(r'^v(\d+)$')
+
+
+def _safe(ticker):
+    return ticker.replace("-", "_")
+
+
+def ticker_dir(ticker, models_dir=None):
+    return os.path.join(models_dir or MODELS_DIR, _safe(ticker))
+
+
+def version_dir(ticker, version, models_dir=None):
+    return os.path.join(ticker_dir(ticker, models_dir), f'v{version}')
+
+
+def legacy_path(ticker, models_dir=None):
+    return os.path.join(models_dir or MODELS_DIR, f'crypto_model_{_safe(ticker)}.pkl')
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.isoformat()
+    raise TypeError(f"No serializable: {type(value)}")
+
+
+def _write_json(path, data):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, default=_json_default)
+    os.replace(tmp, path)
+
+
+def list_versions(ticker, models_dir=None):
+    """Versiones en disco (ordenadas), escaneando el directorio del ticker."""
+    root = ticker_dir(ticker, models_dir)
+    if not os.path.isdir(root):
+        return []
+    versions = []
+    for name in os.listdir(root):
+        match = _VERSION_RE.match(name)
+        if match and os.path.exists(os.path.join(root, name, META_FILE)):
+            versions.append(int(match.group(1)))
+    return sorted(versions)
+
+
+# --- REGISTRO ---
+class _RegistryLock:
+    """Lock de archivo alrededor de leer-modificar-escribir registry.json (varios entrenamientos a la vez)."""
+
+    def __init__(self, models_dir=None):
+        self.path = os.path.join(models_dir or MODELS_DIR, REGISTRY_FILE + '.lock')
+        self.handle = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.handle = open(self.path, 'a')
+        if fcntl is not None:
+            fcntl.flock(self.handle, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self.handle, fcntl.LOCK_UN)
+        self.handle.close()
+
+
+def load_registry(models_dir=None):
+    path = os.path.join(models_dir or MODELS_DIR, REGISTRY_FILE)
+    if not os.path.exists(path):
+        return {'schema_version': ARTIFACT_SCHEMA_VERSION, 'models': {}}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _registry_entry(meta):
+    return {
+        'version': meta['version'],
+        'created_at': meta['created_at'],
+        'interval': meta['interval'],
+        'accuracy': (meta.get('metrics') or {}).get('accuracy'),
+        'path': os.path.join(_safe(meta['ticker']), f"v{meta['version']}"),
+    }
+
+
+def _register(meta, models_dir=None):
+    # Llamar con _RegistryLock tomado
+    registry = load_registry(models_dir)
+    entry = registry['models'].setdefault(meta['ticker'], {'latest': None, 'versions': []})
+    entry['versions'] = [v for v in entry['versions'] if v['version'] != meta['version']]
+    entry['versions'].append(_registry_entry(meta))
+    entry['versions'].sort(key=lambda v: v['version'])
+    entry['latest'] = entry['versions'][-1]['version']
+    _write_json(os.path.join(models_dir or MODELS_DIR, REGISTRY_FILE), registry)
+
+
+def rebuild_registry(models_dir=None):
+    """Reconstruye registry.json desde los meta.json en disco."""
+    root = models_dir or MODELS_DIR
+    registry = {'schema_version': ARTIFACT_SCHEMA_VERSION, 'models': {}}
+    for name in sorted(os.listdir(root)) if os.path.isdir(root) else []:
+        if not os.path.isdir(os.path.join(root, name)):
+            continue
+        for version in list_versions(name, models_dir):
+            meta = load_metadata(name, version, models_dir)
+            entry = registry['models'].setdefault(meta['ticker'], {'latest': None, 'versions': []})
+            entry['versions'].append(_registry_entry(meta))
+            entry['latest'] = version
+    with _RegistryLock(models_dir):
+        _write_json(os.path.join(root, REGISTRY_FILE), registry)
+    return registry
+
+
+def latest_version(ticker, models_dir=None):
+    """Última versión registrada (lectura barata de registry.json; si falta, se escanea el disco)."""
+    entry = load_registry(models_dir)['models'].get(ticker)
+    if entry and entry.get('latest') is not None:
+        return entry['latest']
+    versions = list_versions(ticker, models_dir)
+    return versions[-1] if versions else None
+
+
+# --- ARTEFACTOS ---
+def save_artifact(pack, models_dir=None, compress=MODEL_COMPRESS):
+    """
+    Guarda un pack (mismo dict que producía train_model) como nueva versión.
+    Devuelve (versión, directorio).
+    """
+    ticker = pack['ticker']
+    os.makedirs(ticker_dir(ticker, models_dir), exist_ok=True)
+    with _RegistryLock(models_dir):
+        existing = list_versions(ticker, models_dir)
+        version = (existing[-1] if existing else 0) + 1
+        final_dir = version_dir(ticker, version, models_dir)
+        tmp_dir = final_dir + '.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        joblib.dump(pack['model'], os.path.join(tmp_dir, MODEL_FILE), compress=compress)
+        importance = pack.get('feature_importance')
+        meta = {
+            'schema_version': ARTIFACT_SCHEMA_VERSION,
+            'ticker': ticker,
+            'version': version,
+            'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'interval': pack.get('interval', '1m'),
+            'features': list(pack['features']),
+            'classes': [int(c) for c in getattr(pack['model'], 'classes_', [])],
+            'model_class': type(pack['model']).__name__,
+            'metrics': pack.get('metrics'),
+            'params': pack.get('params'),
+            'tuning': pack.get('tuning'),
+            'feature_importance': importance.to_dict('records') if importance is not None else None,
+            'compress': compress,
+            'model_bytes': os.path.getsize(os.path.join(tmp_dir, MODEL_FILE)),
+        }
+        for key, value in pack.items():
+            # Claves extra (p.ej. de futuras versiones de train_model) también a la metadata
+            if key not in meta and key not in ('model', 'feature_importance'):
+                meta[key] = value
+        _write_json(os.path.join(tmp_dir, META_FILE), meta)
+        # El directorio aparece completo o no aparece
+        os.replace(tmp_dir, final_dir)
+        _register(meta, models_dir)
+    return version, final_dir
+
+
+def _check_schema(meta, where):
+    schema = meta.get('schema_version')
+    if not isinstance(schema, int) or schema > ARTIFACT_SCHEMA_VERSION:
+        raise ValueError(f"{where}: schema_version {schema!r} no soportado (máx. {ARTIFACT_SCHEMA_VERSION})")
+    for key in ('ticker', 'features', 'interval'):
+        if key not in meta:
+            raise ValueError(f"{where}: falta '{key}' en {META_FILE}")
+
+
+def load_metadata(ticker, version=None, models_dir=None):
+    """
+    Metadata de un modelo (sin cargar el bosque). Formato compatible con el pack:
+    feature_importance vuelve como DataFrame. None si no hay modelo.
+    """
+    version = version or latest_version(ticker, models_dir)
+    if version is None:
+        return None
+    path = os.path.join(version_dir(ticker, version, models_dir), META_FILE)
+    with open(path, encoding='utf-8') as f:
+        meta = json.load(f)
+    _check_schema(meta, path)
+    if meta.get('feature_importance') is not None:
+        meta['feature_importance'] = pd.DataFrame(meta['feature_importance'])
+    return meta
+
+
+def load_artifact(ticker, version=None, models_dir=None, mmap=MODEL_MMAP):
+    """Pack completo (metadata + 'model'), con el mismo formato que el .pkl antiguo."""
+    meta = load_metadata(ticker, version, models_dir)
+    if meta is None:
+        return None
+    path = os.path.join(version_dir(ticker, meta['version'], models_dir), MODEL_FILE)
+    # mmap sólo aplica a archivos sin comprimir
+    meta['model'] = joblib.load(path, mmap_mode='r' if mmap and not meta.get('compress') else None)
+    return meta
+
+
+def load_legacy(ticker, models_dir=None):
+    path = legacy_path(ticker, models_dir)
+    return joblib.load(path) if os.path.exists(path) else None
+
+
+def migrate_legacy(models_dir=None, remove=False):
+    """Convierte los crypto_model_<ticker>.pkl a v1 del formato nuevo."""
+    root = models_dir or MODELS_DIR
+    migrated = []
+    for name in sorted(os.listdir(root)) if os.path.isdir(root) else []:
+        match = re.match(r'^crypto_model_(.+)\.pkl$', name)
+        if not match:
+            continue
+        pack = joblib.load(os.path.join(root, name))
+        pack.setdefault('ticker', match.group(1).replace("_", "-"))
+        if list_versions(pack['ticker'], models_dir):
+            continue
+        version, path = save_artifact(pack, models_dir)
+        migrated.append((pack['ticker'], version))
+        if remove:
+            os.remove(os.path.join(root, name))
+    return migrated
+
+
+def prune(ticker, keep=DEFAULT_KEEP, models_dir=None):
+    """Borra las versiones más antiguas, conservando las `keep` últimas."""
+    removed = []
+    for version in list_versions(ticker, models_dir)[:-keep or None]:
+        shutil.rmtree(version_dir(ticker, version, models_dir))
+        removed.append(version)
+    if removed:
+        rebuild_registry(models_dir)
+    return removed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Registro de modelos versionados")
+    parser.add_argument("command", choices=["list", "migrate", "rebuild", "prune"])
+    parser.add_argument("--keep", type=int, default=DEFAULT_KEEP)
+    parser.add_argument("--remove-pkl", action="store_true", help="(migrate) borrar los .pkl migrados")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        print("Migrados:", migrate_legacy(remove=args.remove_pkl) or "nada que migrar")
+    elif args.command == "rebuild":
+        rebuild_registry()
+    elif args.command == "prune":
+        for ticker in load_registry()['models']:
+            print(ticker, "borradas:", prune(ticker, args.keep))
+    registry = load_registry()
+    for ticker, entry in sorted(registry['models'].items()):
+        for v in entry['versions']:
+            mark = '*' if v['version'] == entry['latest'] else ' '
+            acc = f"{v['accuracy']:.3f}" if v['accuracy'] is not None else "n/d"
+            print(f"{mark} {ticker:<9} v{v['version']:<3} {v['interval']:<4} acc {acc}  {v['created_at']}")
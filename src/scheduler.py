@@ -0,0 +1,423 @@
+"""
+Scheduler headless de predicciones (independiente de Streamlit).
+
+Un proceso, una corrutina por activo, despertando alineada al cierre de cada
+vela de su intervalo. En cada vela nueva ejecuta exactamente una vez:
+
+    fetch -> features -> predict -> persist -> grade -> alert
+
+El dashboard (app.py) pasa a ser sólo una vista de lo que queda guardado.
+
+Uso:
+    python src/scheduler.py
+    python src/scheduler.py --symbols BTC-USD ETH-USD --grace 10
+    python src/scheduler.py --once      # una pasada y salir (cron / debug)
+    python src/scheduler.py --stream ccxt --exchange binance   # velas de un feed en vivo
+    python src/scheduler.py --stream replay --speed 600        # replay acelerado de data/
+
+Con --stream no se sondea a Yahoo en cada vela: ingestion.StreamingIngestion
+agrega los ticks del feed en velas, las guarda en el almacén y el cierre de
+cada vela dispara su predicción. Los intervalos se fijan al arrancar (los de
+los modelos cargados). Para probar con replay conviene un CANDLE_STORE_DIR y
+una base de datos aparte: se guardan velas y predicciones de fechas pasadas.
+
+Cada DRIFT_CHECK_SECONDS se revisa si algún modelo tiene más de
+MODEL_REFRESH_SECONDS o si sus features derivaron (PSI, ver drift.py); en ese
+caso se lanza un re-entrenamiento incremental en segundo plano
+(training.submit_training(refresh=True)) y el modelo nuevo se recarga solo.
+
+Con varias réplicas (docker-compose.yml: servicio `worker`) sólo trabaja la
+que tiene el advisory lock de líder (coordination.LeaderLock); las demás
+esperan en standby y toman el relevo si cae. Tras guardar/calificar cada vela
+se avisa a los dashboards con NOTIFY (coordination.notify_update).
+"""
+import os
+import time
+import asyncio
+import argparse
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+load_dotenv(os.path.join(project_root, '.env'))
+
+from database import init_db, save_predictions  # noqa: E402
+from alerts import get_dispatcher, TELEGRAM_THRESHOLD  # noqa: E402
+from candle_store import CandleStore  # noqa: E402
+from features import IncrementalFeatures, calculate_features  # noqa: E402
+from grading import grade_pending  # noqa: E402
+from schema import run_maintenance  # noqa: E402
+from inference import (load_model_pack, model_version, pack_warmup_bars, drop_open_bar,  # noqa: E402
+                       to_db_timestamp)
+from forest_predictor import get_predictor  # noqa: E402
+import metrics  # noqa: E402
+from metrics import timer, observe, inc  # noqa: E402
+from model_registry import latest_version, legacy_path  # noqa: E402
+from drift import drift_report  # noqa: E402
+from training import submit_training  # noqa: E402
+from ingestion import SYMBOLS, INTERVAL_DELTAS, DEFAULT_PERIODS, StreamingIngestion, make_feed  # noqa: E402
+from coordination import LeaderLock, LEADER_CHECK_SECONDS, notify_update  # noqa: E402
+
+# Segundos de margen tras el cierre de vela para que el proveedor la publique
+DEFAULT_GRACE = float(os.getenv("SCHEDULER_GRACE", "5"))
+# Reintentos si la vela recién cerrada aún no está disponible
+BAR_RETRIES = 3
+BAR_RETRY_DELAY = 10
+# Sin modelo entrenado: cada cuánto se vuelve a mirar
+MODEL_POLL_SECONDS = 60
+# Particiones futuras + retención/rollup de predictions
+MAINTENANCE_SECONDS = 24 * 3600
+# Re-entrenamiento incremental: edad máxima del modelo (0 = sin programar), cada cuánto
+# se mira la deriva y sobre cuántas velas recientes
+MODEL_REFRESH_SECONDS = float(os.getenv("MODEL_REFRESH_SECONDS", "21600"))
+DRIFT_CHECK_SECONDS = float(os.getenv("DRIFT_CHECK_SECONDS", "900"))
+DRIFT_WINDOW_BARS = int(os.getenv("DRIFT_WINDOW_BARS", "288"))
+# Pausa mínima entre dos re-entrenamientos del mismo activo
+REFRESH_COOLDOWN_SECONDS = 3600
+# Elección de líder entre réplicas del worker (advisory lock de Postgres)
+SCHEDULER_LEADER = os.getenv("SCHEDULER_LEADER", "1") == "1"
+
+
+def seconds_until_next_bar(interval, grace=0.0, now=None):
+    now = now or pd.Timestamp.now(tz='UTC')
+    step = INTERVAL_DELTAS.get(interval, pd.Timedelta(minutes=1))
+    next_bar = now.floor(step) + step
+    return (next_bar - now).total_seconds() + grace
+
+
+class PredictionJob:
+    """Estado de un activo: modelo cargado, motor de features incremental y última vela procesada."""
+
+    def __init__(self, symbol, store, alerts=None):
+        self.symbol = symbol
+        self.store = store
+        self.alerts = alerts or get_dispatcher()
+        self.pack = None
+        self.model_version = None
+        self.engine = IncrementalFeatures()
+        self.last_bar = None
+
+    @property
+    def interval(self):
+        return self.pack.get('interval', '1m') if self.pack else None
+
+    def reload_model(self):
+        # Recarga el modelo si se re-entrenó (nueva versión en el registro; sin
+        # versiones, cambia el mtime del .pkl antiguo)
+        version = latest_version(self.symbol)
+        if version is None:
+            path = legacy_path(self.symbol)
+            version = ('pkl', os.path.getmtime(path)) if os.path.exists(path) else None
+        if version != self.model_version:
+            self.pack = load_model_pack(self.symbol)
+            if self.pack is not None:
+                # Se aplana el bosque una vez por versión, no en cada vela
+                get_predictor(self.pack)
+            self.model_version = version
+            self.engine.reset()
+        return self.pack
+
+    def _features_for(self, closed):
+        if not set(self.pack['features']) <= set(IncrementalFeatures.FEATURE_COLUMNS):
+            # Conjuntos con indicadores que el motor incremental no tiene (EMAs, ATR...):
+            # cálculo vectorizado sobre la historia mínima que necesitan
+            tail = closed.tail(pack_warmup_bars(self.pack))
+            return calculate_features(tail, features=self.pack['features']).iloc[-1]
+        # Sólo se ingieren las velas cerradas nuevas (O(1) por vela)
+        if self.engine.last_timestamp is None or self.engine.last_timestamp not in closed.index:
+            self.engine.warm_start(closed.iloc[:-1])
+        row = None
+        for ts, bar in closed.loc[closed.index > self.engine.last_timestamp].iterrows():
+            row = self.engine.update(bar, ts)
+        return row
+
+    def run_once(self, now=None, refresh=True):
+        """
+        Procesa la última vela cerrada si no se procesó ya. Devuelve la predicción o None.
+        refresh=False: no se pide nada al proveedor (la vela ya la guardó el streaming).
+        """
+        pack = self.reload_model()
+        if pack is None:
+            return None
+        interval = self.interval
+
+        # 1. Fetch (sólo la cola que falta)
+        with timer('pipeline_stage_seconds', stage='fetch', symbol=self.symbol):
+            if refresh:
+                self.store.update(self.symbol, interval)
+            closed = drop_open_bar(self.store.read(self.symbol, interval, end=now), interval, now=now)
+        if len(closed) < 2 or closed.index[-1] == self.last_bar:
+            return None
+        bar_time = closed.index[-1]
+
+        # 2. Features
+        with timer('pipeline_stage_seconds', stage='features', symbol=self.symbol):
+            row = self._features_for(closed)
+        if row is None:
+            return None
+
+        # 3. Predict (bosque compilado: clase y probabilidad en una sola pasada)
+        with timer('pipeline_stage_seconds', stage='predict', symbol=self.symbol):
+            x = np.array([[row[f] for f in pack['features']]], dtype=np.float64)
+            x = np.nan_to_num(x, nan=0.0, posinf=0.0, neginf=0.0)
+            classes, confidence, _ = get_predictor(pack).predict(x)
+        prediction = {
+            'symbol': self.symbol,
+            'bar_time': to_db_timestamp(bar_time),
+            'bar_interval': interval,
+            'model_version': model_version(pack),
+            'entry_price': float(row['Close']),
+            'prediction': int(classes[0]),
+            'confidence': float(confidence[0] * 100),
+        }
+
+        # 4. Persist (idempotente por vela: si ya estaba guardada, aunque fuera con otra
+        # versión del modelo, no se inserta nada y tampoco se avisa)
+        with timer('pipeline_stage_seconds', stage='persist', symbol=self.symbol):
+            inserted = save_predictions([prediction], per_bar=True)
+
+        # 5. Grade: todas las pendientes del activo cuya vela siguiente ya cerró
+        # (incluidas las de velas perdidas por reinicios), en un único UPDATE
+        with timer('pipeline_stage_seconds', stage='grade', symbol=self.symbol):
+            graded = grade_pending(self.store, [self.symbol], refresh=False, now=now)
+
+        # Aviso a los dashboards (LISTEN): releen este activo sin esperar al TTL de su caché
+        if inserted or graded:
+            try:
+                notify_update(self.symbol, interval, bar_time)
+            except Exception as e:
+                print(f"Error avisando a los dashboards ({self.symbol}): {e}")
+
+        # 6. Alert (sólo quien insertó la fila avisa). Sólo se encola: el envío,
+        # agrupado con el resto de activos de la misma vela, va en otro hilo
+        if inserted and prediction['confidence'] >= TELEGRAM_THRESHOLD:
+            self.alerts.submit(self.symbol, bar_time, prediction['entry_price'],
+                               prediction['prediction'], prediction['confidence'])
+
+        # Retraso desde el cierre de la vela hasta tener la predicción guardada
+        step = INTERVAL_DELTAS.get(interval, pd.Timedelta(minutes=1))
+        observe('prediction_lag_seconds', ((now or pd.Timestamp.now(tz='UTC')) - (bar_time + step)).total_seconds(),
+                symbol=self.symbol)
+        inc('predictions_total', symbol=self.symbol, inserted=bool(inserted))
+
+        self.last_bar = bar_time
+        print(f"[{bar_time}] {self.symbol} {interval}: pred={prediction['prediction']} "
+              f"conf={prediction['confidence']:.1f}% {'(nueva)' if inserted else '(ya guardada)'}")
+        return prediction
+
+
+def refresh_reason(job, now=None):
+    """Motivo para re-entrenar el modelo del activo ('programado' / 'deriva ...') o None."""
+    now = now or pd.Timestamp.now(tz='UTC')
+    created = job.pack.get('created_at')
+    if MODEL_REFRESH_SECONDS > 0 and created is not None and \
+            now - pd.Timestamp(created) >= pd.Timedelta(seconds=MODEL_REFRESH_SECONDS):
+        return 'programado'
+    features = job.pack['features']
+    recent = job.store.read(job.symbol, job.interval, last_n=DRIFT_WINDOW_BARS + pack_warmup_bars(job.pack))
+    closed = drop_open_bar(recent, job.interval, now=now)
+    if closed.empty:
+        return None
+    report = drift_report(job.pack, calculate_features(closed, features=features)[features].tail(DRIFT_WINDOW_BARS))
+    if report is not None and report[2]:
+        return f"deriva (PSI {report[0]:.2f} en {report[1]})"
+    return None
+
+
+async def refresh_loop(jobs):
+    running = {}
+    launched = {}
+    while True:
+        await asyncio.sleep(DRIFT_CHECK_SECONDS)
+        for job in jobs:
+            run = running.get(job.symbol)
+            if job.pack is None or (run is not None and not run.done):
+                continue
+            if time.monotonic() - launched.get(job.symbol, -REFRESH_COOLDOWN_SECONDS) < REFRESH_COOLDOWN_SECONDS:
+                continue
+            try:
+                reason = await asyncio.to_thread(refresh_reason, job)
+                if reason is None:
+                    continue
+                print(f"Re-entrenamiento incremental de {job.symbol} ({reason})")
+                inc('model_refresh_total', symbol=job.symbol, reason=reason.split()[0])
+                # Un proceso y un hilo: el scheduler sigue prediciendo mientras tanto. La ingesta
+                # pide la historia que Yahoo sirve para el intervalo (7d en 1m, no 60d)
+                running[job.symbol] = submit_training([(job.symbol, job.interval)], max_workers=1, n_jobs=1,
+                                                      period=DEFAULT_PERIODS[job.interval], refresh=True)
+                launched[job.symbol] = time.monotonic()
+            except Exception as e:
+                print(f"Error en re-entrenamiento de {job.symbol}: {e}")
+
+
+async def _run_safely(job, **kwargs):
+    try:
+        return await asyncio.to_thread(job.run_once, **kwargs)
+    except Exception as e:
+        print(f"Error en {job.symbol}: {e}")
+        return None
+
+
+async def run_job(job, grace=DEFAULT_GRACE):
+    # Primera pasada inmediata: recupera la última vela si el proceso estuvo parado
+    await _run_safely(job)
+    while True:
+        if job.interval is None:
+            # Todavía no hay modelo entrenado para este activo
+            await asyncio.sleep(MODEL_POLL_SECONDS)
+            await _run_safely(job)
+            continue
+
+        await asyncio.sleep(seconds_until_next_bar(job.interval, grace))
+        # La vela puede tardar unos segundos en publicarse: reintentos cortos
+        for _ in range(BAR_RETRIES):
+            if await _run_safely(job) is not None:
+                break
+            await asyncio.sleep(BAR_RETRY_DELAY)
+
+
+async def consume_bars(ingestion, jobs):
+    # Modo streaming: cada vela cerrada del intervalo del modelo dispara su predicción
+    by_symbol = {job.symbol: job for job in jobs}
+    queue = ingestion.subscribe()
+    while (bar := await queue.get()) is not None:
+        job = by_symbol.get(bar.symbol)
+        if job is None or bar.interval != job.interval:
+            continue
+        await _run_safely(job, now=bar.time + INTERVAL_DELTAS[bar.interval], refresh=False)
+
+
+async def run_stream(jobs, store, feed, refresh=True):
+    for job in jobs:
+        await asyncio.to_thread(job.reload_model)
+    intervals = sorted({job.interval for job in jobs if job.interval}) or ['1m']
+    ingestion = StreamingIngestion(feed, [job.symbol for job in jobs], intervals, store=store)
+    print(f"Streaming {type(feed).__name__}: {', '.join(job.symbol for job in jobs)} ({', '.join(intervals)})")
+    if not feed.realtime:
+        # Replay: termina con el feed
+        await asyncio.gather(ingestion.run(), consume_bars(ingestion, jobs))
+        await asyncio.to_thread(get_dispatcher().flush, 30)
+        metrics.export_files()
+        return
+    # En vivo: primero se recupera la última vela por el proveedor (proceso parado)
+    for job in jobs:
+        await _run_safely(job)
+    loops = [maintenance_loop(), metrics_loop(), ingestion.run(), consume_bars(ingestion, jobs)]
+    if refresh:
+        loops.append(refresh_loop(jobs))
+    await asyncio.gather(*loops)
+
+
+async def metrics_loop():
+    # Archivos de METRICS_DIR para el panel del dashboard / textfile collector
+    while True:
+        await asyncio.sleep(metrics.METRICS_EXPORT_SECONDS)
+        try:
+            await asyncio.to_thread(metrics.export_files)
+        except Exception as e:
+            print(f"Error exportando métricas: {e}")
+
+
+async def maintenance_loop():
+    while True:
+        try:
+            print(f"Mantenimiento DB: {await asyncio.to_thread(run_maintenance)}")
+        except Exception as e:
+            print(f"Error en mantenimiento DB: {e}")
+        await asyncio.sleep(MAINTENANCE_SECONDS)
+
+
+async def run_loops(jobs, grace=DEFAULT_GRACE, refresh=True):
+    loops = [maintenance_loop(), metrics_loop(), *(run_job(job, grace) for job in jobs)]
+    if refresh:
+        loops.append(refresh_loop(jobs))
+    await asyncio.gather(*loops)
+
+
+async def wait_for_leadership(leader):
+    # Standby: otra réplica tiene el lock; se reintenta hasta que lo suelte (o caiga)
+    standby = False
+    while True:
+        try:
+            if await asyncio.to_thread(leader.try_acquire):
+                print("Líder: este worker predice, califica y envía alertas")
+                return
+            if not standby:
+                print(f"Standby: otro worker es el líder (reintento cada {LEADER_CHECK_SECONDS:.0f}s)")
+                standby = True
+        except Exception as e:
+            print(f"Error en la elección de líder: {e}")
+        await asyncio.sleep(LEADER_CHECK_SECONDS)
+
+
+async def while_leader(work, leader):
+    """
+    Ejecuta la corrutina `work` mientras se conserve el lock de líder.
+    True si `work` terminó; False si se perdió el lock (y se canceló `work`).
+    """
+    task = asyncio.ensure_future(work)
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=LEADER_CHECK_SECONDS)
+        if done:
+            task.result()
+            return True
+        if not await asyncio.to_thread(leader.is_held):
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            return False
+
+
+async def main(symbols, grace=DEFAULT_GRACE, once=False, feed=None, refresh=True, leader_election=SCHEDULER_LEADER):
+    init_db()
+    metrics.set_process_name('scheduler')
+    if metrics.start_http_server() is not None:
+        print(f"Métricas en http://0.0.0.0:{metrics.METRICS_PORT}/metrics")
+    store = CandleStore()
+    if once:
+        for job in [PredictionJob(symbol, store) for symbol in symbols]:
+            await asyncio.to_thread(job.run_once)
+        # Que las alertas encoladas salgan antes de terminar el proceso
+        await asyncio.to_thread(get_dispatcher().flush, 30)
+        metrics.export_files()
+        return
+    leader = LeaderLock() if leader_election else None
+    while True:
+        if leader is not None:
+            await wait_for_leadership(leader)
+        # Estado nuevo en cada mandato: otra réplica pudo procesar velas mientras tanto
+        jobs = [PredictionJob(symbol, store) for symbol in symbols]
+        work = run_stream(jobs, store, feed, refresh=refresh) if feed is not None else \
+            run_loops(jobs, grace, refresh=refresh)
+        if leader is None:
+            await work
+            return
+        if await while_leader(work, leader):
+            return
+        print("Lock de líder perdido (¿conexión con Postgres?): vuelta a standby")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scheduler de predicciones alineado a velas")
+    parser.add_argument("--symbols", nargs="*", default=SYMBOLS)
+    parser.add_argument("--grace", type=float, default=DEFAULT_GRACE,
+                        help="Segundos tras el cierre de vela antes de predecir")
+    parser.add_argument("--once", action="store_true", help="Una sola pasada por activo")
+    parser.add_argument("--stream", choices=['replay', 'ccxt'],
+                        help="Predecir al cierre de las velas de un feed en streaming")
+    parser.add_argument("--speed", type=float, default=None, help="Replay: aceleración (0 = sin pausas)")
+    parser.add_argument("--start", default=None, help="Replay: primera vela a reproducir")
+    parser.add_argument("--exchange", default=None, help="CCXT: exchange (binance, kraken...)")
+    parser.add_argument("--no-refresh", action="store_true",
+                        help="Sin re-entrenamiento incremental automático (programado / por deriva)")
+    parser.add_argument("--no-leader", action="store_true",
+                        help="Sin elección de líder (una sola réplica; ver SCHEDULER_LEADER)")
+    args = parser.parse_args()
+    feed = None
+    if args.stream == 'replay':
+        feed = make_feed('replay', speed=args.speed, start=args.start)
+    elif args.stream == 'ccxt':
+        feed = make_feed('ccxt', exchange=args.exchange)
+    asyncio.run(main(args.symbols, grace=args.grace, once=args.once, feed=feed, refresh=not args.no_refresh,
+                     leader_election=SCHEDULER_LEADER and not args.no_leader))
@@ -0,0 +1,394 @@
+"""
+Gestión del esquema de PostgreSQL: migraciones idempotentes, particionado
+mensual de `predictions` por vela (bar_time) y retención con rollup diario.
+
+Uso:
+    python src/schema.py migrate         # aplica migraciones pendientes
+    python src/schema.py maintenance     # crea particiones futuras + retención/rollup
+    python src/schema.py status
+"""
+import os
+import argparse
+from datetime import date, datetime, timedelta
+from dotenv import load_dotenv
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+load_dotenv(os.path.join(project_root, '.env'))
+
+from database import get_connection, CONF_BUCKET_SQL, ROLLUP_NAME  # noqa: E402
+
+# Días de predicciones detalladas a conservar (0 = sin retención).
+# Lo más antiguo se resume en predictions_daily antes de borrarse.
+DB_RETENTION_DAYS = int(os.getenv("DB_RETENTION_DAYS", "180"))
+# Particiones mensuales a crear por adelantado
+DB_PARTITIONS_AHEAD = int(os.getenv("DB_PARTITIONS_AHEAD", "2"))
+# Clave para pg_advisory_lock: sólo un proceso migra a la vez
+MIGRATION_LOCK_KEY = 727401
+
+PARTITION_PREFIX = 'predictions_p'
+# Días recientes que no se resumen todavía: siguen recibiendo calificaciones
+# (la vela siguiente de un modelo 1d tarda hasta 2 días) y se agregan en vivo
+ROLLUP_LIVE_DAYS = 3
+
+
+# --- MIGRACIONES ---
+# Cada migración es una función (cur) -> None idempotente. Se aplican en orden
+# y se registran en schema_migrations; nunca se editan una vez publicadas.
+
+def _m001_base(cur):
+    # Sintaxis de Postgres (cambia un poco respecto a SQLite)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS predictions (
+            id SERIAL PRIMARY KEY,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            symbol TEXT,
+            entry_price FLOAT,
+            prediction INTEGER,
+            confidence FLOAT,
+            result INTEGER
+        )
+    """)
+    # Vela sobre la que se predijo y su intervalo
+    cur.execute("ALTER TABLE predictions ADD COLUMN IF NOT EXISTS bar_time TIMESTAMP")
+    cur.execute("ALTER TABLE predictions ADD COLUMN IF NOT EXISTS bar_interval TEXT")
+    # Una sola predicción por vela (el scheduler puede reintentar sin duplicar)
+    cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS predictions_bar_uniq
+        ON predictions (symbol, bar_interval, bar_time)
+    """)
+
+
+def _is_partitioned(cur, table):
+    cur.execute("""
+        SELECT c.relkind = 'p' FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relname = %s AND n.nspname = current_schema()
+    """, (table,))
+    row = cur.fetchone()
+    return bool(row and row[0])
+
+
+def _m002_partition_predictions(cur):
+    """
+    Convierte `predictions` en tabla particionada por rango mensual de bar_time.
+    bar_time es la clave de partición (los índices únicos deben incluirla), así
+    que las filas antiguas sin vela toman bar_time = timestamp; su bar_interval
+    sigue NULL, que es lo que las identifica como antiguas.
+    """
+    if _is_partitioned(cur, 'predictions'):
+        return
+    cur.execute("ALTER TABLE predictions RENAME TO predictions_legacy")
+    cur.execute("ALTER TABLE predictions_legacy DROP CONSTRAINT IF EXISTS predictions_pkey")
+    cur.execute("DROP INDEX IF EXISTS predictions_bar_uniq")
+    cur.execute("""
+        CREATE TABLE predictions (
+            id INTEGER NOT NULL DEFAULT nextval('predictions_id_seq'),
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            symbol TEXT,
+            entry_price FLOAT,
+            prediction INTEGER,
+            confidence FLOAT,
+            result INTEGER,
+            bar_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            bar_interval TEXT,
+            PRIMARY KEY (id, bar_time)
+        ) PARTITION BY RANGE (bar_time)
+    """)
+    cur.execute(f"CREATE TABLE IF NOT EXISTS {PARTITION_PREFIX}default PARTITION OF predictions DEFAULT")
+    cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS predictions_bar_uniq
+        ON predictions (symbol, bar_interval, bar_time)
+    """)
+
+    # Particiones para el rango de datos existente + las próximas
+    cur.execute("SELECT MIN(COALESCE(bar_time, timestamp)) FROM predictions_legacy")
+    first = cur.fetchone()[0]
+    ensure_partitions(cur, start=first.date() if first else None)
+
+    cur.execute("""
+        INSERT INTO predictions (id, timestamp, symbol, entry_price, prediction, confidence,
+                                 result, bar_time, bar_interval)
+        SELECT id, timestamp, symbol, entry_price, prediction, confidence,
+               result, COALESCE(bar_time, timestamp, CURRENT_TIMESTAMP), bar_interval
+        FROM predictions_legacy
+    """)
+    cur.execute("ALTER SEQUENCE predictions_id_seq OWNED BY predictions.id")
+    cur.execute("DROP TABLE predictions_legacy")
+
+
+def _m003_indexes(cur):
+    # get_history(symbol): ORDER BY timestamp DESC LIMIT n por activo
+    cur.execute("CREATE INDEX IF NOT EXISTS predictions_symbol_ts_idx ON predictions (symbol, timestamp DESC)")
+    # get_history() sin activo (todas las monedas)
+    cur.execute("CREATE INDEX IF NOT EXISTS predictions_ts_idx ON predictions (timestamp DESC)")
+    # Calificación: sólo las pendientes (parcial, se mantiene pequeño)
+    cur.execute("CREATE INDEX IF NOT EXISTS predictions_pending_idx ON predictions (symbol, id) WHERE result IS NULL")
+
+
+def _m004_daily_rollup(cur):
+    # Resumen diario que sobrevive a la retención (también útil para analítica)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS predictions_daily (
+            day DATE NOT NULL,
+            symbol TEXT NOT NULL,
+            bar_interval TEXT NOT NULL,
+            conf_bucket INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            ups INTEGER NOT NULL,
+            graded INTEGER NOT NULL,
+            wins INTEGER NOT NULL,
+            PRIMARY KEY (day, symbol, bar_interval, conf_bucket)
+        )
+    """)
+
+
+def _m005_rollup_state(cur):
+    # Hasta qué día (exclusive) predictions_daily está completo
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            name TEXT PRIMARY KEY,
+            refreshed_until DATE NOT NULL
+        )
+    """)
+    refresh_rollup(cur, full=True)
+
+
+def _m006_model_version(cur):
+    # Versión del modelo que hizo la predicción (el .pkl antiguo y las filas previas: '').
+    # Entra en la clave única para poder re-predecir el histórico con otra versión
+    # sin duplicar ni pisar las predicciones de la anterior.
+    cur.execute("ALTER TABLE predictions ADD COLUMN IF NOT EXISTS model_version TEXT NOT NULL DEFAULT ''")
+    cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS predictions_bar_version_uniq
+        ON predictions (symbol, bar_interval, bar_time, model_version)
+    """)
+    cur.execute("DROP INDEX IF EXISTS predictions_bar_uniq")
+
+
+def _m007_cache_generations(cur):
+    # Último aviso del worker por activo (coordination.notify_update): un dashboard que
+    # (re)conecta lee aquí la generación que ya tienen las demás réplicas
+    cur.execute("CREATE SEQUENCE IF NOT EXISTS cache_generation_seq")
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS cache_generations (
+            symbol TEXT PRIMARY KEY,
+            seq BIGINT NOT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+MIGRATIONS = [
+    (1, 'base', _m001_base),
+    (2, 'partition_predictions', _m002_partition_predictions),
+    (3, 'indexes', _m003_indexes),
+    (4, 'daily_rollup', _m004_daily_rollup),
+    (5, 'rollup_state', _m005_rollup_state),
+    (6, 'model_version', _m006_model_version),
+    (7, 'cache_generations', _m007_cache_generations),
+]
+
+
+def migrate():
+    """Aplica las migraciones pendientes (seguro de llamar desde varios procesos)."""
+    applied = []
+    with get_connection() as conn:
+        cur = conn.cursor()
+        # Lock de transacción: se libera solo al hacer commit/rollback
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_KEY,))
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cur.execute("SELECT version FROM schema_migrations")
+        done = {row[0] for row in cur.fetchall()}
+        for version, name, fn in MIGRATIONS:
+            if version in done:
+                continue
+            fn(cur)
+            cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+            applied.append(name)
+        cur.close()
+    return applied
+
+
+# --- PARTICIONES ---
+def _month_start(d):
+    return date(d.year, d.month, 1)
+
+
+def _next_month(d):
+    return date(d.year + (d.month == 12), d.month % 12 + 1, 1)
+
+
+def ensure_partitions(cur, start=None, months_ahead=DB_PARTITIONS_AHEAD):
+    """Crea las particiones mensuales desde `start` (o el mes actual) hasta N meses vista."""
+    today = datetime.utcnow().date()
+    month = _month_start(start or today)
+    last = _month_start(today)
+    for _ in range(months_ahead):
+        last = _next_month(last)
+    created = []
+    while month <= last:
+        name = f"{PARTITION_PREFIX}{month:%Y%m}"
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {name} PARTITION OF predictions
+            FOR VALUES FROM (%s) TO (%s)
+        """, (month, _next_month(month)))
+        created.append(name)
+        month = _next_month(month)
+    return created
+
+
+def list_partitions(cur):
+    """[(nombre, inicio_mes)] de las particiones mensuales (sin la DEFAULT)."""
+    cur.execute("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = 'predictions'
+    """)
+    partitions = []
+    for (name,) in cur.fetchall():
+        suffix = name[len(PARTITION_PREFIX):]
+        if name.startswith(PARTITION_PREFIX) and suffix.isdigit():
+            partitions.append((name, date(int(suffix[:4]), int(suffix[4:]), 1)))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+# --- RETENCIÓN / ROLLUP ---
+ROLLUP_SQL = """
+    INSERT INTO predictions_daily (day, symbol, bar_interval, conf_bucket, total, ups, graded, wins)
+    SELECT bar_time::date,
+           symbol,
+           COALESCE(bar_interval, ''),
+           {conf_bucket},
+           COUNT(*),
+           COUNT(*) FILTER (WHERE prediction = 1),
+           COUNT(result),
+           COALESCE(SUM(result), 0)
+    FROM predictions
+    WHERE bar_time >= %(start)s AND bar_time < %(end)s
+    GROUP BY 1, 2, 3, 4
+    ON CONFLICT (day, symbol, bar_interval, conf_bucket) DO UPDATE SET
+        total = EXCLUDED.total, ups = EXCLUDED.ups,
+        graded = EXCLUDED.graded, wins = EXCLUDED.wins
+""".format(conf_bucket=CONF_BUCKET_SQL)
+
+
+def rollup_days(cur, start, end):
+    """Recalcula predictions_daily para los días [start, end)."""
+    cur.execute(ROLLUP_SQL, {'start': start, 'end': end})
+    return cur.rowcount
+
+
+def refresh_rollup(cur, full=False):
+    """
+    Refresco incremental de predictions_daily: sólo agrega los días cerrados desde
+    el último refresco hasta hoy - ROLLUP_LIVE_DAYS. full=True lo recalcula todo
+    (p.ej. tras un backfill --regrade). Devuelve (desde, hasta) o None si ya estaba al día.
+    """
+    until = datetime.utcnow().date() - timedelta(days=ROLLUP_LIVE_DAYS)
+    start = None
+    if not full:
+        cur.execute("SELECT refreshed_until FROM rollup_state WHERE name = %s", (ROLLUP_NAME,))
+        row = cur.fetchone()
+        start = row[0] if row else None
+    if start is None:
+        cur.execute("SELECT MIN(bar_time) FROM predictions")
+        first = cur.fetchone()[0]
+        start = first.date() if first else until
+    if start < until:
+        rollup_days(cur, start, until)
+    cur.execute("""
+        INSERT INTO rollup_state (name, refreshed_until) VALUES (%s, %s)
+        ON CONFLICT (name) DO UPDATE
+        SET refreshed_until = GREATEST(rollup_state.refreshed_until, EXCLUDED.refreshed_until)
+    """, (ROLLUP_NAME, until))
+    return (start, until) if start < until else None
+
+
+def check_retention(retention_days):
+    """
+    La retención no puede llegar a los días en vivo: lo borrado sólo sigue contando
+    si su día está antes de rollup_state.refreshed_until (hoy - ROLLUP_LIVE_DAYS),
+    que es lo que database._aggregate lee de predictions_daily.
+    """
+    if retention_days and retention_days <= ROLLUP_LIVE_DAYS:
+        raise ValueError(f"retention_days debe ser 0 (sin retención) o mayor que "
+                         f"ROLLUP_LIVE_DAYS ({ROLLUP_LIVE_DAYS}): {retention_days}")
+
+
+def apply_retention(cur, retention_days=DB_RETENTION_DAYS):
+    """
+    Resume y elimina lo anterior a `retention_days`. Las particiones mensuales
+    completas se eliminan con DROP TABLE (instantáneo); en la DEFAULT se borra fila a fila.
+    """
+    check_retention(retention_days)
+    if not retention_days:
+        return []
+    cutoff = datetime.utcnow().date() - timedelta(days=retention_days)
+    dropped = []
+    for name, month in list_partitions(cur):
+        end = _next_month(month)
+        if end <= cutoff:
+            rollup_days(cur, month, end)
+            cur.execute(f"DROP TABLE IF EXISTS {name}")
+            dropped.append(name)
+    cur.execute(f"SELECT MIN(bar_time) FROM {PARTITION_PREFIX}default WHERE bar_time < %s", (cutoff,))
+    oldest = cur.fetchone()[0]
+    if oldest is not None:
+        rollup_days(cur, oldest.date(), cutoff)
+        cur.execute(f"DELETE FROM {PARTITION_PREFIX}default WHERE bar_time < %s", (cutoff,))
+    return dropped
+
+
+def run_maintenance(retention_days=DB_RETENTION_DAYS):
+    """Job periódico (lo lanza el scheduler): particiones futuras + rollup + retención."""
+    # Antes de abrir la transacción: un DB_RETENTION_DAYS inválido no deja sin particiones
+    check_retention(retention_days)
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_KEY,))
+        created = ensure_partitions(cur)
+        rolled = refresh_rollup(cur)
+        dropped = apply_retention(cur, retention_days)
+        cur.close()
+    return {'partitions': created, 'rollup': rolled, 'dropped': dropped}
+
+
+def rebuild_rollup():
+    """Recalcula predictions_daily entero (tras re-calificar el histórico)."""
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_KEY,))
+        rolled = refresh_rollup(cur, full=True)
+        cur.close()
+    return rolled
+
+
+def status():
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT version, name, applied_at FROM schema_migrations ORDER BY version")
+        migrations = cur.fetchall()
+        partitions = list_partitions(cur)
+        cur.close()
+    return {'migrations': migrations, 'partitions': [name for name, _ in partitions]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migraciones y mantenimiento del esquema")
+    parser.add_argument("command", choices=["migrate", "maintenance", "status"])
+    parser.add_argument("--retention-days", type=int, default=DB_RETENTION_DAYS)
+    args = parser.parse_args()
+    if args.command == "migrate":
+        print("Migraciones aplicadas:", migrate() or "ninguna (esquema al día)")
+    elif args.command == "maintenance":
+        print(run_maintenance(args.retention_days))
+    else:
+        print(status())
@@ -0,0 +1,297 @@
+"""
+Caché compartida entre sesiones del dashboard.
+
+Cada sesión de Streamlit vuelve a ejecutar el script entero en cada refresco,
+así que con N pestañas abiertas las mismas velas y las mismas consultas a
+Postgres se piden N veces por minuto. Esta caché vive a nivel de proceso (la
+comparten todas las sesiones) y, opcionalmente, en disco para varios procesos
+(`SHARED_CACHE_DIR`):
+
+    clave      (tipo, symbol, intervalo, vela) -> la entrada cambia sola con cada vela nueva
+    TTL        hasta el cierre de la siguiente vela (+ margen), ver ttl_until_next_bar()
+    LRU        se expulsan las entradas menos usadas al superar SHARED_CACHE_MB
+    in-flight  si varias sesiones piden la misma clave a la vez sólo una la calcula
+               (single-flight); el resto espera su resultado. Con disco, también
+               entre procesos (lock de archivo por clave).
+    avisos     con coordination.UpdateListener (LISTEN de Postgres) cada aviso del
+               worker cambia la generación del activo, que también va en la clave:
+               sus datos se releen en el siguiente refresco, sin esperar al TTL.
+               La generación sale de Postgres, así que es la misma en todas las
+               réplicas y comparten las entradas en disco.
+
+Los valores se comparten: quien los use no debe modificarlos (copiar antes).
+"""
+import os
+import sys
+import time
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from ingestion import INTERVAL_DELTAS
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin single-flight entre procesos
+    fcntl = None
+
+# Presupuesto de memoria de la caché en proceso
+SHARED_CACHE_MB = float(os.getenv("SHARED_CACHE_MB", "256"))
+# Directorio para compartir entre procesos (vacío = sólo en memoria)
+SHARED_CACHE_DIR = os.getenv("SHARED_CACHE_DIR", "")
+# Segundos tras el cierre de vela hasta que el scheduler la ha guardado
+SHARED_CACHE_GRACE = float(os.getenv("SHARED_CACHE_GRACE", os.getenv("SCHEDULER_GRACE", "5")))
+# Archivos de disco más antiguos que esto se borran (el TTL máximo es una vela de 1d)
+DISK_MAX_AGE = 2 * 24 * 3600
+# Cada cuántas escrituras a disco se barren los archivos viejos
+DISK_SWEEP_EVERY = 100
+
+
+def bar_slot(interval, grace=None, now=None):
+    """
+    Vela en curso, desplazada `grace` segundos: forma parte de la clave, así que
+    cada vela nueva es una clave nueva, pero sólo cuando el scheduler ya la guardó.
+    """
+    now = now or pd.Timestamp.now(tz='UTC')
+    grace = SHARED_CACHE_GRACE if grace is None else grace
+    return (now - pd.Timedelta(seconds=grace)).floor(INTERVAL_DELTAS.get(interval, pd.Timedelta(minutes=1)))
+
+
+def ttl_until_next_bar(interval, grace=None, now=None):
+    """Segundos hasta que cambia bar_slot (cierre de la vela en curso + margen)."""
+    now = now or pd.Timestamp.now(tz='UTC')
+    grace = SHARED_CACHE_GRACE if grace is None else grace
+    step = INTERVAL_DELTAS.get(interval, pd.Timedelta(minutes=1))
+    return (bar_slot(interval, grace, now) + step - now).total_seconds() + grace
+
+
+def estimate_size(value):
+    """Bytes aproximados de un valor (DataFrames/Series con memory_usage, el resto con pickle)."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+class _Flight:
+    """Cálculo en curso de una clave: quien llega después espera a `event`."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class _FileLock:
+    """Lock de archivo por clave (single-flight entre procesos)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.handle = None
+
+    def __enter__(self):
+        self.handle = open(self.path, 'a')
+        if fcntl is not None:
+            fcntl.flock(self.handle, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self.handle, fcntl.LOCK_UN)
+        self.handle.close()
+
+
+class SharedCache:
+    def __init__(self, max_mb=None, cache_dir=None):
+        self.max_bytes = int((SHARED_CACHE_MB if max_mb is None else max_mb) * 1024 * 1024)
+        self.cache_dir = SHARED_CACHE_DIR if cache_dir is None else cache_dir
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        self._entries = OrderedDict()    # clave -> (expira (epoch), bytes, valor)
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.size = 0
+        self._disk_writes = 0
+        self.counters = {'hits': 0, 'misses': 0, 'coalesced': 0, 'disk_hits': 0,
+                         'expired': 0, 'evictions': 0, 'errors': 0}
+
+    # --- Memoria ---
+    def _get_local(self, key, now):
+        # Llamar con self._lock tomado
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        if entry[0] <= now:
+            self._drop(key)
+            self.counters['expired'] += 1
+            return False, None
+        self._entries.move_to_end(key)
+        return True, entry[2]
+
+    def _drop(self, key):
+        _, nbytes, _ = self._entries.pop(key)
+        self.size -= nbytes
+
+    def _put_local(self, key, value, expires):
+        nbytes = estimate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (expires, nbytes, value)
+            self.size += nbytes
+            while self.size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.counters['evictions'] += 1
+
+    # --- Disco (opcional) ---
+    def _disk_path(self, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f'{digest}.pkl')
+
+    def _get_disk(self, key, now):
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                stored_key, expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return False, None, None
+        if stored_key != key or expires <= now:
+            return False, None, None
+        return True, value, expires
+
+    def _put_disk(self, key, value, expires):
+        path = self._disk_path(key)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump((key, expires, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self._disk_writes += 1
+        if self._disk_writes % DISK_SWEEP_EVERY == 0:
+            self._sweep_disk()
+
+    def _sweep_disk(self):
+        cutoff = time.time() - DISK_MAX_AGE
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _load(self, key, loader, ttl):
+        """Con disco: otro proceso puede haberlo calculado ya; si no, se calcula bajo su lock."""
+        if not self.cache_dir:
+            return loader(), time.time() + ttl
+        found, value, expires = self._get_disk(key, time.time())
+        if found:
+            self.counters['disk_hits'] += 1
+            return value, expires
+        with _FileLock(self._disk_path(key) + '.lock'):
+            found, value, expires = self._get_disk(key, time.time())
+            if found:
+                self.counters['disk_hits'] += 1
+                return value, expires
+            value, expires = loader(), time.time() + ttl
+            try:
+                self._put_disk(key, value, expires)
+            except Exception as e:
+                # Valores no serializables: se quedan sólo en memoria
+                print(f"Caché compartida: no se pudo guardar en disco: {e}")
+            return value, expires
+
+    # --- API ---
+    def get_or_load(self, key, loader, ttl):
+        """Valor de `key`; si no está (o expiró) se calcula con loader() una sola vez."""
+        with self._lock:
+            found, value = self._get_local(key, time.time())
+            if found:
+                self.counters['hits'] += 1
+                return value
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.counters['coalesced'] += 1
+                leader = False
+            else:
+                flight = self._flights[key] = _Flight()
+                self.counters['misses'] += 1
+                leader = True
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value, expires = self._load(key, loader, ttl)
+            self._put_local(key, value, expires)
+            flight.value = value
+            return value
+        except Exception as e:
+            self.counters['errors'] += 1
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def invalidate(self, prefix=None):
+        """Borra las entradas en memoria cuya clave empieza por `prefix` (todas si None)."""
+        with self._lock:
+            for key in [k for k in self._entries if prefix is None or k[:len(prefix)] == prefix]:
+                self._drop(key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters['hits'] + self.counters['misses'] + self.counters['coalesced']
+            return dict(self.counters, entries=len(self._entries), size_mb=self.size / 1024 / 1024,
+                        hit_rate=(lookups - self.counters['misses']) / lookups if lookups else 0.0)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+# Generación por activo (secuencia de coordination.notify_update), cambiada por los avisos de Postgres
+_generations = {}
+
+
+def get_cache():
+    """Caché del proceso (la comparten todas las sesiones de Streamlit)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SharedCache()
+        return _cache
+
+
+def bump_generation(symbol, seq):
+    """
+    Invalida lo cacheado de `symbol`: `seq` va en la clave. Es la misma en todos los
+    procesos, así que comparten también las entradas en disco. Una generación más
+    antigua que la actual (aviso atrasado tras releer cache_generations) se ignora.
+    """
+    with _cache_lock:
+        if seq > _generations.get(symbol, -1):
+            _generations[symbol] = seq
+
+
+def cached(kind, symbol, interval, loader, *extra):
+    """
+    get_or_load con clave (kind, symbol, interval, vela en curso, generación, *extra)
+    y TTL hasta la siguiente vela.
+    """
+    now = pd.Timestamp.now(tz='UTC')
+    key = (kind, symbol, interval, bar_slot(interval, now=now).isoformat(),
+           _generations.get(symbol)) + tuple(extra)
+    return get_cache().get_or_load(key, loader, ttl_until_next_bar(interval, now=now))
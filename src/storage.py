@@ -0,0 +1,166 @@
+import os
+import uuid
+import argparse
+import pyarrow as pa
+import pyarrow.parquet as pq
+from ingestion import normalize_ohlcv, read_yfinance_csv
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+DATA_DIR = os.path.join(project_root, 'data')
+
+# Formato columnar tipado: Parquet (comprimido) o Arrow IPC (sin comprimir, mmap de coste ~0)
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+DEFAULT_FORMAT = os.getenv("DATA_FORMAT", "parquet")
+
+
+def training_data_path(ticker, fmt=None, data_dir=None):
+    safe_ticker = ticker.replace("-", "_")
+    ext = FORMATS[fmt or DEFAULT_FORMAT]
+    return os.path.join(data_dir or DATA_DIR, f'raw_{safe_ticker}_data{ext}')
+
+
+def legacy_csv_path(ticker, data_dir=None):
+    safe_ticker = ticker.replace("-", "_")
+    return os.path.join(data_dir or DATA_DIR, f'raw_{safe_ticker}_data.csv')
+
+
+def temp_path(path):
+    """
+    Temporal único junto a `path` (mismo directorio, para que os.replace sea atómico):
+    dos procesos que escriben el mismo archivo a la vez no comparten el temporal.
+    """
+    return f'{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp'
+
+
+def save_ohlcv(df, path):
+    """
+    Guarda velas con tipos reales (DatetimeIndex UTC, precios float64, volumen int64).
+    El formato se elige por la extensión (.parquet / .arrow). Escritura atómica.
+    """
+    df = normalize_ohlcv(df)
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    tmp = temp_path(path)
+    try:
+        if path.endswith(FORMATS['arrow']):
+            with pa.OSFile(tmp, 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+        else:
+            pq.write_table(table, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return path
+
+
+def load_ohlcv(path, columns=None, memory_map=True):
+    """
+    Lee velas guardadas con save_ohlcv.
+    columns: proyección de columnas (sólo se leen del disco las pedidas).
+    memory_map: mapea el archivo en memoria en lugar de copiarlo a un buffer.
+    """
+    if path.endswith(FORMATS['arrow']):
+        source = pa.memory_map(path, 'r') if memory_map else pa.OSFile(path, 'rb')
+        table = pa.ipc.open_file(source).read_all()
+        if columns is not None:
+            table = table.select(list(columns) + ['Datetime'])
+    else:
+        read_cols = None if columns is None else list(columns) + ['Datetime']
+        table = pq.read_table(path, columns=read_cols, memory_map=memory_map)
+    return table.to_pandas()
+
+
+def count_rows(path):
+    """Velas de un archivo de save_ohlcv, leídas de la metadata (sin cargar los datos)."""
+    if path.endswith(FORMATS['arrow']):
+        reader = pa.ipc.open_file(pa.memory_map(path, 'r'))
+        return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+    return pq.ParquetFile(path).metadata.num_rows
+
+
+def iter_ohlcv(path, batch_rows, columns=None, skip_rows=0):
+    """
+    Lee velas guardadas con save_ohlcv en DataFrames de como mucho `batch_rows`
+    filas, desde la fila `skip_rows`. Memoria acotada: Parquet se lee row group
+    a row group (los anteriores a `skip_rows` ni se leen) y Arrow IPC se mapea
+    en memoria y se corta sin copiar.
+    """
+    if path.endswith(FORMATS['arrow']):
+        table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        if columns is not None:
+            table = table.select(list(columns) + ['Datetime'])
+        for start in range(skip_rows, table.num_rows, batch_rows):
+            yield table.slice(start, batch_rows).to_pandas()
+        return
+    # Row group a row group (save_ohlcv los escribe de ~1M filas): iter_batches va
+    # acumulando buffers de lectura y memory_map haría contar el archivo en el RSS
+    parquet = pq.ParquetFile(path)
+    read_cols = None if columns is None else list(columns) + ['Datetime']
+    position = 0
+    for i in range(parquet.metadata.num_row_groups):
+        rows = parquet.metadata.row_group(i).num_rows
+        if position + rows <= skip_rows:
+            position += rows
+            continue
+        table = parquet.read_row_group(i, columns=read_cols)
+        for start in range(max(0, skip_rows - position), rows, batch_rows):
+            yield table.slice(start, batch_rows).to_pandas()
+        position += rows
+
+
+def read_legacy_csv(path):
+    """Ruta antigua: CSV de yfinance con 3 filas de cabecera, re-parseado y re-tipado."""
+    return normalize_ohlcv(read_yfinance_csv(path))
+
+
+def find_training_data(ticker, data_dir=None):
+    """
+    Ruta del dataset de entrenamiento de un ticker (None si no hay). Si sólo
+    existe el CSV antiguo, lo migra una vez al formato columnar.
+    """
+    for fmt in (DEFAULT_FORMAT, *[f for f in FORMATS if f != DEFAULT_FORMAT]):
+        path = training_data_path(ticker, fmt, data_dir)
+        if os.path.exists(path):
+            return path
+    csv_path = legacy_csv_path(ticker, data_dir)
+    if os.path.exists(csv_path):
+        return migrate_csv(csv_path)
+    return None
+
+
+def load_training_data(ticker, columns=None, data_dir=None):
+    """Carga el dataset de entrenamiento de un ticker (ver find_training_data)."""
+    path = find_training_data(ticker, data_dir)
+    return load_ohlcv(path, columns=columns) if path else None
+
+
+def migrate_csv(csv_path, fmt=None, remove=False):
+    fmt = fmt or DEFAULT_FORMAT
+    path = csv_path[:-len('.csv')] + FORMATS[fmt]
+    save_ohlcv(read_legacy_csv(csv_path), path)
+    print(f"Migrado {csv_path} -> {path}")
+    if remove:
+        os.remove(csv_path)
+    return path
+
+
+def migrate_data_dir(data_dir=None, fmt=None, remove=False):
+    """Migración única de todos los raw_*_data.csv de data/ al formato columnar."""
+    data_dir = data_dir or DATA_DIR
+    migrated = []
+    for name in sorted(os.listdir(data_dir)):
+        if name.startswith('raw_') and name.endswith('_data.csv'):
+            migrated.append(migrate_csv(os.path.join(data_dir, name), fmt=fmt, remove=remove))
+    return migrated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migra los CSV de data/ a Parquet / Arrow IPC")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--format", choices=list(FORMATS), default=DEFAULT_FORMAT)
+    parser.add_argument("--remove-csv", action="store_true", help="Borra los CSV una vez migrados")
+    args = parser.parse_args()
+    migrate_data_dir(args.data_dir, fmt=args.format, remove=args.remove_csv)
@@ -2,82 +2,118 @@
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, accuracy_score
-import joblib
 import os
-from features import calculate_features
+import time
+from storage import load_training_data, find_training_data, load_ohlcv, count_rows
+from model_registry import save_artifact, load_metadata, load_legacy, load_artifact
+from metrics import timer, timed, peak_rss_mb
+from features import BASE_COLUMNS
+from indicators import FEATURE_SETS, DEFAULT_FEATURE_SET, resolve_feature_set, warmup_bars
+from drift import feature_profile
+from training_matrix import build_training_matrix, split_train_test
 
-def train_model(ticker="BTC-USD", interval="5m"):
-    # 1. Load Data
-    safe_ticker = ticker.replace("-", "_")
-    data_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', f'raw_{safe_ticker}_data.csv')
-    print(f"Loading data from {data_path}...")
-    
-    if not os.path.exists(data_path):
-        print(f"Data file not found at {data_path}!")
-        return
+# Relative features only (absolute prices do not generalise across regimes).
+# Default set; train_model(feature_set=...) picks any of indicators.FEATURE_SETS.
+FEATURES = FEATURE_SETS[DEFAULT_FEATURE_SET]
+# Constrained trees to prevent overfitting/memorization
+MODEL_PARAMS = {'n_estimators': 100, 'random_state': 42, 'max_depth': 10, 'min_samples_leaf': 5}
+# Incremental refresh: trees replaced per refresh and most recent rows they are fitted on
+REFRESH_TREES = int(os.getenv("MODEL_REFRESH_TREES", "10"))
+REFRESH_WINDOW = int(os.getenv("MODEL_REFRESH_WINDOW", "5000"))
+# Memory-bounded training (training_matrix.py) above this many candles; 0 disables it
+LOW_MEMORY_ROWS = int(os.getenv("TRAIN_LOW_MEMORY_ROWS", "2000000"))
+# Train on the most recent candles only (0 = the whole history)
+MAX_ROWS = int(os.getenv("TRAIN_MAX_ROWS", "0"))
 
-    # Load data
-    # The CSV has 3 header rows:
-    # 1: Price,Close,High,Low,Open,Volume
-    # 2: Ticker,BTC-USD,BTC-USD...
-    # 3: Datetime,,,,,
-    # We want to skip 2 and 3, or better yet, read properly.
-    
-    # Reading with header=0 reads line 1.
-    df = pd.read_csv(data_path, header=0)
-    
-    # Drop the first two rows (Ticker and Datetime placeholders) which are now rows 0 and 1 in the DF
-    df = df.iloc[2:]
-    
-    # Rename the index column (first column) to Datetime
-    df.rename(columns={'Price': 'Datetime'}, inplace=True)
-    
-    # Set index
-    df.set_index('Datetime', inplace=True)
-    df.index = pd.to_datetime(df.index)
-    
-    # Convert numeric columns
-    numeric_cols = ['Close', 'High', 'Low', 'Open', 'Volume']
-    for col in numeric_cols:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-    
-    # Sort
-    df = df.sort_index()
+def describe_cache_hit(hit):
+    return {True: 'loaded from cache', 'extended': 'extended from cache'}.get(hit, 'computed')
 
-    # 2. Feature Engineering (Centralized)
-    df = calculate_features(df)
-    
+def add_target(df):
     # Target: 1 if Close(t+1) > Close(t)
     df['Target'] = (df['Close'].shift(-1) > df['Close']).astype(int)
-    
-    # Drop NaNs created by rolling/shifting
-    df_ml = df.dropna()
-    
-    if df_ml.empty:
+    return df
+
+@timed('train_model_seconds')
+def train_model(ticker="BTC-USD", interval="5m", n_jobs=None, params=None, tuning=None, feature_set=None,
+                low_memory=None, max_rows=None):
+    """
+    low_memory: build the float32 matrix in chunks (training_matrix.py) instead of
+    going through the feature cache; None = only above TRAIN_LOW_MEMORY_ROWS candles.
+    max_rows: train on the most recent candles only (None = TRAIN_MAX_ROWS).
+    """
+    # 1. Load Data
+    print(f"Loading data for {ticker}...")
+
+    # Typed columnar file: UTC DatetimeIndex, float64 prices, int64 volume.
+    # If only the legacy 3-header-row yfinance CSV exists, it is migrated once to Parquet.
+    path = find_training_data(ticker)
+    if path is None:
+        print(f"Data file not found for {ticker}!")
+        return
+
+    # Retraining keeps the config saved in the current artifact (e.g. found by tune_model.py)
+    previous = (load_metadata(ticker) or load_legacy(ticker) or {}) if params is None or feature_set is None else {}
+    if feature_set is None:
+        feature_set = previous.get('feature_set') or DEFAULT_FEATURE_SET
+    features = resolve_feature_set(feature_set)
+    max_rows = MAX_ROWS if max_rows is None else max_rows
+    if low_memory is None:
+        low_memory = LOW_MEMORY_ROWS > 0 and count_rows(path) > LOW_MEMORY_ROWS
+
+    # 2. Feature Engineering (Centralized); NaNs created by rolling/shifting are dropped
+    if low_memory:
+        # Chunked load straight into a contiguous float32 matrix: peak memory is the
+        # matrix plus one chunk, whatever the history length (no feature cache)
+        matrix = build_training_matrix(path, features, max_rows=max_rows or None)
+        X, y, trained_until = matrix.X, matrix.y, matrix.last
+        print("Feature matrix built in chunks (float32)")
+    else:
+        # Cached on disk by candle content + FEATURES_VERSION
+        df = load_ohlcv(path)
+        if max_rows and len(df) > max_rows:
+            # Keep the warmup history of the first row so that no row is lost
+            since = df.index[-max_rows]
+            df = df.iloc[-(max_rows + warmup_bars(BASE_COLUMNS + features)):]
+        else:
+            since = None
+        from feature_cache import load_feature_matrix
+        df_ml, cache_hit = load_feature_matrix(ticker, df, features=features)
+        if since is not None:
+            df_ml = df_ml.loc[df_ml.index >= since]
+        print(f"Feature matrix {describe_cache_hit(cache_hit)}")
+        # Only the relative metrics of the chosen feature set
+        X, y = df_ml[features], df_ml['Target']
+        # The last candle's Target is a placeholder (next close unknown): not trained on yet
+        labeled = df_ml.index[df_ml.index < df.index[-1]]
+        trained_until = labeled[-1] if len(labeled) else None
+
+    if X.empty:
         print("Not enough data to train model.")
         return
 
-    print(f"Data shape after cleaning: {df_ml.shape}")
+    print(f"Data shape after cleaning: {X.shape}")
     print("Class Balance:")
-    print(df_ml['Target'].value_counts(normalize=True))
+    print(y.value_counts(normalize=True))
+    print(f"Feature set: {feature_set} ({len(features)} features)")
     
-    # Update feature list to use ONLY relative metrics
-    features = ['Returns_1m', 'Returns_2m', 'Dist_MA_20', 'RSI_14', 'BB_Position']
-    X = df_ml[features]
-    y = df_ml['Target']
-    
-    # 3. Split
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
+    # 3. Split (chronological, last 20% for test; positional views, no copies)
+    X_train, X_test, y_train, y_test = split_train_test(X, y, test_size=0.2)
     
     # 4. Train
     print(f"Training Random Forest for {ticker}...")
-    model = RandomForestClassifier(n_estimators=100, random_state=42, max_depth=10, min_samples_leaf=5) 
-    # Added constraints to prevent overfitting/memorization
-    
-    model.fit(X_train, y_train)
+    if params is None:
+        params, tuning = previous.get('params'), previous.get('tuning')
+    params = {**MODEL_PARAMS, **(params or {})}
+    print(f"Params: {params}")
+    # n_jobs: trees fitted in parallel (the training orchestrator splits the CPUs between jobs)
+    model = RandomForestClassifier(**params, n_jobs=n_jobs)
     
+    with timer('train_fit_seconds', symbol=ticker, interval=interval):
+        model.fit(X_train, y_train)
+    # Inference predicts a handful of rows: a thread pool per call only adds overhead
+    model.set_params(n_jobs=None)
+
     # --- FEATURE IMPORTANCE (Data Science) ---
     # Extraemos qué variables influyen más en la decisión del modelo
     importances = model.feature_importances_
@@ -108,21 +144,155 @@ def train_model(ticker="BTC-USD", interval="5m"):
     print("\nClassification Report:")
     print(classification_report(y_test, y_pred))
     
-    # 6. Save
-    model_filename = f'crypto_model_{safe_ticker}.pkl'
-    model_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'models', model_filename)
-    
+    # 6. Save (new version in models/<ticker>/vN: meta.json + model.joblib, see model_registry.py)
     # Guardamos también los artefactos para visualizar en la App
-    joblib.dump({
+    version, model_path = save_artifact({
         'model': model, 
         'features': features, 
+        'feature_set': feature_set if isinstance(feature_set, str) else None, # Name in indicators.FEATURE_SETS
         'interval': interval, 
         'ticker': ticker,
         'feature_importance': feature_imp_df,
-        'metrics': metrics # Nuevo artefacto para estadísticas
-    }, model_path)
+        'metrics': metrics, # Nuevo artefacto para estadísticas
+        'params': params, # Hiperparámetros usados (los re-entrenamientos los reutilizan)
+        'tuning': tuning, # Resumen de la búsqueda de tune_model.py (o None)
+        'trained_until': trained_until, # Last row with a known Target: refresh_model trains on what comes after
+        'drift_profile': feature_profile(X_train.tail(REFRESH_WINDOW)), # Reference for drift.py
+    })
     
-    print(f"\nModel saved to {model_path} with training interval: {interval}")
+    print(f"\nModel v{version} saved to {model_path} with training interval: {interval}")
+    rss = peak_rss_mb()
+    if rss is not None:
+        print(f"Peak RSS: {rss:.0f} MB")
+    return {
+        'ticker': ticker,
+        'interval': interval,
+        'version': version,
+        'model_path': model_path,
+        'rows': len(X),
+        'accuracy': metrics['accuracy'],
+        'low_memory': low_memory,
+        'peak_rss_mb': rss,
+    }
+
+@timed('refresh_model_seconds')
+def refresh_model(ticker="BTC-USD", interval=None, n_jobs=None, trees=None, window=None):
+    """
+    Incremental retraining: instead of refitting the whole forest, retire the
+    `trees` oldest trees and warm-start `trees` new ones on the most recent
+    `window` rows (at least all rows newer than the previous artifact). Cost
+    grows with `window`, not with the total history. Falls back to train_model
+    when there is no compatible previous forest.
+    """
+    t0 = time.perf_counter()
+    previous = load_artifact(ticker)
+    model = previous.get('model') if previous else None
+    if (model is None or previous.get('trained_until') is None
+            or not isinstance(model, RandomForestClassifier) or not model.bootstrap
+            or (interval is not None and interval != previous.get('interval'))):
+        print(f"No incremental base model for {ticker}: full training")
+        return train_model(ticker, interval or (previous or {}).get('interval', '5m'), n_jobs=n_jobs)
+    interval = interval or previous.get('interval', '5m')
+    features = previous['features']
+    trees = min(trees or REFRESH_TREES, len(model.estimators_))
+    window = window or REFRESH_WINDOW
+
+    df = load_training_data(ticker)
+    if df is None:
+        print(f"Data file not found for {ticker}!")
+        return
+    from feature_cache import load_feature_matrix
+    df_ml, cache_hit = load_feature_matrix(ticker, df, features=features)
+    print(f"Feature matrix {describe_cache_hit(cache_hit)}")
+
+    # The last candle's Target is the placeholder 0 from add_target (next close unknown
+    # yet): it is left for the next refresh, once its real label exists
+    labeled = df_ml.loc[df_ml.index < df.index[-1]]
+    trained_until = pd.Timestamp(previous['trained_until'])
+    new_rows = labeled.loc[labeled.index > trained_until]
+    if new_rows.empty:
+        print(f"No new rows for {ticker} since {trained_until}: model v{previous['version']} kept")
+        return {
+            'ticker': ticker, 'interval': interval, 'version': previous['version'], 'model_path': None,
+            'rows': 0, 'accuracy': (previous.get('metrics') or {}).get('accuracy'), 'skipped': True,
+        }
+
+    # Prequential check: the current model has never seen these rows
+    accuracy_before = accuracy_score(new_rows['Target'], model.predict(new_rows[features]))
+    recent = labeled.tail(max(window, len(new_rows)))
+
+    # Retire the oldest trees, then grow the forest back on the recent window
+    print(f"Refreshing {ticker}: {len(new_rows)} new rows, {trees} trees on the last {len(recent)} rows")
+    refreshes = (previous.get('refresh') or {}).get('count', 0) + 1
+    model.estimators_ = model.estimators_[trees:]
+    # A different seed per refresh, otherwise every refresh would draw the same bootstrap seeds
+    seed = (previous.get('params') or {}).get('random_state') or 0
+    model.set_params(n_estimators=len(model.estimators_) + trees, warm_start=True, n_jobs=n_jobs,
+                     random_state=seed + refreshes)
+    with timer('train_fit_seconds', symbol=ticker, interval=interval, mode='refresh'):
+        model.fit(recent[features], recent['Target'])
+    model.set_params(warm_start=False, n_jobs=None)
+    accuracy_after = accuracy_score(new_rows['Target'], model.predict(new_rows[features]))
+
+    feature_imp_df = pd.DataFrame({
+        'Feature': features,
+        'Importance': model.feature_importances_
+    }).sort_values(by='Importance', ascending=False)
+    refresh = {
+        'count': refreshes,  # Refreshes since the last full training
+        'base_version': (previous.get('refresh') or {}).get('base_version', previous['version']),
+        'previous_version': previous['version'],
+        'new_rows': len(new_rows),
+        'window_rows': len(recent),
+        'trees_replaced': trees,
+        # Accuracy on the new rows before the refresh (unseen) and after (in-sample for the new trees)
+        'accuracy_before': accuracy_before,
+        'accuracy_after': accuracy_after,
+        'seconds': time.perf_counter() - t0,
+    }
+    print(f"Accuracy on new rows: {accuracy_before:.2f} before, {accuracy_after:.2f} after")
+
+    # Test metrics stay those of the last full training; see 'refresh' for this update
+    version, model_path = save_artifact({
+        'model': model,
+        'features': features,
+        'feature_set': previous.get('feature_set'),
+        'interval': interval,
+        'ticker': ticker,
+        'feature_importance': feature_imp_df,
+        'metrics': previous.get('metrics'),
+        'params': previous.get('params'),
+        'tuning': previous.get('tuning'),
+        'trained_until': labeled.index[-1],
+        'drift_profile': feature_profile(recent[features]),
+        'refresh': refresh,
+    })
+    print(f"\nModel v{version} saved to {model_path} (refresh #{refreshes} of v{refresh['base_version']})")
+    return {
+        'ticker': ticker,
+        'interval': interval,
+        'version': version,
+        'model_path': model_path,
+        'rows': len(recent),
+        # Test accuracy of the last full training (the metrics kept in the artifact)
+        'accuracy': (previous.get('metrics') or {}).get('accuracy'),
+        'accuracy_before': accuracy_before,
+        'accuracy_after': accuracy_after,
+    }
 
 if __name__ == "__main__":
-    train_model()
+    import argparse
+    parser = argparse.ArgumentParser(description="Train (or incrementally refresh) a model")
+    parser.add_argument("--ticker", default="BTC-USD")
+    parser.add_argument("--interval", default="5m")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Replace the oldest trees with trees fitted on recent rows")
+    parser.add_argument("--low-memory", action="store_true", default=None,
+                        help="Chunked float32 feature matrix (default: above TRAIN_LOW_MEMORY_ROWS candles)")
+    parser.add_argument("--max-rows", type=int, default=None,
+                        help="Train on the most recent candles only (default: TRAIN_MAX_ROWS)")
+    args = parser.parse_args()
+    if args.refresh:
+        refresh_model(args.ticker, args.interval)
+    else:
+        train_model(args.ticker, args.interval, low_memory=args.low_memory, max_rows=args.max_rows)
@@ -0,0 +1,220 @@
+"""
+Orquestador de entrenamiento multi-activo.
+
+Entrena una lista de trabajos (ticker, intervalo) en paralelo en un pool de
+procesos. Los núcleos se reparten entre procesos y `n_jobs` de cada
+RandomForest para no sobre-suscribir la CPU (procesos x n_jobs <= núcleos).
+Cada trabajo informa tiempos por etapa (ingesta / entrenamiento) y pico de RSS.
+
+También expone TrainingRun: el mismo pool lanzado en segundo plano para que
+el dashboard pueda encolarlo y consultar su estado sin bloquear la UI.
+
+Uso:
+    python src/training.py                                   # todos los SYMBOLS, 5m
+    python src/training.py --symbols BTC-USD ETH-USD --interval 1h --period 1y
+    python src/training.py --workers 3 --n-jobs 2 --no-ingest
+    python src/training.py --feature-set full                # ver indicators.FEATURE_SETS
+    python src/training.py --refresh --no-ingest             # incremental (train_model.refresh_model)
+"""
+import os
+import time
+import uuid
+import threading
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from ingestion import SYMBOLS, DEFAULT_PERIODS
+from indicators import FEATURE_SETS
+from metrics import observe, inc, peak_rss_mb
+
+DEFAULT_INTERVAL = "5m"
+# Sin `period` se usa DEFAULT_PERIODS[interval]; éste, para intervalos que no estén ahí
+DEFAULT_PERIOD = "60d"
+
+
+def plan_workers(n_tasks, max_workers=None, n_jobs=None, cpus=None):
+    """
+    Reparte los núcleos: (procesos, n_jobs por modelo) con procesos * n_jobs <= cpus.
+    Se priorizan procesos (un trabajo por núcleo) y los núcleos sobrantes van a n_jobs.
+    """
+    cpus = cpus or os.cpu_count() or 1
+    workers = max(1, min(n_tasks, max_workers or cpus))
+    n_jobs = n_jobs or max(1, cpus // workers)
+    return workers, n_jobs
+
+
+def _init_worker(n_jobs):
+    # Limita también los hilos de BLAS/OpenMP del proceso al presupuesto de n_jobs
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(limits=n_jobs)
+
+
+def run_training_job(ticker, interval=DEFAULT_INTERVAL, period=None, ingest=True, n_jobs=None,
+                     feature_set=None, refresh=False):
+    """
+    Ingesta (opcional) + entrenamiento de un activo. Se ejecuta dentro del proceso worker.
+    refresh=True: re-entrenamiento incremental (train_model.refresh_model) en lugar de completo.
+    period=None: DEFAULT_PERIODS[interval] ('60d' pediría a Yahoo más de los 7 días que da en 1m).
+    """
+    from ingestion import run_ingestion
+    from train_model import train_model, refresh_model
+
+    period = period or DEFAULT_PERIODS.get(interval, DEFAULT_PERIOD)
+    report = {'ticker': ticker, 'interval': interval, 'pid': os.getpid(), 'n_jobs': n_jobs}
+    t0 = time.perf_counter()
+    if ingest and not run_ingestion(ticker=ticker, period=period, interval=interval):
+        raise RuntimeError(f"Falló la descarga de datos de {ticker}")
+    report['ingest_seconds'] = time.perf_counter() - t0
+
+    t1 = time.perf_counter()
+    if refresh and feature_set is None:
+        result = refresh_model(ticker=ticker, interval=interval, n_jobs=n_jobs)
+    else:
+        result = train_model(ticker=ticker, interval=interval, n_jobs=n_jobs, feature_set=feature_set)
+    if result is None:
+        raise RuntimeError(f"No se pudo entrenar {ticker} (sin datos suficientes)")
+    report['train_seconds'] = time.perf_counter() - t1
+    report['seconds'] = time.perf_counter() - t0
+    report['peak_rss_mb'] = peak_rss_mb()
+    # accuracy: test del último entrenamiento completo; accuracy_before (refresco): la del
+    # modelo anterior sobre las velas nuevas, que aún no había visto
+    report.update(rows=result['rows'], accuracy=result['accuracy'], accuracy_before=result.get('accuracy_before'),
+                  model_path=result['model_path'], mode='refresh' if refresh else 'full',
+                  skipped=result.get('skipped', False))
+    return report
+
+
+class TrainingRun:
+    """
+    Ejecución de un lote de trabajos en segundo plano. `status()` es seguro de
+    llamar en cualquier momento (desde cada re-ejecución de Streamlit).
+    """
+
+    def __init__(self, jobs, max_workers=None, n_jobs=None, ingest=True, period=None,
+                 feature_set=None, refresh=False):
+        self.id = uuid.uuid4().hex[:8]
+        self.jobs = [(ticker, interval) for ticker, interval in jobs]
+        self.workers, self.n_jobs = plan_workers(len(self.jobs), max_workers, n_jobs)
+        self.ingest = ingest
+        self.period = period
+        self.feature_set = feature_set
+        self.refresh = refresh
+        self.started_at = None
+        self.finished_at = None
+        self._futures = {}
+        self._executor = None
+
+    def start(self):
+        # spawn: hacer fork de un proceso con hilos (Streamlit) no es seguro.
+        # max_tasks_per_child=1: proceso nuevo por trabajo -> pico de RSS propio
+        self._executor = ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker, initargs=(self.n_jobs,), max_tasks_per_child=1,
+        )
+        self.started_at = time.time()
+        for ticker, interval in self.jobs:
+            self._futures[(ticker, interval)] = self._executor.submit(
+                run_training_job, ticker, interval, self.period, self.ingest, self.n_jobs, self.feature_set,
+                self.refresh
+            )
+        # Hilo vigilante: cierra el pool al terminar sin bloquear a quien lo lanzó
+        threading.Thread(target=self._finish, daemon=True).start()
+        return self
+
+    def _finish(self):
+        for (ticker, interval), future in list(self._futures.items()):
+            # Los workers son procesos aparte: sus tiempos se registran aquí, en el padre
+            if future.exception() is None:
+                report = future.result()
+                for stage in ('ingest', 'train'):
+                    observe('training_stage_seconds', report[f'{stage}_seconds'], stage=stage, symbol=ticker)
+                inc('training_jobs_total', status='ok', symbol=ticker)
+            else:
+                inc('training_jobs_total', status='error', symbol=ticker)
+        self._executor.shutdown(wait=True)
+        self.finished_at = time.time()
+
+    @property
+    def done(self):
+        return self.finished_at is not None
+
+    def status(self):
+        """Lista de dicts por trabajo: state = pendiente | en curso | ok | error."""
+        rows = []
+        for (ticker, interval), future in list(self._futures.items()):
+            row = {'ticker': ticker, 'interval': interval}
+            if future.done():
+                error = future.exception()
+                if error is None:
+                    row.update(future.result(), state='ok')
+                else:
+                    row.update(state='error', error=str(error))
+            else:
+                row['state'] = 'en curso' if future.running() else 'pendiente'
+            rows.append(row)
+        return rows
+
+    def wait(self):
+        while not self.done:
+            time.sleep(0.1)
+        return self.status()
+
+
+# Ejecuciones lanzadas desde este proceso (el dashboard las consulta por id)
+_runs = {}
+_runs_lock = threading.Lock()
+
+
+def submit_training(jobs, max_workers=None, n_jobs=None, ingest=True, period=None, feature_set=None,
+                    refresh=False):
+    """Lanza un lote en segundo plano y devuelve su TrainingRun (no bloquea)."""
+    run = TrainingRun(jobs, max_workers, n_jobs, ingest, period, feature_set, refresh).start()
+    with _runs_lock:
+        _runs[run.id] = run
+    return run
+
+
+def get_training_run(run_id):
+    with _runs_lock:
+        return _runs.get(run_id)
+
+
+def train_all(jobs, max_workers=None, n_jobs=None, ingest=True, period=None, feature_set=None,
+              refresh=False):
+    """Versión bloqueante: entrena todos los trabajos y devuelve sus informes."""
+    return TrainingRun(jobs, max_workers, n_jobs, ingest, period, feature_set, refresh).start().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Entrenamiento paralelo multi-activo")
+    parser.add_argument("--symbols", nargs="*", default=SYMBOLS)
+    parser.add_argument("--interval", default=DEFAULT_INTERVAL)
+    parser.add_argument("--period", default=None,
+                        help="Historia a descargar (por defecto, la máxima del intervalo en Yahoo)")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos en paralelo")
+    parser.add_argument("--n-jobs", type=int, default=None, help="Hilos por RandomForest")
+    parser.add_argument("--no-ingest", action="store_true", help="Entrenar con los datos ya descargados")
+    parser.add_argument("--feature-set", choices=list(FEATURE_SETS), default=None,
+                        help="Conjunto de features (por defecto, el del modelo actual de cada activo)")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Re-entrenamiento incremental: reemplaza los árboles más antiguos por árboles "
+                             "ajustados sobre las velas recientes")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    jobs = [(symbol, args.interval) for symbol in args.symbols]
+    workers, n_jobs = plan_workers(len(jobs), args.workers, args.n_jobs)
+    print(f"{len(jobs)} trabajos | {workers} procesos x {n_jobs} hilos")
+    for row in train_all(jobs, workers, n_jobs, ingest=not args.no_ingest, period=args.period,
+                         feature_set=args.feature_set, refresh=args.refresh):
+        if row['state'] == 'ok':
+            rss = f"{row['peak_rss_mb']:.0f} MB" if row['peak_rss_mb'] is not None else "n/d"
+            acc = f"{row['accuracy']:.3f}" if row['accuracy'] is not None else "n/d"
+            if row.get('accuracy_before') is not None:
+                acc += f" (velas nuevas {row['accuracy_before']:.3f})"
+            print(f"  {row['ticker']:<9} {row['interval']:<4} ingesta {row['ingest_seconds']:6.1f}s  "
+                  f"entrenamiento {row['train_seconds']:6.1f}s  RSS {rss}  acc {acc}")
+        else:
+            print(f"  {row['ticker']:<9} {row['interval']:<4} ERROR: {row['error']}")
+    print(f"Total: {time.perf_counter() - t0:.1f}s")
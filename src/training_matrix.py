@@ -0,0 +1,110 @@
+"""
+Matriz de entrenamiento con memoria acotada para historias largas (10M+ velas).
+
+El camino habitual de train_model tiene en memoria a la vez el DataFrame de
+velas, su copia en calculate_features con las columnas de indicadores en
+float64, la matriz sin NaN (y su conversión a Arrow para la caché), X y los
+splits: varias veces el tamaño del dataset. Aquí:
+
+    lectura    bloques de TRAIN_CHUNK_ROWS velas (storage.iter_ohlcv), cada uno
+               precedido de las warmup_bars velas anteriores para que los
+               indicadores salgan igual que en una pasada completa
+    features   indicators.compute por bloque, escritas directamente en una
+               matriz float32 contigua (filas x features) reservada una sola vez
+    target     int8; la última vela de cada bloque espera a la primera del
+               siguiente para conocer su Target
+
+RandomForest convierte X a float32 internamente, así que entrenar sobre esta
+matriz da los mismos árboles que sobre float64 y se ahorra esa copia. Las
+filas son las mismas que las de feature_cache.build_feature_matrix (mismo
+dropna, misma última fila) y los splits train/test son vistas, sin copia.
+
+Pico de memoria ~ matriz final + un bloque, independiente de la historia total.
+"""
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from features import BASE_COLUMNS
+from indicators import compute, warmup_bars
+from storage import count_rows, iter_ohlcv
+
+# Velas por bloque de lectura / cálculo de features
+TRAIN_CHUNK_ROWS = int(os.getenv("TRAIN_CHUNK_ROWS", "500000"))
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# X: DataFrame float32 (RangeIndex) sobre la matriz contigua; y: Series int8.
+# first: fecha de la primera fila; last: de la última con Target conocido (la última
+# vela del archivo lleva el Target 0 provisional: refresh_model la usa más adelante).
+TrainingMatrix = namedtuple('TrainingMatrix', ['X', 'y', 'first', 'last'])
+
+
+def build_training_matrix(path, features, chunk_rows=None, max_rows=None, dtype=np.float32):
+    """
+    Features + Target de las velas del archivo `path` (ver storage.save_ohlcv),
+    calculados por bloques. max_rows: sólo las velas más recientes (con su
+    historia de calentamiento leída aparte, así que no se pierden filas).
+    """
+    chunk_rows = chunk_rows or TRAIN_CHUNK_ROWS
+    columns = BASE_COLUMNS + [c for c in features if c not in BASE_COLUMNS]
+    warmup = warmup_bars(columns)
+    total = count_rows(path)
+    skip = max(0, total - max_rows) if max_rows else 0
+    start = max(0, skip - warmup)
+
+    # np.empty no toca la memoria: las filas que descarte el dropna no llegan a ocupar RSS
+    X = np.empty((total - skip, len(features)), dtype=dtype)
+    y = np.empty(total - skip, dtype=np.int8)
+    rows = 0
+    first = last = None
+
+    def emit(frame, values, target, lo, hi, labeled=True):
+        nonlocal rows, first, last
+        if hi <= lo:
+            return
+        # dropna de build_feature_matrix: cualquier indicador u OHLCV a NaN descarta la fila
+        keep = np.ones(hi - lo, dtype=bool)
+        for array in [values[c] for c in columns] + \
+                [frame[c].to_numpy(dtype=np.float64) for c in OHLCV_COLUMNS if c in frame.columns]:
+            keep &= ~np.isnan(array[lo:hi])
+        k = int(keep.sum())
+        if not k:
+            return
+        for j, col in enumerate(features):
+            X[rows:rows + k, j] = values[col][lo:hi][keep]
+        y[rows:rows + k] = target[lo:hi][keep]
+        times = frame.index[lo:hi][keep]
+        first = times[0] if first is None else first
+        if labeled:
+            last = times[-1]
+        rows += k
+
+    tail = None     # velas de calentamiento + la última del bloque anterior (pendiente de Target)
+    position = start
+    frame = values = target = None
+    for chunk in iter_ohlcv(path, chunk_rows, columns=OHLCV_COLUMNS, skip_rows=start):
+        frame = chunk if tail is None else pd.concat([tail, chunk])
+        frame_start = position - (0 if tail is None else len(tail))
+        values = compute(frame, columns)
+        close = frame['Close'].to_numpy(dtype=np.float64)
+        # Target: 1 si Close(t+1) > Close(t); la última vela de todas queda en 0 como en add_target
+        target = np.zeros(len(frame), dtype=np.int8)
+        target[:-1] = close[1:] > close[:-1]
+        lo = max(skip - frame_start, 0 if tail is None else len(tail) - 1)
+        emit(frame, values, target, lo, len(frame) - 1)
+        position += len(chunk)
+        tail = frame.iloc[-(warmup + 1):]
+    if frame is not None:
+        emit(frame, values, target, max(skip - frame_start, len(frame) - 1), len(frame), labeled=False)
+
+    return TrainingMatrix(pd.DataFrame(X[:rows], columns=features, copy=False), pd.Series(y[:rows], name='Target'),
+                          first, last)
+
+
+def split_train_test(X, y, test_size=0.2):
+    """Split temporal (como train_test_split con shuffle=False) con vistas, sin copiar."""
+    n_test = int(np.ceil(len(X) * test_size))
+    split = len(X) - n_test
+    return X.iloc[:split], X.iloc[split:], y.iloc[:split], y.iloc[split:]
@@ -0,0 +1,151 @@
+"""
+Búsqueda de hiperparámetros del RandomForest con validación temporal.
+
+Folds tipo TimeSeriesSplit (cada fold valida sobre velas posteriores a las de
+entrenamiento) sobre el 80% inicial del dataset: el 20% final queda reservado
+como test, igual que en train_model. Dos estrategias:
+
+    random   RandomizedSearchCV, n_iter configuraciones con todos los árboles
+    halving  HalvingRandomSearchCV: empieza con muchas configuraciones y pocos
+             árboles, y sólo las mejores pasan a la siguiente ronda con más
+
+La matriz de features sale de la caché (feature_cache), así que repetir la
+búsqueda sobre las mismas velas no recalcula los indicadores. La mejor
+configuración se entrena con train_model y queda en el artefacto junto a
+`metrics` (claves `params` y `tuning`).
+
+Uso:
+    python src/tune_model.py --ticker BTC-USD
+    python src/tune_model.py --method random --n-iter 30 --splits 5 --scoring neg_log_loss
+"""
+import time
+import argparse
+import pandas as pd
+from scipy.stats import randint
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import HalvingRandomSearchCV, RandomizedSearchCV, TimeSeriesSplit
+
+from feature_cache import load_feature_matrix
+from storage import load_training_data
+from indicators import FEATURE_SETS, DEFAULT_FEATURE_SET, resolve_feature_set
+from model_registry import load_metadata
+from train_model import MODEL_PARAMS, train_model
+
+# Espacio de búsqueda (n_estimators es el "recurso" en halving)
+PARAM_SPACE = {
+    'max_depth': [4, 6, 8, 10, 12, 16, 20, None],
+    'min_samples_leaf': randint(1, 100),
+    'max_features': ['sqrt', 0.5, 0.8, 1.0],
+    'max_samples': [None, 0.3, 0.5, 0.8],
+}
+N_ESTIMATORS_RANGE = (25, 400)
+DEFAULT_SCORING = 'roc_auc'
+# Fracción final reservada como test (no la ve la búsqueda)
+TEST_SIZE = 0.2
+# Configuraciones que se guardan en el resumen del artefacto
+TOP_RESULTS = 10
+
+
+def build_search(method='halving', n_iter=20, n_splits=5, gap=1, scoring=DEFAULT_SCORING,
+                 n_jobs=None, random_state=MODEL_PARAMS['random_state']):
+    """
+    gap: velas descartadas entre train y validación de cada fold (el target de la
+    última vela de train usa el cierre de la siguiente).
+    """
+    cv = TimeSeriesSplit(n_splits=n_splits, gap=gap)
+    estimator = RandomForestClassifier(random_state=random_state)
+    if method == 'halving':
+        return HalvingRandomSearchCV(
+            estimator, PARAM_SPACE, resource='n_estimators',
+            min_resources=N_ESTIMATORS_RANGE[0], max_resources=N_ESTIMATORS_RANGE[1],
+            n_candidates='exhaust', factor=2, cv=cv, scoring=scoring, refit=False,
+            n_jobs=n_jobs, random_state=random_state,
+        )
+    if method == 'random':
+        space = dict(PARAM_SPACE, n_estimators=randint(*N_ESTIMATORS_RANGE))
+        return RandomizedSearchCV(
+            estimator, space, n_iter=n_iter, cv=cv, scoring=scoring, refit=False,
+            n_jobs=n_jobs, random_state=random_state,
+        )
+    raise ValueError("method debe ser 'halving' o 'random'")
+
+
+def _summary(search, method, scoring, n_splits, seconds, cache_hit):
+    results = pd.DataFrame(search.cv_results_)
+    if 'iter' in results:
+        # Halving: sólo cuenta la última ronda de cada candidato (la de más árboles)
+        results = results[results['iter'] == results['iter'].max()]
+    results = results.sort_values('rank_test_score').head(TOP_RESULTS)
+    best = {k: (v.item() if hasattr(v, 'item') else v) for k, v in search.best_params_.items()}
+    return {
+        'method': method,
+        'scoring': scoring,
+        'cv_splits': n_splits,
+        'best_score': float(search.best_score_),
+        'best_params': best,
+        'candidates': int(len(search.cv_results_['params'])),
+        'seconds': seconds,
+        'feature_cache_hit': cache_hit,
+        'top': [
+            {'params': p, 'score': float(m), 'std': float(s)}
+            for p, m, s in zip(results['params'], results['mean_test_score'], results['std_test_score'])
+        ],
+    }
+
+
+def tune_model(ticker="BTC-USD", interval="5m", method='halving', n_iter=20, n_splits=5,
+               scoring=DEFAULT_SCORING, n_jobs=-1, save=True, feature_set=None):
+    """
+    Busca la mejor configuración y (si save) re-entrena y guarda el artefacto con ella.
+    feature_set: conjunto de indicators.FEATURE_SETS (por defecto, el del modelo actual).
+    """
+    df = load_training_data(ticker)
+    if df is None:
+        print(f"Data file not found for {ticker}!")
+        return None
+    if feature_set is None:
+        feature_set = (load_metadata(ticker) or {}).get('feature_set') or DEFAULT_FEATURE_SET
+    features = resolve_feature_set(feature_set)
+
+    t0 = time.perf_counter()
+    df_ml, cache_hit = load_feature_matrix(ticker, df, features=features)
+    source = {True: 'desde caché', 'extended': 'extendidas desde caché'}.get(cache_hit, 'calculadas')
+    print(f"Features {source} en {time.perf_counter() - t0:.2f}s "
+          f"({len(df_ml)} filas)")
+
+    n_train = int(len(df_ml) * (1 - TEST_SIZE))
+    X, y = df_ml[features].iloc[:n_train], df_ml['Target'].iloc[:n_train]
+
+    search = build_search(method, n_iter, n_splits, scoring=scoring, n_jobs=n_jobs)
+    t1 = time.perf_counter()
+    search.fit(X, y)
+    tuning = _summary(search, method, scoring, n_splits, time.perf_counter() - t1, cache_hit)
+    print(f"Mejor {scoring}: {tuning['best_score']:.4f} con {tuning['best_params']} "
+          f"({tuning['candidates']} evaluaciones, {tuning['seconds']:.1f}s)")
+
+    if method == 'halving':
+        # El recurso (n_estimators) de la ronda final forma parte de la configuración
+        tuning['best_params'].setdefault('n_estimators', N_ESTIMATORS_RANGE[1])
+    if save:
+        params = dict(MODEL_PARAMS, **tuning['best_params'])
+        train_model(ticker=ticker, interval=interval, n_jobs=n_jobs, params=params, tuning=tuning,
+                    feature_set=feature_set)
+    return tuning
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Búsqueda de hiperparámetros con validación temporal")
+    parser.add_argument("--ticker", default="BTC-USD")
+    parser.add_argument("--interval", default="5m")
+    parser.add_argument("--method", choices=["halving", "random"], default="halving")
+    parser.add_argument("--n-iter", type=int, default=20, help="(random) configuraciones a probar")
+    parser.add_argument("--splits", type=int, default=5)
+    parser.add_argument("--scoring", default=DEFAULT_SCORING)
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    parser.add_argument("--no-save", action="store_true", help="Sólo buscar, sin re-entrenar el artefacto")
+    parser.add_argument("--feature-set", choices=list(FEATURE_SETS), default=None,
+                        help="Conjunto de features (por defecto, el del modelo actual)")
+    args = parser.parse_args()
+    tune_model(args.ticker, args.interval, args.method, args.n_iter, args.splits,
+               args.scoring, args.n_jobs, save=not args.no_save, feature_set=args.feature_set)
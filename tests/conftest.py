@@ -0,0 +1,21 @@
+import os
+import sys
+import glob
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(TESTS_DIR)
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'src'))
+
+# Sin instrumentación: los tests comprueban resultados, no tiempos
+os.environ.setdefault('METRICS_ENABLED', '0')
+
+RAW_CSVS = sorted(glob.glob(os.path.join(PROJECT_DIR, 'data', 'raw_*_data.csv')))
+
+
+@pytest.fixture(params=RAW_CSVS, ids=lambda p: os.path.basename(p))
+def raw_ohlcv(request):
+    """Velas de cada CSV de yfinance versionado en data/."""
+    from storage import read_legacy_csv
+    return read_legacy_csv(request.param)
@@ -0,0 +1,171 @@
+"""AlertDispatcher contra un servidor HTTP local que imita la API de Telegram."""
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import alerts
+from alerts import AlertDispatcher, MAX_MESSAGE_CHARS, split_message
+
+TOKEN = 'test-token'
+CHAT_ID = '42'
+
+
+class StubTelegram:
+    """sendMessage con respuestas programadas (por defecto 200) y registro de cada petición."""
+
+    def __init__(self):
+        self.requests = []
+        self.responses = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                stub.requests.append({'at': time.monotonic(), 'path': self.path, 'body': body})
+                status, payload = stub.responses.pop(0) if stub.responses else (200, {'ok': True})
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def texts(self):
+        return [r['body']['text'] for r in self.requests]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def telegram(monkeypatch):
+    stub = StubTelegram()
+    monkeypatch.setattr(alerts, 'TELEGRAM_API_URL', stub.url)
+    yield stub
+    stub.close()
+
+
+def dispatcher(**kwargs):
+    options = dict(token=TOKEN, chat_id=CHAT_ID, coalesce=0.2, rate_per_minute=6000,
+                   max_retries=3, session=requests.Session())
+    options.update(kwargs)
+    return AlertDispatcher(**options)
+
+
+def test_coalesces_one_bar_into_one_message(telegram):
+    d = dispatcher(coalesce=0.5)
+    for symbol, price in [('BTC-USD', 90000.0), ('ETH-USD', 3000.0), ('SOL-USD', 150.0)]:
+        assert d.submit(symbol, '2026-01-01 00:05', price, 1, 85.0)
+    assert d.flush(timeout=5)
+    assert len(telegram.requests) == 1
+    request = telegram.requests[0]
+    assert request['path'] == f'/bot{TOKEN}/sendMessage'
+    assert request['body']['chat_id'] == CHAT_ID
+    text = request['body']['text']
+    assert 'NUEVAS PREDICCIONES* (3)' in text
+    assert all(symbol in text for symbol in ('BTC-USD', 'ETH-USD', 'SOL-USD'))
+    assert d.stats['messages'] == 1 and d.stats['submitted'] == 3
+
+
+def test_deduplicates_symbol_and_bar(telegram):
+    d = dispatcher()
+    assert d.submit('BTC-USD', '2026-01-01 00:05', 90000.0, 1, 85.0)
+    assert not d.submit('BTC-USD', '2026-01-01 00:05', 90100.0, 0, 90.0)
+    assert d.submit('BTC-USD', '2026-01-01 00:10', 90100.0, 0, 90.0)
+    assert d.submit('ETH-USD', '2026-01-01 00:05', 3000.0, 1, 82.0)
+    assert d.flush(timeout=5)
+    assert d.stats['duplicates'] == 1
+    assert d.stats['submitted'] == 3
+    assert sum(text.count('BTC-USD') for text in telegram.texts) == 2
+
+
+def test_retries_429_with_retry_after_and_500_with_backoff(telegram):
+    telegram.responses = [(429, {'ok': False, 'parameters': {'retry_after': 1.5}}),
+                          (500, {'ok': False}),
+                          (200, {'ok': True})]
+    d = dispatcher()
+    d.submit('BTC-USD', '2026-01-01 00:05', 90000.0, 1, 85.0)
+    assert d.flush(timeout=10)
+    times = [r['at'] for r in telegram.requests]
+    assert len(times) == 3
+    # 429: espera lo que pide Telegram (1.5s > backoff de 1s); 500: backoff 2^1 = 2s
+    assert times[1] - times[0] >= 1.5
+    assert times[2] - times[1] >= 2.0
+    assert len(set(telegram.texts)) == 1
+    assert d.stats['retries'] == 2 and d.stats['messages'] == 1 and d.stats['failed'] == 0
+
+
+def test_gives_up_after_max_retries(telegram):
+    telegram.responses = [(500, {'ok': False})] * 5
+    d = dispatcher(max_retries=1)
+    d.submit('BTC-USD', '2026-01-01 00:05', 90000.0, 1, 85.0)
+    assert d.flush(timeout=10)
+    assert len(telegram.requests) == 2
+    assert d.stats['failed'] == 1 and d.stats['messages'] == 0
+
+
+def test_client_error_is_not_retried(telegram):
+    telegram.responses = [(400, {'ok': False, 'description': "Bad Request: can't parse entities"})]
+    d = dispatcher()
+    d.submit('BTC-USD', '2026-01-01 00:05', 90000.0, 1, 85.0)
+    assert d.flush(timeout=5)
+    assert len(telegram.requests) == 1
+    assert d.stats['failed'] == 1 and d.stats['retries'] == 0
+
+
+def test_long_batch_is_split_and_rate_limited(telegram):
+    # 60 mensajes/min: un token por segundo, sin ráfaga
+    d = dispatcher(coalesce=0.5, rate_per_minute=60)
+    symbols = [f'COIN{i:03d}-USD' for i in range(120)]
+    for i, symbol in enumerate(symbols):
+        d.submit(symbol, '2026-01-01 00:05', 1000.0 + i, i % 2, 80.0 + i / 10)
+    assert d.flush(timeout=15)
+    texts = telegram.texts
+    assert len(texts) > 1
+    assert all(len(text) <= MAX_MESSAGE_CHARS for text in texts)
+    joined = '\n'.join(texts)
+    assert all(symbol in joined for symbol in symbols)
+    times = [r['at'] for r in telegram.requests]
+    assert all(b - a >= 0.9 for a, b in zip(times, times[1:]))
+
+
+def test_disabled_without_credentials(telegram):
+    d = AlertDispatcher(token='', chat_id='', session=requests.Session())
+    assert not d.enabled
+    assert not d.submit('BTC-USD', '2026-01-01 00:05', 90000.0, 1, 85.0)
+    assert telegram.requests == []
+
+
+def test_split_message_cuts_on_lines():
+    lines = [f'linea {i:04d} ' + 'x' * 40 for i in range(300)]
+    chunks = split_message('\n'.join(lines), limit=1000)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 1000 for chunk in chunks)
+    # Ninguna línea queda partida entre dos trozos
+    assert [line for chunk in chunks for line in chunk.split('\n')] == lines
+
+
+def test_split_message_hard_splits_long_lines():
+    text = 'cabecera\n' + 'y' * 2500 + '\nfinal'
+    chunks = split_message(text, limit=1000)
+    assert all(len(chunk) <= 1000 for chunk in chunks)
+    assert ''.join(chunks).replace('\n', '') == text.replace('\n', '')
+
+
+def test_split_message_short_text():
+    assert split_message('hola', limit=1000) == ['hola']
+    assert split_message('', limit=1000) == []
@@ -0,0 +1,195 @@
+"""CandleStore offline contra CsvReplayProvider: descarga inicial, cola incremental y relleno de cabeza."""
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from candle_store import CandleStore
+from ingestion import CsvReplayProvider
+
+TICKER = 'BTC-USD'
+INTERVAL = '5m'
+STEP = pd.Timedelta(minutes=5)
+
+
+class RevisingProvider(CsvReplayProvider):
+    """Replay que suma `bump` a los cierres: simula velas revisadas por el proveedor."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.bump = 0.0
+
+    def fetch(self, ticker, interval, start=None, end=None, period=None):
+        df = super().fetch(ticker, interval, start=start, end=end, period=period)
+        df['Close'] = df['Close'] + self.bump
+        return df
+
+
+@pytest.fixture
+def replay():
+    provider = RevisingProvider()
+    full = provider._load(TICKER)
+    provider.advance(full.index[-1] - pd.Timedelta(days=10))
+    return provider, full
+
+
+@pytest.fixture
+def store(tmp_path, replay):
+    return CandleStore(root=str(tmp_path), provider=replay[0])
+
+
+def test_first_download(store, replay):
+    provider, full = replay
+    assert store.update(TICKER, INTERVAL, period='7d') > 0
+    df = store.read(TICKER, INTERVAL)
+    expected = full.loc[(full.index >= provider.now - pd.Timedelta(days=7)) & (full.index <= provider.now)]
+    pd.testing.assert_frame_equal(df, expected, check_freq=False)
+    assert provider.calls[-1]['period'] == '7d'
+    assert store._read_meta(TICKER, INTERVAL)['covered_period'] == '7d'
+
+
+def test_tail_delta_after_advance(store, replay):
+    provider, full = replay
+    store.update(TICKER, INTERVAL, period='7d')
+    last = store.last_timestamp(TICKER, INTERVAL)
+    provider.advance(provider.now + pd.Timedelta(days=1))
+
+    added = store.update(TICKER, INTERVAL, period='7d')
+    # Sólo la cola (desde la última vela menos el solape), sin volver a pedir el periodo
+    call = provider.calls[-1]
+    assert call['period'] is None and call['start'] == last - 2 * STEP
+    new = full.loc[(full.index > last) & (full.index <= provider.now)]
+    assert added == len(new)
+    df = store.read(TICKER, INTERVAL)
+    assert df.index.is_unique and df.index.is_monotonic_increasing
+    pd.testing.assert_frame_equal(df.tail(len(new)), new, check_freq=False)
+
+
+def test_overlap_newest_bar_wins(store, replay):
+    provider, full = replay
+    store.update(TICKER, INTERVAL, period='7d')
+    before = store.read(TICKER, INTERVAL)
+    last = before.index[-1]
+    provider.bump = 0.5
+    provider.advance(provider.now + 3 * STEP)
+    store.update(TICKER, INTERVAL, period='7d')
+
+    df = store.read(TICKER, INTERVAL)
+    assert df.index.is_unique and len(df) == len(before) + 3
+    revised = df.index >= last - 2 * STEP
+    np.testing.assert_array_equal(df['Close'][revised], full['Close'].reindex(df.index[revised]) + 0.5)
+    np.testing.assert_array_equal(df['Close'][~revised], before['Close'][before.index < last - 2 * STEP])
+
+
+def test_head_backfill_when_period_widens(store, replay):
+    provider, full = replay
+    store.update(TICKER, INTERVAL, period='7d')
+    first = store.read(TICKER, INTERVAL).index[0]
+
+    store.update(TICKER, INTERVAL, period='14d')
+    assert provider.calls[-1]['period'] == '14d'
+    df = store.read(TICKER, INTERVAL)
+    assert df.index[0] == full.index[full.index >= provider.now - pd.Timedelta(days=14)][0] < first
+    assert df.index.is_unique
+    pd.testing.assert_frame_equal(df, full.loc[df.index[0]:provider.now], check_freq=False)
+    assert store._read_meta(TICKER, INTERVAL)['covered_period'] == '14d'
+
+    # Ya cubierto: un periodo menor sólo trae la cola
+    calls = len(provider.calls)
+    store.update(TICKER, INTERVAL, period='7d')
+    assert [c['period'] for c in provider.calls[calls:]] == [None]
+
+
+def test_head_backfill_does_not_overwrite_stored_bars(store, replay):
+    provider, full = replay
+    store.update(TICKER, INTERVAL, period='7d')
+    before = store.read(TICKER, INTERVAL)
+    provider.bump = 1.0
+    store.update(TICKER, INTERVAL, period='14d')
+    df = store.read(TICKER, INTERVAL)
+    # Las velas ya guardadas (salvo el solape de la cola) conservan su valor
+    kept = before.index[before.index < before.index[-1] - 2 * STEP]
+    np.testing.assert_array_equal(df.loc[kept, 'Close'], before.loc[kept, 'Close'])
+
+
+def test_empty_head_fetch_does_not_mark_period_covered(store, replay, monkeypatch):
+    provider, _ = replay
+    store.update(TICKER, INTERVAL, period='7d')
+    fetch = provider.fetch
+
+    def limited(ticker, interval, start=None, end=None, period=None):
+        # Como Yahoo en 1m: más historia de la que sirve -> respuesta vacía
+        if period is not None and period != '7d':
+            return fetch(ticker, interval, start=start, end=end, period=period).iloc[:0]
+        return fetch(ticker, interval, start=start, end=end, period=period)
+
+    monkeypatch.setattr(provider, 'fetch', limited)
+    store.update(TICKER, INTERVAL, period='60d')
+    assert store._read_meta(TICKER, INTERVAL)['covered_period'] == '7d'
+    # Se vuelve a intentar en el siguiente refresco
+    store.update(TICKER, INTERVAL, period='60d')
+    assert provider.calls[-1]['period'] == '60d'
+
+
+def test_empty_first_download_leaves_no_meta(tmp_path):
+    provider = CsvReplayProvider()
+    provider.advance(pd.Timestamp('2020-01-01', tz='UTC'))
+    store = CandleStore(root=str(tmp_path), provider=provider)
+    assert store.update(TICKER, INTERVAL, period='7d') == 0
+    assert store._read_meta(TICKER, INTERVAL) == {}
+
+
+@pytest.mark.parametrize('start, end', [
+    ('2026-01-10', '2026-01-11'),
+    (pd.Timestamp('2026-01-10'), pd.Timestamp('2026-01-11')),
+    (pd.Timestamp('2026-01-10 01:00', tz='Europe/Madrid'), '2026-01-11 00:00+00:00'),
+])
+def test_read_accepts_naive_and_string_bounds(store, start, end):
+    store.update(TICKER, INTERVAL, period='60d')
+    df = store.read(TICKER, INTERVAL, start=start, end=end)
+    assert not df.empty
+    assert df.index[0] == pd.Timestamp('2026-01-10', tz='UTC')
+    assert df.index[-1] == pd.Timestamp('2026-01-11', tz='UTC') - STEP
+
+
+def test_merge():
+    index = pd.date_range('2026-01-01', periods=4, freq='5min', tz='UTC', name='Datetime')
+    old = pd.DataFrame({'Open': 1.0, 'High': 1.0, 'Low': 1.0, 'Close': [1.0, 2.0, 3.0, 4.0], 'Volume': 0},
+                       index=index)
+    new = old.iloc[2:].assign(Close=[30.0, 40.0])
+    new = pd.concat([new, old.iloc[:1].assign(Close=10.0, Volume=5)]).iloc[::-1]
+    merged = CandleStore.merge(CandleStore.merge(old, None), new)
+    assert merged.index.equals(index)
+    assert merged['Close'].tolist() == [10.0, 2.0, 30.0, 40.0]
+
+
+def test_concurrent_writers_do_not_lose_bars(tmp_path, replay):
+    # Un CandleStore por escritor, como el subproceso de refresco y el streaming del líder:
+    # sólo el lock de archivo los coordina
+    provider, full = replay
+    CandleStore(root=str(tmp_path), provider=provider).update(TICKER, INTERVAL, period='7d')
+    future = pd.date_range(provider.now + pd.Timedelta(days=1), periods=120, freq='5min', name='Datetime')
+    bars = pd.DataFrame({'Open': 1.0, 'High': 1.0, 'Low': 1.0, 'Close': np.arange(120.0), 'Volume': 0},
+                        index=future)
+    errors = []
+
+    def writer(rows):
+        store = CandleStore(root=str(tmp_path), provider=provider)
+        try:
+            for i in rows:
+                store.append(TICKER, INTERVAL, bars.iloc[i:i + 1])
+                store.update(TICKER, INTERVAL, period='7d')
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(range(k, 120, 4),)) for k in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    df = CandleStore(root=str(tmp_path), provider=provider).read(TICKER, INTERVAL)
+    pd.testing.assert_frame_equal(df.loc[future], bars, check_freq=False, check_index_type=False)
+    assert df.index.is_unique and df.index.is_monotonic_increasing
@@ -0,0 +1,75 @@
+"""
+ChartSeries.update incremental (sólo la cola y la cubeta inicial) contra una
+ChartSeries nueva sobre las mismas velas, al crecer la serie y al revisarse la
+última vela, para cada zoom y presupuesto de puntos.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from chart_data import ChartSeries
+
+INTERVAL = '5m'
+# Velas nuevas entre refrescos: de una en una, varias seguidas y saltos que cambian k
+GROWTH = [1, 1, 2, 5, 13, 1, 37, 288, 3, 700]
+
+
+@pytest.fixture(scope='module')
+def btc():
+    from conftest import RAW_CSVS
+    from storage import read_legacy_csv
+    [path] = [p for p in RAW_CSVS if os.path.basename(p) == 'raw_BTC_USD_data.csv']
+    return read_legacy_csv(path)
+
+
+def assert_same(got, want):
+    (ohlc, ma), (want_ohlc, want_ma) = got, want
+    pd.testing.assert_frame_equal(ohlc, want_ohlc, check_freq=False, rtol=1e-12)
+    # Los mismos puntos elegidos por LTTB; la MA se calcula desde otra posición (rolling)
+    pd.testing.assert_index_equal(ma.index, want_ma.index)
+    np.testing.assert_allclose(ma.to_numpy(), want_ma.to_numpy(), rtol=1e-12, equal_nan=True)
+
+
+def lengths(start, stop):
+    n, i = start, 0
+    while n < stop:
+        yield n
+        n += GROWTH[i % len(GROWTH)]
+        i += 1
+    yield stop
+
+
+@pytest.mark.parametrize('max_points', [300, 1000])
+@pytest.mark.parametrize('zoom', [None, 288, 2000])
+def test_incremental_matches_fresh(btc, zoom, max_points):
+    series = ChartSeries(INTERVAL, zoom, max_points)
+    for n in lengths(150, len(btc)):
+        df = btc.iloc[:n]
+        got = series.update(df)
+        assert_same(got, ChartSeries(INTERVAL, zoom, max_points).update(df))
+    # Cada refresco procesa menos velas que recalcular todo cada vez
+    assert series.bars_processed < sum(min(n, zoom or n) for n in lengths(150, len(btc)))
+
+
+@pytest.mark.parametrize('max_points', [300, 1000])
+@pytest.mark.parametrize('zoom', [None, 288, 2000])
+def test_revised_last_bar(btc, zoom, max_points):
+    series = ChartSeries(INTERVAL, zoom, max_points)
+    rng = np.random.default_rng(0)
+    n = 5000
+    series.update(btc.iloc[:n])
+    for step in range(30):
+        df = btc.iloc[:n].copy()
+        # La vela en curso cambia entre refrescos (nuevo máximo / mínimo / cierre)
+        last = df.index[-1]
+        close = df.at[last, 'Close'] * (1 + rng.normal(0, 0.01))
+        df.loc[last, 'Close'] = close
+        df.loc[last, 'High'] = max(df.at[last, 'High'], close)
+        df.loc[last, 'Low'] = min(df.at[last, 'Low'], close)
+        df.loc[last, 'Volume'] = df.at[last, 'Volume'] + 1000
+        assert_same(series.update(df), ChartSeries(INTERVAL, zoom, max_points).update(df))
+        # Cada tres refrescos la vela se cierra y entra la siguiente
+        if step % 3 == 2:
+            n += 1
@@ -0,0 +1,74 @@
+"""
+notify_update / UpdateListener contra PostgreSQL (sólo con PYTEST_DB=1, ver
+test_database.py): avisos en vivo y generaciones recuperadas al conectar.
+"""
+import os
+import time
+import threading
+
+import pytest
+
+pytestmark = pytest.mark.skipif(os.getenv('PYTEST_DB') != '1', reason='PYTEST_DB=1 para usar PostgreSQL')
+
+SYMBOL = 'PYTEST-USD'
+CHANNEL = 'pytest_updates'
+
+
+@pytest.fixture
+def coordination(monkeypatch):
+    import coordination
+    from database import init_db, get_connection, close_pool
+
+    def cleanup():
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM cache_generations WHERE symbol = %s", (SYMBOL,))
+
+    monkeypatch.setattr(coordination, 'DB_NOTIFY_CHANNEL', CHANNEL)
+    init_db()
+    cleanup()
+    yield coordination
+    cleanup()
+    close_pool()
+
+
+class Recorder:
+    def __init__(self):
+        self.updates = []
+        self.event = threading.Event()
+
+    def __call__(self, symbol, seq):
+        if symbol == SYMBOL:
+            self.updates.append(seq)
+            self.event.set()
+
+    def wait(self, n, timeout=10.0):
+        deadline = time.monotonic() + timeout
+        while len(self.updates) < n and time.monotonic() < deadline:
+            self.event.wait(0.05)
+            self.event.clear()
+        return self.updates
+
+
+def test_listener_reads_generation_on_connect_and_live(coordination):
+    coordination.notify_update(SYMBOL, '5m')
+    recorder = Recorder()
+    listener = coordination.UpdateListener(recorder, channel=CHANNEL)
+    listener.start()
+    try:
+        # Aviso anterior a la conexión: sale de cache_generations
+        first = recorder.wait(1)[0]
+        coordination.notify_update(SYMBOL, '5m')
+        updates = recorder.wait(2)
+        assert len(updates) == 2 and updates[1] > first
+    finally:
+        listener.stop()
+
+    # Otra réplica que conecta después empieza en la misma generación
+    late = Recorder()
+    listener = coordination.UpdateListener(late, channel=CHANNEL)
+    listener.start()
+    try:
+        assert late.wait(1) == [updates[1]]
+    finally:
+        listener.stop()
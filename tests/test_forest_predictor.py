@@ -0,0 +1,123 @@
+"""Paridad de forest_predictor.FlatForest con predict_proba de sklearn."""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+
+from features import calculate_features
+from forest_predictor import SKLEARN_MIN_ROWS, FlatForest, compile_model, get_predictor
+from indicators import FEATURE_SETS
+
+FEATURES = FEATURE_SETS['base']
+
+
+@pytest.fixture(scope='module')
+def dataset():
+    """Features reales (CSV de BTC) con el Target de train_model."""
+    from conftest import RAW_CSVS
+    from storage import read_legacy_csv
+    df = calculate_features(read_legacy_csv(RAW_CSVS[0]), features=FEATURES).dropna()
+    y = (df['Close'].shift(-1) > df['Close']).astype(int)
+    return df[FEATURES], y
+
+
+def sklearn_proba(model, X):
+    return model.predict_proba(pd.DataFrame(X, columns=FEATURES))
+
+
+FORESTS = {
+    'depth_8': dict(n_estimators=25, max_depth=8),
+    'unbounded_depth': dict(n_estimators=10, max_depth=None),
+    'max_samples': dict(n_estimators=20, max_depth=10, max_samples=0.3),
+    'max_features_sqrt': dict(n_estimators=20, max_depth=10, max_features='sqrt'),
+    'max_features_all': dict(n_estimators=20, max_depth=10, max_features=None),
+    'max_features_2_leaf_5': dict(n_estimators=20, max_features=2, min_samples_leaf=5),
+}
+
+
+@pytest.fixture(scope='module', params=list(FORESTS), ids=list(FORESTS))
+def fitted(request, dataset):
+    X, y = dataset
+    model = RandomForestClassifier(random_state=0, n_jobs=1, **FORESTS[request.param]).fit(X, y)
+    return model, X.to_numpy(dtype=np.float64)
+
+
+@pytest.mark.parametrize('rows', [1, 7, SKLEARN_MIN_ROWS - 1, SKLEARN_MIN_ROWS, 3000])
+def test_predict_proba_matches_sklearn(fitted, rows):
+    model, X = fitted
+    forest = FlatForest(model)
+    X = X[-rows:]
+    expected = sklearn_proba(model, X)
+    np.testing.assert_array_equal(forest.predict_proba(X), expected)
+    # El recorrido NumPy también por encima de SKLEARN_MIN_ROWS (donde delega en sklearn)
+    np.testing.assert_array_equal(forest.predict_proba_flat(X), expected)
+
+
+def test_single_row_1d(fitted):
+    model, X = fitted
+    forest = FlatForest(model)
+    np.testing.assert_array_equal(forest.predict_proba_flat(X[-1]), sklearn_proba(model, X[-1:]))
+
+
+def test_predict_classes_and_confidence(fitted):
+    model, X = fitted
+    X = X[-200:]
+    classes, confidence, proba = FlatForest(model).predict(X)
+    expected = sklearn_proba(model, X)
+    np.testing.assert_array_equal(proba, expected)
+    np.testing.assert_array_equal(classes, model.predict(pd.DataFrame(X, columns=FEATURES)))
+    np.testing.assert_array_equal(confidence, expected.max(axis=1))
+
+
+def test_thresholds_at_float32_boundaries(fitted):
+    # Valores justo en el umbral de cada nodo y a un ulp de float32 a cada lado
+    model, X = fitted
+    forest = FlatForest(model)
+    tree = model.estimators_[0].tree_
+    split = tree.children_left != -1
+    rows = np.repeat(X[-1:], split.sum() * 3, axis=0)
+    for i, (feature, threshold) in enumerate(zip(tree.feature[split], tree.threshold[split])):
+        t = np.float32(threshold)
+        for j, value in enumerate([t, np.nextafter(t, np.float32(-np.inf)), np.nextafter(t, np.float32(np.inf))]):
+            rows[i * 3 + j, feature] = value
+    np.testing.assert_array_equal(forest.predict_proba_flat(rows), sklearn_proba(model, rows))
+
+
+def test_missing_values(dataset):
+    X, y = dataset
+    X = X.to_numpy(dtype=np.float64).copy()
+    rng = np.random.default_rng(0)
+    X[rng.random(X.shape) < 0.05] = np.nan
+    model = RandomForestClassifier(n_estimators=10, max_depth=8, random_state=0, n_jobs=1)
+    model.fit(pd.DataFrame(X, columns=FEATURES), y)
+    np.testing.assert_array_equal(FlatForest(model).predict_proba_flat(X[-300:]), sklearn_proba(model, X[-300:]))
+
+
+def test_string_and_multiclass_labels(dataset):
+    X, y = dataset
+    labels = np.where(X['Returns_1m'] > 0.0005, 'SUBE', np.where(X['Returns_1m'] < -0.0005, 'BAJA', 'IGUAL'))
+    model = RandomForestClassifier(n_estimators=10, max_depth=6, random_state=0, n_jobs=1).fit(X, labels)
+    Xn = X.to_numpy(dtype=np.float64)[-100:]
+    classes, _, proba = FlatForest(model).predict(Xn)
+    np.testing.assert_array_equal(proba, sklearn_proba(model, Xn))
+    np.testing.assert_array_equal(classes, model.predict(pd.DataFrame(Xn, columns=FEATURES)))
+
+
+def test_compile_model_dispatch(dataset):
+    X, y = dataset
+    extra = ExtraTreesClassifier(n_estimators=5, max_depth=6, random_state=0).fit(X, y)
+    assert isinstance(compile_model(extra), FlatForest)
+    Xn = X.to_numpy(dtype=np.float64)[-50:]
+    np.testing.assert_array_equal(compile_model(extra).predict_proba(Xn), sklearn_proba(extra, Xn))
+
+    linear = LogisticRegression().fit(X, y)
+    predictor = compile_model(linear)
+    assert not isinstance(predictor, FlatForest)
+    np.testing.assert_array_equal(predictor.predict_proba(Xn), sklearn_proba(linear, Xn))
+
+
+def test_get_predictor_compiles_once(fitted):
+    model, _ = fitted
+    pack = {'model': model}
+    assert get_predictor(pack) is get_predictor(pack)
@@ -0,0 +1,113 @@
+"""grading.resolve_outcomes: pares (id, result) exactos sobre velas y predicciones construidas a mano."""
+import numpy as np
+import pandas as pd
+
+from grading import resolve_outcomes
+
+INTERVAL = '5m'
+STEP = pd.Timedelta(minutes=5)
+T0 = pd.Timestamp('2026-01-01 00:00', tz='UTC')
+
+
+def candles(closes, start=T0):
+    index = pd.date_range(start, periods=len(closes), freq='5min', tz='UTC')
+    closes = np.asarray(closes, dtype=np.float64)
+    return pd.DataFrame({'Open': closes, 'High': closes, 'Low': closes, 'Close': closes,
+                         'Volume': np.zeros(len(closes))}, index=index)
+
+
+def pending(rows):
+    """rows: (id, bar_time | None, timestamp, entry_price, prediction). Fechas naive, como en la DB."""
+    def naive(ts):
+        return None if ts is None else pd.Timestamp(ts).tz_convert('UTC').tz_localize(None)
+    return pd.DataFrame({
+        'id': [r[0] for r in rows],
+        'bar_time': pd.to_datetime([naive(r[1]) for r in rows]),
+        'timestamp': pd.to_datetime([naive(r[2]) for r in rows]),
+        'entry_price': [r[3] for r in rows],
+        'prediction': [r[4] for r in rows],
+    })
+
+
+# Cierres de las velas T0, T0+5m, ...
+CLOSES = [100.0, 101.0, 99.0, 99.0, 105.0, 104.0]
+NOW = T0 + 7 * STEP  # ya cerró la vela T0+5*STEP (cierra en T0+6*STEP)
+
+
+def test_next_bar_close_decides():
+    rows = [
+        (1, T0, T0 + pd.Timedelta(seconds=5), 100.0, 1),            # siguiente 101 > 100: acierto
+        (2, T0, T0 + pd.Timedelta(seconds=5), 100.0, 0),            # baja pero subió: fallo
+        (3, T0 + STEP, T0 + STEP, 101.0, 0),                        # 99 < 101: acierto
+        (4, T0 + STEP, T0 + STEP, 101.0, 1),                        # fallo
+        (5, T0 + 3 * STEP, T0 + 3 * STEP, 99.0, 1),                 # 105 > 99: acierto
+    ]
+    assert resolve_outcomes(pending(rows), candles(CLOSES), INTERVAL, now=NOW) == [
+        (1, 1), (2, 0), (3, 1), (4, 0), (5, 1)]
+
+
+def test_tie_is_a_miss_either_way():
+    # La vela siguiente cierra exactamente al precio de entrada: ni sube ni baja
+    rows = [(1, T0 + 2 * STEP, T0 + 2 * STEP, 99.0, 1), (2, T0 + 2 * STEP, T0 + 2 * STEP, 99.0, 0)]
+    assert resolve_outcomes(pending(rows), candles(CLOSES), INTERVAL, now=NOW) == [(1, 0), (2, 0)]
+
+
+def test_entry_price_is_the_stored_one_not_the_bar_close():
+    # Entrada a 98 en la vela T0+1 (cierre 101): la siguiente cierra en 99 > 98
+    rows = [(7, T0 + STEP, T0 + STEP, 98.0, 1)]
+    assert resolve_outcomes(pending(rows), candles(CLOSES), INTERVAL, now=NOW) == [(7, 1)]
+
+
+def test_now_cutoff():
+    # Vela predicha T0+4: la siguiente (T0+5) cierra en T0+6
+    rows = [(1, T0 + 4 * STEP, T0 + 4 * STEP, 104.5, 0)]
+    df = pending(rows)
+    close_time = T0 + 6 * STEP
+    assert resolve_outcomes(df, candles(CLOSES), INTERVAL, now=close_time - pd.Timedelta(seconds=1)) == []
+    assert resolve_outcomes(df, candles(CLOSES), INTERVAL, now=close_time) == [(1, 1)]
+
+
+def test_open_next_bar_is_not_graded_even_if_stored():
+    # El almacén ya tiene la vela T0+5 (en curso, cierre provisional): no se usa hasta que cierre
+    rows = [(1, T0 + 4 * STEP, T0 + 4 * STEP, 100.0, 1)]
+    assert resolve_outcomes(pending(rows), candles(CLOSES), INTERVAL, now=T0 + 5 * STEP + pd.Timedelta(minutes=2)) == []
+
+
+def test_missing_next_candle_stays_pending():
+    # Hueco en el almacén: falta la vela T0+3 (y no hay nada después de T0+5)
+    df_candles = candles(CLOSES).drop(T0 + 3 * STEP)
+    rows = [(1, T0 + 2 * STEP, T0 + 2 * STEP, 90.0, 1),   # siguiente = T0+3: falta
+            (2, T0 + 3 * STEP, T0 + 3 * STEP, 90.0, 1),   # siguiente = T0+4: está
+            (3, T0 + 5 * STEP, T0 + 5 * STEP, 90.0, 1)]   # siguiente = T0+6: aún no existe
+    now = T0 + 20 * STEP
+    assert resolve_outcomes(pending(rows), df_candles, INTERVAL, now=now) == [(2, 1)]
+
+
+def test_legacy_rows_use_timestamp_floored_to_interval():
+    # Sin bar_interval (legacy): la vela es la que estaba en curso al guardar
+    rows = [(1, None, T0 + STEP + pd.Timedelta(minutes=3, seconds=20), 101.0, 0),   # -> T0+1, siguiente 99
+            (2, T0, T0 + 2 * STEP + pd.Timedelta(seconds=59), 99.5, 1)]             # -> T0+2, siguiente 99
+    df = pending(rows).assign(legacy=[True, True])
+    assert resolve_outcomes(df, candles(CLOSES), INTERVAL, now=NOW) == [(1, 1), (2, 0)]
+
+
+def test_missing_bar_time_falls_back_to_timestamp():
+    # Sin columna legacy: bar_time NULL se trata como fila antigua
+    rows = [(1, None, T0 + 3 * STEP + pd.Timedelta(minutes=1), 99.0, 1),
+            (2, T0 + STEP, T0 + 3 * STEP, 101.0, 0)]
+    assert resolve_outcomes(pending(rows), candles(CLOSES), INTERVAL, now=NOW) == [(1, 1), (2, 1)]
+
+
+def test_other_interval():
+    hourly = candles([10.0, 11.0, 9.0], start=T0)
+    hourly.index = pd.date_range(T0, periods=3, freq='1h', tz='UTC')
+    rows = [(1, T0, T0, 10.0, 1), (2, T0 + pd.Timedelta(hours=1), T0 + pd.Timedelta(hours=1), 11.0, 1)]
+    now = T0 + pd.Timedelta(hours=2, minutes=30)
+    # La vela de las 02:00 aún no cerró a las 02:30
+    assert resolve_outcomes(pending(rows), hourly, '1h', now=now) == [(1, 1)]
+
+
+def test_empty_inputs():
+    rows = [(1, T0, T0, 100.0, 1)]
+    assert resolve_outcomes(pending([]), candles(CLOSES), INTERVAL, now=NOW) == []
+    assert resolve_outcomes(pending(rows), candles([]), INTERVAL, now=NOW) == []
@@ -0,0 +1,112 @@
+"""Paridad de features.IncrementalFeatures con calculate_features (batch)."""
+import copy
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from features import BASE_COLUMNS, IncrementalFeatures, calculate_features
+
+RTOL = 1e-9
+ATOL = 1e-9
+
+
+def replay(engine, df):
+    """Pasa las velas de `df` por engine.update y devuelve las features como DataFrame."""
+    rows = [engine.update(bar, ts) for ts, bar in zip(df.index, df.to_dict('records'))]
+    return pd.DataFrame(rows, index=df.index)
+
+
+def assert_parity(streamed, df):
+    expected = calculate_features(df)
+    for col in BASE_COLUMNS:
+        np.testing.assert_allclose(streamed[col].to_numpy(dtype=np.float64),
+                                   expected[col].to_numpy(dtype=np.float64),
+                                   rtol=RTOL, atol=ATOL, equal_nan=True, err_msg=col)
+
+
+def synthetic(closes, start='2026-01-01'):
+    closes = np.asarray(closes, dtype=np.float64)
+    index = pd.date_range(start, periods=len(closes), freq='5min', tz='UTC')
+    return pd.DataFrame({'Open': closes, 'High': closes, 'Low': closes, 'Close': closes,
+                         'Volume': np.zeros(len(closes))}, index=index)
+
+
+def test_update_matches_batch(raw_ohlcv):
+    assert_parity(replay(IncrementalFeatures(), raw_ohlcv), raw_ohlcv)
+
+
+def test_update_matches_batch_with_frequent_resync(raw_ohlcv):
+    # El recálculo desde los buffers no debe cambiar los valores
+    assert_parity(replay(IncrementalFeatures(resync_every=7), raw_ohlcv), raw_ohlcv)
+
+
+def test_peek_does_not_commit(raw_ohlcv):
+    df = raw_ohlcv.iloc[:300]
+    engine = IncrementalFeatures()
+    rows = []
+    for ts, bar in zip(df.index, df.to_dict('records')):
+        before = copy.deepcopy(engine.to_state())
+        peeked = engine.peek(bar)
+        assert engine.to_state() == before
+        row = engine.update(bar, ts)
+        np.testing.assert_allclose([peeked[c] for c in BASE_COLUMNS], [row[c] for c in BASE_COLUMNS],
+                                   rtol=RTOL, atol=ATOL, equal_nan=True)
+        rows.append(row)
+    assert_parity(pd.DataFrame(rows, index=df.index), df)
+
+
+@pytest.mark.parametrize('split', [1, 5, 21, 250])
+def test_state_round_trip(raw_ohlcv, split):
+    engine = IncrementalFeatures()
+    head = replay(engine, raw_ohlcv.iloc[:split])
+    restored = IncrementalFeatures.from_state(copy.deepcopy(engine.to_state()))
+    assert restored.last_timestamp == raw_ohlcv.index[split - 1]
+    tail = replay(restored, raw_ohlcv.iloc[split:])
+    assert_parity(pd.concat([head, tail]), raw_ohlcv)
+
+
+def test_warm_start(raw_ohlcv):
+    split = len(raw_ohlcv) // 2
+    engine = IncrementalFeatures.from_frame(raw_ohlcv.iloc[:split])
+    tail = replay(engine, raw_ohlcv.iloc[split:])
+    expected = calculate_features(raw_ohlcv).iloc[split:]
+    for col in BASE_COLUMNS:
+        np.testing.assert_allclose(tail[col].to_numpy(), expected[col].to_numpy(),
+                                   rtol=RTOL, atol=ATOL, equal_nan=True, err_msg=col)
+
+
+def test_constant_price_window():
+    # Rama equal_run: ventana constante -> std exactamente 0, bandas sobre la media
+    rng = np.random.default_rng(7)
+    closes = np.r_[100 + rng.normal(0, 1, 40).cumsum(), np.full(45, 101.25), 101.5, np.full(30, 101.5)]
+    df = synthetic(closes)
+    streamed = replay(IncrementalFeatures(), df)
+    assert_parity(streamed, df)
+    flat = streamed.iloc[70:85]
+    assert (flat['BB_Upper'] == flat['MA_20']).all()
+    assert (flat['BB_Lower'] == flat['MA_20']).all()
+    assert (flat['MA_20'] == 101.25).all()
+
+
+def test_nan_closes():
+    rng = np.random.default_rng(11)
+    closes = 100 + rng.normal(0, 1, 200).cumsum()
+    closes[[30, 31, 90, 150]] = np.nan
+    closes[100:104] = np.nan
+    df = synthetic(closes)
+    streamed = replay(IncrementalFeatures(), df)
+    assert_parity(streamed, df)
+    # La ventana de 20 con un NaN no tiene media
+    assert np.isnan(streamed['MA_20'].iloc[30:50]).all()
+
+
+def test_nan_closes_round_trip():
+    rng = np.random.default_rng(3)
+    closes = 100 + rng.normal(0, 1, 120).cumsum()
+    closes[[40, 41, 60]] = np.nan
+    df = synthetic(closes)
+    engine = IncrementalFeatures()
+    head = replay(engine, df.iloc[:50])
+    tail = replay(IncrementalFeatures.from_state(engine.to_state()), df.iloc[50:])
+    assert_parity(pd.concat([head, tail]), df)
@@ -0,0 +1,189 @@
+"""
+Paridad de indicators.compute con pandas (rolling / ewm) para cada entrada de
+INDICATORS: un activo, varios apilados (group_col), huecos NaN y ventanas
+constantes. También los kernels sueltos contra pandas en ventanas que cruzan
+bloques (BLOCK_SIZE).
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicators import (BB_MIN_WIDTH, BLOCK_SIZE, INDICATORS, compute, ema, rolling_extreme,
+                        rolling_moments)
+
+RTOL = 1e-9
+ATOL = 1e-9
+
+
+# --- Referencia en pandas (un activo) ---
+def _std(x, window):
+    # rolling().std() de pandas es un algoritmo online que deriva ~1e-9 relativo con
+    # precios ~1e5 (BB_Position lo amplifica): la referencia calcula cada ventana aparte,
+    # en dos pasadas (0 exacto en ventanas constantes, como pandas)
+    out = np.full(len(x), np.nan)
+    if window == 1:
+        # Una vela es una ventana constante: rolling_moments da 0 (pandas, NaN con ddof=1)
+        out[x.notna().to_numpy()] = 0.0
+    elif window <= len(x):
+        win = np.lib.stride_tricks.sliding_window_view(x.to_numpy(dtype=np.float64), window)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out[window - 1:] = np.where(win.max(axis=1) != win.min(axis=1), win.std(axis=1, ddof=1), 0.0)
+    return pd.Series(out, index=x.index)
+
+
+def _ema(x, span):
+    return x.ffill().bfill().ewm(span=span, adjust=False).mean()
+
+
+def reference(df):
+    """Dict nombre -> Series, con las mismas definiciones que INDICATORS, sin calentamiento."""
+    c, h, low = df['Close'], df['High'], df['Low']
+    v = df['Volume'].fillna(0)
+    delta = c.diff()
+    ref = {'Delta': delta}
+    for k, name in [(1, 'Returns_1m'), (2, 'Returns_2m'), (5, 'Returns_5'), (15, 'Returns_15'), (60, 'Returns_60')]:
+        ref[name] = c / c.shift(k) - 1
+    ma = c.rolling(20).mean()
+    std = _std(c, 20)
+    ref['MA_20'] = ma
+    ref['Dist_MA_20'] = (c - ma) / ma
+    gain = delta.where(delta > 0, 0).rolling(14).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
+    ref['RSI_14'] = 100 - 100 / (1 + gain / loss)
+    ref['BB_Upper'] = ma + std * 2
+    ref['BB_Lower'] = ma - std * 2
+    width = (ref['BB_Upper'] - ref['BB_Lower']).replace(0, BB_MIN_WIDTH)
+    ref['BB_Position'] = (c - ref['BB_Lower']) / width
+    ref['Dist_EMA_12'] = c / _ema(c, 12) - 1
+    ref['Dist_EMA_26'] = c / _ema(c, 26) - 1
+    macd = _ema(c, 12) - _ema(c, 26)
+    ref['MACD'] = macd
+    ref['MACD_Rel'] = macd / c
+    ref['MACD_Hist_Rel'] = (macd - _ema(macd, 9)) / c
+    ref['Volatility_15'] = _std(ref['Returns_1m'], 15)
+    ref['Volatility_60'] = _std(ref['Returns_1m'], 60)
+    prev = c.shift(1)
+    tr = pd.concat([h - low, (h - prev).abs(), (low - prev).abs()], axis=1).max(axis=1)
+    ref['ATR_Rel_14'] = tr.rolling(14).mean() / c
+    hh, ll = h.rolling(14).max(), low.rolling(14).min()
+    stoch = 100 * (c - ll) / (hh - ll)
+    ref['Stoch_K_14'] = stoch.where(hh - ll != 0, 50.0)
+    ref['Stoch_D_14'] = ref['Stoch_K_14'].rolling(3).mean()
+    flow = (np.sign(delta.fillna(0)) * v).rolling(20).mean()
+    volume = v.rolling(20).mean()
+    ref['OBV_Flow_20'] = (flow / volume).where(volume != 0, 0.0).where(flow.notna())
+    pv = ((h + low + c) / 3 * v).rolling(20).mean()
+    vwap = (pv / volume).where(volume != 0)
+    ref['Dist_VWAP_20'] = (c / vwap - 1).where(vwap.notna(), 0.0).where(pv.notna())
+    return ref
+
+
+def expected(df, name, group_col=None):
+    """Referencia de `name` por activo, con su calentamiento y ±inf -> 0 (como compute)."""
+    warmup = INDICATORS[name][1]
+    groups = [g for _, g in df.groupby(group_col, sort=False)] if group_col else [df]
+    parts = []
+    for g in groups:
+        values = reference(g)[name].to_numpy(dtype=np.float64).copy()
+        values[:warmup] = np.nan
+        parts.append(values)
+    values = np.concatenate(parts)
+    values[np.isinf(values)] = 0.0
+    return values
+
+
+def assert_parity(df, group_col=None):
+    got = compute(df, list(INDICATORS), group_col=group_col)
+    for name in INDICATORS:
+        np.testing.assert_allclose(got[name], expected(df, name, group_col),
+                                   rtol=RTOL, atol=ATOL, equal_nan=True, err_msg=name)
+
+
+# --- Datos ---
+def with_gaps(df):
+    """Huecos NaN: velas sueltas y un tramo seguido, en precios y volumen."""
+    df = df.copy()
+    n = len(df)
+    for pos in (n // 7, n // 3, n // 3 + 1, n // 2 + 11):
+        df.iloc[pos, df.columns.get_indexer(['Open', 'High', 'Low', 'Close'])] = np.nan
+    df.iloc[n // 5:n // 5 + 30, df.columns.get_loc('Close')] = np.nan
+    df.iloc[n // 4, df.columns.get_loc('Volume')] = np.nan
+    return df
+
+
+def with_flat(df):
+    """Tramos de precio constante (más largos que las ventanas) con y sin volumen."""
+    df = df.copy()
+    n = len(df)
+    price = df['Close'].iloc[n // 3]
+    df.iloc[n // 3:n // 3 + 120, df.columns.get_indexer(['Open', 'High', 'Low', 'Close'])] = price
+    df.iloc[n // 3:n // 3 + 60, df.columns.get_loc('Volume')] = 0
+    df.iloc[2 * n // 3:2 * n // 3 + 25, df.columns.get_indexer(['Open', 'High', 'Low', 'Close'])] = 1.0
+    return df
+
+
+def stacked(frames):
+    return pd.concat([f.assign(Symbol=str(i)) for i, f in enumerate(frames)])
+
+
+# --- compute() contra pandas ---
+def test_indicators_match_pandas(raw_ohlcv):
+    assert_parity(raw_ohlcv)
+
+
+def test_indicators_match_pandas_with_nan_gaps(raw_ohlcv):
+    assert_parity(with_gaps(raw_ohlcv))
+
+
+def test_indicators_match_pandas_with_constant_windows(raw_ohlcv):
+    assert_parity(with_flat(raw_ohlcv))
+
+
+def test_indicators_match_pandas_stacked(raw_ohlcv):
+    # Ninguna ventana ni EMA cruza de un activo al siguiente; incluye un activo
+    # más corto que el calentamiento de las EMAs
+    frames = [raw_ohlcv, with_gaps(raw_ohlcv.iloc[:700]), with_flat(raw_ohlcv.iloc[-2000:]), raw_ohlcv.iloc[:40]]
+    assert_parity(stacked(frames), group_col='Symbol')
+
+
+def test_unknown_indicator():
+    with pytest.raises(ValueError):
+        compute(pd.DataFrame({'Close': [1.0]}), ['RSI_15'])
+
+
+# --- Kernels ---
+def random_walk(n, level=90000.0, seed=0):
+    rng = np.random.default_rng(seed)
+    return level * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+
+
+@pytest.mark.parametrize('window', [1, 2, 20, BLOCK_SIZE - 1, BLOCK_SIZE, BLOCK_SIZE + 44])
+@pytest.mark.parametrize('n', [5, BLOCK_SIZE, 3 * BLOCK_SIZE + 17])
+def test_rolling_kernels_match_pandas(window, n):
+    x = random_walk(n)
+    x[n // 2] = np.nan
+    x[n // 4:n // 4 + window + 3] = x[n // 4]
+    s = pd.Series(x)
+    mean, sd = rolling_moments(x, window)
+    np.testing.assert_allclose(mean, s.rolling(window).mean(), rtol=RTOL, equal_nan=True)
+    np.testing.assert_allclose(sd, _std(s, window), rtol=RTOL, atol=ATOL, equal_nan=True)
+    np.testing.assert_array_equal(rolling_extreme(x, window, np.maximum), s.rolling(window).max())
+    np.testing.assert_array_equal(rolling_extreme(x, window, np.minimum), s.rolling(window).min())
+
+
+def test_constant_window_is_exact():
+    x = np.concatenate([random_walk(50), np.full(40, 12345.678)])
+    mean, sd = rolling_moments(x, 20)
+    assert (mean[69:] == 12345.678).all()
+    assert (sd[69:] == 0.0).all()
+
+
+@pytest.mark.parametrize('span', [3, 12, 26])
+def test_ema_matches_pandas_per_asset(span):
+    x = random_walk(900)
+    x[100:105] = np.nan
+    starts = [0, 300, 301, 650]
+    got = ema(x, span, starts)
+    bounds = starts + [len(x)]
+    want = np.concatenate([_ema(pd.Series(x[a:b]), span).to_numpy() for a, b in zip(bounds[:-1], bounds[1:])])
+    np.testing.assert_allclose(got, want, rtol=RTOL, equal_nan=True)
@@ -0,0 +1,114 @@
+"""inference.predict_all con un proveedor de velas en memoria y bosques pequeños."""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from candle_store import CandleStore
+from features import calculate_features
+from indicators import FEATURE_SETS
+from inference import pack_warmup_bars, predict_all
+
+INTERVAL = '5m'
+N_BARS = 800
+START = pd.Timestamp('2026-01-01', tz='UTC')
+
+
+def synthetic_ohlcv(seed, level):
+    rng = np.random.default_rng(seed)
+    close = level * np.exp(rng.normal(0, 0.002, N_BARS).cumsum())
+    open_ = np.r_[close[0], close[:-1]]
+    index = pd.date_range(START, periods=N_BARS, freq='5min')
+    return pd.DataFrame({'Open': open_, 'High': np.maximum(open_, close) * 1.001,
+                         'Low': np.minimum(open_, close) * 0.999, 'Close': close,
+                         'Volume': rng.integers(1, 1000, N_BARS)}, index=index)
+
+
+class StubProvider:
+    """Mismo contrato que YahooFinanceProvider.fetch, sobre frames fijos."""
+
+    def __init__(self, frames, failing=()):
+        self.frames = frames
+        self.failing = set(failing)
+        self.calls = []
+
+    def fetch(self, ticker, interval, start=None, end=None, period=None):
+        self.calls.append(ticker)
+        if ticker in self.failing:
+            raise ConnectionError(f"{ticker} no disponible")
+        df = self.frames.get(ticker, pd.DataFrame(columns=['Open', 'High', 'Low', 'Close', 'Volume']))
+        if start is not None:
+            df = df.loc[df.index >= pd.Timestamp(start)]
+        return df.copy()
+
+
+def fit_pack(df, features, version):
+    data = calculate_features(df, features=features).dropna()
+    target = (data['Close'].shift(-1) > data['Close']).astype(int)
+    model = RandomForestClassifier(n_estimators=5, max_depth=4, random_state=0)
+    model.fit(data[features], target)
+    return {'model': model, 'features': features, 'interval': INTERVAL, 'version': version}
+
+
+@pytest.fixture
+def frames():
+    return {'BTC-USD': synthetic_ohlcv(1, 90000.0), 'ETH-USD': synthetic_ohlcv(2, 3000.0),
+            'SOL-USD': synthetic_ohlcv(3, 150.0)}
+
+
+@pytest.fixture
+def packs(frames):
+    return {'BTC-USD': fit_pack(frames['BTC-USD'], FEATURE_SETS['base'], 3),
+            # Conjunto 'full': más velas de calentamiento (pack_warmup_bars)
+            'ETH-USD': fit_pack(frames['ETH-USD'], FEATURE_SETS['full'], 1),
+            'SOL-USD': fit_pack(frames['SOL-USD'], ['RSI_14', 'BB_Position'], None)}
+
+
+def expected_prediction(df, pack):
+    """Predicción de referencia: features del activo solo (misma cola) y predict_proba de sklearn."""
+    row = calculate_features(df.tail(pack_warmup_bars(pack)), features=pack['features']).iloc[[-1]]
+    proba = pack['model'].predict_proba(row[pack['features']].fillna(0.0))[0]
+    return int(pack['model'].classes_[proba.argmax()]), float(proba.max() * 100)
+
+
+def test_predict_all_matches_per_asset_reference(tmp_path, frames, packs):
+    store = CandleStore(root=str(tmp_path), provider=StubProvider(frames))
+    # La última vela sigue abierta: se predice sobre la anterior
+    now = frames['BTC-USD'].index[-1] + pd.Timedelta(minutes=2)
+    predictions, timings = predict_all(list(frames), store=store, model_packs=packs, save=False, now=now)
+
+    assert sorted(predictions['symbol']) == sorted(frames)
+    assert {'fetch', 'features', 'predict', 'total'} <= set(timings)
+    for _, row in predictions.iterrows():
+        df = frames[row['symbol']].iloc[:-1]
+        pack = packs[row['symbol']]
+        prediction, confidence = expected_prediction(df, pack)
+        assert row['bar_time'] == df.index[-1]
+        assert row['bar_interval'] == INTERVAL
+        assert row['model_version'] == ('' if pack['version'] is None else str(pack['version']))
+        assert row['entry_price'] == pytest.approx(df['Close'].iloc[-1])
+        assert row['prediction'] == prediction
+        assert row['confidence'] == pytest.approx(confidence)
+
+
+def test_predict_all_keeps_open_bar(tmp_path, frames, packs):
+    store = CandleStore(root=str(tmp_path), provider=StubProvider(frames))
+    predictions, _ = predict_all(['BTC-USD'], store=store, model_packs=packs, save=False, closed_only=False)
+    assert list(predictions['bar_time']) == [frames['BTC-USD'].index[-1]]
+
+
+def test_predict_all_skips_failed_and_missing(tmp_path, frames, packs):
+    provider = StubProvider(frames, failing=['ETH-USD'])
+    store = CandleStore(root=str(tmp_path), provider=provider)
+    packs = {**packs, 'SOL-USD': None}
+    predictions, _ = predict_all(list(frames), store=store, model_packs=packs, save=False, closed_only=False)
+    assert list(predictions['symbol']) == ['BTC-USD']
+    # Sin modelo no se descarga nada
+    assert 'SOL-USD' not in provider.calls
+
+
+def test_predict_all_without_models(tmp_path, frames):
+    store = CandleStore(root=str(tmp_path), provider=StubProvider(frames))
+    predictions, timings = predict_all(list(frames), store=store, model_packs={}, save=False)
+    assert predictions.empty
+    assert 'fetch' not in timings
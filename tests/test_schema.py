@@ -0,0 +1,130 @@
+"""
+Migraciones y retención de schema.py. Los que usan PostgreSQL sólo corren con
+PYTEST_DB=1 (ver test_database.py). La retención borra de verdad (particiones
+antiguas incluidas): apuntar a una base de pruebas. Las filas del test llevan
+bar_interval='pytest' y se borran al terminar.
+"""
+import os
+from datetime import datetime, time, timedelta
+
+import pytest
+
+from schema import ROLLUP_LIVE_DAYS, check_retention
+
+TEST_INTERVAL = 'pytest'
+SYMBOLS = ['PYTEST-USD', 'PYTEST2-USD']
+
+needs_db = pytest.mark.skipif(os.getenv('PYTEST_DB') != '1', reason='PYTEST_DB=1 para usar PostgreSQL')
+
+
+@pytest.fixture
+def db():
+    from database import init_db, get_connection, close_pool
+
+    def cleanup():
+        with get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM predictions WHERE bar_interval = %s", (TEST_INTERVAL,))
+                cur.execute("DELETE FROM predictions_daily WHERE bar_interval = %s", (TEST_INTERVAL,))
+
+    init_db()
+    cleanup()
+    yield get_connection
+    cleanup()
+    close_pool()
+
+
+def seed(days_back=45):
+    """Una predicción por activo y día (hoy incluido), calificadas salvo las de hoy."""
+    from database import save_predictions, grade_predictions
+    today = datetime.utcnow().date()
+    rows = []
+    for d in range(days_back, -1, -1):
+        for i, symbol in enumerate(SYMBOLS):
+            rows.append({'symbol': symbol, 'bar_time': datetime.combine(today - timedelta(days=d), time(i)),
+                         'bar_interval': TEST_INTERVAL, 'model_version': 'pytest', 'entry_price': 100.0,
+                         'prediction': (d + i) % 2, 'confidence': 50.0 + (d * 7) % 50})
+    ids = {(r['symbol'], r['bar_time']): r['id'] for r in save_predictions(rows)}
+    assert len(ids) == len(rows)
+    by_symbol = {s: {'total': 0, 'ups': 0, 'graded': 0, 'wins': 0} for s in SYMBOLS}
+    results = []
+    for row in rows:
+        stats = by_symbol[row['symbol']]
+        stats['total'] += 1
+        stats['ups'] += row['prediction']
+        if row['bar_time'].date() < today:
+            win = int((row['bar_time'].day + len(row['symbol'])) % 3 == 0)
+            results.append((ids[(row['symbol'], row['bar_time'])], win))
+            stats['graded'] += 1
+            stats['wins'] += win
+    grade_predictions(results)
+    return by_symbol
+
+
+def summary():
+    from database import get_performance_summary
+    df = get_performance_summary(symbols=SYMBOLS).set_index('symbol')
+    return {s: {c: int(df.at[s, c]) for c in ['total', 'ups', 'graded', 'wins']} for s in df.index}
+
+
+@pytest.mark.parametrize('days', [1, 2, ROLLUP_LIVE_DAYS])
+def test_retention_cannot_reach_live_days(days):
+    with pytest.raises(ValueError):
+        check_retention(days)
+
+
+@pytest.mark.parametrize('days', [0, None, ROLLUP_LIVE_DAYS + 1, 180])
+def test_valid_retention(days):
+    check_retention(days)
+
+
+@needs_db
+def test_migrate_is_idempotent(db):
+    from schema import MIGRATIONS, migrate
+    assert migrate() == []
+    # Cada migración vuelve a aplicarse sin error sobre el esquema ya migrado
+    with db() as conn:
+        with conn.cursor() as cur:
+            for _, _, fn in MIGRATIONS:
+                fn(cur)
+    assert migrate() == []
+    with db() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT version FROM schema_migrations ORDER BY version")
+            assert [r[0] for r in cur.fetchall()] == [v for v, _, _ in MIGRATIONS]
+
+
+@needs_db
+def test_retention_keeps_totals(db):
+    from schema import rebuild_rollup, run_maintenance, _month_start
+    expected = seed()
+    # Filas históricas añadidas a posteriori: como tras un backfill, se recalcula el rollup
+    rebuild_rollup()
+    assert summary() == expected
+
+    retention = ROLLUP_LIVE_DAYS + 1
+    run_maintenance(retention_days=retention)
+    cutoff = datetime.utcnow().date() - timedelta(days=retention)
+    with db() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT MIN(bar_time), COUNT(*) FROM predictions WHERE bar_interval = %s",
+                        (TEST_INTERVAL,))
+            oldest, remaining = cur.fetchone()
+    # Se borran las particiones de meses ya pasados y, en la DEFAULT, hasta el corte; el
+    # mes del corte se conserva entero hasta que termine
+    assert oldest.date() >= _month_start(cutoff)
+    assert remaining < sum(s['total'] for s in expected.values())
+    # Lo borrado sigue contando desde predictions_daily
+    assert summary() == expected
+
+
+@needs_db
+def test_retention_into_live_days_is_rejected_before_touching_anything(db):
+    from schema import run_maintenance
+    expected = seed(days_back=10)
+    with pytest.raises(ValueError):
+        run_maintenance(retention_days=ROLLUP_LIVE_DAYS)
+    with db() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM predictions WHERE bar_interval = %s", (TEST_INTERVAL,))
+            assert cur.fetchone()[0] == sum(s['total'] for s in expected.values())
@@ -0,0 +1,58 @@
+"""Claves de shared_cache.cached: generación por activo y entradas en disco compartidas entre procesos."""
+import pytest
+
+import shared_cache
+from shared_cache import SharedCache, bump_generation, cached
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_cache, '_generations', {})
+    monkeypatch.setattr(shared_cache, '_cache', SharedCache(cache_dir=str(tmp_path)))
+    return str(tmp_path)
+
+
+def counting_loader(calls, value):
+    def loader():
+        calls.append(value)
+        return value
+    return loader
+
+
+def new_process(cache_dir, monkeypatch, generations):
+    """Otra réplica: caché en memoria vacía, mismo directorio y las generaciones que leyó de Postgres."""
+    monkeypatch.setattr(shared_cache, '_cache', SharedCache(cache_dir=cache_dir))
+    monkeypatch.setattr(shared_cache, '_generations', {})
+    for symbol, seq in generations.items():
+        bump_generation(symbol, seq)
+
+
+def test_generation_invalidates_only_its_symbol(cache_dir):
+    calls = []
+    cached('latest', 'BTC-USD', '5m', counting_loader(calls, 'btc-1'))
+    cached('latest', 'ETH-USD', '5m', counting_loader(calls, 'eth-1'))
+    bump_generation('BTC-USD', 1)
+    assert cached('latest', 'BTC-USD', '5m', counting_loader(calls, 'btc-2')) == 'btc-2'
+    assert cached('latest', 'ETH-USD', '5m', counting_loader(calls, 'eth-2')) == 'eth-1'
+    assert calls == ['btc-1', 'eth-1', 'btc-2']
+
+
+def test_older_generation_is_ignored(cache_dir):
+    bump_generation('BTC-USD', 7)
+    # Aviso atrasado, entregado después de releer cache_generations al reconectar
+    bump_generation('BTC-USD', 5)
+    assert shared_cache._generations['BTC-USD'] == 7
+
+
+def test_replicas_share_disk_entries(cache_dir, monkeypatch):
+    calls = []
+    bump_generation('BTC-USD', 3)
+    cached('history', 'BTC-USD', '5m', counting_loader(calls, 'a'))
+    # Una réplica que arranca (o reconecta) después lee la misma generación: acierto en disco
+    new_process(cache_dir, monkeypatch, {'BTC-USD': 3})
+    assert cached('history', 'BTC-USD', '5m', counting_loader(calls, 'b')) == 'a'
+    assert shared_cache.get_cache().stats()['disk_hits'] == 1
+    # Con una generación nueva se vuelve a leer el origen
+    new_process(cache_dir, monkeypatch, {'BTC-USD': 4})
+    assert cached('history', 'BTC-USD', '5m', counting_loader(calls, 'c')) == 'c'
+    assert calls == ['a', 'c']
@@ -0,0 +1,39 @@
+"""Escritura atómica de storage.save_ohlcv con varios escritores del mismo archivo."""
+import os
+import threading
+
+import pytest
+
+from storage import FORMATS, load_ohlcv, save_ohlcv, temp_path
+
+
+def test_temp_path_is_unique_and_beside_target(tmp_path):
+    path = str(tmp_path / 'raw_BTC_USD_data.parquet')
+    first, second = temp_path(path), temp_path(path)
+    assert first != second
+    assert os.path.dirname(first) == str(tmp_path)
+
+
+@pytest.mark.parametrize('fmt', list(FORMATS))
+def test_concurrent_writers_leave_a_complete_file(raw_ohlcv, tmp_path, fmt):
+    path = str(tmp_path / f'raw_BTC_USD_data{FORMATS[fmt]}')
+    # Cada escritor guarda un tramo distinto: el resultado es uno de ellos entero
+    parts = [raw_ohlcv.iloc[:len(raw_ohlcv) // 2 + i] for i in range(6)]
+    errors = []
+
+    def write(df):
+        try:
+            for _ in range(5):
+                save_ohlcv(df, path)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(df,)) for df in parts]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
+    assert len(load_ohlcv(path)) in {len(df) for df in parts}
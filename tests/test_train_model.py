@@ -0,0 +1,72 @@
+"""trained_until y refresh_model: la última vela (Target provisional) no se da por entrenada."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import feature_cache
+import model_registry
+import storage
+from model_registry import load_metadata
+from storage import save_ohlcv, training_data_path
+from train_model import refresh_model, train_model
+
+TICKER = 'TEST-USD'
+N_BARS = 3000
+NEW_BARS = 50
+
+
+def synthetic_ohlcv(n, seed=5):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(rng.normal(0, 0.002, n).cumsum())
+    open_ = np.r_[close[0], close[:-1]]
+    index = pd.date_range('2026-01-01', periods=n, freq='5min', tz='UTC')
+    return pd.DataFrame({'Open': open_, 'High': np.maximum(open_, close) * 1.001,
+                         'Low': np.minimum(open_, close) * 0.999, 'Close': close,
+                         'Volume': rng.integers(1, 1000, n)}, index=index)
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, 'DATA_DIR', str(tmp_path / 'data'))
+    monkeypatch.setattr(model_registry, 'MODELS_DIR', str(tmp_path / 'models'))
+    monkeypatch.setattr(feature_cache, 'FEATURE_CACHE_DIR', str(tmp_path / 'features'))
+    (tmp_path / 'data').mkdir()
+    candles = synthetic_ohlcv(N_BARS + NEW_BARS)
+
+    def write(n):
+        save_ohlcv(candles.iloc[:n], training_data_path(TICKER))
+        return candles.iloc[:n]
+
+    return write
+
+
+def train(**kwargs):
+    return train_model(TICKER, '5m', n_jobs=1, params={'n_estimators': 20, 'max_depth': 6, 'random_state': 0},
+                       feature_set='base', **kwargs)
+
+
+@pytest.mark.parametrize('low_memory', [False, True])
+def test_full_training_stops_before_placeholder_target(workspace, low_memory):
+    candles = workspace(N_BARS)
+    train(low_memory=low_memory)
+    assert pd.Timestamp(load_metadata(TICKER)['trained_until']) == candles.index[-2]
+
+
+def test_refresh_uses_only_labeled_rows(workspace):
+    workspace(N_BARS)
+    full = train(low_memory=False)
+    candles = workspace(N_BARS + NEW_BARS)
+
+    result = refresh_model(TICKER, n_jobs=1, trees=5, window=500)
+    meta = load_metadata(TICKER)
+    assert pd.Timestamp(meta['trained_until']) == candles.index[-2]
+    # La vela que antes era la última (Target provisional) entra ahora con su Target real
+    assert meta['refresh']['new_rows'] == NEW_BARS
+    assert meta['refresh']['window_rows'] == 500
+    # accuracy sigue siendo la de test del entrenamiento completo; la del modelo anterior va aparte
+    assert result['accuracy'] == pytest.approx(full['accuracy'])
+    assert 0.0 <= result['accuracy_before'] <= 1.0
+    assert result['accuracy_before'] == pytest.approx(meta['refresh']['accuracy_before'])
+
+    # Sin velas nuevas no hay nada que refrescar
+    assert refresh_model(TICKER, n_jobs=1, trees=5, window=500)['skipped']